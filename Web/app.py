@@ -9,12 +9,13 @@
     - 创建Flask应用实例
     - 配置开发环境
     - 启动应用服务器
+    - 只在入口中创建应用，进程池子进程重新执行本模块时没有副作用
 
 作者: Jolly
 创建时间: 2025-04-01
-最后修改: 2025-06-13
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.2.1
+版本: 1.2.2
 
 依赖:
     - app: 应用工厂函数
@@ -31,7 +32,12 @@ load_dotenv()
 
 from app import create_app
 
-app = create_app('development')
+
+def main():
+    # 应用只在入口中创建：进程池子进程会重新执行本模块，模块级别创建应用会在每个子进程中重复初始化
+    app = create_app('development')
+    app.run(host='0.0.0.0', debug=True, port=5000)
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True, port=5000)
\ No newline at end of file
+    main()
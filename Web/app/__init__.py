@@ -10,12 +10,13 @@
     - 初始化数据库和扩展
     - 注册蓝图和错误处理器
     - 设置CORS和中间件
+    - 在子进程（如Markdown转换进程池）中重新执行主模块时不初始化数据库和后台任务
 
 作者: Jolly
 创建时间: 2025-06-04
-最后修改: 2025-06-04
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.0.0
+版本: 1.0.1
 
 依赖:
     - flask: Web框架
@@ -35,7 +36,14 @@ from app.api.files import files_bp
 from app.api.notes import notes_bp
 from app.api.folders import folders_bp
 from app.api.health import health_bp
-from app.api.ai import ai_bp
+from app.api.ai import ai_bp, summary_service, prefetch_service, temp_file_manager
+from app.api.duplicates import duplicates_bp
+from app.services import note_events, note_text
+from app.services.related_index import related_index
+from app.services.duplicate_detector import duplicate_detector
+from app.services.conversion_pool import conversion_pool
+from app.services.revision_store import revision_store
+from app.services.db_backup import db_backup
 from app.config import config
 
 # 设置更详细的日志记录
@@ -49,6 +57,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _in_worker_bootstrap():
+    """子进程正在以 __mp_main__ 重新执行主模块（父进程中 __mp_main__ 与 __main__ 是同一模块）"""
+    mp_main = sys.modules.get('__mp_main__')
+    return mp_main is not None and mp_main is not sys.modules.get('__main__')
+
 def create_app(config_name='default'):
     """创建并配置Flask应用"""
     app = Flask(__name__)
@@ -92,10 +105,29 @@ def create_app(config_name='default'):
     app.register_blueprint(folders_bp, url_prefix='/api')
     app.register_blueprint(health_bp, url_prefix='/api')
     app.register_blueprint(ai_bp, url_prefix='/api')  # 新的模块化AI API
+    app.register_blueprint(duplicates_bp, url_prefix='/api')
+    
+    # 进程池子进程（forkserver/spawn）启动时会以 __mp_main__ 重新执行主模块，主模块中创建的应用
+    # 不连接数据库，也不启动摘要刷新、产物清理、版本压缩、数据库备份等后台任务
+    if _in_worker_bootstrap():
+        logger.debug('子进程中创建应用：跳过数据库初始化和后台任务')
+        return app
     
     # 创建数据库表
     with app.app_context():
         db.create_all()
+    note_text.init_app(app)
+    
+    # 笔记变更事件和摘要后台刷新
+    note_events.install()
+    summary_service.init_app(app)
+    prefetch_service.init_app(app)
+    temp_file_manager.janitor.init_app(app)
+    related_index.init_app(app)
+    duplicate_detector.init_app(app)
+    conversion_pool.init_app(app)
+    revision_store.init_app(app)
+    db_backup.init_app(app)
     
     @app.route('/')
     def index():
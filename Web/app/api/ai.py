@@ -10,32 +10,57 @@
     - AI内容优化API
     - 结果应用和备份管理API
     - 临时文件管理API
+    - 精简响应模式（compact）：只返回产物引用、大小和指纹，正文通过分段读取接口按需获取
+    - 修订版本备份：按版本ID或时间点恢复，分页列出
 
 作者: Jolly
 创建时间: 2025-04-01
-最后修改: 2025-06-04
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.2.0
+版本: 1.7.2
 
 依赖:
     - Flask: Web框架
     - app.services: 业务服务模块
 
 API端点:
-    - POST /api/ai/collect-content: 收集内容
-    - POST /api/ai/optimize-content: 优化内容
-    - POST /api/ai/apply-optimization: 应用优化结果
+    - POST /api/ai/collect-content: 收集内容（内容未变化时直接使用缓存）
+    - POST /api/ai/prefetch: 打开文件时请求后台预收集
+    - POST /api/ai/optimize-content: 优化内容（from_collected 时使用已收集的内容）
+    - POST /api/ai/optimization-report: 按需生成块级优化报告
+    - POST /api/ai/apply-optimization: 应用优化结果（from_artifact 时使用已保存的优化结果，需提供 artifact_etag）
+    - POST /api/ai/preview-optimization: 预览应用优化会执行的操作（from_artifact 同上）
+    - GET /api/ai/artifacts/<filename>/text: 按字节偏移分段读取产物正文
+    - POST /api/ai/restore-backup: 按修订版本ID或时间点恢复文件
+    - GET /api/ai/list-backups/<file_id>: 分页列出文件的修订版本
+    - GET /api/ai/backups/<file_id>/<backup_id>: 读取指定版本的笔记内容
     - GET /api/ai/temp-files: 获取临时文件列表
+    - GET /api/ai/temp-file/<filename>: 临时文件内容（JSON），download/raw 参数时流式发送（支持gzip原样发送和Range）
+    - GET /api/ai/health: AI服务健康状态（含熔断、限流状态）
+    - GET /api/ai/metrics: AI调用运行指标
+    - POST /api/ai/batch: 批量收集/优化/摘要/应用
+    - GET /api/ai/batch/<job_id>: 批量任务进度
+    - GET /api/ai/summary/<file_id>: 读取已保存的文件摘要
+    - GET /api/ai/summaries: 批量读取文件摘要
+    - POST /api/ai/summary/<file_id>/refresh: 刷新文件摘要
 
 许可证: Apache-2.0
 """
 
 import os
-from flask import Blueprint, request, jsonify, send_file
+import datetime
+from flask import Blueprint, request, jsonify, send_file, current_app, Response
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import wrap_file
 from app.services.data_processor import DataProcessor
 from app.services.ai_optimizer import AIOptimizer
 from app.services.data_applier import DataApplier
 from app.services.temp_file_manager import TempFileManager
+from app.services.batch_processor import BatchProcessor
+from app.services.summary_service import SummaryService
+from app.services.prefetch_service import PrefetchService
+from app.services.artifact_store import strip_header, artifact_etag, ENCODING_GZIP
+from app.utils.metrics import metrics
 import logging
 
 # 设置日志级别
@@ -51,6 +76,56 @@ data_processor = DataProcessor(TEMP_DIR)
 ai_optimizer = AIOptimizer(TEMP_DIR)
 data_applier = DataApplier()
 temp_file_manager = TempFileManager(TEMP_DIR)
+batch_processor = BatchProcessor(data_processor, ai_optimizer, data_applier)
+summary_service = SummaryService(data_processor)
+prefetch_service = PrefetchService(data_processor)
+
+
+# 精简模式下不返回的正文字段，改为返回 <字段>_length，正文通过产物分段读取接口获取
+_TEXT_FIELDS = ('original_content', 'optimized_content', 'applied_content', 'collected_content', 'content')
+
+
+def _wants_compact(data=None):
+    """请求是否要求精简响应（查询参数或请求体中的 compact）"""
+    value = request.args.get('compact')
+    if value is None and data:
+        value = data.get('compact')
+    return str(value).lower() in ('true', '1')
+
+
+def _compact(result):
+    """去掉响应中的正文字段并保留长度，嵌套的结果一并处理"""
+    if isinstance(result, dict):
+        compacted = {}
+        for key, value in result.items():
+            if key in _TEXT_FIELDS and isinstance(value, str):
+                compacted[f'{key}_length'] = len(value)
+            else:
+                compacted[key] = _compact(value)
+        return compacted
+    if isinstance(result, list):
+        return [_compact(item) for item in result]
+    return result
+
+
+def _saved_optimized_content(file_id, optimization_type, etag):
+    """
+    读取客户端审阅过的那份优化结果正文
+    
+    Returns:
+        tuple: (正文, 错误响应)，成功时错误响应为None
+    """
+    if not etag:
+        return None, (jsonify({
+            'success': False,
+            'error': '使用已保存的优化结果时需要提供 artifact_etag（优化结果引用中的 etag）'
+        }), 400)
+    result = ai_optimizer.get_optimized_content(file_id, optimization_type, expected_etag=etag)
+    if result.get('conflict'):
+        return None, (jsonify(result), 409)
+    if not result['success']:
+        return None, (jsonify(result), 404)
+    return strip_header(result['optimized_content']), None
 
 
 # 简单测试端点
@@ -82,6 +157,8 @@ def collect_content():
         
         # 调用数据处理器收集内容
         result = data_processor.collect_file_content(file_id)
+        if _wants_compact(data):
+            result = _compact(result)
         
         if result['success']:
             return jsonify(result), 200
@@ -96,13 +173,52 @@ def collect_content():
         }), 500
 
 
+@ai_bp.route('/ai/prefetch', methods=['POST'])
+def prefetch_content():
+    """
+    打开文件时请求后台预收集内容，未启用预收集时直接返回
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        file_id = data.get('file_id')
+        
+        if not file_id:
+            return jsonify({
+                'success': False,
+                'error': '缺少文件ID参数'
+            }), 400
+        
+        if isinstance(file_id, str) and file_id.strip().isdigit():
+            file_id = int(file_id)
+        if isinstance(file_id, bool) or not isinstance(file_id, int):
+            return jsonify({
+                'success': False,
+                'error': f'无效的文件ID: {file_id!r}'
+            }), 400
+        
+        queued = prefetch_service.request(file_id)
+        return jsonify({
+            'success': True,
+            'enabled': prefetch_service.enabled,
+            'queued': queued
+        }), 202 if queued else 200
+        
+    except Exception as e:
+        logger.error(f"请求预收集失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'请求预收集时发生错误: {str(e)}'
+        }), 500
+
+
 @ai_bp.route('/ai/collected-content/<int:file_id>', methods=['GET'])
 def get_collected_content(file_id):
     """
-    获取已收集的内容
+    获取已收集的内容，body_only=true 时只返回正文（不含元数据头部）
     """
     try:
-        result = data_processor.get_collected_content(file_id)
+        body_only = request.args.get('body_only', 'false').lower() == 'true'
+        result = data_processor.get_collected_content(file_id, body_only=body_only)
         
         if result['success']:
             return jsonify(result), 200
@@ -149,6 +265,11 @@ def optimize_content():
         file_id = data.get('file_id')
         content = data.get('content')
         optimization_type = data.get('type', 'general')
+        detailed_report = bool(data.get('detailed_report', False))
+        
+        if not content and file_id and data.get('from_collected'):
+            # 使用服务端已收集的内容，客户端不必先下载再上传正文
+            content = data_processor.read_collected_content(file_id)
         
         print(f"🔧 [DEBUG] 请求参数: file_id={file_id}, content_length={len(content) if content else 0}, type={optimization_type}")
         logger.info(f"请求参数: file_id={file_id}, content_length={len(content) if content else 0}, type={optimization_type}")
@@ -174,10 +295,12 @@ def optimize_content():
         logger.info(f"开始AI优化: file_name={file_name}")
         
         # 调用AI优化器
-        result = ai_optimizer.optimize_content(file_id, file_name, content, optimization_type)
+        result = ai_optimizer.optimize_content(file_id, file_name, content, optimization_type, detailed_report)
         
         print(f"🔧 [DEBUG] AI优化结果: success={result.get('success', False)}")
         logger.info(f"AI优化结果: success={result.get('success', False)}")
+        if _wants_compact(data):
+            result = _compact(result)
         
         if result['success']:
             return jsonify(result), 200
@@ -192,6 +315,53 @@ def optimize_content():
         }), 500
 
 
+@ai_bp.route('/ai/optimization-report', methods=['POST'])
+def get_optimization_report():
+    """
+    按需生成块级优化报告
+    
+    请求体可以直接提供 original_content 和 optimized_content，
+    也可以只提供 file_id，使用已保存的收集内容和优化结果
+    """
+    try:
+        data = request.get_json() or {}
+        optimization_type = data.get('optimization_type', data.get('type', 'general'))
+        original = data.get('original_content')
+        optimized = data.get('optimized_content')
+        
+        if original is None or optimized is None:
+            file_id = data.get('file_id')
+            if not file_id:
+                return jsonify({
+                    'success': False,
+                    'error': '缺少文件ID或内容参数'
+                }), 400
+            
+            collected = data_processor.get_collected_content(file_id)
+            optimized_result = ai_optimizer.get_optimized_content(file_id, optimization_type)
+            if not collected['success'] or not optimized_result['success']:
+                return jsonify({
+                    'success': False,
+                    'error': '未找到收集内容或优化结果'
+                }), 404
+            original = strip_header(collected['collected_content'])
+            optimized = strip_header(optimized_result['optimized_content'])
+        
+        from app.services.ai_service import ai_service
+        report = ai_service.build_report(original, optimized, optimization_type)
+        return jsonify({
+            'success': True,
+            'report': report
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"生成优化报告失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'生成优化报告时发生错误: {str(e)}'
+        }), 500
+
+
 @ai_bp.route('/ai/optimized-content/<int:file_id>', methods=['GET'])
 def get_optimized_content(file_id):
     """
@@ -277,6 +447,87 @@ def generate_summary():
         }), 500
 
 
+@ai_bp.route('/ai/summary/<int:file_id>', methods=['GET'])
+def get_file_summary(file_id):
+    """
+    读取已保存的文件摘要，check_stale=true 时同时返回摘要是否过期
+    """
+    try:
+        check_stale = request.args.get('check_stale', 'false').lower() == 'true'
+        summary = summary_service.get_summary(file_id, check_stale=check_stale)
+        if summary is None:
+            return jsonify({
+                'success': False,
+                'error': '该文件尚未生成摘要'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'summary': summary
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"读取文件摘要失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'读取文件摘要时发生错误: {str(e)}'
+        }), 500
+
+
+@ai_bp.route('/ai/summaries', methods=['GET'])
+def get_file_summaries():
+    """
+    批量读取文件摘要，file_ids 为逗号分隔的文件ID列表
+    """
+    try:
+        raw_ids = request.args.get('file_ids', '')
+        try:
+            file_ids = [int(value) for value in raw_ids.split(',') if value.strip()]
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': '文件ID列表格式错误'
+            }), 400
+        
+        check_stale = request.args.get('check_stale', 'false').lower() == 'true'
+        summaries = summary_service.get_summaries(file_ids, check_stale=check_stale)
+        return jsonify({
+            'success': True,
+            'summaries': {str(file_id): summary for file_id, summary in summaries.items()}
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"批量读取文件摘要失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'批量读取文件摘要时发生错误: {str(e)}'
+        }), 500
+
+
+@ai_bp.route('/ai/summary/<int:file_id>/refresh', methods=['POST'])
+def refresh_file_summary(file_id):
+    """
+    刷新文件摘要，内容未变化时直接返回已保存的摘要，force=true 时强制重新生成
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        result = summary_service.refresh(file_id, force=bool(data.get('force', False)))
+        
+        if result['success']:
+            return jsonify(result), 200
+        elif result.get('error') == '文件不存在':
+            return jsonify(result), 404
+        else:
+            return jsonify(result), 500
+            
+    except Exception as e:
+        logger.error(f"刷新文件摘要失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'刷新文件摘要时发生错误: {str(e)}'
+        }), 500
+
+
 # ==================== 数据返回相关API ====================
 
 @ai_bp.route('/ai/apply-optimization', methods=['POST'])
@@ -289,12 +540,21 @@ def apply_optimization():
         file_id = data.get('file_id')
         optimized_content = data.get('optimized_content')
         backup_original = data.get('backup_original', True)
+        duplicate_check = data.get('duplicate_check')
+        mode = data.get('mode', 'diff')
         
         if not file_id:
             return jsonify({
                 'success': False,
                 'error': '缺少文件ID参数'
             }), 400
+        
+        if not optimized_content and data.get('from_artifact'):
+            # 使用服务端保存的优化结果，客户端不必回传正文；必须是客户端审阅过的版本
+            optimized_content, error_response = _saved_optimized_content(
+                file_id, data.get('optimization_type', 'general'), data.get('artifact_etag'))
+            if error_response:
+                return error_response
             
         if not optimized_content:
             return jsonify({
@@ -302,11 +562,28 @@ def apply_optimization():
                 'error': '缺少优化内容参数'
             }), 400
         
+        if duplicate_check not in (None, 'warn', 'block'):
+            return jsonify({
+                'success': False,
+                'error': 'duplicate_check 只能是 warn 或 block'
+            }), 400
+        
+        if mode not in ('diff', 'replace'):
+            return jsonify({
+                'success': False,
+                'error': 'mode 只能是 diff 或 replace'
+            }), 400
+        
         # 调用数据应用器
-        result = data_applier.apply_optimization(file_id, optimized_content, backup_original)
+        result = data_applier.apply_optimization(file_id, optimized_content, backup_original, duplicate_check,
+                                                 mode=mode)
+        if _wants_compact(data):
+            result = _compact(result)
         
         if result['success']:
             return jsonify(result), 200
+        elif result.get('duplicate_warnings'):
+            return jsonify(result), 409
         else:
             return jsonify(result), 400
             
@@ -318,15 +595,61 @@ def apply_optimization():
         }), 500
 
 
+@ai_bp.route('/ai/preview-optimization', methods=['POST'])
+def preview_optimization():
+    """
+    预览应用优化结果会插入、修改、删除和调序的笔记，不写入数据库
+    """
+    try:
+        data = request.get_json() or {}
+        file_id = data.get('file_id')
+        optimized_content = data.get('optimized_content')
+        
+        if not file_id:
+            return jsonify({
+                'success': False,
+                'error': '缺少文件ID参数'
+            }), 400
+        
+        if not optimized_content and data.get('from_artifact'):
+            optimized_content, error_response = _saved_optimized_content(
+                file_id, data.get('optimization_type', 'general'), data.get('artifact_etag'))
+            if error_response:
+                return error_response
+        
+        if not optimized_content:
+            return jsonify({
+                'success': False,
+                'error': '缺少优化内容参数'
+            }), 400
+        
+        result = data_applier.preview_optimization(file_id, optimized_content, compact=_wants_compact(data))
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 400
+            
+    except Exception as e:
+        logger.error(f"预览优化失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'预览优化时发生错误: {str(e)}'
+        }), 500
+
+
 @ai_bp.route('/ai/restore-backup', methods=['POST'])
 def restore_backup():
     """
     恢复备份内容
+    
+    请求体: file_id，以及 backup_id（修订版本ID）或 at（ISO格式的UTC时间点）之一
     """
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         file_id = data.get('file_id')
         backup_id = data.get('backup_id')
+        at = data.get('at')
         
         if not file_id:
             return jsonify({
@@ -334,14 +657,26 @@ def restore_backup():
                 'error': '缺少文件ID参数'
             }), 400
             
-        if not backup_id:
+        if not backup_id and not at:
             return jsonify({
                 'success': False,
                 'error': '缺少备份ID参数'
             }), 400
         
+        try:
+            backup_id = int(backup_id) if backup_id else None
+            at = datetime.datetime.fromisoformat(at) if at else None
+            if at is not None and at.tzinfo is not None:
+                # 版本时间以不带时区的UTC保存
+                at = at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': '备份ID或时间点格式无效'
+            }), 400
+        
         # 调用数据应用器恢复备份
-        result = data_applier.restore_backup(file_id, backup_id)
+        result = data_applier.restore_backup(file_id, backup_id, at=at)
         
         if result['success']:
             return jsonify(result), 200
@@ -360,9 +695,13 @@ def restore_backup():
 def list_backups(file_id):
     """
     获取文件的备份列表
+    
+    查询参数: limit 每页数量（默认50），before_id 翻页时传上一页返回的 next_before_id
     """
     try:
-        result = data_applier.list_backups(file_id)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        before_id = request.args.get('before_id', type=int)
+        result = data_applier.list_backups(file_id, limit=limit, before_id=before_id)
         
         if result['success']:
             return jsonify(result), 200
@@ -377,6 +716,27 @@ def list_backups(file_id):
         }), 500
 
 
+@ai_bp.route('/ai/backups/<int:file_id>/<int:backup_id>', methods=['GET'])
+def get_backup(file_id, backup_id):
+    """
+    读取指定备份版本时文件的笔记内容
+    """
+    try:
+        result = data_applier.get_backup(file_id, backup_id)
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 404
+            
+    except Exception as e:
+        logger.error(f"读取备份失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'读取备份时发生错误: {str(e)}'
+        }), 500
+
+
 # ==================== 临时文件管理API ====================
 
 @ai_bp.route('/ai/temp-files', methods=['GET'])
@@ -401,25 +761,66 @@ def get_temp_files():
         }), 500
 
 
+def _send_artifact(record, as_attachment):
+    """
+    流式发送产物文件，内存占用与文件大小无关
+
+    客户端接受 gzip 时原样发送压缩文件（Content-Encoding: gzip，可走 sendfile 零拷贝），
+    否则边读边解压；两种方式都支持条件请求和 Range 请求
+    """
+    etag = artifact_etag(record)
+    if record['encoding'] == ENCODING_GZIP and request.accept_encodings['gzip']:
+        response = send_file(record['path'], mimetype='text/plain', as_attachment=as_attachment,
+                             download_name=record['filename'], etag=f'{etag}-gz',
+                             last_modified=record['created_at'], max_age=0)
+        response.headers['Content-Encoding'] = ENCODING_GZIP
+    elif not record['encoding']:
+        response = send_file(record['path'], mimetype='text/plain', as_attachment=as_attachment,
+                             download_name=record['filename'], etag=etag,
+                             last_modified=record['created_at'], max_age=0)
+    else:
+        stream = temp_file_manager.artifacts.open(record)
+        try:
+            response = Response(wrap_file(request.environ, stream), mimetype='text/plain',
+                                direct_passthrough=True)
+            response.content_length = record['size']
+            response.set_etag(etag)
+            response.last_modified = record['created_at']
+            response.accept_ranges = 'bytes'
+            if as_attachment:
+                response.headers.set('Content-Disposition', 'attachment', filename=record['filename'])
+            response.make_conditional(request, accept_ranges=True, complete_length=record['size'])
+        except Exception:
+            # 例如 416：响应不会发送，立即关闭文件
+            stream.close()
+            raise
+        if response.status_code in (304, 412):
+            # 不发送响应体，不必等到响应结束才关闭文件
+            stream.close()
+            response.response = []
+    response.vary.add('Accept-Encoding')
+    metrics.incr('artifacts.downloads')
+    return response
+
+
 @ai_bp.route('/ai/temp-file/<filename>', methods=['GET'])
 def get_temp_file(filename):
     """
-    获取临时文件内容或下载临时文件
+    获取临时文件内容（JSON），或以 download=true（附件）/ raw=true（内联）流式发送文件
     """
     try:
-        # 检查是否请求下载
         download = request.args.get('download', 'false').lower() == 'true'
+        raw = request.args.get('raw', 'false').lower() == 'true'
         
-        if download:
-            # 返回文件下载
-            temp_filepath = os.path.join(TEMP_DIR, filename)
-            if not os.path.exists(temp_filepath):
+        if download or raw:
+            record = temp_file_manager.get_temp_file_record(filename)
+            if not record:
                 return jsonify({
                     'success': False,
                     'error': '临时文件不存在'
                 }), 404
             
-            return send_file(temp_filepath, as_attachment=True, download_name=filename)
+            return _send_artifact(record, as_attachment=download)
         else:
             # 返回文件内容
             result = data_processor.get_temp_file_content(filename)
@@ -429,6 +830,15 @@ def get_temp_file(filename):
             else:
                 return jsonify(result), 404
                 
+    except HTTPException as e:
+        # 例如 416 Range Not Satisfiable
+        return e
+    except FileNotFoundError:
+        # 查询到记录后文件已被清理
+        return jsonify({
+            'success': False,
+            'error': '临时文件不存在'
+        }), 404
     except Exception as e:
         logger.error(f"获取临时文件失败: {str(e)}")
         return jsonify({
@@ -437,6 +847,42 @@ def get_temp_file(filename):
         }), 500
 
 
+@ai_bp.route('/ai/artifacts/<filename>/text', methods=['GET'])
+def get_artifact_text(filename):
+    """
+    按字节偏移分段读取产物正文
+    
+    查询参数: offset 起始偏移（默认0），limit 本段字节数（不超过 AI_TEXT_PAGE_MAX），
+    body_only=true 时跳过元数据头部；继续读取时把返回的 next_offset 作为下一次的 offset
+    """
+    try:
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', current_app.config.get('AI_TEXT_PAGE_SIZE', 64 * 1024), type=int)
+        body_only = request.args.get('body_only', 'false').lower() == 'true'
+        
+        if offset < 0 or limit <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'offset 不能为负数，limit 必须大于0'
+            }), 400
+        
+        limit = min(limit, current_app.config.get('AI_TEXT_PAGE_MAX', 1024 * 1024))
+        result = data_processor.read_artifact_text(filename, offset, limit, body_only=body_only)
+        
+        if result['success']:
+            metrics.incr('artifacts.text_pages')
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 404
+            
+    except Exception as e:
+        logger.error(f"分段读取产物失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'分段读取产物时发生错误: {str(e)}'
+        }), 500
+
+
 @ai_bp.route('/ai/cleanup-temp-files', methods=['POST'])
 def cleanup_temp_files():
     """
@@ -505,6 +951,26 @@ def check_health():
         }), 500
 
 
+@ai_bp.route('/ai/metrics', methods=['GET'])
+def get_metrics():
+    """
+    获取AI调用相关的运行指标（调用次数、重试、超时、熔断状态、耗时等）
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'metrics': metrics.snapshot(),
+            'prefetch': prefetch_service.get_stats()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"获取运行指标失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'获取运行指标时发生错误: {str(e)}'
+        }), 500
+
+
 # ==================== 完整流程API ====================
 
 @ai_bp.route('/ai/full-optimization', methods=['POST'])
@@ -517,6 +983,7 @@ def full_optimization():
         file_id = data.get('file_id')
         optimization_type = data.get('optimization_type', 'general')
         backup_original = data.get('backup_original', True)
+        compact = _wants_compact(data)
         
         if not file_id:
             return jsonify({
@@ -535,11 +1002,18 @@ def full_optimization():
                 'step': 'collect'
             }), 400
         
-        # 步骤2: AI优化
+        # 步骤2: AI优化（收集结果只包含产物引用，正文从产物读取）
+        collected_content = data_processor.read_collected_content(file_id)
+        if collected_content is None:
+            return jsonify({
+                'success': False,
+                'error': '收集内容失败: 未找到收集的内容',
+                'step': 'collect'
+            }), 400
         optimize_result = ai_optimizer.optimize_content(
             file_id, 
             collect_result['file_name'], 
-            collect_result['collected_content'], 
+            collected_content, 
             optimization_type
         )
         
@@ -564,17 +1038,18 @@ def full_optimization():
                     'success': False,
                     'error': f'应用优化失败: {apply_result["error"]}',
                     'step': 'apply',
-                    'optimization_result': optimize_result
+                    'optimization_result': _compact(optimize_result) if compact else optimize_result
                 }), 400
         
-        return jsonify({
+        result = {
             'success': True,
             'file_id': file_id,
             'steps_completed': ['collect', 'optimize'] + (['apply'] if apply_result else []),
             'collect_result': collect_result,
             'optimize_result': optimize_result,
             'apply_result': apply_result
-        }), 200
+        }
+        return jsonify(_compact(result) if compact else result), 200
         
     except Exception as e:
         logger.error(f"完整AI优化流程失败: {str(e)}")
@@ -583,3 +1058,149 @@ def full_optimization():
             'error': f'完整AI优化流程时发生错误: {str(e)}',
             'step': 'unknown'
         }), 500
+
+
+# ==================== 批量处理API ====================
+
+@ai_bp.route('/ai/batch', methods=['POST'])
+def create_batch_job():
+    """
+    对文件夹或文件列表批量执行收集/优化/摘要/应用，立即返回任务ID，进度通过任务查询接口获取
+    """
+    try:
+        data = request.get_json() or {}
+        folder_id = data.get('folder_id')
+        file_ids = data.get('file_ids')
+        
+        if not folder_id and not file_ids:
+            return jsonify({
+                'success': False,
+                'error': '缺少文件夹ID或文件ID列表参数'
+            }), 400
+        
+        steps, error = BatchProcessor.normalize_steps(data.get('operations'), data.get('apply', False))
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
+        from app.models.note_file import NoteFile
+        if folder_id:
+            files = NoteFile.query.filter_by(folder_id=folder_id).order_by(NoteFile.order).all()
+            file_ids = [f.id for f in files]
+        else:
+            requested, error = BatchProcessor.normalize_file_ids(file_ids)
+            if error:
+                return jsonify({
+                    'success': False,
+                    'error': error
+                }), 400
+            existing = {f.id for f in NoteFile.query.filter(NoteFile.id.in_(requested)).all()}
+            missing = [fid for fid in requested if fid not in existing]
+            if missing:
+                return jsonify({
+                    'success': False,
+                    'error': f'文件不存在: {missing}'
+                }), 404
+            file_ids = requested
+        
+        if not file_ids:
+            return jsonify({
+                'success': False,
+                'error': '没有需要处理的文件'
+            }), 400
+        
+        job = batch_processor.submit(
+            current_app._get_current_object(),
+            file_ids,
+            steps,
+            optimization_type=data.get('optimization_type', 'general'),
+            backup_original=data.get('backup_original', True)
+        )
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(include_items=False),
+            'url': f'/api/ai/batch/{job.id}'
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"创建批量任务失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'创建批量任务时发生错误: {str(e)}'
+        }), 500
+
+
+@ai_bp.route('/ai/batch', methods=['GET'])
+def list_batch_jobs():
+    """
+    获取最近的批量任务列表
+    """
+    return jsonify({
+        'success': True,
+        'jobs': batch_processor.list_jobs()
+    }), 200
+
+
+@ai_bp.route('/ai/batch/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    """
+    获取批量任务进度，包含每个文件的状态
+    """
+    job = batch_processor.get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': '批量任务不存在'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    }), 200
+
+
+@ai_bp.route('/ai/batch/<job_id>/resume', methods=['POST'])
+def resume_batch_job(job_id):
+    """
+    继续执行批量任务中失败或被取消的文件，已完成的步骤不会重复执行
+    """
+    try:
+        job = batch_processor.resume(current_app._get_current_object(), job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': '批量任务不存在'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(include_items=False)
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"继续批量任务失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'继续批量任务时发生错误: {str(e)}'
+        }), 500
+
+
+@ai_bp.route('/ai/batch/<job_id>/cancel', methods=['POST'])
+def cancel_batch_job(job_id):
+    """
+    取消批量任务
+    """
+    job = batch_processor.cancel(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': '批量任务不存在'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(include_items=False)
+    }), 200
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: duplicates.py
+模块: API路由 - 重复笔记检测
+描述: 提供近似重复笔记的查询接口
+功能:
+    - GET /api/duplicates - 查询工作区或文件夹内的近似重复笔记分组
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - flask: Web框架
+    - app.services.duplicate_detector: 近似重复检测服务
+
+许可证: Apache-2.0
+"""
+
+import logging
+from flask import Blueprint, request, jsonify
+from app.services.duplicate_detector import duplicate_detector
+
+logger = logging.getLogger(__name__)
+
+duplicates_bp = Blueprint('duplicates', __name__)
+
+
+def parse_threshold(default=None):
+    """解析相似度阈值参数，非法时抛出ValueError"""
+    threshold = request.args.get('threshold', default, type=float)
+    if threshold is not None and not 0 < threshold <= 1:
+        raise ValueError('相似度阈值必须在0到1之间')
+    return threshold
+
+
+@duplicates_bp.route('/duplicates', methods=['GET'])
+def get_duplicates():
+    """
+    查询近似重复笔记分组，folder_id 为空时检查整个工作区
+    """
+    try:
+        threshold = parse_threshold()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        folder_id = request.args.get('folder_id', type=int)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+        result = duplicate_detector.find_duplicates(folder_id=folder_id, threshold=threshold, limit=limit)
+        return jsonify({
+            'success': True,
+            'scope': 'folder' if folder_id is not None else 'workspace',
+            'folder_id': folder_id,
+            **result
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"查询重复笔记失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'查询重复笔记时发生错误: {str(e)}'
+        }), 500
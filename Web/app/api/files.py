@@ -28,6 +28,7 @@ API端点:
     - PUT /api/files/<id>: 更新文件信息
     - DELETE /api/files/<id>: 删除文件
     - PUT /api/files/reorder: 重新排序文件
+    - GET /api/files/<id>/related: 获取相关文件
 
 许可证: Apache-2.0
 """
@@ -43,6 +44,7 @@ from flask import Blueprint, request, jsonify
 # 本地应用导入
 from app.extensions import db
 from app.models.note_file import NoteFile
+from app.services.related_index import related_index
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -298,6 +300,30 @@ def update_file(file_id):
         logger.error(traceback.format_exc())
         return jsonify({'error': '更新文件失败'}), 500
 
+@files_bp.route('/files/<int:file_id>/related', methods=['GET'])
+def get_related_files(file_id):
+    """获取与指定文件内容相关的其他文件"""
+    NoteFile.query.get_or_404(file_id)
+    k = min(max(request.args.get('k', 10, type=int), 1), 50)
+    
+    try:
+        related = related_index.related_files(file_id, k=k)
+        names = {f.id: f.name for f in NoteFile.query.filter(NoteFile.id.in_([r['file_id'] for r in related])).all()}
+        results = []
+        for item in related:
+            if item['file_id'] in names:
+                item['name'] = names[item['file_id']]
+                results.append(item)
+        
+        return jsonify({
+            'file_id': file_id,
+            'related': results
+        })
+    except Exception as e:
+        logger.error(f"查询文件 {file_id} 的相关文件失败: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': '查询相关文件失败'}), 500
+
 @files_bp.route('/files/<int:file_id>', methods=['DELETE'])
 def delete_file(file_id):
     """删除笔记文件"""
@@ -28,6 +28,8 @@ API端点:
     - GET /api/notes/<id>: 获取特定笔记
     - PUT /api/notes/<id>: 更新笔记
     - DELETE /api/notes/<id>: 删除笔记
+    - GET /api/notes/<id>/related: 获取相关笔记
+    - GET /api/notes/<id>/similar: 获取近似重复的笔记块
 
 注意事项:
     - 所有API都返回统一的JSON格式
@@ -41,6 +43,9 @@ from flask import Blueprint, request, jsonify
 from app.extensions import db  # 更新导入路径
 from app.models.note_file import NoteFile  
 from app.models.note import Note  
+from app.services.related_index import related_index
+from app.services.duplicate_detector import duplicate_detector
+from app.services.note_text import plain_text_of
 
 notes_bp = Blueprint('notes_bp', __name__)
 
@@ -131,6 +136,56 @@ def delete_note(note_id):
     db.session.commit()
     return jsonify({'message': 'Note deleted successfully'})
 
+@notes_bp.route('/notes/<int:note_id>/related', methods=['GET'])
+def get_related_notes(note_id):
+    """获取与指定笔记内容相关的其他文件中的笔记"""
+    Note.query.get_or_404(note_id)
+    k = min(max(request.args.get('k', 10, type=int), 1), 50)
+    include_same_file = request.args.get('include_same_file', 'false').lower() == 'true'
+    
+    related = related_index.related_notes(note_id, k=k, include_same_file=include_same_file) or []
+    
+    # 一次查询补充笔记预览和文件名
+    notes = {note.id: note for note in Note.query.filter(Note.id.in_([r['note_id'] for r in related])).all()}
+    files = {f.id: f.name for f in NoteFile.query.filter(NoteFile.id.in_([r['file_id'] for r in related])).all()}
+    results = []
+    for item in related:
+        note = notes.get(item['note_id'])
+        if note is None:
+            continue
+        item['format'] = note.format
+        item['preview'] = plain_text_of(note.plain_text, note.content)[:100]
+        item['file_name'] = files.get(item['file_id'])
+        results.append(item)
+    
+    return jsonify({
+        'note_id': note_id,
+        'related': results
+    })
+
+@notes_bp.route('/notes/<int:note_id>/similar', methods=['GET'])
+def get_similar_notes(note_id):
+    """获取与指定笔记近似重复的笔记块"""
+    Note.query.get_or_404(note_id)
+    threshold = request.args.get('threshold', 0.5, type=float)
+    if not 0 < threshold <= 1:
+        return jsonify({
+            'error': 'Invalid request',
+            'message': 'threshold must be in (0, 1]'
+        }), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    similar = duplicate_detector.similar_notes(note_id, threshold=threshold, limit=limit)
+    notes = {note.id: note for note in Note.query.filter(Note.id.in_([s['note_id'] for s in similar])).all()}
+    for item in similar:
+        note = notes.get(item['note_id'])
+        item['preview'] = plain_text_of(note.plain_text, note.content)[:100] if note else ''
+    
+    return jsonify({
+        'note_id': note_id,
+        'similar': similar
+    })
+
 @notes_bp.route('/notes/reorder', methods=['PUT'])
 def reorder_notes():
     """重新排序笔记"""
@@ -43,6 +43,62 @@ class Config:
     # 应用配置
     DEBUG = False
     TESTING = False
+    
+    # 文件摘要后台刷新配置
+    SUMMARY_AUTO_REFRESH = os.environ.get('SUMMARY_AUTO_REFRESH', 'true').lower() == 'true'
+    SUMMARY_REFRESH_DEBOUNCE = float(os.environ.get('SUMMARY_REFRESH_DEBOUNCE', '60'))
+    SUMMARY_REFRESH_WORKERS = int(os.environ.get('SUMMARY_REFRESH_WORKERS', '2'))
+    SUMMARY_REFRESH_INTERVAL = float(os.environ.get('SUMMARY_REFRESH_INTERVAL', '5'))
+    
+    # AI内容预收集配置（默认关闭）
+    AI_PREFETCH_ENABLED = os.environ.get('AI_PREFETCH_ENABLED', 'false').lower() == 'true'
+    AI_PREFETCH_IDLE_DELAY = float(os.environ.get('AI_PREFETCH_IDLE_DELAY', '10'))
+    AI_PREFETCH_WORKERS = int(os.environ.get('AI_PREFETCH_WORKERS', '1'))
+    AI_PREFETCH_INTERVAL = float(os.environ.get('AI_PREFETCH_INTERVAL', '2'))
+
+    # AI中间产物后台清理（总字节配额 + 每文件数量上限，按访问时间LRU淘汰）
+    ARTIFACT_JANITOR_ENABLED = os.environ.get('ARTIFACT_JANITOR_ENABLED', 'true').lower() == 'true'
+    ARTIFACT_JANITOR_INTERVAL = float(os.environ.get('ARTIFACT_JANITOR_INTERVAL', '300'))
+    ARTIFACT_QUOTA_BYTES = int(os.environ.get('ARTIFACT_QUOTA_BYTES', str(256 * 1024 * 1024)))
+    ARTIFACT_MAX_PER_FILE = int(os.environ.get('ARTIFACT_MAX_PER_FILE', '2'))
+    ARTIFACT_MAX_AGE_DAYS = float(os.environ.get('ARTIFACT_MAX_AGE_DAYS', '7'))
+    
+    # 相关笔记向量索引配置
+    RELATED_INDEX_DIR = os.environ.get('RELATED_INDEX_DIR') or os.path.join(basedir, 'index', 'related')
+    RELATED_INDEX_DIM = int(os.environ.get('RELATED_INDEX_DIM', '1024'))
+    
+    # 近似重复检测的默认相似度阈值
+    DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', '0.8'))
+    
+    # 大文件Markdown并行转换（进程数为0时按CPU核数自动选择）
+    NOTE_CONVERT_WORKERS = int(os.environ.get('NOTE_CONVERT_WORKERS', '0'))
+    NOTE_CONVERT_PARALLEL_MIN_NOTES = int(os.environ.get('NOTE_CONVERT_PARALLEL_MIN_NOTES', '1000'))
+    NOTE_CONVERT_PARALLEL_MIN_CHARS = int(os.environ.get('NOTE_CONVERT_PARALLEL_MIN_CHARS', str(256 * 1024)))
+    
+    # AI产物正文分段读取（字节）：默认每段大小和单次请求上限
+    AI_TEXT_PAGE_SIZE = int(os.environ.get('AI_TEXT_PAGE_SIZE', str(64 * 1024)))
+    AI_TEXT_PAGE_MAX = int(os.environ.get('AI_TEXT_PAGE_MAX', str(1024 * 1024)))
+    
+    # 文件修订版本（差量 + 定期快照）及保留策略
+    REVISIONS_ENABLED = os.environ.get('REVISIONS_ENABLED', 'true').lower() == 'true'
+    REVISION_SNAPSHOT_INTERVAL = int(os.environ.get('REVISION_SNAPSHOT_INTERVAL', '32'))
+    REVISION_COALESCE_SECONDS = float(os.environ.get('REVISION_COALESCE_SECONDS', '300'))
+    REVISION_KEEP_ALL_HOURS = float(os.environ.get('REVISION_KEEP_ALL_HOURS', '24'))
+    REVISION_THIN_MINUTES = float(os.environ.get('REVISION_THIN_MINUTES', '60'))
+    REVISION_DAILY_AFTER_DAYS = float(os.environ.get('REVISION_DAILY_AFTER_DAYS', '7'))
+    REVISION_MAX_AGE_DAYS = float(os.environ.get('REVISION_MAX_AGE_DAYS', '90'))
+    REVISION_COMPACT_ENABLED = os.environ.get('REVISION_COMPACT_ENABLED', 'true').lower() == 'true'
+    REVISION_COMPACT_INTERVAL = float(os.environ.get('REVISION_COMPACT_INTERVAL', '3600'))
+    
+    # 数据库在线备份（SQLite备份接口分步复制）及保留数量
+    BACKUP_ENABLED = os.environ.get('BACKUP_ENABLED', 'true').lower() == 'true'
+    BACKUP_DIR = os.environ.get('BACKUP_DIR') or os.path.join(basedir, 'backups')
+    BACKUP_INTERVAL = float(os.environ.get('BACKUP_INTERVAL', '3600'))
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', '24'))
+    BACKUP_PAGES_PER_STEP = int(os.environ.get('BACKUP_PAGES_PER_STEP', '256'))
+    BACKUP_STEP_SLEEP = float(os.environ.get('BACKUP_STEP_SLEEP', '0.01'))
+    BACKUP_MAX_RESTARTS = int(os.environ.get('BACKUP_MAX_RESTARTS', '5'))
+    BACKUP_INTEGRITY_CHECK = os.environ.get('BACKUP_INTEGRITY_CHECK', 'full')
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
@@ -52,6 +108,12 @@ class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SUMMARY_AUTO_REFRESH = False
+    AI_PREFETCH_ENABLED = False
+    ARTIFACT_JANITOR_ENABLED = False
+    REVISION_COMPACT_ENABLED = False
+    BACKUP_ENABLED = False
+    RELATED_INDEX_DIR = None
     
 class ProductionConfig(Config):
     """生产环境配置"""
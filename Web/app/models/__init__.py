@@ -29,4 +29,7 @@
 # 导入所有模型，以便在其他地方能够直接从app.models导入
 from app.models.folder import Folder
 from app.models.note_file import NoteFile
-from app.models.note import Note
\ No newline at end of file
+from app.models.note import Note
+from app.models.note_summary import NoteSummary
+from app.models.note_signature import NoteSignature, NoteLshBucket
+from app.models.note_revision import NoteRevision
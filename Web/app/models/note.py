@@ -24,12 +24,13 @@
     - 数据库表映射
     - 笔记CRUD操作方法
     - 时间戳管理
+    - 写入时计算的Markdown和纯文本派生列
 
 作者: Jolly
 创建时间: 2025-04-01
-最后修改: 2025-06-04
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.0.0
+版本: 1.1.0
 
 依赖:
     - datetime: 时间处理
@@ -52,6 +53,8 @@ class Note(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 创建时间
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 更新时间
     file_id = db.Column(db.Integer, db.ForeignKey('note_files.id', ondelete='CASCADE'))  # 所属文件ID
+    markdown = db.Column(db.Text)  # 内容转换后的Markdown，写入时由 note_text 服务计算
+    plain_text = db.Column(db.Text)  # 去除HTML后的纯文本，写入时由 note_text 服务计算
 
     def to_dict(self):
         """转换为字典格式"""
@@ -72,6 +72,10 @@ class NoteFile(db.Model):
                            lazy=True, 
                            cascade='all, delete-orphan',
                            order_by='Note.order')
+    summary = db.relationship('NoteSummary',
+                             uselist=False,
+                             lazy=True,
+                             cascade='all, delete-orphan')
 
     def __repr__(self):
         """字符串表示"""
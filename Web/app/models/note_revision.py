@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: note_revision.py
+模块: 数据模型 - 文件修订版本
+描述: 保存笔记文件的历史版本，相邻版本之间只存差量，定期存完整快照
+功能:
+    - 每个版本一条记录，按文件ID和版本ID建立索引，支持按文件分页列出
+    - 按文件ID和状态时间建立索引，支持按时间点定位版本
+    - 按文件ID和版本ID的索引定位目标版本之前最近的快照，重建只读取快照到目标版本之间的记录
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - datetime: 时间处理
+    - app.extensions: 数据库扩展
+
+许可证: Apache-2.0
+"""
+
+from datetime import datetime
+from app.extensions import db
+
+
+class NoteRevision(db.Model):
+    """文件修订版本
+
+    Attributes:
+        id (int): 版本ID，同一文件内按写入顺序递增
+        file_id (int): 文件ID（不设外键，文件删除后由压缩任务清理）
+        kind (str): snapshot 完整快照，delta 相对上一版本的差量
+        reason (str): 产生版本的操作，如 edit、ai_apply、restore、baseline
+        pinned (bool): 应用优化前的备份点，保留策略不会稀疏掉
+        notes_count (int): 该版本的笔记数
+        size (int): 压缩后的字节数
+        data (bytes): zlib 压缩的 JSON
+        created_at (datetime): 版本记录创建时间（合并连续编辑时为第一次编辑的时间）
+        updated_at (datetime): 版本所表示状态的时间
+    """
+    __tablename__ = 'note_revisions'
+    __table_args__ = (
+        db.Index('ix_note_revisions_file_id_id', 'file_id', 'id'),
+        db.Index('ix_note_revisions_file_id_updated_at', 'file_id', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    reason = db.Column(db.String(20), default='edit', nullable=False)
+    pinned = db.Column(db.Boolean, default=False, nullable=False)
+    notes_count = db.Column(db.Integer, default=0, nullable=False)
+    size = db.Column(db.Integer, default=0, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NoteRevision {self.id} file={self.file_id} {self.kind}>'
+
+    def to_dict(self):
+        """转换为字典格式（不含版本内容）"""
+        return {
+            'id': self.id,
+            'file_id': self.file_id,
+            'kind': self.kind,
+            'reason': self.reason,
+            'pinned': self.pinned,
+            'notes_count': self.notes_count,
+            'size': self.size,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
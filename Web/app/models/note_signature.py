@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: note_signature.py
+模块: 数据模型 - 笔记MinHash签名
+描述: 保存每条笔记的MinHash签名及其LSH分桶，用于近似重复检测
+功能:
+    - 每条笔记一条签名记录
+    - 每条笔记每个分段一条分桶记录，按桶值建立索引
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - datetime: 时间处理
+    - app.extensions: 数据库扩展
+
+许可证: Apache-2.0
+"""
+
+from datetime import datetime
+from app.extensions import db
+
+
+class NoteSignature(db.Model):
+    """笔记MinHash签名
+
+    Attributes:
+        note_id (int): 笔记ID
+        signature (bytes): uint32 数组形式的MinHash签名
+        updated_at (datetime): 签名计算时间
+    """
+    __tablename__ = 'note_signatures'
+
+    note_id = db.Column(db.Integer, db.ForeignKey('notes.id', ondelete='CASCADE'), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NoteSignature note={self.note_id}>'
+
+
+class NoteLshBucket(db.Model):
+    """笔记LSH分桶
+
+    Attributes:
+        note_id (int): 笔记ID
+        band (int): 分段序号
+        bucket (int): 分段哈希值（包含分段序号，不同分段不会冲突）
+    """
+    __tablename__ = 'note_lsh_buckets'
+
+    note_id = db.Column(db.Integer, db.ForeignKey('note_signatures.note_id', ondelete='CASCADE'), primary_key=True)
+    band = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.BigInteger, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<NoteLshBucket note={self.note_id} band={self.band}>'
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: note_summary.py
+模块: 数据模型 - 文件摘要
+描述: 文件AI摘要数据模型，保存摘要及其对应的内容指纹
+功能:
+    - 每个文件一条摘要记录，按文件ID唯一索引
+    - 记录生成摘要时的内容指纹，用于判断是否过期
+    - 记录生成模型和失败信息
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - datetime: 时间处理
+    - app.extensions: 数据库扩展
+
+许可证: Apache-2.0
+"""
+
+from datetime import datetime
+from app.extensions import db
+
+
+class NoteSummary(db.Model):
+    """文件摘要模型
+
+    Attributes:
+        id (int): 主键ID
+        file_id (int): 文件ID，唯一索引
+        summary (str): 摘要内容
+        fingerprint (str): 生成摘要时的文件内容指纹
+        model (str): 生成摘要的模型
+        status (str): ready 或 error
+        error (str): 最近一次失败的错误信息
+    """
+    __tablename__ = 'note_summaries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('note_files.id', ondelete='CASCADE'),
+                        nullable=False, unique=True, index=True)
+    summary = db.Column(db.Text)
+    fingerprint = db.Column(db.String(64))
+    model = db.Column(db.String(100))
+    status = db.Column(db.String(20), default='ready', nullable=False)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NoteSummary file={self.file_id}>'
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'file_id': self.file_id,
+            'summary': self.summary,
+            'fingerprint': self.fingerprint,
+            'model': self.model,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -10,32 +10,36 @@
     - 支持多种优化类型（语法、结构、清晰度等）
     - 生成优化报告和临时文件管理
     - 内容预处理和后处理
+    - 优化结果产物保存去掉Markdown包装后的正文，结果附带产物引用供精简响应使用
+    - 保存某一优化类型的结果不再删除同一文件其他优化类型的结果
+    - 按产物版本（etag）读取优化结果，版本已变化时返回冲突
 
 作者: Jolly
 创建时间: 2025-04-01
-最后修改: 2025-06-04
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.1.0
+版本: 1.5.0
 
 依赖:
     - app.services.ai_service: AI服务模块
-    - os, datetime, re: 系统和文本处理
+    - app.services.artifact_store: 产物存储
+    - datetime: 时间处理
 
 许可证: Apache-2.0
 """
 
-import os
 import datetime
-import re
 from app.services.ai_service import ai_service
+from app.services.artifact_store import get_artifact_store, artifact_etag, KIND_OPTIMIZED
 
 class AIOptimizer:
     """AI优化器，负责调用AI服务对内容进行优化"""
     
     def __init__(self, temp_dir):
         self.temp_dir = temp_dir
+        self.artifacts = get_artifact_store(temp_dir)
     
-    def optimize_content(self, file_id, file_name, content, optimization_type='general'):
+    def optimize_content(self, file_id, file_name, content, optimization_type='general', detailed_report=False):
         """
         使用AI优化内容
         
@@ -44,6 +48,7 @@ class AIOptimizer:
             file_name: 文件名
             content: 待优化的内容
             optimization_type: 优化类型
+            detailed_report: 是否同时生成块级改动明细
             
         Returns:
             dict: 包含优化结果的字典
@@ -56,7 +61,7 @@ class AIOptimizer:
                 }
             
             # 使用AI服务进行优化
-            ai_result = ai_service.optimize_content(content, optimization_type)
+            ai_result = ai_service.optimize_content(content, optimization_type, detailed_report=detailed_report)
             
             if not ai_result['success']:
                 return {
@@ -64,9 +69,10 @@ class AIOptimizer:
                     'error': ai_result['error']
                 }
             
-            # 保存优化结果到临时文件
-            optimized_temp_file = self._save_optimized_to_temp_file(
-                ai_result['optimized_content'], 
+            # 移除markdown包装器后保存，产物正文与返回的优化内容一致
+            optimized_content = self._remove_markdown_wrapper(ai_result['optimized_content'])
+            optimized_temp_file, optimized_artifact = self._save_optimized_to_temp_file(
+                optimized_content, 
                 file_name, 
                 file_id, 
                 optimization_type
@@ -77,10 +83,11 @@ class AIOptimizer:
                 'file_id': file_id,
                 'file_name': file_name,
                 'original_content': ai_result['original_content'],
-                'optimized_content': self._remove_markdown_wrapper(ai_result['optimized_content']), # 调用方法移除markdown包装器
+                'optimized_content': optimized_content,
                 'optimization_type': optimization_type,
                 'report': ai_result['report'],
-                'optimized_temp_file': optimized_temp_file
+                'optimized_temp_file': optimized_temp_file,
+                'optimized_artifact': optimized_artifact
             }
             
         except Exception as e:
@@ -133,17 +140,12 @@ class AIOptimizer:
     
     def _save_optimized_to_temp_file(self, content, file_name, file_id, optimization_type):
         """
-        将优化后的内容保存到临时文件
+        将优化后的内容保存为产物文件
+        
+        Returns:
+            tuple: (产物文件信息, 产物引用)
         """
         try:
-            # 清理该文件ID的旧优化文件
-            self._cleanup_old_optimized_files(file_id, file_name)
-            
-            # 生成临时文件名
-            safe_file_name = re.sub(r'[^\w\-_\.]', '_', file_name)
-            temp_filename = f"{safe_file_name}_{file_id}_optimized_{optimization_type}.txt"
-            temp_filepath = os.path.join(self.temp_dir, temp_filename)
-            
             # 准备文件内容，添加元数据头部
             file_content = f"""# AI优化结果 - {file_name}
 生成时间: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
@@ -156,125 +158,55 @@ class AIOptimizer:
 {content}
 """
             
-            # 写入文件
-            with open(temp_filepath, 'w', encoding='utf-8') as f:
-                f.write(file_content)
+            # 同一优化类型只保留最新一份（put 覆盖），其他优化类型的结果保留，旧产物的淘汰由后台清理器负责
+            record = self.artifacts.put(file_id, KIND_OPTIMIZED, file_content, file_name,
+                                        variant=optimization_type)
             
+            info = self.artifacts.describe(record)
             return {
-                'filename': temp_filename,
-                'filepath': temp_filepath,
-                'size': len(file_content),
-                'created_at': datetime.datetime.now().isoformat(),
-                'url': f'/api/ai/temp-file/{temp_filename}',
+                'filename': info['filename'],
+                'filepath': info['filepath'],
+                'size': info['size'],
+                'created_at': info['created_at'],
+                'url': info['url'],
                 'optimization_type': optimization_type
-            }
+            }, self.artifacts.reference(record)
             
         except Exception as e:
             raise Exception(f"保存优化结果失败: {str(e)}")
     
-    def _cleanup_old_optimized_files(self, file_id, file_name):
-        """
-        清理指定文件ID的旧优化文件，并实现缓冲区管理策略：
-        只保留最新的一个笔记文件对应的collected和optimized_general文件
-        """
-        try:
-            safe_file_name = re.sub(r'[^\w\-_\.]', '_', file_name)
-            
-            # 1. 清理当前文件ID的旧优化文件
-            for filename in os.listdir(self.temp_dir):
-                filepath = os.path.join(self.temp_dir, filename)
-                
-                # 检查是否是该文件的优化文件
-                if (filename.startswith(safe_file_name) and 
-                    str(file_id) in filename and 
-                    'optimized' in filename):
-                    try:
-                        os.remove(filepath)
-                    except OSError:
-                        pass  # 忽略删除失败的情况
-            
-            # 2. 实现缓冲区管理：只保留最新的一个笔记文件的temp文件
-            self._manage_temp_buffer(file_id, file_name)
-            
-        except Exception:
-            pass  # 忽略清理过程中的错误
-    
-    def _manage_temp_buffer(self, current_file_id, current_file_name):
-        """
-        管理temp文件缓冲区，只保留最新的一个笔记文件对应的collected和optimized_general文件
-        """
-        try:
-            # 获取所有temp文件，按修改时间排序
-            temp_files = []
-            for filename in os.listdir(self.temp_dir):
-                if filename.endswith('.txt'):
-                    filepath = os.path.join(self.temp_dir, filename)
-                    try:
-                        stat = os.stat(filepath)
-                        temp_files.append({
-                            'filename': filename,
-                            'filepath': filepath,
-                            'modified_time': stat.st_mtime,
-                            'file_id': self._extract_file_id_from_filename(filename)
-                        })
-                    except OSError:
-                        continue
-            
-            # 按修改时间降序排序
-            temp_files.sort(key=lambda x: x['modified_time'], reverse=True)
-            
-            # 找到最新的文件ID（如果当前操作不是最新的，则使用当前文件ID）
-            latest_file_id = current_file_id
-            if temp_files:
-                latest_file_id = temp_files[0]['file_id'] or current_file_id
-            
-            # 删除非最新文件ID的所有temp文件
-            for file_info in temp_files:
-                if file_info['file_id'] and str(file_info['file_id']) != str(latest_file_id):
-                    try:
-                        os.remove(file_info['filepath'])
-                    except OSError:
-                        pass
-                        
-        except Exception:
-            pass  # 忽略缓冲区管理过程中的错误
-    
-    def _extract_file_id_from_filename(self, filename):
-        """
-        从文件名中提取文件ID
-        """
-        try:
-            # 文件名格式: {safe_file_name}_{file_id}_{type}.txt
-            parts = filename.replace('.txt', '').split('_')
-            for i, part in enumerate(parts):
-                if part.isdigit():
-                    return int(part)
-            return None
-        except Exception:
-            return None
-    
     def get_ai_health_status(self):
         """
-        获取AI服务健康状态
+        获取AI服务健康状态，包含弹性层（熔断器、限流、并发）的状态
         """
         try:
             ai_status = "available"
             ai_error = None
+            provider_info = ai_service.get_provider_info()
+            resilience = ai_service.get_client_stats()
             
-            try:
-                # 尝试简单的AI调用测试
-                test_result = ai_service.optimize_content("测试内容", "general")
-                if not test_result['success']:
-                    ai_status = "error"
-                    ai_error = test_result.get('error', 'Unknown error')
-            except Exception as e:
+            if resilience['circuit_breaker']['state'] == 'open':
+                # 熔断中直接报告，不再发起探测调用
                 ai_status = "error"
-                ai_error = str(e)
+                ai_error = 'AI服务熔断中'
+            else:
+                try:
+                    # 尝试简单的AI调用测试
+                    test_result = ai_service.optimize_content("测试内容", "general")
+                    if not test_result['success']:
+                        ai_status = "error"
+                        ai_error = test_result.get('error', 'Unknown error')
+                except Exception as e:
+                    ai_status = "error"
+                    ai_error = str(e)
+                resilience = ai_service.get_client_stats()
             
             return {
                 'status': ai_status,
                 'error': ai_error,
-                'model': 'qwen-turbo'
+                'model': provider_info['model'],
+                'provider': provider_info['provider'],
+                'resilience': resilience
             }
             
         except Exception as e:
@@ -284,76 +216,73 @@ class AIOptimizer:
                 'model': 'unknown'
             }
     
-    def get_optimized_content(self, file_id, optimization_type='general'):
+    def get_optimized_content(self, file_id, optimization_type='general', expected_etag=None):
         """
         获取已优化的内容
+        
+        Args:
+            expected_etag: 客户端审阅过的产物版本（优化结果引用中的 etag），
+                           当前保存的优化结果不是该版本时返回 conflict
         """
         try:
-            # 查找优化的临时文件
-            for filename in os.listdir(self.temp_dir):
-                if (f"_{file_id}_optimized_{optimization_type}.txt" in filename):
-                    temp_filepath = os.path.join(self.temp_dir, filename)
-                    
-                    if not os.path.exists(temp_filepath):
-                        continue
-                    
-                    # 读取文件内容
-                    with open(temp_filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # 获取文件信息
-                    file_stat = os.stat(temp_filepath)
-                    
-                    return {
-                        'success': True,
-                        'file_id': file_id,
-                        'optimization_type': optimization_type,
-                        'optimized_content': content,
-                        'temp_file': {
-                            'filename': filename,
-                            'size': file_stat.st_size,
-                            'created_at': datetime.datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
-                            'modified_at': datetime.datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
-                            'url': f'/api/ai/temp-file/{filename}'
-                        }
-                    }
+            record = self.artifacts.get(file_id, KIND_OPTIMIZED, optimization_type)
+            if record and expected_etag is not None and artifact_etag(record) != expected_etag:
+                return self._etag_conflict(record)
+            content = self.artifacts.read(record) if record else None
+            if content is None:
+                return {'success': False, 'error': '未找到优化的内容'}
+            if expected_etag is not None:
+                # 读取期间优化结果可能被重新生成，确认读到的仍是该版本
+                latest = self.artifacts.get(file_id, KIND_OPTIMIZED, optimization_type)
+                if latest is None or artifact_etag(latest) != expected_etag:
+                    return self._etag_conflict(latest)
             
-            return {'success': False, 'error': '未找到优化的内容'}
+            info = self.artifacts.describe(record)
+            return {
+                'success': True,
+                'file_id': file_id,
+                'optimization_type': optimization_type,
+                'optimized_content': content,
+                'optimized_artifact': self.artifacts.reference(record),
+                'temp_file': {
+                    'filename': info['filename'],
+                    'size': info['size'],
+                    'created_at': info['created_at'],
+                    'modified_at': info['modified_at'],
+                    'url': info['url']
+                }
+            }
             
         except Exception as e:
             return {'success': False, 'error': f'获取优化内容失败: {str(e)}'}
     
+    def _etag_conflict(self, record):
+        return {
+            'success': False,
+            'conflict': True,
+            'error': '优化结果已被重新生成，与审阅的版本不一致，请重新查看后再应用',
+            'optimized_artifact': self.artifacts.reference(record) if record else None
+        }
+    
     def check_optimized_content_exists(self, file_id):
         """
         检查优化的内容是否存在
         """
         try:
-            optimization_types = []
-            temp_files = []
-            exists = False
-            
-            for filename in os.listdir(self.temp_dir):
-                if f"_{file_id}_optimized_" in filename:
-                    exists = True
-                    
-                    # 提取优化类型
-                    match = re.search(rf"_{file_id}_optimized_(.+)\.txt", filename)
-                    if match:
-                        opt_type = match.group(1)
-                        if opt_type not in optimization_types:
-                            optimization_types.append(opt_type)
-                    
-                    temp_files.append({
-                        'filename': filename,
-                        'type': 'optimized',
-                        'url': f'/api/ai/temp-file/{filename}'
-                    })
+            records = self.artifacts.list(file_id=file_id, kind=KIND_OPTIMIZED)
             
             return {
                 'success': True,
-                'exists': exists,
-                'optimization_types': optimization_types,
-                'temp_files': temp_files
+                'exists': bool(records),
+                'optimization_types': [record['variant'] for record in records],
+                'temp_files': [
+                    {
+                        'filename': record['filename'],
+                        'type': 'optimized',
+                        'url': f"/api/ai/temp-file/{record['filename']}"
+                    }
+                    for record in records
+                ]
             }
             
         except Exception as e:
@@ -4,7 +4,7 @@
 """
 文件名: ai_service.py
 模块: AI优化服务
-描述: 使用LangChain和Qwen模型进行笔记内容的智能优化处理
+描述: 使用可插拔的大模型服务商进行笔记内容的智能优化处理
 功能:
     - 提供多种类型的内容优化（语法、结构、清晰度、格式、综合）
     - 集成通义千问API进行AI内容处理
@@ -13,17 +13,18 @@
 
 作者: 开发团队
 创建时间: 2024-11-15
-最后修改: 2025-01-04
-修改人: 系统维护
-版本: 1.2.1
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.6.0
 
 依赖:
-    - langchain: AI链式处理框架
-    - dashscope: 通义千问API SDK
+    - app.services.llm_providers: 大模型服务商（通义千问/OpenAI兼容/本地桩服务）
+    - app.services.llm_resilience: 调用弹性层
     - typing: 类型注解支持
 
 注意事项:
-    - 需要配置QWEN_API_KEY环境变量
+    - 通过AI_PROVIDER选择服务商，默认qwen，需要配置QWEN_API_KEY环境变量
+    - 离线压测可使用 AI_PROVIDER=stub
     - AI服务调用有频率限制
     - 内容长度不应超过100000字符
     - 使用前需确保网络连接正常
@@ -31,74 +32,106 @@
 许可证: Apache-2.0
 
 修改历史:
+    v1.6.0 (2026-10-18): 移除LangChain，内置提示词模板；大模型客户端在首次调用时创建
+    v1.5.0 (2026-10-18): 优化报告改为块/行哈希线性差异，明细按需生成
+    v1.4.0 (2026-10-18): 服务商可插拔（qwen/openai/stub/replay），缺少密钥不再导致导入失败
+    v1.3.0 (2026-10-18): 调用接入弹性层（并发限制、限流、重试、超时、熔断）
     v1.2.1 (2025-01-04): 优化错误处理和日志记录
     v1.2.0 (2024-12-15): 添加内容后处理功能
     v1.1.0 (2024-12-01): 新增多种优化类型支持
     v1.0.0 (2024-11-15): 初始版本，基础AI优化功能
 """
-import os
 import re
+import threading
+from string import Formatter
 from typing import Optional, Dict, Any
-from langchain.llms.base import LLM
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-import dashscope
-from dashscope import Generation
-import json
 import logging
-
-# 禁用LangSmith以提高性能
-os.environ["LANGCHAIN_TRACING_V2"] = "false"
-os.environ["LANGCHAIN_API_KEY"] = ""
+from app.services.llm_resilience import ResilientLLMClient
+from app.services.llm_providers import BaseLLMProvider, create_provider
+from app.services import optimization_report
+from app.utils.metrics import metrics
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class QwenLLM(LLM):
+
+class PromptTemplate:
     """
-    自定义Qwen LLM类，继承自LangChain的LLM基类
-    优化版本：使用更快的模型和参数
+    提示词模板，按 str.format 语法填充变量
     """
-    model_name: str = "qwen-turbo"  # 使用turbo版本更快
-    temperature: float = 0.3  # 降低温度，减少随机性，提高一致性和速度
-    max_tokens: int = 1500  # 减少最大token数，加快响应速度
-    api_key: str = ""
     
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.api_key = os.getenv('QWEN_API_KEY', '')
-        if not self.api_key:
-            raise ValueError("QWEN_API_KEY environment variable is required")
-        dashscope.api_key = self.api_key
+    def __init__(self, template: str, input_variables: Optional[list] = None):
+        self.template = template
+        self.input_variables = input_variables or sorted(
+            {name for _, name, _, _ in Formatter().parse(template) if name}
+        )
+    
+    def format(self, **kwargs) -> str:
+        missing = [name for name in self.input_variables if name not in kwargs]
+        if missing:
+            raise KeyError(f"提示词缺少变量: {', '.join(missing)}")
+        return self.template.format(**kwargs)
+
+
+class ProviderLLM:
+    """
+    大模型调用入口，实际调用由可插拔的服务商完成（通义千问、OpenAI兼容接口、本地桩服务）
+    调用经过弹性层（并发、限流、重试、超时、熔断）
+    """
+    
+    def __init__(self, provider=None, client=None):
+        self._provider = provider or create_provider()
+        self._client = client or ResilientLLMClient.from_env(self._request, name=self._provider.name)
     
     @property
-    def _llm_type(self) -> str:
-        return "qwen"
+    def provider(self) -> BaseLLMProvider:
+        return self._provider
     
-    def _call(self, prompt: str, stop: Optional[list] = None) -> str:
-        try:
-            response = Generation.call(
-                model=self.model_name,
-                prompt=prompt,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                stop_words=stop or []
-            )
-            
-            if response.status_code == 200:
-                return response.output.text.strip()
-            else:
-                logger.error(f"Qwen API error: {response.code} - {response.message}")
-                return f"API调用失败: {response.message}"
-                
-        except Exception as e:
-            logger.error(f"Error calling Qwen API: {str(e)}")
-            return f"调用AI服务时出错: {str(e)}"
+    @property
+    def client(self) -> ResilientLLMClient:
+        return self._client
+    
+    def __call__(self, prompt: str, stop: Optional[list] = None) -> str:
+        return self._client.call(prompt, stop=stop)
+    
+    def _request(self, prompt: str, stop: Optional[list] = None) -> str:
+        """直接调用服务商，失败时抛出LLMProviderError供弹性层判断是否重试"""
+        response = self._provider.generate(prompt, stop=stop)
+        metrics.incr(f'llm.{self._provider.name}.input_tokens', response.input_tokens)
+        metrics.incr(f'llm.{self._provider.name}.output_tokens', response.output_tokens)
+        return response.text
+
+
+# 兼容旧名称
+QwenLLM = ProviderLLM
+
+# 优化提示模板 - 简化版本
+CONTENT_OPTIMIZATION_TEMPLATE = PromptTemplate(
+    input_variables=["content", "optimization_type"],
+    template="""请优化以下内容（类型：{optimization_type}）：
+
+{content}
+
+要求：保持原意，输出优化后的markdown格式内容，无需解释。
+"""
+)
+
+# 摘要提示模板 - 简化版本
+CONTENT_SUMMARY_TEMPLATE = PromptTemplate(
+    input_variables=["content"],
+    template="""请为以下内容生成简洁摘要：
+
+{content}
+
+摘要：
+"""
+)
+
 
 class AIOptimizationService:
     """
-    AI优化服务类 - 单例模式，提高性能
+    AI优化服务类 - 单例模式，大模型客户端在首次调用时创建
     """
     _instance = None
     _initialized = False
@@ -112,53 +145,30 @@ class AIOptimizationService:
         # 避免重复初始化
         if self._initialized:
             return
-        self.llm = QwenLLM()
-        self._setup_chains()
+        self._llm = None
+        self._llm_lock = threading.Lock()
+        self.content_optimization_template = CONTENT_OPTIMIZATION_TEMPLATE
+        self.content_summary_template = CONTENT_SUMMARY_TEMPLATE
         self._initialized = True
     
-    def _setup_chains(self):
-        """设置LangChain chains"""
-        
-        # 优化的内容优化提示模板 - 简化版本
-        self.content_optimization_template = PromptTemplate(
-            input_variables=["content", "optimization_type"],
-            template="""请优化以下内容（类型：{optimization_type}）：
-
-{content}
-
-要求：保持原意，输出优化后的markdown格式内容，无需解释。
-"""
-        )
-        
-        # 优化的内容摘要提示模板 - 简化版本
-        self.content_summary_template = PromptTemplate(
-            input_variables=["content"],
-            template="""请为以下内容生成简洁摘要：
-
-{content}
-
-摘要：
-"""
-        )
-        
-        # 创建chains
-        self.optimization_chain = LLMChain(
-            llm=self.llm,
-            prompt=self.content_optimization_template
-        )
-        
-        self.summary_chain = LLMChain(
-            llm=self.llm,
-            prompt=self.content_summary_template
-        )
+    @property
+    def llm(self) -> ProviderLLM:
+        """首次使用时创建服务商和弹性层客户端"""
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = ProviderLLM()
+        return self._llm
     
-    def optimize_content(self, content: str, optimization_type: str = "general") -> Dict[str, Any]:
+    def optimize_content(self, content: str, optimization_type: str = "general",
+                         detailed_report: bool = False) -> Dict[str, Any]:
         """
         优化笔记内容
         
         Args:
             content: 原始内容
             optimization_type: 优化类型 (grammar, structure, clarity, markdown, general)
+            detailed_report: 是否同时生成块级改动明细，默认只返回快速统计
             
         Returns:
             包含优化结果的字典
@@ -180,11 +190,11 @@ class AIOptimizationService:
             else:
                 processed_content = self._preprocess_content(content)
             
-            # 调用优化chain
-            result = self.optimization_chain.run(
+            # 调用大模型
+            result = self.llm(self.content_optimization_template.format(
                 content=processed_content,
                 optimization_type=optimization_type
-            )
+            ))
             
             # 后处理结果
             optimized_content = self._postprocess_content(result)
@@ -193,7 +203,8 @@ class AIOptimizationService:
             report = self._generate_optimization_report(
                 processed_content, 
                 optimized_content, 
-                optimization_type
+                optimization_type,
+                detailed=detailed_report
             )
             
             return {
@@ -233,8 +244,8 @@ class AIOptimizationService:
             # 预处理内容
             processed_content = self._preprocess_content(content)
             
-            # 调用摘要chain
-            summary = self.summary_chain.run(content=processed_content)
+            # 调用大模型
+            summary = self.llm(self.content_summary_template.format(content=processed_content))
             
             return {
                 'success': True,
@@ -249,6 +260,14 @@ class AIOptimizationService:
                 'error': f'生成摘要失败: {str(e)}'
             }
     
+    def get_client_stats(self) -> Dict[str, Any]:
+        """获取大模型调用弹性层（熔断、限流、并发）的状态"""
+        return self.llm.client.get_stats()
+    
+    def get_provider_info(self) -> Dict[str, Any]:
+        """获取当前服务商和模型信息"""
+        return self.llm.provider.get_info()
+    
     def _preprocess_content(self, content: str) -> str:
         """预处理内容"""
         if not content:
@@ -291,41 +310,19 @@ class AIOptimizationService:
         
         return result
     
-    def _generate_optimization_report(self, original: str, optimized: str, optimization_type: str) -> Dict[str, Any]:
-        """生成优化报告"""
-        original_length = len(original)
-        optimized_length = len(optimized)
-        
-        # 简单的变化检测
-        changes_detected = original != optimized
-        
-        # 计算大概的改动数量 - 基于字符差异的简单估算
-        import difflib
-        diff = list(difflib.unified_diff(
-            original.splitlines(keepends=True),
-            optimized.splitlines(keepends=True),
-            n=0
-        ))
-        # 过滤掉标题行，计算实际变更行数
-        changes_count = len([line for line in diff if line.startswith('+') or line.startswith('-')]) // 2
-        if changes_count == 0 and changes_detected:
-            changes_count = 1  # 至少有一处改动
-        
-        # 计算大概的改动数量
-        original_words = len(original.split())
-        optimized_words = len(optimized.split())        
-        return {
-            'optimization_type': optimization_type,
-            'original_length': original_length,
-            'optimized_length': optimized_length,
-            'length_change': optimized_length - original_length,
-            'original_words': original_words,
-            'optimized_words': optimized_words,
-            'word_change': optimized_words - original_words,
-            'changes_detected': changes_detected,
-            'changes_count': changes_count,  # 添加前端需要的字段
-            'improvements': self._get_improvement_areas(optimization_type)
-        }
+    def _generate_optimization_report(self, original: str, optimized: str, optimization_type: str,
+                                      detailed: bool = False) -> Dict[str, Any]:
+        """生成优化报告，detailed 为 False 时只做长度和词数统计"""
+        improvements = self._get_improvement_areas(optimization_type)
+        if detailed:
+            return optimization_report.build_report(original, optimized, optimization_type, improvements)
+        return optimization_report.summarize(original, optimized, optimization_type, improvements)
+    
+    def build_report(self, original: str, optimized: str, optimization_type: str = "general") -> Dict[str, Any]:
+        """按需生成块级改动明细报告"""
+        return self._generate_optimization_report(
+            self._preprocess_content(original), optimized, optimization_type, detailed=True
+        )
     
     def _get_improvement_areas(self, optimization_type: str) -> list:
         """获取改进领域说明"""
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: artifact_janitor.py
+模块: AI服务 - 产物清理
+描述: 后台定时清理AI中间产物，按总字节配额和每个文件的数量上限做LRU淘汰
+功能:
+    - 过期清理：生成时间超过保留天数的产物
+    - 每个笔记文件只保留最近访问的若干个产物
+    - 总字节配额：超出时按最近访问时间淘汰最久未用的产物
+    - 清理清单未引用的残留文件（崩溃留下的临时文件等）
+    - 全部在后台线程中执行，请求路径上不做任何清理
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app.services.artifact_store: 产物存储（清理均为清单上的索引查询）
+
+配置项:
+    - ARTIFACT_JANITOR_ENABLED: 是否启用后台清理
+    - ARTIFACT_JANITOR_INTERVAL: 清理间隔（秒）
+    - ARTIFACT_QUOTA_BYTES: 产物总字节配额
+    - ARTIFACT_MAX_PER_FILE: 每个笔记文件保留的产物数量上限
+    - ARTIFACT_MAX_AGE_DAYS: 产物保留天数
+
+许可证: Apache-2.0
+"""
+
+import time
+import threading
+import logging
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactJanitor:
+    """产物后台清理器"""
+
+    def __init__(self, store, max_bytes=256 * 1024 * 1024, max_per_file=4, max_age_days=7,
+                 orphan_grace=3600, clock=time.time):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_per_file = max_per_file
+        self.max_age_days = max_age_days
+        self.orphan_grace = orphan_grace
+        self._clock = clock
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'expired': 0,
+            'evicted_per_file': 0,
+            'evicted_quota': 0,
+            'orphans_removed': 0,
+            'last_run_at': None,
+            'last_duration_ms': None,
+            'last_error': None
+        }
+
+    def init_app(self, app):
+        """根据应用配置启动后台清理"""
+        self.max_bytes = int(app.config.get('ARTIFACT_QUOTA_BYTES', self.max_bytes))
+        self.max_per_file = int(app.config.get('ARTIFACT_MAX_PER_FILE', self.max_per_file))
+        self.max_age_days = float(app.config.get('ARTIFACT_MAX_AGE_DAYS', self.max_age_days))
+        if app.config.get('ARTIFACT_JANITOR_ENABLED', False):
+            self.start(float(app.config.get('ARTIFACT_JANITOR_INTERVAL', 300)))
+
+    def start(self, interval=300.0):
+        """启动清理线程，重复调用无副作用"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(interval,),
+                                            name='artifact-janitor', daemon=True)
+            self._thread.start()
+        logger.info(f"产物后台清理已启用: 间隔={interval}s, 配额={self.max_bytes}B, "
+                    f"每文件上限={self.max_per_file}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, interval):
+        while not self._stop.wait(interval):
+            self.run_once()
+
+    def run_once(self):
+        """
+        执行一轮清理
+
+        Returns:
+            dict: 本轮各类清理的数量
+        """
+        started = time.perf_counter()
+        result = {'expired': 0, 'evicted_per_file': 0, 'evicted_quota': 0, 'orphans_removed': 0}
+        error = None
+        try:
+            if self.max_age_days:
+                result['expired'] = self.store.delete_older_than(self._clock() - self.max_age_days * 86400)
+            if self.max_per_file:
+                result['evicted_per_file'] = self.store.evict_per_file(self.max_per_file)
+            if self.max_bytes:
+                result['evicted_quota'] = self.store.evict_to_quota(self.max_bytes)
+            result['orphans_removed'] = self.store.sweep_orphans(self.orphan_grace)
+        except Exception as e:
+            error = str(e)
+            logger.error(f"产物清理失败: {error}")
+
+        with self._lock:
+            self._stats['runs'] += 1
+            for key, value in result.items():
+                self._stats[key] += value
+            self._stats['last_run_at'] = self._clock()
+            self._stats['last_duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            self._stats['last_error'] = error
+        for key, value in result.items():
+            if value:
+                metrics.incr(f'artifacts.{key}', value)
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'enabled': self._thread is not None and self._thread.is_alive(),
+            'max_bytes': self.max_bytes,
+            'max_per_file': self.max_per_file,
+            'max_age_days': self.max_age_days
+        })
+        return stats
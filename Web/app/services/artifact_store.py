@@ -0,0 +1,594 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: artifact_store.py
+模块: AI服务 - 中间产物存储
+描述: 管理AI流程的中间产物（收集内容、优化结果），以SQLite清单索引磁盘上的分片文件
+功能:
+    - 按 (文件ID, 产物类型, 优化类型) 建立索引，查找和清理都是索引查询，不再扫描目录
+    - 产物文件按文件ID分片存放在子目录中，清单记录路径、大小、内容指纹和访问时间
+    - 对外文件名保持原有格式，/api/ai/temp-file/<filename> 等接口不变
+    - 首次启动时把旧版平铺在临时目录中的产物导入清单（文件ID从元数据头部读取）
+    - 写入先落到临时文件再原子替换，可配置 fsync 策略
+    - 同一产物的写入和删除通过建议锁（flock）在线程和进程之间互斥
+    - 提供按访问时间的LRU淘汰（每文件数量上限、总字节配额）和残留文件清理，由后台清理器调用
+    - 产物以 gzip 压缩存储，下载时可直接以 Content-Encoding: gzip 原样发送，也可流式解压
+    - 支持按分块流式写入产物，写入大文件时不需要在内存中拼出完整内容
+    - 按字节偏移分段读取正文（边界对齐到UTF-8字符），以及供API精简响应使用的产物引用
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.5.0
+
+依赖:
+    - sqlite3: 清单数据库（位于临时目录中，与产物文件一起存放）
+    - fcntl: 跨进程建议锁（Windows 下退化为进程内锁）
+
+环境变量:
+    - AI_ARTIFACT_FSYNC: none（不主动落盘）| file（落盘文件内容，默认）| full（同时落盘目录项）
+    - AI_ARTIFACT_COMPRESS: 是否以 gzip 压缩存储新产物，默认开启（已有的未压缩产物仍可读取）
+
+注意事项:
+    - 清单与应用数据库分开：删除整个临时目录即可重置，不影响笔记数据
+    - 同一临时目录在进程内共享一个实例，通过 get_artifact_store 获取
+    - 读者打开文件后即使产物被替换或删除，仍然读到打开时的完整内容（POSIX 语义）
+
+许可证: Apache-2.0
+"""
+
+import io
+import os
+import re
+import gzip
+import time
+import zlib
+import sqlite3
+import tempfile
+import contextlib
+import datetime
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只保留进程内的互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.db'
+LOCK_DIR = 'locks'
+LOCK_STRIPES = 64
+
+FSYNC_POLICIES = ('none', 'file', 'full')
+
+KIND_COLLECTED = 'collected'
+KIND_OPTIMIZED = 'optimized'
+
+ENCODING_GZIP = 'gzip'
+COMPRESS_LEVEL = 6
+
+# 查找元数据头部时读取的字节数（头部不超过10行）
+HEADER_SCAN_BYTES = 4096
+_HEADER_SEPARATOR = b'\n---\n'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    fingerprint TEXT,
+    file_name TEXT,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    encoding TEXT NOT NULL DEFAULT '',
+    stored_size INTEGER,
+    UNIQUE (file_id, kind, variant)
+);
+CREATE INDEX IF NOT EXISTS ix_artifacts_created_at ON artifacts (created_at);
+CREATE INDEX IF NOT EXISTS ix_artifacts_accessed_at ON artifacts (accessed_at);
+"""
+
+_COLUMNS = ('id', 'file_id', 'kind', 'variant', 'filename', 'path', 'size',
+            'fingerprint', 'file_name', 'created_at', 'accessed_at', 'encoding', 'stored_size')
+
+# 旧版清单缺少的列：(列名, 定义)
+_ADDED_COLUMNS = (
+    ('encoding', "TEXT NOT NULL DEFAULT ''"),
+    ('stored_size', 'INTEGER'),
+)
+
+_LEGACY_PATTERN = re.compile(r'_(collected|optimized_(\w+))\.txt$')
+_HEADER_FILE_ID = re.compile(r'^文件ID:\s*(\d+)\s*$', re.MULTILINE)
+
+
+def safe_file_name(file_name):
+    """与旧版一致的文件名清理规则"""
+    return re.sub(r'[^\w\-_\.]', '_', file_name or '')
+
+
+def artifact_filename(file_name, file_id, kind, variant=''):
+    """生成对外的产物文件名，与旧版命名保持一致"""
+    if kind == KIND_COLLECTED:
+        return f"{safe_file_name(file_name)}_{file_id}_collected.txt"
+    return f"{safe_file_name(file_name)}_{file_id}_{kind}_{variant}.txt"
+
+
+def strip_header(text):
+    """去掉产物文件的元数据头部（第一个 --- 分隔线之前的内容）"""
+    if text and text.startswith('# '):
+        header, separator, body = text.partition('\n---\n')
+        if separator and header.count('\n') < 10:
+            return body.strip()
+    return text
+
+
+def artifact_etag(record):
+    """产物版本标识，产物被重新生成后改变"""
+    return f"{record['id']}-{int(record['created_at'] * 1000)}"
+
+
+def _isoformat(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).isoformat()
+
+
+class ArtifactStore:
+    """带索引清单的中间产物存储"""
+
+    def __init__(self, root, clock=time.time, fsync='file', compress=True):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'无效的fsync策略: {fsync}')
+        self.root = root
+        self.fsync = fsync
+        self.compress = compress
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._stripe_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._conn = None
+        self._pid = None
+        os.makedirs(os.path.join(self.root, LOCK_DIR), exist_ok=True)
+        with self._lock:
+            self._connection()
+        self._import_legacy_files()
+
+    # ==================== 清单连接 ====================
+
+    def _connection(self):
+        """当前进程的清单连接，fork 后重新打开"""
+        pid = os.getpid()
+        if self._conn is None or self._pid != pid:
+            conn = sqlite3.connect(os.path.join(self.root, MANIFEST_NAME), timeout=10,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(artifacts)')}
+            for column, definition in _ADDED_COLUMNS:
+                if column not in existing:
+                    with contextlib.suppress(sqlite3.OperationalError):   # 其他进程可能已添加
+                        conn.execute(f'ALTER TABLE artifacts ADD COLUMN {column} {definition}')
+            self._conn = conn
+            self._pid = pid
+        return self._conn
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def _to_record(self, row):
+        record = dict(zip(_COLUMNS, row))
+        record['relative_path'] = record['path']
+        record['path'] = os.path.join(self.root, record['path'])
+        return record
+
+    # ==================== 锁与原子写入 ====================
+
+    @contextlib.contextmanager
+    def _key_lock(self, file_id, kind, variant):
+        """
+        同一产物的写入、删除互斥（进程内线程锁 + 跨进程 flock 建议锁）
+
+        锁按键哈希分到固定数量的锁文件上，锁文件数量有界且不需要清理
+        """
+        stripe = zlib.crc32(f'{file_id}:{kind}:{variant}'.encode('utf-8')) % LOCK_STRIPES
+        with self._stripe_locks[stripe]:
+            if fcntl is None:
+                yield
+                return
+            path = os.path.join(self.root, LOCK_DIR, f'{stripe:02d}.lock')
+            with open(path, 'a+b') as handle:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _atomic_write(self, path, write):
+        """
+        写入同目录下的临时文件后原子替换，读者只会看到完整的旧内容或新内容
+
+        Args:
+            path: 目标路径
+            write: 回调 write(f)，向打开的二进制文件写入内容
+        """
+        directory = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                if self.fsync != 'none':
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        if self.fsync == 'full':
+            # 目录项也落盘，掉电后 rename 不会丢失
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    # ==================== 写入 ====================
+
+    def put(self, file_id, kind, content, file_name, variant='', fingerprint=None):
+        """
+        写入产物并更新清单，同一 (文件ID, 类型, 优化类型) 只保留最新一份
+
+        Args:
+            file_id: 笔记文件ID
+            kind: 产物类型 collected / optimized
+            content: 完整的文件内容（含元数据头部）
+            file_name: 笔记文件名，用于生成对外文件名
+            variant: 优化类型，收集内容为空字符串
+            fingerprint: 生成该产物时的内容指纹
+
+        Returns:
+            dict: 产物记录（size 为原始字节数，stored_size 为磁盘上的字节数）
+        """
+        return self.put_stream(file_id, kind, (content,), file_name, variant, fingerprint)
+
+    def put_stream(self, file_id, kind, chunks, file_name, variant='', fingerprint=None):
+        """
+        边生成边写入产物，内存占用只与单个分块有关，其余同 put
+
+        Args:
+            chunks: 文本分块的可迭代对象，按顺序拼接即为完整的文件内容
+        """
+        filename = artifact_filename(file_name, file_id, kind, variant)
+        encoding = ENCODING_GZIP if self.compress else ''
+        disk_name = f'{filename}.gz' if encoding else filename
+        relative_path = os.path.join(f'{int(file_id) % 256:02x}', disk_name)
+        absolute_path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+        sizes = {'size': 0, 'stored_size': 0}
+
+        def write(f):
+            if encoding:
+                # 文件名为空、mtime 固定为0：相同内容得到相同的压缩字节，ETag 等缓存校验保持稳定
+                target = gzip.GzipFile(filename='', mode='wb', fileobj=f,
+                                       compresslevel=COMPRESS_LEVEL, mtime=0)
+            else:
+                target = f
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                sizes['size'] += len(data)
+                target.write(data)
+            if encoding:
+                target.close()
+            sizes['stored_size'] = f.tell()
+
+        with self._key_lock(file_id, kind, variant):
+            self._atomic_write(absolute_path, write)
+            now = self._clock()
+            with self._lock:
+                conn = self._connection()
+                previous = conn.execute(
+                    'SELECT path FROM artifacts WHERE file_id = ? AND kind = ? AND variant = ?',
+                    (file_id, kind, variant)).fetchone()
+                conn.execute(
+                    'INSERT INTO artifacts (file_id, kind, variant, filename, path, size, fingerprint, '
+                    'file_name, created_at, accessed_at, encoding, stored_size) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (file_id, kind, variant) DO UPDATE SET filename = excluded.filename, '
+                    'path = excluded.path, size = excluded.size, fingerprint = excluded.fingerprint, '
+                    'file_name = excluded.file_name, created_at = excluded.created_at, '
+                    'accessed_at = excluded.accessed_at, encoding = excluded.encoding, '
+                    'stored_size = excluded.stored_size',
+                    (file_id, kind, variant, filename, relative_path, sizes['size'], fingerprint,
+                     file_name, now, now, encoding, sizes['stored_size']))
+            # 文件重命名后旧路径不再被引用
+            if previous and previous[0] != relative_path:
+                self._remove_file(previous[0])
+        return self.get(file_id, kind, variant, touch=False)
+
+    # ==================== 查询 ====================
+
+    def get(self, file_id, kind, variant='', touch=True):
+        """按索引查找产物记录，不存在时返回None"""
+        records = self._query('SELECT * FROM artifacts WHERE file_id = ? AND kind = ? AND variant = ?',
+                              (file_id, kind, variant))
+        if not records:
+            return None
+        if touch:
+            self._touch(records[0]['id'])
+        return records[0]
+
+    def find_by_filename(self, filename):
+        """按对外文件名查找产物记录"""
+        records = self._query('SELECT * FROM artifacts WHERE filename = ?', (filename,))
+        return records[0] if records else None
+
+    def list(self, file_id=None, kind=None):
+        """列出产物，按生成时间倒序"""
+        clauses, params = [], []
+        if file_id is not None:
+            clauses.append('file_id = ?')
+            params.append(file_id)
+        if kind is not None:
+            clauses.append('kind = ?')
+            params.append(kind)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return self._query(f'SELECT * FROM artifacts{where} ORDER BY created_at DESC', params)
+
+    def open(self, record):
+        """
+        以二进制流打开产物的原始内容（压缩产物边读边解压，内存占用与文件大小无关）
+
+        Raises:
+            FileNotFoundError: 产物文件已被删除
+        """
+        if record['encoding'] == ENCODING_GZIP:
+            return gzip.open(record['path'], 'rb')
+        return open(record['path'], 'rb')
+
+    def read(self, record):
+        """读取产物文件内容，文件已被删除时返回None"""
+        try:
+            with self.open(record) as f:
+                return io.TextIOWrapper(f, encoding='utf-8').read()
+        except FileNotFoundError:
+            pass
+        # 文件丢失（例如进程在写清单前崩溃后被清理）：确认记录未被并发更新后再移除
+        with self._key_lock(record['file_id'], record['kind'], record['variant']):
+            if not os.path.exists(record['path']):
+                with self._lock:
+                    self._connection().execute('DELETE FROM artifacts WHERE id = ? AND created_at = ?',
+                                               (record['id'], record['created_at']))
+        logger.warning(f"产物文件不存在: {record['filename']}")
+        return None
+
+    def body_offset(self, record):
+        """
+        正文在产物中的字节偏移（跳过元数据头部），与 strip_header 的判断一致
+
+        Raises:
+            FileNotFoundError: 产物文件已被删除
+        """
+        with self.open(record) as f:
+            head = f.read(HEADER_SCAN_BYTES)
+        if not head.startswith(b'# '):
+            return 0
+        end = head.find(_HEADER_SEPARATOR)
+        if end < 0 or head.count(b'\n', 0, end) >= 10:
+            return 0
+        offset = end + len(_HEADER_SEPARATOR)
+        while offset < len(head) and head[offset:offset + 1].isspace():
+            offset += 1
+        return offset
+
+    def read_range(self, record, offset, limit):
+        """
+        按字节偏移读取一段正文，起止位置对齐到UTF-8字符边界
+
+        压缩产物需要从头解压到偏移处，耗时与偏移成正比，但内存占用只与 limit 有关
+
+        Args:
+            record: 产物记录
+            offset: 起始字节偏移（落在字符中间时后移到下一个字符）
+            limit: 最多读取的字节数
+
+        Returns:
+            tuple: (文本, 下一段的起始偏移)
+
+        Raises:
+            FileNotFoundError: 产物文件已被删除
+        """
+        with self.open(record) as f:
+            f.seek(offset)
+            # 多读3个字节，用来判断末尾是否截断了多字节字符
+            data = f.read(limit + 3)
+        start = 0
+        while start < len(data) and _is_continuation(data[start]):
+            start += 1
+        end = min(len(data), limit)
+        if end < len(data):
+            while end > start and _is_continuation(data[end]):
+                end -= 1
+            if end == start:
+                # limit 小于一个字符时至少返回一个完整字符，保证调用方能继续向后读
+                end = start + 1
+                while end < len(data) and _is_continuation(data[end]):
+                    end += 1
+        return data[start:end].decode('utf-8', errors='replace'), offset + end
+
+    def reference(self, record):
+        """产物的精简引用：标识、大小、指纹和分段读取地址，不含正文"""
+        return {
+            'artifact_id': record['id'],
+            'filename': record['filename'],
+            'size': record['size'],
+            'fingerprint': record['fingerprint'],
+            'etag': artifact_etag(record),
+            'created_at': _isoformat(record['created_at']),
+            'text_url': f"/api/ai/artifacts/{record['filename']}/text"
+        }
+
+    def describe(self, record):
+        """产物的对外描述信息"""
+        return {
+            'filename': record['filename'],
+            'filepath': record['path'],
+            'size': record['size'],
+            'stored_size': record['stored_size'] if record['stored_size'] is not None else record['size'],
+            'encoding': record['encoding'] or None,
+            'created_at': _isoformat(record['created_at']),
+            'modified_at': _isoformat(record['created_at']),
+            'url': f"/api/ai/temp-file/{record['filename']}",
+            'type': record['kind'],
+            'optimization_type': record['variant'] or None,
+            'fingerprint': record['fingerprint']
+        }
+
+    def _touch(self, artifact_id):
+        with self._lock:
+            self._connection().execute('UPDATE artifacts SET accessed_at = ? WHERE id = ?',
+                                       (self._clock(), artifact_id))
+
+    # ==================== 清理 ====================
+
+    def delete(self, file_id=None, kind=None, variant=None):
+        """删除匹配的产物，返回删除数量"""
+        clauses, params = [], []
+        for column, value in (('file_id', file_id), ('kind', kind), ('variant', variant)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        return self._delete_where(' AND '.join(clauses) or '1 = 1', params)
+
+    def delete_older_than(self, cutoff):
+        """删除生成时间早于 cutoff（时间戳）的产物"""
+        return self._delete_where('created_at < ?', (cutoff,))
+
+    def evict_per_file(self, max_per_file):
+        """每个笔记文件只保留最近访问的 max_per_file 个产物，返回删除数量"""
+        return self._delete_where(
+            'id IN (SELECT id FROM (SELECT id, ROW_NUMBER() OVER '
+            '(PARTITION BY file_id ORDER BY accessed_at DESC, id DESC) AS rank FROM artifacts) '
+            'WHERE rank > ?)', (max_per_file,))
+
+    def evict_to_quota(self, max_bytes):
+        """按最近访问时间从新到旧累计磁盘占用，淘汰超出总字节配额的产物，返回删除数量"""
+        return self._delete_where(
+            'id IN (SELECT id FROM (SELECT id, SUM(COALESCE(stored_size, size)) OVER '
+            '(ORDER BY accessed_at DESC, id DESC) AS running FROM artifacts) '
+            'WHERE running > ?)', (max_bytes,))
+
+    def sweep_orphans(self, grace_seconds=3600):
+        """
+        删除分片目录中清单未引用的文件（崩溃残留的临时文件等）
+
+        只处理修改时间早于宽限期的文件，避免误删正在写入的文件
+        """
+        with self._lock:
+            referenced = {row[0] for row in self._connection().execute('SELECT path FROM artifacts')}
+        cutoff = self._clock() - grace_seconds
+        removed = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or entry.name == LOCK_DIR:
+                continue
+            for item in os.scandir(entry.path):
+                relative_path = os.path.join(entry.name, item.name)
+                if relative_path in referenced or not item.is_file():
+                    continue
+                try:
+                    if item.stat().st_mtime < cutoff:
+                        os.remove(item.path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def _delete_where(self, condition, params):
+        with self._lock:
+            rows = self._connection().execute(
+                f'SELECT id, file_id, kind, variant, path, created_at FROM artifacts WHERE {condition}',
+                params).fetchall()
+        deleted = 0
+        for artifact_id, file_id, kind, variant, relative_path, created_at in rows:
+            # 持有键锁后按生成时间比对删除：查询之后被重新写入的产物保留
+            with self._key_lock(file_id, kind, variant):
+                with self._lock:
+                    cursor = self._connection().execute(
+                        'DELETE FROM artifacts WHERE id = ? AND created_at = ?', (artifact_id, created_at))
+                if cursor.rowcount:
+                    self._remove_file(relative_path)
+                    deleted += 1
+        return deleted
+
+    def _remove_file(self, relative_path):
+        try:
+            os.remove(os.path.join(self.root, relative_path))
+        except OSError:
+            pass
+
+    def get_stats(self):
+        """产物数量、原始总大小和磁盘占用"""
+        with self._lock:
+            count, total, stored = self._connection().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(COALESCE(stored_size, size)), 0) '
+                'FROM artifacts').fetchone()
+        return {'file_count': count, 'total_size': total, 'stored_size': stored}
+
+    # ==================== 旧版迁移 ====================
+
+    def _import_legacy_files(self):
+        """把旧版平铺在临时目录中的产物导入清单，文件ID从元数据头部读取"""
+        try:
+            names = [name for name in os.listdir(self.root) if name.endswith('.txt')]
+        except OSError:
+            return
+        imported = 0
+        for name in names:
+            match = _LEGACY_PATTERN.search(name)
+            path = os.path.join(self.root, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+            header_match = _HEADER_FILE_ID.search(content.partition('\n---\n')[0])
+            if not match or not header_match:
+                continue
+            kind, variant = (KIND_COLLECTED, '') if match.group(1) == 'collected' else (KIND_OPTIMIZED, match.group(2))
+            file_name = name[:match.start()].rsplit('_', 1)[0]
+            self.put(int(header_match.group(1)), kind, content, file_name, variant)
+            # 多个进程同时启动时可能已被其他进程导入
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            imported += 1
+        if imported:
+            logger.info(f"已导入 {imported} 个旧版临时文件到产物清单")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _is_continuation(byte):
+    return byte & 0xC0 == 0x80
+
+
+def get_artifact_store(root):
+    """按目录获取进程内共享的产物存储"""
+    key = os.path.realpath(root)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = ArtifactStore(root, fsync=os.getenv('AI_ARTIFACT_FSYNC', 'file').strip().lower(),
+                                      compress=os.getenv('AI_ARTIFACT_COMPRESS', 'true').lower() == 'true')
+                _stores[key] = store
+    return store
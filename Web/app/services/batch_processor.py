@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: batch_processor.py
+模块: AI服务 - 批量处理
+描述: 对文件夹或文件列表批量执行 收集/优化/摘要/应用，使用有界线程池并行处理
+功能:
+    - 批量任务创建与进度跟踪（按文件记录状态）
+    - 有界工作线程池并行处理，AI调用共享弹性层的限流和并发控制
+    - 每个文件的应用在单独事务中完成
+    - 部分失败后可从未完成的步骤继续
+    - 任务取消
+    - 文件ID列表校验
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.1
+
+依赖:
+    - concurrent.futures: 线程池
+    - app.services: 数据处理、AI优化、数据应用服务
+
+环境变量:
+    - AI_BATCH_WORKERS: 批量任务工作线程数，默认4
+    - AI_BATCH_MAX_JOBS: 内存中保留的最近任务数，默认50
+
+许可证: Apache-2.0
+"""
+
+import os
+import uuid
+import datetime
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_OPERATIONS = ('collect', 'optimize', 'summary', 'apply')
+
+# 单个文件的处理状态
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class BatchJob:
+    """批量任务，记录每个文件的处理状态"""
+
+    def __init__(self, file_ids, steps, optimization_type='general', backup_original=True):
+        self.id = uuid.uuid4().hex
+        self.steps = steps
+        self.optimization_type = optimization_type
+        self.backup_original = backup_original
+        self.created_at = datetime.datetime.now().isoformat()
+        self.finished_at = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        for file_id in file_ids:
+            self.items[file_id] = {
+                'file_id': file_id,
+                'file_name': None,
+                'status': PENDING,
+                'completed_steps': [],
+                'current_step': None,
+                'error': None,
+                'attempts': 0,
+                'started_at': None,
+                'finished_at': None,
+                'result': {}
+            }
+        # 中间结果只保存在内存中，用于失败后继续，不随进度返回
+        self.intermediate = {file_id: {} for file_id in file_ids}
+
+    @property
+    def status(self):
+        statuses = [item['status'] for item in self.items.values()]
+        if any(s in (PENDING, RUNNING) for s in statuses):
+            return 'cancelling' if self.cancelled else 'running'
+        if self.cancelled:
+            return 'cancelled'
+        if all(s == SUCCEEDED for s in statuses):
+            return 'completed'
+        if any(s == SUCCEEDED for s in statuses):
+            return 'partially_failed'
+        return 'failed'
+
+    def to_dict(self, include_items=True):
+        with self.lock:
+            counts = {s: 0 for s in (PENDING, RUNNING, SUCCEEDED, FAILED, CANCELLED)}
+            for item in self.items.values():
+                counts[item['status']] += 1
+            total = len(self.items)
+            done = counts[SUCCEEDED] + counts[FAILED] + counts[CANCELLED]
+            result = {
+                'job_id': self.id,
+                'status': self.status,
+                'steps': self.steps,
+                'optimization_type': self.optimization_type,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+                'total': total,
+                'counts': counts,
+                'progress': round(done / total * 100, 1) if total else 100.0
+            }
+            if include_items:
+                result['items'] = [dict(item) for item in self.items.values()]
+            return result
+
+
+class BatchProcessor:
+    """批量AI处理器"""
+
+    def __init__(self, data_processor, ai_optimizer, data_applier, max_workers=None, max_jobs=None):
+        self.data_processor = data_processor
+        self.ai_optimizer = ai_optimizer
+        self.data_applier = data_applier
+        self.max_workers = max_workers or int(os.getenv('AI_BATCH_WORKERS', '4'))
+        self.max_jobs = max_jobs or int(os.getenv('AI_BATCH_MAX_JOBS', '50'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ai-batch')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_steps(operations, apply=False):
+        """
+        规范化步骤列表，补全依赖的步骤并按执行顺序排列
+
+        Returns:
+            tuple: (steps, error_message)
+        """
+        operations = list(operations or ['collect', 'optimize'])
+        unknown = [op for op in operations if op not in SUPPORTED_OPERATIONS]
+        if unknown:
+            return None, f'不支持的操作: {", ".join(unknown)}'
+        if apply and 'apply' not in operations:
+            operations.append('apply')
+        if 'apply' in operations and 'optimize' not in operations:
+            operations.append('optimize')
+        # 优化和摘要都需要先收集内容
+        if ('optimize' in operations or 'summary' in operations) and 'collect' not in operations:
+            operations.append('collect')
+        return [op for op in SUPPORTED_OPERATIONS if op in operations], None
+
+    @staticmethod
+    def normalize_file_ids(file_ids):
+        """
+        校验文件ID列表（整数或数字字符串），去重并保持顺序
+
+        Returns:
+            tuple: (file_ids, error_message)
+        """
+        if not isinstance(file_ids, list):
+            return None, '文件ID列表必须是数组'
+        normalized = []
+        for file_id in file_ids:
+            if isinstance(file_id, str) and file_id.strip().isdigit():
+                file_id = int(file_id)
+            if isinstance(file_id, bool) or not isinstance(file_id, int):
+                return None, f'无效的文件ID: {file_id!r}'
+            normalized.append(file_id)
+        return list(dict.fromkeys(normalized)), None
+
+    def submit(self, app, file_ids, steps, optimization_type='general', backup_original=True):
+        """创建批量任务并提交到线程池"""
+        job = BatchJob(file_ids, steps, optimization_type, backup_original)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status in ('running', 'cancelling'):
+                    break
+                self._jobs.pop(oldest_id)
+
+        logger.info(f"批量任务 {job.id} 已创建: {len(file_ids)} 个文件, 步骤={steps}")
+        for file_id in file_ids:
+            self._executor.submit(self._run_item, app, job, file_id)
+        return job
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict(include_items=False) for job in reversed(jobs)]
+
+    def resume(self, app, job_id):
+        """重新提交失败或被取消的文件，从未完成的步骤继续"""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+
+        resubmit = []
+        with job.lock:
+            job.cancelled = False
+            job.finished_at = None
+            for file_id, item in job.items.items():
+                if item['status'] in (FAILED, CANCELLED):
+                    item['status'] = PENDING
+                    item['error'] = None
+                    resubmit.append(file_id)
+
+        for file_id in resubmit:
+            self._executor.submit(self._run_item, app, job, file_id)
+        logger.info(f"批量任务 {job.id} 继续执行 {len(resubmit)} 个文件")
+        return job
+
+    def cancel(self, job_id):
+        """取消任务：尚未开始的文件不再处理，正在处理的文件完成当前文件后停止"""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        with job.lock:
+            job.cancelled = True
+            for item in job.items.values():
+                if item['status'] == PENDING:
+                    item['status'] = CANCELLED
+        self._mark_finished_if_done(job)
+        return job
+
+    def _mark_finished_if_done(self, job):
+        with job.lock:
+            if job.finished_at is None and all(
+                item['status'] not in (PENDING, RUNNING) for item in job.items.values()
+            ):
+                job.finished_at = datetime.datetime.now().isoformat()
+
+    def _run_item(self, app, job, file_id):
+        item = job.items[file_id]
+        with job.lock:
+            if job.cancelled or item['status'] != PENDING:
+                return
+            item['status'] = RUNNING
+            item['attempts'] += 1
+            item['started_at'] = datetime.datetime.now().isoformat()
+
+        try:
+            with app.app_context():
+                for step in job.steps:
+                    if step in item['completed_steps']:
+                        continue
+                    with job.lock:
+                        item['current_step'] = step
+                    error = self._run_step(job, file_id, step)
+                    if error:
+                        raise RuntimeError(error)
+                    with job.lock:
+                        item['completed_steps'].append(step)
+
+            with job.lock:
+                item['status'] = SUCCEEDED
+                item['current_step'] = None
+                # 文件完成后释放中间结果
+                job.intermediate[file_id] = {}
+        except Exception as e:
+            logger.warning(f"批量任务 {job.id} 文件 {file_id} 在步骤 {item['current_step']} 失败: {str(e)}")
+            with job.lock:
+                item['status'] = FAILED
+                item['error'] = str(e)
+        finally:
+            with job.lock:
+                item['finished_at'] = datetime.datetime.now().isoformat()
+            self._mark_finished_if_done(job)
+
+    def _run_step(self, job, file_id, step):
+        """执行单个步骤，返回错误信息（成功时返回None）"""
+        item = job.items[file_id]
+        state = job.intermediate[file_id]
+
+        if step == 'collect':
+            result = self.data_processor.collect_file_content(file_id)
+            if not result['success']:
+                return result['error']
+            collected_content = self.data_processor.read_collected_content(file_id)
+            if collected_content is None:
+                return '未找到收集的内容'
+            state['file_name'] = result['file_name']
+            state['collected_content'] = collected_content
+            with job.lock:
+                item['file_name'] = result['file_name']
+                item['result']['total_notes'] = result['total_notes']
+            return None
+
+        if step == 'optimize':
+            result = self.ai_optimizer.optimize_content(
+                file_id, state['file_name'], state['collected_content'], job.optimization_type
+            )
+            if not result['success']:
+                return result['error']
+            state['optimized_content'] = result['optimized_content']
+            with job.lock:
+                item['result']['report'] = result.get('report')
+                item['result']['optimized_temp_file'] = (result.get('optimized_temp_file') or {}).get('filename')
+            return None
+
+        if step == 'summary':
+            result = self.ai_optimizer.generate_summary(
+                file_id, state['file_name'], state['collected_content']
+            )
+            if not result['success']:
+                return result['error']
+            with job.lock:
+                item['result']['summary'] = result['summary']
+            return None
+
+        if step == 'apply':
+            # apply_optimization 在单个事务中完成，失败时整体回滚
+            result = self.data_applier.apply_optimization(
+                file_id, state['optimized_content'], job.backup_original
+            )
+            if not result['success']:
+                return result['error']
+            with job.lock:
+                item['result']['new_notes_count'] = result['new_notes_count']
+            return None
+
+        return f'不支持的操作: {step}'
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: conversion_pool.py
+模块: 服务层 - 并行Markdown转换
+描述: 大批量笔记的HTML转Markdown分块交给进程池并行执行，小批量在当前线程转换
+功能:
+    - 按笔记数和总字符数判断是否走进程池
+    - 笔记按顺序分块提交，结果按提交顺序拼回
+    - 进程池常驻复用，异常时退回当前线程转换
+    - 转换次数与耗时统计
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - concurrent.futures: 进程池
+    - app.services.note_text: 单条笔记的Markdown转换
+
+配置项:
+    - NOTE_CONVERT_WORKERS: 进程数，0 表示按CPU核数自动选择，1 表示不使用进程池
+    - NOTE_CONVERT_PARALLEL_MIN_NOTES: 走进程池的最少笔记数
+    - NOTE_CONVERT_PARALLEL_MIN_CHARS: 走进程池的最少总字符数
+
+注意事项:
+    - 进程使用 forkserver/spawn 方式启动，避免在有后台线程的进程中直接 fork
+    - 进程池的固定开销约为每批几毫秒、每个笔记约10%，多核机器上几百个笔记即可回本；
+      默认阈值取得更保守，避免进程池被普通请求占满，部署机器变化后可用
+      tools/benchmark_parallel_conversion.py 重新测量交叉点
+
+许可证: Apache-2.0
+"""
+
+import os
+import time
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from app.services.note_text import render_markdown
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_NOTES = 1000
+DEFAULT_MIN_CHARS = 256 * 1024
+# 每个进程分到的块数，块越多负载越均衡，进程间传输开销也越大
+CHUNKS_PER_WORKER = 4
+
+
+def _render_chunk(items):
+    """进程池中执行：转换一块笔记，items 为 (内容, 格式) 列表"""
+    return [render_markdown(content, format_type) for content, format_type in items]
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class ConversionPool:
+    """笔记Markdown转换的进程池"""
+
+    def __init__(self, workers=0, min_notes=DEFAULT_MIN_NOTES, min_chars=DEFAULT_MIN_CHARS):
+        self.workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        self.min_notes = min_notes
+        self.min_chars = min_chars
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {'inline_batches': 0, 'parallel_batches': 0, 'fallbacks': 0, 'notes': 0}
+
+    def init_app(self, app):
+        workers = int(app.config.get('NOTE_CONVERT_WORKERS', 0))
+        self.workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        self.min_notes = int(app.config.get('NOTE_CONVERT_PARALLEL_MIN_NOTES', self.min_notes))
+        self.min_chars = int(app.config.get('NOTE_CONVERT_PARALLEL_MIN_CHARS', self.min_chars))
+        metrics.register_collector('convert.pool', self.get_stats)
+
+    def should_parallelize(self, count, chars):
+        return self.workers > 1 and count >= self.min_notes and chars >= self.min_chars
+
+    def render(self, items):
+        """
+        批量转换笔记内容
+
+        Args:
+            items: (内容, 格式) 列表，按笔记顺序排列
+
+        Returns:
+            list: 与 items 一一对应的Markdown文本
+        """
+        items = list(items)
+        chars = sum(len(content or '') for content, _ in items)
+        started = time.perf_counter()
+        if self.should_parallelize(len(items), chars):
+            try:
+                result = self._render_parallel(items)
+                outcome = 'parallel_batches'
+            except Exception as e:
+                # 进程池损坏（例如子进程被杀）时丢弃并退回当前线程
+                logger.warning(f"进程池转换失败，改为当前线程转换: {str(e)}")
+                self.shutdown()
+                result = _render_chunk(items)
+                outcome = 'fallbacks'
+        else:
+            result = _render_chunk(items)
+            outcome = 'inline_batches'
+        with self._lock:
+            self.stats[outcome] += 1
+            self.stats['notes'] += len(items)
+        metrics.incr(f'convert.{outcome}')
+        metrics.observe('convert.batch_seconds', time.perf_counter() - started)
+        return result
+
+    def _render_parallel(self, items):
+        size = max(1, -(-len(items) // (self.workers * CHUNKS_PER_WORKER)))
+        chunks = [items[start:start + size] for start in range(0, len(items), size)]
+        result = []
+        # map 按提交顺序返回结果，拼接后与笔记顺序一致
+        for rendered in self._get_executor().map(_render_chunk, chunks):
+            result.extend(rendered)
+        return result
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+                logger.info(f"Markdown转换进程池已启动: 进程数={self.workers}")
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return dict(stats, workers=self.workers, min_notes=self.min_notes,
+                    min_chars=self.min_chars, running=self._executor is not None)
+
+
+conversion_pool = ConversionPool()
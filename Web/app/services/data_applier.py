@@ -10,26 +10,68 @@
     - 笔记数据结构转换
     - 批量笔记创建和更新
     - 数据验证和清理
+    - 应用前的近似重复检查（可选）
+    - 块级差异应用：未改动的笔记保留原ID，只以批量语句写入变化的行
+    - 整体替换和备份恢复：按文件一条删除语句加一次批量插入，与文件时间戳在同一事务中提交
+    - 优化内容按Markdown结构分块，标题、列表、引用写入对应的笔记格式，内容为编辑器HTML
+    - 预览的精简模式只返回笔记的顺序、格式和长度
+    - 应用优化前把当前状态记为修订版本备份点，按版本ID或时间点恢复、分页列出备份
 
 作者: Jolly
 创建时间: 2025-06-04
-最后修改: 2025-06-04
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.0.0
+版本: 1.6.0
 
 依赖:
     - re: 正则表达式处理
     - datetime: 时间处理
     - app.models: 数据模型
     - app.extensions: 数据库扩展
+    - app.services.note_diff: 笔记块差异
+    - app.services.revision_store: 文件修订版本
+    - app.utils.markdown_blocks: Markdown分块与格式识别
 
 许可证: Apache-2.0
 """
 import re
 import datetime
+import logging
+from collections import namedtuple
+from sqlalchemy import bindparam
 from app.models.note import Note
 from app.models.note_file import NoteFile
 from app.extensions import db
+from app.services import note_events
+from app.services.duplicate_detector import duplicate_detector
+from app.services.note_diff import plan_note_changes
+from app.services.conversion_pool import conversion_pool
+from app.services.revision_store import revision_store
+from app.utils.markdown_blocks import parse_markdown_blocks
+from app.utils.text import strip_html
+
+logger = logging.getLogger(__name__)
+
+SQL_BATCH = 500
+
+MODE_DIFF = 'diff'
+MODE_REPLACE = 'replace'
+
+# 修订版本的操作类型
+REASON_AI_APPLY = 'ai_apply'
+REASON_RESTORE = 'restore'
+
+# 待写入的笔记块；markdown 为派生文本，只在差异比较或写入需要时计算
+NoteBlock = namedtuple('NoteBlock', 'content format markdown plain_text')
+
+_BACKUP_HEADER = re.compile(r'^# 笔记 \d+ \(Order: (\d+)(?:, Format: ([\w-]+))?\)$')
+
+
+def _chunks(items, size=SQL_BATCH):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 
 class DataApplier:
     """数据应用器，负责将优化后的内容应用到笔记系统"""
@@ -37,7 +79,8 @@ class DataApplier:
     def __init__(self):
         pass
     
-    def apply_optimization(self, file_id, optimized_content, backup_original=True):
+    def apply_optimization(self, file_id, optimized_content, backup_original=True, duplicate_check=None,
+                           mode=MODE_DIFF):
         """
         将优化后的内容应用到笔记文件
         
@@ -45,6 +88,9 @@ class DataApplier:
             file_id: 文件ID
             optimized_content: 优化后的内容
             backup_original: 是否备份原始内容
+            duplicate_check: 重复检查方式，None 不检查，'warn' 应用并返回重复提示，
+                'block' 发现重复时不应用
+            mode: 'diff' 只写入变化的块（默认），'replace' 整体替换文件的全部笔记
             
         Returns:
             dict: 包含应用结果的字典
@@ -55,8 +101,8 @@ class DataApplier:
             if not note_file:
                 return {'success': False, 'error': '文件不存在'}
             
-            # 获取原始笔记
-            original_notes = Note.query.filter_by(file_id=file_id).order_by(Note.order.asc()).all()
+            # 获取原始笔记（只读取列，不加载ORM对象）
+            original_notes = self._load_notes(file_id)
             
             if backup_original and original_notes:
                 # 创建备份
@@ -64,55 +110,177 @@ class DataApplier:
             else:
                 backup_info = None
             
-            # 解析优化后的内容为笔记块
+            # 解析优化后的内容为带格式的笔记块
             new_notes = self._parse_optimized_content(optimized_content)
+            revision_store.set_reason(db.session, REASON_AI_APPLY)
+            
+            # 检查新块是否与其他文件中的笔记重复
+            duplicate_warnings = None
+            if duplicate_check in ('warn', 'block'):
+                duplicate_warnings = duplicate_detector.check_blocks([block.content for block in new_notes],
+                                                                     exclude_file_id=file_id)
+                if duplicate_check == 'block' and duplicate_warnings:
+                    db.session.rollback()
+                    return {
+                        'success': False,
+                        'error': f'优化内容中有 {len(duplicate_warnings)} 个块与已有笔记重复',
+                        'duplicate_warnings': duplicate_warnings
+                    }
             
-            # 删除原有笔记
-            for note in original_notes:
-                db.session.delete(note)
-            
-            # 创建新笔记
-            created_notes = []
-            for i, note_content in enumerate(new_notes):
-                if note_content.strip():  # 只创建非空笔记
-                    new_note = Note(
-                        content=note_content,
-                        file_id=file_id,
-                        order=i,
-                        format='text',  # 默认使用text格式
-                        created_at=datetime.datetime.utcnow(),
-                        updated_at=datetime.datetime.utcnow()
-                    )
-                    db.session.add(new_note)
-                    created_notes.append(new_note)
+            if mode == MODE_REPLACE:
+                # 整体替换：一条删除语句加一次批量插入
+                self._replace_notes(file_id, new_notes)
+                changes = {'inserted': len(new_notes), 'updated': 0, 'deleted': len(original_notes),
+                           'reordered': 0, 'unchanged': 0}
+            else:
+                # 块级差异：未改动的笔记保留原ID和内容，只写入变化的行
+                plan = plan_note_changes(original_notes, new_notes)
+                self._execute_plan(file_id, plan)
+                changes = plan.to_dict()
             
             # 更新文件的修改时间
             note_file.updated_at = datetime.datetime.utcnow()
             
             # 提交数据库更改
             db.session.commit()
+            logger.info(f"文件 {file_id} 已应用优化（{mode}）: {changes}")
             
-            return {
+            result = {
                 'success': True,
                 'file_id': file_id,
                 'file_name': note_file.name,
                 'original_notes_count': len(original_notes),
-                'new_notes_count': len(created_notes),
+                'new_notes_count': len(new_notes),
+                'mode': mode,
+                'changes': changes,
                 'backup_info': backup_info,
                 'applied_content': optimized_content
             }
+            if duplicate_warnings is not None:
+                result['duplicate_warnings'] = duplicate_warnings
+            return result
             
         except Exception as e:
             db.session.rollback()
             return {'success': False, 'error': f'应用优化失败: {str(e)}'}
     
-    def preview_optimization(self, file_id, optimized_content):
+    def _load_notes(self, file_id):
+        """按顺序读取文件的笔记列"""
+        return db.session.query(Note.id, Note.order, Note.content, Note.format, Note.markdown, Note.plain_text) \
+            .filter(Note.file_id == file_id) \
+            .order_by(Note.order.asc(), Note.id.asc()) \
+            .all()
+    
+    def _execute_plan(self, file_id, plan):
+        """
+        以批量语句执行差异操作，并同步变更事件和近似重复签名
+        
+        绕过ORM的语句不会触发flush事件，需要手动登记
+        """
+        table = Note.__table__
+        session = db.session
+        now = datetime.datetime.utcnow()
+        
+        # 只为写入的块计算Markdown派生文本
+        written = self._with_markdown([block for _, _, block in plan.updates] + [block for _, block in plan.inserts])
+        updates = [(note_id, order, block) for (note_id, order, _), block in zip(plan.updates, written)]
+        inserts = [(order, block) for (order, _), block in zip(plan.inserts, written[len(updates):])]
+        
+        for batch in _chunks(plan.deletes):
+            session.execute(table.delete().where(table.c.id.in_(batch)))
+        
+        if plan.reorders:
+            # 只调整顺序时保留更新时间，相关笔记索引不必重新计算
+            session.execute(
+                table.update().where(table.c.id == bindparam('_id'))
+                .values(order=bindparam('_order'), updated_at=table.c.updated_at),
+                [{'_id': note_id, '_order': order} for note_id, order in plan.reorders]
+            )
+        
+        if updates:
+            params = [{'_id': note_id, '_order': order, '_content': block.content, '_format': block.format,
+                       '_markdown': block.markdown, '_plain_text': block.plain_text, '_updated_at': now}
+                      for note_id, order, block in updates]
+            session.execute(
+                table.update().where(table.c.id == bindparam('_id'))
+                .values(order=bindparam('_order'), content=bindparam('_content'), format=bindparam('_format'),
+                        markdown=bindparam('_markdown'), plain_text=bindparam('_plain_text'),
+                        updated_at=bindparam('_updated_at')),
+                params
+            )
+        
+        contents = {note_id: block.content for note_id, _, block in updates}
+        if inserts:
+            session.execute(table.insert(), [self._note_row(file_id, order, block, now)
+                                             for order, block in inserts])
+            # 执行后每个位置只对应一行，按顺序取回新行的ID
+            inserted = dict(inserts)
+            for batch in _chunks(list(inserted)):
+                for note_id, order in session.query(Note.id, Note.order) \
+                        .filter(Note.file_id == file_id, Note.order.in_(batch)):
+                    contents[note_id] = inserted[order].content
+        
+        note_events.mark_notes_changed(session, file_id, upserted_ids=list(contents), deleted_ids=plan.deletes,
+                                       reordered_ids=[note_id for note_id, _ in plan.reorders])
+        duplicate_detector.refresh_signatures(session, contents, plan.deletes)
+    
+    def _replace_notes(self, file_id, notes):
+        """
+        以一条按文件删除的语句和一次批量插入替换文件的全部笔记，在调用方的事务中执行
+        
+        Args:
+            file_id: 文件ID
+            notes: 按顺序排列的 NoteBlock，markdown 为 None 时在写入前计算
+            
+        Returns:
+            int: 插入的笔记数
+        """
+        table = Note.__table__
+        session = db.session
+        now = datetime.datetime.utcnow()
+        
+        deleted_ids = [note_id for note_id, in session.query(Note.id).filter(Note.file_id == file_id)]
+        session.execute(table.delete().where(table.c.file_id == file_id))
+        
+        rows = [self._note_row(file_id, order, block, now) for order, block in enumerate(self._with_markdown(notes))]
+        if rows:
+            session.execute(table.insert(), rows)
+        
+        contents = dict(session.query(Note.id, Note.content).filter(Note.file_id == file_id))
+        note_events.mark_notes_changed(session, file_id, upserted_ids=list(contents), deleted_ids=deleted_ids)
+        duplicate_detector.refresh_signatures(session, contents, deleted_ids)
+        return len(rows)
+    
+    @staticmethod
+    def _note_row(file_id, order, block, now):
+        return {'file_id': file_id, 'order': order, 'content': block.content, 'format': block.format,
+                'markdown': block.markdown, 'plain_text': block.plain_text,
+                'created_at': now, 'updated_at': now}
+    
+    @staticmethod
+    def _block(content, format_type):
+        return NoteBlock(content, format_type, None, strip_html(content))
+    
+    @staticmethod
+    def _with_markdown(blocks):
+        """补齐笔记块的Markdown派生文本，大批量时交给转换进程池"""
+        missing = [i for i, block in enumerate(blocks) if block.markdown is None]
+        if not missing:
+            return blocks
+        rendered = conversion_pool.render([(blocks[i].content, blocks[i].format) for i in missing])
+        blocks = list(blocks)
+        for i, markdown in zip(missing, rendered):
+            blocks[i] = blocks[i]._replace(markdown=markdown)
+        return blocks
+    
+    def preview_optimization(self, file_id, optimized_content, compact=False):
         """
         预览优化后的内容如何应用到笔记
         
         Args:
             file_id: 文件ID
             optimized_content: 优化后的内容
+            compact: 为True时笔记列表只返回ID、顺序、格式和长度，不返回正文
             
         Returns:
             dict: 包含预览结果的字典
@@ -124,209 +292,73 @@ class DataApplier:
                 return {'success': False, 'error': '文件不存在'}
             
             # 获取原始笔记
-            original_notes = Note.query.filter_by(file_id=file_id).order_by(Note.order.asc()).all()
+            original_notes = self._load_notes(file_id)
             
-            # 解析优化后的内容为笔记块
+            # 解析优化后的内容为笔记块，并计算应用时会执行的操作
             new_notes = self._parse_optimized_content(optimized_content)
+            plan = plan_note_changes(original_notes, new_notes)
+            
+            def describe(content, **fields):
+                if compact:
+                    fields['length'] = len(content or '')
+                else:
+                    fields['content'] = content
+                return fields
             
             return {
                 'success': True,
                 'file_id': file_id,
                 'file_name': note_file.name,
                 'original_notes': [
-                    {
-                        'id': note.id,
-                        'content': note.content,
-                        'format': note.format,
-                        'order': note.order
-                    }
+                    describe(note.content, id=note.id, format=note.format, order=note.order)
                     for note in original_notes
                 ],
                 'new_notes': [
-                    {
-                        'content': content,
-                        'format': 'text',
-                        'order': i
-                    }
-                    for i, content in enumerate(new_notes) if content.strip()
+                    describe(block.content, format=block.format, order=i)
+                    for i, block in enumerate(new_notes)
                 ],
                 'comparison': {
                     'original_count': len(original_notes),
-                    'new_count': len([n for n in new_notes if n.strip()]),
-                    'content_change': True                }            }
+                    'new_count': len(new_notes),
+                    'content_change': plan.touched > 0,
+                    'changes': plan.to_dict()
+                }
+            }
             
         except Exception as e:
             return {'success': False, 'error': f'预览失败: {str(e)}'}
     
     def _parse_optimized_content(self, content):
         """
-        精细化解析：每个标题和段落都是独立的block
+        把优化后的Markdown解析为笔记块
         
-        规则：
-        1. 每个标题（#, ##, ###, ####等）是一个独立的block
-        2. 每个段落（由空行分隔）是一个独立的block
-        3. 列表项保持在一起作为一个block（除非被空行分隔）
-        4. 代码块保持完整
-        5. 分隔符（---）单独作为一个block
-        """
-        if not content:
-            return []
-        
-        content = self._remove_metadata_header(content)
-        
-        # 按行分割，然后重新组合成block
-        lines = content.split('\n')
-        blocks = []
-        current_block = []
-        in_code_block = False
+        标题、列表、引用分别对应 h1-h3、bullet/number、quote 格式，代码块、分隔线和段落为 text，
+        内容均为编辑器HTML
         
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            stripped_line = line.strip()
-            
-            # 检查代码块开始/结束
-            if stripped_line.startswith('```'):
-                if in_code_block:
-                    # 代码块结束
-                    current_block.append(line)
-                    blocks.append('\n'.join(current_block))
-                    current_block = []
-                    in_code_block = False
-                else:
-                    # 代码块开始
-                    if current_block:
-                        blocks.append('\n'.join(current_block))
-                        current_block = []
-                    current_block.append(line)
-                    in_code_block = True
-                i += 1
-                continue
-            
-            # 如果在代码块内，直接添加
-            if in_code_block:
-                current_block.append(line)
-                i += 1
-                continue
-            
-            # 检查标题
-            if stripped_line.startswith('#') and ' ' in stripped_line:
-                # 先保存当前block
-                if current_block:
-                    blocks.append('\n'.join(current_block))
-                    current_block = []
-                
-                # 标题单独作为一个block
-                blocks.append(line.strip())
-                i += 1
-                continue
-            
-            # 检查分隔符
-            if stripped_line == '---':
-                # 先保存当前block
-                if current_block:
-                    blocks.append('\n'.join(current_block))
-                    current_block = []
-                
-                # 分隔符单独作为一个block
-                blocks.append(stripped_line)
-                i += 1
-                continue
-            
-            # 检查空行
-            if not stripped_line:
-                # 如果当前block有内容，保存它
-                if current_block:
-                    blocks.append('\n'.join(current_block))
-                    current_block = []
-                # 跳过连续的空行
-                while i < len(lines) and not lines[i].strip():
-                    i += 1
-                continue
-            
-            # 普通行，添加到当前block
-            current_block.append(line)
-            i += 1
-        
-        # 保存最后的block
-        if current_block:
-            blocks.append('\n'.join(current_block))
-        
-        # 清理空块和仅包含空白的块
-        cleaned_blocks = []
-        for block in blocks:
-            cleaned_block = block.strip()
-            if cleaned_block:
-                cleaned_blocks.append(cleaned_block)
-        
-        # 添加调试信息
-        print(f"DEBUG: 精细化解析后得到 {len(cleaned_blocks)} 个笔记块")
-        for i, block in enumerate(cleaned_blocks):
-            preview = block[:50].replace('\n', '\\n')
-            block_type = "段落"
-            if block.startswith('#'):
-                level = len(block) - len(block.lstrip('#'))
-                block_type = f"H{level}标题"
-            elif block == '---':
-                block_type = "分隔符"
-            elif block.startswith('- ') or block.startswith('* '):
-                block_type = "列表"
-            print(f"DEBUG: Block {i+1} ({block_type}): {preview}...")
-        
-        return cleaned_blocks
-    
-    def _remove_metadata_header(self, content):
-        """
-        移除文件头部的元数据
+        Returns:
+            list: NoteBlock 列表（Markdown派生文本尚未计算），不含空块
         """
-        lines = content.split('\n')
-        content_start = 0
-        
-        # 只有当 "---" 出现在文件开头的前几行时才认为是元数据分隔符
-        # 而不是markdown中间的分隔符
-        for i, line in enumerate(lines):
-            if i > 5:  # 如果前5行都没有找到，就不是元数据
-                break
-            if line.strip() == '---' and i > 0:  # 必须不是第一行，且在前几行中
-                # 检查前面是否有类似元数据的内容（包含冒号的行）
-                has_metadata = False
-                for j in range(i):
-                    if ':' in lines[j] and not lines[j].strip().startswith('#'):
-                        has_metadata = True
-                        break
-                if has_metadata:
-                    content_start = i + 1
-                    break
-        
-        # 添加调试信息
-        if content_start > 0:
-            print(f"DEBUG: 检测到真正的元数据分隔符，跳过前 {content_start} 行")
-        else:
-            print("DEBUG: 未检测到元数据分隔符，保留全部内容")
-        
-        result = '\n'.join(lines[content_start:]).strip()
-        print(f"DEBUG: 移除元数据后内容长度: {len(result)}")
-        print(f"DEBUG: 移除元数据后内容开头: {result[:200]}...")
-        
-        return result
+        blocks = [self._block(block.content, block.format) for block in parse_markdown_blocks(content)]
+        logger.debug(f"优化内容解析为 {len(blocks)} 个笔记块")
+        return blocks
     
     def _create_backup(self, file_id, notes):
         """
-        创建原始笔记的备份
+        创建原始笔记的备份：当前状态记为修订版本备份点（backup_id 可用于 restore_backup），
+        同时返回文本形式的备份内容供前端下载或 restore_from_backup 使用
         """
         try:
-            # 这里可以实现备份逻辑，比如：
-            # 1. 创建一个新的文件作为备份
-            # 2. 或者保存到专门的备份表
-            # 3. 或者简单地返回备份信息供前端下载
+            revision = revision_store.checkpoint(db.session, file_id)
             
             backup_content = []
             for note in notes:
-                backup_content.append(f"# 笔记 {note.id} (Order: {note.order})\n{note.content}")
+                backup_content.append(f"# 笔记 {note.id} (Order: {note.order}, Format: {note.format or 'text'})\n"
+                                      f"{note.content}")
             
             backup_text = '\n\n---\n\n'.join(backup_content)
             
             return {
+                'backup_id': revision['id'] if revision else None,
                 'created_at': datetime.datetime.now().isoformat(),
                 'notes_count': len(notes),
                 'content': backup_text,
@@ -359,25 +391,13 @@ class DataApplier:
             
             # 解析备份内容
             restored_notes = self._parse_backup_content(backup_content)
+            revision_store.set_reason(db.session, REASON_RESTORE)
             
-            # 删除当前笔记
-            current_notes = Note.query.filter_by(file_id=file_id).all()
-            for note in current_notes:
-                db.session.delete(note)
-            
-            # 创建恢复的笔记
-            created_notes = []
-            for i, note_data in enumerate(restored_notes):
-                new_note = Note(
-                    content=note_data['content'],
-                    file_id=file_id,
-                    order=note_data.get('order', i),
-                    format=note_data.get('format', 'text'),
-                    created_at=datetime.datetime.utcnow(),
-                    updated_at=datetime.datetime.utcnow()
-                )
-                db.session.add(new_note)
-                created_notes.append(new_note)
+            # 整体替换当前笔记
+            restored_count = self._replace_notes(file_id, [
+                self._block(note_data['content'], note_data.get('format', 'text'))
+                for note_data in restored_notes
+            ])
             
             # 更新文件的修改时间
             note_file.updated_at = datetime.datetime.utcnow()
@@ -389,7 +409,7 @@ class DataApplier:
                 'success': True,
                 'file_id': file_id,
                 'file_name': note_file.name,
-                'restored_notes_count': len(created_notes)
+                'restored_notes_count': restored_count
             }
             
         except Exception as e:
@@ -406,58 +426,111 @@ class DataApplier:
         
         for section in sections:
             if section.strip():
-                # 移除备份标题行
+                # 移除备份标题行，标题中记录了格式时一并恢复
                 lines = section.split('\n')
-                if lines and lines[0].startswith('# 笔记'):
+                header = _BACKUP_HEADER.match(lines[0])
+                format_type = 'text'
+                if header:
+                    content = '\n'.join(lines[1:])
+                    format_type = header.group(2) or 'text'
+                elif lines and lines[0].startswith('# 笔记'):
                     content = '\n'.join(lines[1:])
                 else:
                     content = section
                 
                 notes.append({
                     'content': content.strip(),
-                    'format': 'text',
+                    'format': format_type,
                     'order': len(notes)
                 })
         
         return notes
     
-    def restore_backup(self, file_id, backup_id):
+    def restore_backup(self, file_id, backup_id=None, at=None):
         """
-        恢复指定的备份
+        把文件恢复到指定的修订版本
+        
+        按块级差异写入：与版本中相同的笔记保留，只写入变化的行；恢复本身也记为一个新版本
         
         Args:
             file_id: 文件ID
-            backup_id: 备份ID（这里简化为备份时间戳）
+            backup_id: 版本ID（list_backups 返回的 id，或应用优化时的 backup_id）
+            at: 时间点（datetime，UTC），恢复到不晚于该时间的最后一个版本；与 backup_id 二选一
             
         Returns:
             dict: 包含恢复结果的字典
         """
         try:
-            # 这是一个简化的实现，实际项目中可能需要更复杂的备份管理
+            note_file = NoteFile.query.get(file_id)
+            if not note_file:
+                return {'success': False, 'error': '文件不存在'}
+            
+            revision = revision_store.find_revision(file_id, revision_id=backup_id, at=at)
+            if revision is None or (backup_id is None and at is None):
+                return {'success': False, 'error': '未找到指定的备份版本'}
+            
+            restored = revision_store.reconstruct(file_id, revision['id'])
+            blocks = [self._block(note['content'], note['format']) for note in restored]
+            plan = plan_note_changes(self._load_notes(file_id), blocks)
+            revision_store.set_reason(db.session, REASON_RESTORE)
+            self._execute_plan(file_id, plan)
+            note_file.updated_at = datetime.datetime.utcnow()
+            db.session.commit()
+            logger.info(f"文件 {file_id} 已恢复到版本 {revision['id']}: {plan.to_dict()}")
+            
             return {
-                'success': False,
-                'error': '备份恢复功能暂未完全实现，请使用手动恢复'
+                'success': True,
+                'file_id': file_id,
+                'file_name': note_file.name,
+                'backup': revision,
+                'restored_notes_count': len(blocks),
+                'changes': plan.to_dict()
             }
             
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': f'恢复备份失败: {str(e)}'}
     
-    def list_backups(self, file_id):
+    def get_backup(self, file_id, backup_id):
+        """
+        读取指定修订版本时文件的笔记内容（不修改当前笔记）
+        
+        Returns:
+            dict: 版本信息和按顺序排列的笔记
+        """
+        try:
+            revision = revision_store.find_revision(file_id, revision_id=backup_id)
+            if revision is None:
+                return {'success': False, 'error': '未找到指定的备份版本'}
+            return {
+                'success': True,
+                'file_id': file_id,
+                'backup': revision,
+                'notes': revision_store.reconstruct(file_id, backup_id)
+            }
+            
+        except Exception as e:
+            return {'success': False, 'error': f'读取备份失败: {str(e)}'}
+    
+    def list_backups(self, file_id, limit=50, before_id=None):
         """
-        获取文件的备份列表
+        获取文件的备份列表（修订版本，按时间倒序）
         
         Args:
             file_id: 文件ID
+            limit: 本页数量
+            before_id: 只返回ID小于该值的版本，用于翻页
             
         Returns:
             dict: 包含备份列表的字典
         """
         try:
-            # 这是一个简化的实现，实际项目中可能需要专门的备份表
+            backups = revision_store.list_revisions(file_id, limit=limit, before_id=before_id)
             return {
                 'success': True,
                 'file_id': file_id,
-                'backups': []  # 暂时返回空列表
+                'backups': backups,
+                'next_before_id': backups[-1]['id'] if len(backups) == limit else None
             }
             
         except Exception as e:
@@ -7,30 +7,52 @@
 描述: 负责将笔记文件整理成txt格式，进行内容收集、格式化和临时文件管理
 功能:
     - 收集指定文件的所有笔记内容
-    - 将HTML格式转换为纯文本
-    - 生成临时文件用于AI处理
+    - 将HTML格式转换为Markdown（基于词法分析的单遍转换）
+    - 生成临时文件用于AI处理（由产物存储按索引管理）
     - 管理笔记内容的格式化输出
+    - 支持后台预收集（提前生成收集产物）
+    - 产物记录的指纹与当前一致时直接复用已有产物，不再转换和写盘
+    - 流式收集：分批读取笔记、逐批转换并分块写入产物，内存占用与文件大小无关
+    - 收集时直接读取笔记写入时计算好的Markdown派生列
+    - 未回填派生列的大文件分块交给进程池并行转换：未回填的笔记攒够进程池阈值再一起转换，窗口有上限
+    - 产物正文按字节偏移分段读取，收集结果附带产物引用（标识、大小、指纹）
 
 作者: Jolly
 创建时间: 2025-04-01
-最后修改: 2025-06-04
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.1.0
+版本: 1.10.1
 
 依赖:
-    - html2text: HTML转文本转换
+    - app.services.note_text: 笔记Markdown派生列
+    - app.services.conversion_pool: 并行Markdown转换
     - app.models: 数据模型
+    - app.services.fingerprint: 内容指纹
+    - app.services.artifact_store: 产物存储
     - re: 正则表达式处理
 
 许可证: Apache-2.0
 """
 
-import html2text
 import re
 import os
 import datetime
+import logging
+from app.extensions import db
 from app.models.note import Note
 from app.models.note_file import NoteFile
+from app.services.fingerprint import compute_file_fingerprint, EMPTY_FINGERPRINT
+from app.services.artifact_store import get_artifact_store, strip_header, artifact_etag, KIND_COLLECTED
+from app.utils.metrics import metrics
+from app.services.note_text import render_markdown
+from app.services.conversion_pool import conversion_pool
+
+logger = logging.getLogger(__name__)
+
+# 流式收集时每批读取和转换的笔记数
+STREAM_BATCH = 500
+# 有未回填笔记时窗口的笔记数上限为 max(STREAM_BATCH, 进程池最少笔记数) 的倍数
+STREAM_WINDOW_FACTOR = 2
 
 class DataProcessor:
     """数据处理器，负责笔记内容的收集、格式化和临时文件管理"""
@@ -42,10 +64,14 @@ class DataProcessor:
             'max_age_days': 7,
             'auto_cleanup': True
         }
+        # 产物文件由带索引清单的存储统一管理
+        self.artifacts = get_artifact_store(temp_dir)
     
     def collect_file_content(self, file_id):
         """
-        收集指定文件的所有笔记内容，整理成连续文本
+        收集指定文件的所有笔记内容，流式写入收集产物
+        
+        返回值只包含元数据和产物引用，正文通过 read_collected_content 或下载接口读取
         
         Args:
             file_id: 文件ID
@@ -59,375 +85,290 @@ class DataProcessor:
             if not note_file:
                 return {'success': False, 'error': '文件不存在'}
             
-            # 获取该文件下的所有笔记，按顺序排列
-            notes = Note.query.filter_by(file_id=file_id).order_by(Note.order.asc()).all()
-            
-            if not notes:
+            record, total_notes, fingerprint, cached = self._collect_artifact(file_id, note_file.name)
+            if record is None:
                 return {'success': False, 'error': '文件中没有笔记内容'}
             
-            # 整理笔记内容（保持markdown格式）
-            collected_content = self._collect_and_format_notes_markdown(notes)
-            
-            # 保存内容到临时文件
-            temp_file_info = self._save_to_temp_file(
-                collected_content, note_file.name, file_id, 'collected'
-            )
-            
             return {
                 'success': True,
                 'file_id': file_id,
                 'file_name': note_file.name,
-                'total_notes': len(notes),
-                'collected_content': collected_content,
-                'temp_file': temp_file_info,
-                'original_notes': [
-                    {
-                        'id': note.id,
-                        'content': note.content,
-                        'format': note.format,
-                        'order': note.order
-                    }
-                    for note in notes
-                ]
+                'total_notes': total_notes,
+                'temp_file': self._temp_file_info(record),
+                'content_url': f'/api/ai/collected-content/{file_id}?body_only=true',
+                'artifact': self.artifacts.reference(record),
+                'fingerprint': fingerprint,
+                'cached': cached
             }
             
         except Exception as e:
             return {'success': False, 'error': f'收集内容失败: {str(e)}'}
     
-    def _collect_and_format_notes_markdown(self, notes):
-        """
-        将多个笔记块整理成连续的markdown格式文本
+    def prefetch_collection(self, file_id):
         """
-        if not notes:
-            return ""
-        
-        collected_parts = []
-        
-        for note in notes:
-            if not note.content or note.content.strip() == "":
-                continue
-                
-            # 根据笔记格式处理内容，保持markdown格式
-            processed_content = self._process_note_content_markdown(note.content, note.format)
-            
-            if processed_content.strip():
-                collected_parts.append(processed_content)
+        提前生成收集产物，之后的收集按指纹直接复用
         
-        # 用双换行符连接所有内容，保持段落分隔
-        return "\n\n".join(collected_parts)
+        Returns:
+            dict: {'success', 'cached', 'fingerprint'}
+        """
+        try:
+            note_file = NoteFile.query.get(file_id)
+            if not note_file:
+                return {'success': False, 'error': '文件不存在'}
+            record, _, fingerprint, cached = self._collect_artifact(file_id, note_file.name)
+            return {
+                'success': record is not None,
+                'cached': cached,
+                'fingerprint': fingerprint
+            }
+        except Exception as e:
+            return {'success': False, 'error': f'预收集内容失败: {str(e)}'}
     
-    def _process_note_content_markdown(self, content, format_type):
+    def read_collected_content(self, file_id):
         """
-        根据笔记格式处理内容，保持markdown格式
+        读取收集产物的正文（不含元数据头部），产物不存在时返回None
         """
-        if not content:
-            return ""
-        
-        # 如果是HTML格式，转换为markdown
-        if format_type and format_type != 'text':
-            try:
-                # 创建html2text转换器，保持markdown格式
-                h = html2text.HTML2Text()
-                h.ignore_links = False
-                h.ignore_images = False
-                h.body_width = 0  # 不限制行宽
-                h.unicode_snob = True  # 更好的Unicode处理
-                h.escape_snob = True  # 保持特殊字符
-                
-                # 先清理HTML内容
-                clean_content = self._clean_html_content(content)
-                
-                # 转换为markdown格式
-                markdown_content = h.handle(clean_content)
-                
-                # 清理多余的空行，但保持段落结构
-                markdown_content = re.sub(r'\n\s*\n\s*\n+', '\n\n', markdown_content)
-                
-                return markdown_content.strip()
-                
-            except Exception as e:
-                # 如果转换失败，返回清理后的原始内容
-                return self._simple_html_to_markdown(content)
-        
-        return content.strip()
+        record = self.artifacts.get(file_id, KIND_COLLECTED)
+        content = self.artifacts.read(record) if record else None
+        return strip_header(content) if content is not None else None
     
-    def _clean_html_content(self, html_content):
+    def _collect_artifact(self, file_id, file_name):
         """
-        清理HTML内容，保留有用的结构
-        """
-        if not html_content:
-            return ""
+        按内容指纹复用或流式生成收集产物
         
-        # 移除空的p标签
-        html_content = re.sub(r'<p[^>]*>\s*</p>', '', html_content)
+        Returns:
+            tuple: (产物记录, 笔记数, 指纹, 是否复用已有产物)，文件没有笔记时记录为None
+        """
+        fingerprint = compute_file_fingerprint(file_id)
+        if fingerprint == EMPTY_FINGERPRINT:
+            return None, 0, fingerprint, False
         
-        # 移除style属性但保留结构标签
-        html_content = re.sub(r'\s*style="[^"]*"', '', html_content)
+        # 已有产物的指纹和文件名都一致时直接复用，不再查询笔记和转换
+        record = self.artifacts.get(file_id, KIND_COLLECTED)
+        if record and record['fingerprint'] == fingerprint and record['file_name'] == file_name:
+            metrics.incr('collect.artifact_hits')
+            return record, Note.query.filter_by(file_id=file_id).count(), fingerprint, True
         
-        # 移除class属性但保留结构标签
-        html_content = re.sub(r'\s*class="[^"]*"', '', html_content)
+        counter = {'notes': 0}
+        rows = db.session.query(Note.content, Note.format, Note.markdown) \
+            .filter(Note.file_id == file_id) \
+            .order_by(Note.order.asc()) \
+            .yield_per(STREAM_BATCH)
+        chunks = self._iter_collected_chunks(self._count_rows(rows, counter), file_name, file_id)
+        record = self.artifacts.put_stream(file_id, KIND_COLLECTED, chunks, file_name, fingerprint=fingerprint)
+        metrics.incr('collect.streamed')
+        return record, counter['notes'], fingerprint, False
+    
+    @staticmethod
+    def _count_rows(rows, counter):
+        for row in rows:
+            counter['notes'] += 1
+            yield row
+    
+    def _iter_collected_chunks(self, rows, file_name, file_id):
+        """按顺序生成收集产物的文本分块：元数据头部、各笔记的markdown（双换行分隔）"""
+        yield self._collected_header(file_name, file_id)
+        first = True
+        for markdown in self._iter_notes_markdown(rows):
+            yield markdown if first else '\n\n' + markdown
+            first = False
+        yield '\n'
+    
+    def _collected_header(self, file_name, file_id):
+        return f"""# 笔记内容收集 - {file_name}
+生成时间: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+文件ID: {file_id}
+原始文件名: {file_name}
+
+---
+
+"""
+    
+    def _iter_notes_markdown(self, rows):
+        """
+        按顺序生成各笔记的markdown，跳过空内容
         
-        # 保留重要的HTML结构标签
-        html_content = re.sub(r'<h([1-6])[^>]*>', r'<h\1>', html_content)
-        html_content = re.sub(r'<p[^>]*>', '<p>', html_content)
-        html_content = re.sub(r'<ul[^>]*>', '<ul>', html_content)
-        html_content = re.sub(r'<ol[^>]*>', '<ol>', html_content)
-        html_content = re.sub(r'<li[^>]*>', '<li>', html_content)
-        html_content = re.sub(r'<strong[^>]*>', '<strong>', html_content)
-        html_content = re.sub(r'<em[^>]*>', '<em>', html_content)
-        html_content = re.sub(r'<b[^>]*>', '<strong>', html_content)
-        html_content = re.sub(r'<i[^>]*>', '<em>', html_content)
+        Args:
+            rows: (内容, 格式, 已存储的markdown) 的可迭代对象
+        """
+        batch = []
+        pending = chars = 0
+        for row in rows:
+            batch.append(row)
+            if row[2] is None:
+                pending += 1
+                chars += len(row[0] or '')
+            if self._window_full(len(batch), pending, chars):
+                yield from self._render_batch(batch)
+                batch = []
+                pending = chars = 0
+        if batch:
+            yield from self._render_batch(batch)
+    
+    @staticmethod
+    def _window_full(size, pending, chars):
+        """
+        当前窗口是否可以转换输出
         
-        return html_content
+        没有未回填的笔记或不使用进程池时按 STREAM_BATCH 分批；否则等未回填的笔记达到进程池阈值
+        （笔记数和字符数）再一起转换，窗口笔记数达到上限时即使未达阈值也在当前线程转换
+        """
+        if not pending or conversion_pool.workers <= 1:
+            return size >= STREAM_BATCH
+        limit = max(STREAM_BATCH, conversion_pool.min_notes) * STREAM_WINDOW_FACTOR
+        return conversion_pool.should_parallelize(pending, chars) or size >= limit
     
-    def _simple_html_to_markdown(self, html_content):
+    def _render_batch(self, batch):
+        batch = [row for row in batch if row[0] and row[0].strip()]
+        # 优先使用写入时计算好的markdown，尚未回填的笔记批量转换（数量大时走进程池）
+        pending = [(content, format_type) for content, format_type, markdown in batch if markdown is None]
+        rendered = iter(conversion_pool.render(pending) if pending else ())
+        for content, format_type, markdown in batch:
+            if markdown is None:
+                markdown = next(rendered)
+            if markdown.strip():
+                yield markdown
+    
+    def _collect_and_format_notes_markdown(self, notes):
         """
-        简单的HTML到markdown转换（备用方法）
+        将多个笔记块整理成连续的markdown格式文本
         """
-        if not html_content:
+        if not notes:
             return ""
         
-        # 基本的HTML标签到markdown转换
-        text = html_content
-        
-        # 标题转换
-        text = re.sub(r'<h1[^>]*>(.*?)</h1>', r'# \1\n', text)
-        text = re.sub(r'<h2[^>]*>(.*?)</h2>', r'## \1\n', text)
-        text = re.sub(r'<h3[^>]*>(.*?)</h3>', r'### \1\n', text)
-        text = re.sub(r'<h4[^>]*>(.*?)</h4>', r'#### \1\n', text)
-        text = re.sub(r'<h5[^>]*>(.*?)</h5>', r'##### \1\n', text)
-        text = re.sub(r'<h6[^>]*>(.*?)</h6>', r'###### \1\n', text)
-        
-        # 粗体和斜体
-        text = re.sub(r'<(strong|b)[^>]*>(.*?)</\1>', r'**\2**', text)
-        text = re.sub(r'<(em|i)[^>]*>(.*?)</\1>', r'*\2*', text)
-        
-        # 删除线
-        text = re.sub(r'<(s|del|strike)[^>]*>(.*?)</\1>', r'~~\2~~', text)
-        
-        # 代码
-        text = re.sub(r'<code[^>]*>(.*?)</code>', r'`\1`', text)
-        
-        # 列表
-        text = re.sub(r'<li[^>]*>(.*?)</li>', r'- \1\n', text)
-        text = re.sub(r'<ul[^>]*>', '', text)
-        text = re.sub(r'</ul>', '\n', text)
-        text = re.sub(r'<ol[^>]*>', '', text)
-        text = re.sub(r'</ol>', '\n', text)
-        
-        # 段落
-        text = re.sub(r'<p[^>]*>', '', text)
-        text = re.sub(r'</p>', '\n\n', text)
-        
-        # 换行
-        text = re.sub(r'<br[^>]*/?>', '\n', text)
-        
-        # 移除其他HTML标签
-        text = re.sub(r'<[^>]+>', '', text)
-        
-        # 解码HTML实体
-        text = text.replace('&lt;', '<')
-        text = text.replace('&gt;', '>')
-        text = text.replace('&amp;', '&')
-        text = text.replace('&quot;', '"')
-        text = text.replace('&#39;', "'")
-        text = text.replace('&nbsp;', ' ')
-        
-        # 清理多余的空白字符
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-        text = re.sub(r'[ \t]+', ' ', text)
-        
-        return text.strip()
+        # 用双换行符连接所有内容，保持段落分隔
+        return "\n\n".join(self._iter_notes_markdown((note.content, note.format, note.markdown) for note in notes))
     
-    def _save_to_temp_file(self, content, file_name, file_id, file_type='collected'):
+    def _process_note_content_markdown(self, content, format_type):
+        """
+        根据笔记格式处理内容，保持markdown格式
+        """
+        return render_markdown(content, format_type)
+    
+    def _save_to_temp_file(self, content, file_name, file_id, file_type='collected', fingerprint=None):
         """
-        将内容保存到临时文件，每个文件ID只保留一个最新的临时文件
+        将内容保存为产物文件，每个文件ID只保留一个最新的收集文件
         """
         try:
-            # 清理该文件ID的旧临时文件
-            self._cleanup_old_temp_files(file_id, file_name, file_type)
-            
-            # 生成临时文件名
-            safe_file_name = re.sub(r'[^\w\-_\.]', '_', file_name)
-            if file_type == 'collected':
-                temp_filename = f"{safe_file_name}_{file_id}_collected.txt"
-            else:
-                temp_filename = f"{safe_file_name}_{file_id}_{file_type}.txt"
-            
-            temp_filepath = os.path.join(self.temp_dir, temp_filename)
-            
             # 准备文件内容，添加元数据头部
             if file_type == 'collected':
-                file_content = f"""# 笔记内容收集 - {file_name}
-生成时间: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-文件ID: {file_id}
-原始文件名: {file_name}
-
----
-
-{content}
-"""
+                file_content = f"{self._collected_header(file_name, file_id)}{content}\n"
             else:
                 file_content = content
             
-            # 写入文件
-            with open(temp_filepath, 'w', encoding='utf-8') as f:
-                f.write(file_content)
-            
-            return {
-                'filename': temp_filename,
-                'filepath': temp_filepath,
-                'size': len(file_content),
-                'created_at': datetime.datetime.now().isoformat(),
-                'url': f'/api/ai/temp-file/{temp_filename}'
-            }
+            record = self.artifacts.put(file_id, file_type, file_content, file_name,
+                                        fingerprint=fingerprint)
+            return self._temp_file_info(record)
             
         except Exception as e:
             raise Exception(f"保存临时文件失败: {str(e)}")
     
-    def _cleanup_old_temp_files(self, file_id, file_name, file_type='collected'):
-        """
-        清理指定文件ID的旧临时文件，并实现缓冲区管理策略：
-        只保留最新的一个笔记文件对应的collected和optimized_general文件
-        """
-        try:
-            safe_file_name = re.sub(r'[^\w\-_\.]', '_', file_name)
-            
-            # 1. 清理当前文件ID的旧临时文件
-            for filename in os.listdir(self.temp_dir):
-                filepath = os.path.join(self.temp_dir, filename)
-                
-                # 检查是否是该文件的临时文件
-                if filename.startswith(safe_file_name) and str(file_id) in filename:
-                    if file_type == 'collected' and 'optimized' not in filename:
-                        # 删除旧的收集文件
-                        try:
-                            os.remove(filepath)
-                        except OSError:
-                            pass  # 忽略删除失败的情况
-                    elif file_type != 'collected' and file_type in filename:
-                        # 删除旧的特定类型文件
-                        try:
-                            os.remove(filepath)
-                        except OSError:
-                            pass  # 忽略删除失败的情况
-            
-            # 2. 实现缓冲区管理：只保留最新的一个笔记文件的temp文件
-            self._manage_temp_buffer(file_id, file_name)
-            
-        except Exception:
-            pass  # 忽略清理过程中的错误
+    def _temp_file_info(self, record):
+        """返回给调用方的产物文件信息"""
+        info = self.artifacts.describe(record)
+        return {
+            'filename': info['filename'],
+            'filepath': info['filepath'],
+            'size': info['size'],
+            'created_at': info['created_at'],
+            'url': info['url']
+        }
     
-    def _manage_temp_buffer(self, current_file_id, current_file_name):
+    def get_temp_file_content(self, filename):
         """
-        管理temp文件缓冲区，只保留最新的一个笔记文件对应的collected和optimized_general文件
+        获取临时文件内容
         """
         try:
-            # 获取所有temp文件，按修改时间排序
-            temp_files = []
-            for filename in os.listdir(self.temp_dir):
-                if filename.endswith('.txt'):
-                    filepath = os.path.join(self.temp_dir, filename)
-                    try:
-                        stat = os.stat(filepath)
-                        temp_files.append({
-                            'filename': filename,
-                            'filepath': filepath,
-                            'modified_time': stat.st_mtime,
-                            'file_id': self._extract_file_id_from_filename(filename)
-                        })
-                    except OSError:
-                        continue
+            # 验证文件名安全性
+            if not re.match(r'^[\w\-_\.]+$', filename):
+                return {'success': False, 'error': '无效的文件名'}
             
-            # 按修改时间降序排序
-            temp_files.sort(key=lambda x: x['modified_time'], reverse=True)
+            record = self.artifacts.find_by_filename(filename)
+            content = self.artifacts.read(record) if record else None
+            if content is None:
+                return {'success': False, 'error': '临时文件不存在'}
             
-            # 找到最新的文件ID（如果当前操作不是最新的，则使用当前文件ID）
-            latest_file_id = current_file_id
-            if temp_files:
-                latest_file_id = temp_files[0]['file_id'] or current_file_id
+            info = self.artifacts.describe(record)
+            return {
+                'success': True,
+                'filename': filename,
+                'content': content,
+                'size': info['size'],
+                'created_at': info['created_at'],
+                'modified_at': info['modified_at']
+            }
             
-            # 删除非最新文件ID的所有temp文件
-            for file_info in temp_files:
-                if file_info['file_id'] and str(file_info['file_id']) != str(latest_file_id):
-                    try:
-                        os.remove(file_info['filepath'])
-                    except OSError:
-                        pass
-                        
-        except Exception:
-            pass  # 忽略缓冲区管理过程中的错误
-    
-    def _extract_file_id_from_filename(self, filename):
-        """
-        从文件名中提取文件ID
-        """
-        try:
-            # 文件名格式: {safe_file_name}_{file_id}_{type}.txt
-            parts = filename.replace('.txt', '').split('_')
-            for i, part in enumerate(parts):
-                if part.isdigit():
-                    return int(part)
-            return None
-        except Exception:
-            return None
+        except Exception as e:
+            return {'success': False, 'error': f'读取临时文件失败: {str(e)}'}
     
-    def get_temp_file_content(self, filename):
+    def read_artifact_text(self, filename, offset=0, limit=64 * 1024, body_only=False):
         """
-        获取临时文件内容
+        按字节偏移分段读取产物正文
+        
+        Args:
+            filename: 产物文件名
+            offset: 起始字节偏移
+            limit: 本段最多读取的字节数
+            body_only: 为True时跳过元数据头部（偏移小于正文起点时从正文起点开始）
+            
+        Returns:
+            dict: 本段文本、下一段偏移、产物大小和版本标识
         """
         try:
-            # 验证文件名安全性
             if not re.match(r'^[\w\-_\.]+$', filename):
                 return {'success': False, 'error': '无效的文件名'}
             
-            temp_filepath = os.path.join(self.temp_dir, filename)
-            
-            if not os.path.exists(temp_filepath):
+            record = self.artifacts.find_by_filename(filename)
+            if not record:
                 return {'success': False, 'error': '临时文件不存在'}
             
-            # 读取文件内容
-            with open(temp_filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 获取文件信息
-            file_stat = os.stat(temp_filepath)
-            
+            if body_only:
+                offset = max(offset, self.artifacts.body_offset(record))
+            text, next_offset = self.artifacts.read_range(record, offset, limit)
             return {
                 'success': True,
                 'filename': filename,
-                'content': content,
-                'size': file_stat.st_size,
-                'created_at': datetime.datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
-                'modified_at': datetime.datetime.fromtimestamp(file_stat.st_mtime).isoformat()
+                'offset': offset,
+                'next_offset': next_offset,
+                'size': record['size'],
+                'eof': next_offset >= record['size'],
+                'etag': artifact_etag(record),
+                'text': text
             }
             
+        except FileNotFoundError:
+            return {'success': False, 'error': '临时文件不存在'}
         except Exception as e:
             return {'success': False, 'error': f'读取临时文件失败: {str(e)}'}
     
-    def get_collected_content(self, file_id):
+    def get_collected_content(self, file_id, body_only=False):
         """
         获取已收集的内容
+        
+        Args:
+            file_id: 文件ID
+            body_only: 为True时去掉元数据头部，只返回正文
         """
         try:
-            # 查找收集的临时文件
-            for filename in os.listdir(self.temp_dir):
-                if f"_{file_id}_collected.txt" in filename:
-                    result = self.get_temp_file_content(filename)
-                    if result['success']:
-                        return {
-                            'success': True,
-                            'file_id': file_id,
-                            'collected_content': result['content'],
-                            'temp_file': {
-                                'filename': result['filename'],
-                                'size': result['size'],
-                                'created_at': result['created_at'],
-                                'modified_at': result['modified_at']
-                            }
-                        }
-            
-            return {'success': False, 'error': '未找到收集的内容'}
+            record = self.artifacts.get(file_id, KIND_COLLECTED)
+            content = self.artifacts.read(record) if record else None
+            if content is None:
+                return {'success': False, 'error': '未找到收集的内容'}
+            if body_only:
+                content = strip_header(content)
+            
+            info = self.artifacts.describe(record)
+            return {
+                'success': True,
+                'file_id': file_id,
+                'collected_content': content,
+                'temp_file': {
+                    'filename': info['filename'],
+                    'size': info['size'],
+                    'created_at': info['created_at'],
+                    'modified_at': info['modified_at']
+                }
+            }
             
         except Exception as e:
             return {'success': False, 'error': f'获取收集内容失败: {str(e)}'}
@@ -437,21 +378,18 @@ class DataProcessor:
         检查收集的内容是否存在
         """
         try:
+            record = self.artifacts.get(file_id, KIND_COLLECTED, touch=False)
             temp_files = []
-            exists = False
-            
-            for filename in os.listdir(self.temp_dir):
-                if f"_{file_id}_collected.txt" in filename:
-                    exists = True
-                    temp_files.append({
-                        'filename': filename,
-                        'type': 'collected',
-                        'url': f'/api/ai/temp-file/{filename}'
-                    })
+            if record:
+                temp_files.append({
+                    'filename': record['filename'],
+                    'type': 'collected',
+                    'url': f"/api/ai/temp-file/{record['filename']}"
+                })
             
             return {
                 'success': True,
-                'exists': exists,
+                'exists': record is not None,
                 'temp_files': temp_files
             }
             
@@ -471,7 +409,7 @@ class DataProcessor:
                 return {'success': False, 'error': '临时目录不可写'}
             
             # 检查可用空间（简单检查）
-            temp_files_count = len([f for f in os.listdir(self.temp_dir) if f.endswith('.txt')])
+            temp_files_count = self.artifacts.get_stats()['file_count']
             
             return {
                 'success': True,
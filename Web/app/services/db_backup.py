@@ -0,0 +1,515 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: db_backup.py
+模块: 服务层 - 数据库在线备份
+描述: 使用SQLite在线备份接口按页分步复制数据库，得到一致的快照，不长时间阻塞写入
+功能:
+    - 在线快照：每步复制若干页，步与步之间让出锁，写入方只在单步复制期间等待
+    - 复制期间源库被其他连接修改时SQLite会从头重新复制，重启次数过多时改为一次复制完
+    - 快照先写入临时文件，完整性检查通过后再原子改名，目录中只会出现完整可用的快照
+    - 按数量保留最近的快照，清理残留的临时文件
+    - 后台定时备份（上一个快照早于备份间隔时执行；快照目录加跨进程锁并在拿到锁后重新检查，多进程同时到期时只备份一次）
+    - 从快照恢复：先校验快照，恢复前自动为当前数据库做一次快照，再用备份接口写回
+    - 指标：快照耗时、写入方等待时间（源库持锁时长，WAL模式下读不阻塞写，记为0）、重启次数
+    - 提供 flask db-backup create/list/verify/restore 命令
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.1
+
+依赖:
+    - sqlite3: 在线备份接口与完整性检查
+    - fcntl: 跨进程建议锁（Windows 下退化为进程内锁）
+    - click / flask.cli: 命令行
+    - app.utils.metrics: 运行指标
+
+配置项:
+    - BACKUP_ENABLED: 是否启用后台定时备份
+    - BACKUP_DIR: 快照目录
+    - BACKUP_INTERVAL: 备份间隔（秒）
+    - BACKUP_KEEP: 保留的快照数量
+    - BACKUP_PAGES_PER_STEP: 每步复制的页数
+    - BACKUP_STEP_SLEEP: 每步之后让出锁的时间（秒）
+    - BACKUP_MAX_RESTARTS: 分步复制允许的重启次数
+    - BACKUP_INTEGRITY_CHECK: 快照校验方式，full 为 integrity_check，quick 为 quick_check
+
+注意事项:
+    - 只支持SQLite文件数据库，内存数据库或其他数据库时备份不可用
+    - 恢复会覆盖当前数据库的全部内容，命令行默认要求确认
+
+许可证: Apache-2.0
+"""
+
+import os
+import re
+import time
+import contextlib
+import sqlite3
+import datetime
+import threading
+import logging
+import click
+from flask.cli import AppGroup
+from app.utils.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只保留进程内的互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = 'snapshot-'
+_SNAPSHOT_NAME = re.compile(r'^snapshot-(\d{8}-\d{6}-\d{6})-([\w-]+)\.db$')
+_TEMP_SUFFIX = '.tmp'
+_LOCK_NAME = '.snapshot.lock'
+# 残留临时文件的清理宽限时间（秒）
+_TEMP_GRACE = 3600
+
+LABEL_SCHEDULED = 'scheduled'
+LABEL_MANUAL = 'manual'
+LABEL_PRE_RESTORE = 'pre-restore'
+
+
+def sqlite_path(uri):
+    """从SQLAlchemy连接串取SQLite数据库文件路径，不是SQLite文件数据库时返回None"""
+    if not uri or not uri.startswith('sqlite:///'):
+        return None
+    path = uri[len('sqlite:///'):].split('?', 1)[0]
+    if not path or path == ':memory:':
+        return None
+    return os.path.abspath(path)
+
+
+class _TooManyRestarts(Exception):
+    """分步复制期间源库不断被修改"""
+
+
+class _StepTimer:
+    """在备份进度回调中统计每步的持锁时间和重启次数，并在步与步之间让出锁"""
+
+    def __init__(self, sleep, max_restarts, blocks_writers):
+        self.sleep = sleep
+        self.max_restarts = max_restarts
+        self.blocks_writers = blocks_writers
+        self.steps = 0
+        self.restarts = 0
+        self.stall = 0.0
+        self.max_stall = 0.0
+        self.pages = 0
+        self._remaining = None
+        self._step_started = time.perf_counter()
+
+    def add_step(self, seconds):
+        self.steps += 1
+        if self.blocks_writers:
+            self.stall += seconds
+            self.max_stall = max(self.max_stall, seconds)
+
+    def progress(self, status, remaining, total):
+        self.add_step(time.perf_counter() - self._step_started)
+        self.pages = total
+        if status == sqlite3.SQLITE_OK and self._remaining is not None and remaining > self._remaining:
+            self.restarts += 1
+            if self.restarts > self.max_restarts:
+                raise _TooManyRestarts()
+        self._remaining = remaining
+        if remaining and self.sleep:
+            # 此时源库的锁已释放，等待中的写入可以提交
+            time.sleep(self.sleep)
+        self._step_started = time.perf_counter()
+
+
+class DatabaseBackup:
+    """SQLite数据库在线备份服务"""
+
+    def __init__(self, db_path=None, backup_dir=None, keep=24, pages_per_step=256, step_sleep=0.01,
+                 max_restarts=5, integrity_check='full'):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self.integrity_check = integrity_check
+        self.interval = 3600.0
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats = {
+            'runs': 0,
+            'failures': 0,
+            'last_snapshot': None,
+            'last_run_at': None,
+            'last_duration_ms': None,
+            'last_writer_stall_ms': None,
+            'last_max_writer_stall_ms': None,
+            'last_restarts': None,
+            'last_error': None
+        }
+
+    def init_app(self, app):
+        """根据应用配置设置数据库路径、注册命令，并按配置启动定时备份"""
+        self.db_path = sqlite_path(app.config.get('SQLALCHEMY_DATABASE_URI'))
+        self.backup_dir = app.config.get('BACKUP_DIR') or self.backup_dir
+        self.keep = int(app.config.get('BACKUP_KEEP', self.keep))
+        self.pages_per_step = int(app.config.get('BACKUP_PAGES_PER_STEP', self.pages_per_step))
+        self.step_sleep = float(app.config.get('BACKUP_STEP_SLEEP', self.step_sleep))
+        self.max_restarts = int(app.config.get('BACKUP_MAX_RESTARTS', self.max_restarts))
+        self.integrity_check = app.config.get('BACKUP_INTEGRITY_CHECK', self.integrity_check)
+        self.interval = float(app.config.get('BACKUP_INTERVAL', self.interval))
+        metrics.register_collector('db_backup', self.get_stats)
+        app.cli.add_command(backup_cli)
+        if app.config.get('BACKUP_ENABLED', False):
+            if self.db_path and self.backup_dir:
+                self.start(self.interval)
+            else:
+                logger.warning("数据库不是SQLite文件或未配置备份目录，定时备份未启用")
+
+    # ==================== 快照 ====================
+
+    def snapshot(self, label=LABEL_MANUAL):
+        """
+        在线生成数据库快照
+
+        Args:
+            label: 快照标签（scheduled、manual、pre-restore），写入文件名
+
+        Returns:
+            dict: 快照信息和本次的耗时、写入等待、重启次数；失败时 success 为 False
+        """
+        if not self.db_path or not self.backup_dir:
+            return {'success': False, 'error': '当前数据库不是SQLite文件或未配置备份目录，无法备份'}
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with self._run_lock, self._dir_lock():
+            return self._snapshot(label)
+
+    def _snapshot(self, label):
+        """生成快照（调用方已持有进程内锁和快照目录锁）"""
+        started = time.perf_counter()
+        stamp = datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')
+        name = f'{SNAPSHOT_PREFIX}{stamp}-{label}.db'
+        path = os.path.join(self.backup_dir, name)
+        temp_path = path + _TEMP_SUFFIX
+        timer = None
+        error = None
+        try:
+            timer = self._copy(temp_path)
+            check = self.verify(temp_path)
+            if not check['ok']:
+                raise RuntimeError(f"快照完整性检查未通过: {'; '.join(check['messages'][:3])}")
+            os.replace(temp_path, path)
+            pruned = self.prune()
+        except Exception as e:
+            error = str(e)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        duration = time.perf_counter() - started
+        self._record(name, duration, timer, error)
+        if error:
+            logger.error(f"数据库快照失败: {error}")
+            return {'success': False, 'error': f'数据库快照失败: {error}'}
+
+        logger.info(f"数据库快照完成: {name}, 耗时 {duration:.3f}s, 写入等待 {timer.stall:.3f}s, "
+                    f"重启 {timer.restarts} 次")
+        result = self._describe(name)
+        result.update({
+            'success': True,
+            'duration_ms': round(duration * 1000, 2),
+            'writer_stall_ms': round(timer.stall * 1000, 2),
+            'max_writer_stall_ms': round(timer.max_stall * 1000, 2),
+            'steps': timer.steps,
+            'restarts': timer.restarts,
+            'pruned': pruned
+        })
+        return result
+
+    @contextlib.contextmanager
+    def _dir_lock(self):
+        """快照目录的跨进程建议锁（flock），多个进程的快照、保留清理和恢复互斥"""
+        if not self.backup_dir or fcntl is None:
+            yield
+            return
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with open(os.path.join(self.backup_dir, _LOCK_NAME), 'a+b') as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _copy(self, temp_path):
+        """按页分步把源库复制到临时文件，返回统计"""
+        source = sqlite3.connect(self.db_path, timeout=30)
+        target = sqlite3.connect(temp_path)
+        try:
+            # WAL模式下读事务不阻塞写入，只有回滚日志模式下复制期间写入方需要等待
+            journal_mode = source.execute('PRAGMA journal_mode').fetchone()[0].lower()
+            timer = _StepTimer(self.step_sleep, self.max_restarts, blocks_writers=journal_mode != 'wal')
+            try:
+                source.backup(target, pages=self.pages_per_step, progress=timer.progress)
+            except _TooManyRestarts:
+                # 源库写入频繁，分步复制不断从头开始：改为一次复制完
+                logger.warning(f"分步复制重启 {timer.restarts} 次，改为一次复制完")
+                step_started = time.perf_counter()
+                source.backup(target)
+                timer.add_step(time.perf_counter() - step_started)
+            # 快照为单个自包含文件
+            target.execute('PRAGMA journal_mode=DELETE')
+            return timer
+        finally:
+            target.close()
+            source.close()
+
+    def verify(self, path):
+        """
+        检查快照完整性
+
+        Returns:
+            dict: ok 是否通过，messages 为检查输出
+        """
+        pragma = 'quick_check' if self.integrity_check == 'quick' else 'integrity_check'
+        try:
+            connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                messages = [row[0] for row in connection.execute(f'PRAGMA {pragma}')]
+            finally:
+                connection.close()
+        except sqlite3.DatabaseError as e:
+            return {'ok': False, 'messages': [str(e)]}
+        return {'ok': messages == ['ok'], 'messages': messages}
+
+    def _record(self, name, duration, timer, error):
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['last_run_at'] = time.time()
+            self._stats['last_duration_ms'] = round(duration * 1000, 2)
+            self._stats['last_error'] = error
+            if error:
+                self._stats['failures'] += 1
+            else:
+                self._stats['last_snapshot'] = name
+                self._stats['last_writer_stall_ms'] = round(timer.stall * 1000, 2)
+                self._stats['last_max_writer_stall_ms'] = round(timer.max_stall * 1000, 2)
+                self._stats['last_restarts'] = timer.restarts
+        if error:
+            metrics.incr('db_backup.failures')
+            return
+        metrics.incr('db_backup.snapshots')
+        metrics.observe('db_backup.duration_seconds', duration)
+        metrics.observe('db_backup.writer_stall_seconds', timer.stall)
+        metrics.set_gauge('db_backup.max_writer_stall_seconds', timer.max_stall)
+        if timer.restarts:
+            metrics.incr('db_backup.restarts', timer.restarts)
+
+    # ==================== 保留 ====================
+
+    def _describe(self, name):
+        match = _SNAPSHOT_NAME.match(name)
+        path = os.path.join(self.backup_dir, name)
+        created_at = datetime.datetime.strptime(match.group(1), '%Y%m%d-%H%M%S-%f')
+        return {
+            'name': name,
+            'label': match.group(2),
+            'size': os.path.getsize(path),
+            'created_at': created_at.isoformat()
+        }
+
+    def list_snapshots(self):
+        """按时间倒序列出快照"""
+        if not self.backup_dir or not os.path.isdir(self.backup_dir):
+            return []
+        names = sorted((name for name in os.listdir(self.backup_dir) if _SNAPSHOT_NAME.match(name)), reverse=True)
+        snapshots = []
+        for name in names:
+            try:
+                snapshots.append(self._describe(name))
+            except FileNotFoundError:
+                # 列出期间被其他进程的保留清理删除
+                continue
+        return snapshots
+
+    def prune(self):
+        """只保留最近的 keep 个快照，并清理残留的临时文件，返回删除的快照数"""
+        removed = 0
+        for snapshot in self.list_snapshots()[self.keep:]:
+            os.remove(os.path.join(self.backup_dir, snapshot['name']))
+            removed += 1
+        now = time.time()
+        for name in os.listdir(self.backup_dir):
+            path = os.path.join(self.backup_dir, name)
+            if name.endswith(_TEMP_SUFFIX) and now - os.path.getmtime(path) > _TEMP_GRACE:
+                os.remove(path)
+        return removed
+
+    # ==================== 恢复 ====================
+
+    def resolve(self, name):
+        """快照名或路径 -> 快照文件路径，不存在时返回None"""
+        path = name if os.path.sep in name else os.path.join(self.backup_dir or '', name)
+        return path if os.path.isfile(path) else None
+
+    def restore(self, name, safety_snapshot=True):
+        """
+        用快照覆盖当前数据库
+
+        Args:
+            name: 快照名或快照文件路径
+            safety_snapshot: 恢复前是否为当前数据库生成快照
+
+        Returns:
+            dict: 恢复结果
+        """
+        if not self.db_path:
+            return {'success': False, 'error': '当前数据库不是SQLite文件，无法恢复'}
+        path = self.resolve(name)
+        if path is None:
+            return {'success': False, 'error': f'快照不存在: {name}'}
+        check = self.verify(path)
+        if not check['ok']:
+            return {'success': False, 'error': f"快照完整性检查未通过: {'; '.join(check['messages'][:3])}"}
+
+        safety = None
+        if safety_snapshot and os.path.exists(self.db_path):
+            safety = self.snapshot(LABEL_PRE_RESTORE)
+            if not safety['success']:
+                return {'success': False, 'error': f"恢复前备份当前数据库失败: {safety['error']}"}
+
+        started = time.perf_counter()
+        with self._run_lock, self._dir_lock():
+            source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            target = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                # 一次写入全部页，其他连接在此期间等待，完成后读到的都是快照内容
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        duration = time.perf_counter() - started
+        metrics.incr('db_backup.restores')
+        logger.info(f"数据库已从快照 {os.path.basename(path)} 恢复，耗时 {duration:.3f}s")
+        return {
+            'success': True,
+            'snapshot': os.path.basename(path),
+            'safety_snapshot': safety['name'] if safety else None,
+            'duration_ms': round(duration * 1000, 2)
+        }
+
+    # ==================== 定时备份 ====================
+
+    def is_due(self):
+        """最近的快照早于备份间隔时需要备份"""
+        snapshots = self.list_snapshots()
+        if not snapshots:
+            return True
+        latest = datetime.datetime.fromisoformat(snapshots[0]['created_at'])
+        return (datetime.datetime.utcnow() - latest).total_seconds() >= self.interval
+
+    def run_scheduled(self):
+        """
+        到期时生成定时快照
+
+        多个进程同时到期时，只有先拿到快照目录锁的进程备份，其余进程拿到锁后重新检查发现已不到期
+
+        Returns:
+            dict: 快照结果，未到期时返回None
+        """
+        if not self.db_path or not self.backup_dir or not self.is_due():
+            return None
+        with self._run_lock, self._dir_lock():
+            if not self.is_due():
+                return None
+            return self._snapshot(LABEL_SCHEDULED)
+
+    def start(self, interval=3600.0):
+        """启动定时备份线程，重复调用无副作用"""
+        with self._lock:
+            self.interval = interval
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='db-backup', daemon=True)
+            self._thread.start()
+        logger.info(f"数据库定时备份已启用: 间隔={interval}s, 保留={self.keep}, 目录={self.backup_dir}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        # 检查间隔不超过一分钟，进程重启后也能按时备份；先等待一轮，命令行等短时进程不会触发备份
+        check_interval = min(self.interval, 60.0)
+        while not self._stop.wait(check_interval):
+            try:
+                self.run_scheduled()
+            except Exception as e:
+                logger.error(f"定时备份失败: {str(e)}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'enabled': self._thread is not None and self._thread.is_alive(),
+            'interval': self.interval,
+            'keep': self.keep,
+            'backup_dir': self.backup_dir
+        })
+        return stats
+
+
+# 全局实例
+db_backup = DatabaseBackup()
+
+backup_cli = AppGroup('db-backup', help='数据库在线备份与恢复')
+
+
+@backup_cli.command('create')
+def create_command():
+    """立即生成一个数据库快照"""
+    result = db_backup.snapshot(LABEL_MANUAL)
+    if not result['success']:
+        raise click.ClickException(result['error'])
+    click.echo(f"已生成快照 {result['name']}（{result['size']} 字节，耗时 {result['duration_ms']} ms，"
+               f"写入等待 {result['writer_stall_ms']} ms）")
+
+
+@backup_cli.command('list')
+def list_command():
+    """列出快照（最新的在前）"""
+    snapshots = db_backup.list_snapshots()
+    if not snapshots:
+        click.echo('没有快照')
+    for snapshot in snapshots:
+        click.echo(f"{snapshot['name']}\t{snapshot['size']}\t{snapshot['created_at']}")
+
+
+@backup_cli.command('verify')
+@click.argument('name')
+def verify_command(name):
+    """检查快照完整性"""
+    path = db_backup.resolve(name)
+    if path is None:
+        raise click.ClickException(f'快照不存在: {name}')
+    check = db_backup.verify(path)
+    if not check['ok']:
+        raise click.ClickException('完整性检查未通过: ' + '; '.join(check['messages'][:10]))
+    click.echo('ok')
+
+
+@backup_cli.command('restore')
+@click.argument('name')
+@click.option('--no-safety-snapshot', is_flag=True, help='恢复前不为当前数据库生成快照')
+@click.confirmation_option(prompt='恢复会覆盖当前数据库的全部内容，确定继续吗？')
+def restore_command(name, no_safety_snapshot):
+    """用快照覆盖当前数据库"""
+    result = db_backup.restore(name, safety_snapshot=not no_safety_snapshot)
+    if not result['success']:
+        raise click.ClickException(result['error'])
+    click.echo(f"已从 {result['snapshot']} 恢复（耗时 {result['duration_ms']} ms）")
+    if result['safety_snapshot']:
+        click.echo(f"恢复前的数据库已保存为 {result['safety_snapshot']}")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: debounced_worker.py
+模块: 服务层 - 按文件防抖的后台任务
+描述: 订阅笔记变更事件，文件最后一次变更后空闲一段时间再由有界线程池在后台处理
+功能:
+    - 事务提交回调中只标记文件和变更时间
+    - 调度线程定期提交空闲超过延迟的文件，同一文件同时只处理一次
+    - 也可立即提交单个文件（如打开文件时）
+    - 任务在应用上下文中执行，结束后释放数据库会话
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app.services.note_events: 笔记变更事件
+
+注意事项:
+    - 摘要后台刷新和内容预收集共用此调度器
+
+许可证: Apache-2.0
+"""
+
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app.extensions import db
+from app.services import note_events
+
+logger = logging.getLogger(__name__)
+
+
+class DebouncedFileWorker:
+    """按文件防抖的后台任务调度器"""
+
+    def __init__(self, task, delay, max_workers, name, clock=time.monotonic):
+        """
+        Args:
+            task: 处理单个文件的函数 task(file_id)，在应用上下文中调用
+            delay: 文件最后一次变更后等待的秒数
+            max_workers: 最大并发数
+            name: 线程名前缀，也用于日志
+            clock: 时钟（测试时可替换）
+        """
+        self.task = task
+        self.delay = delay
+        self.max_workers = max_workers
+        self.name = name
+        self._clock = clock
+        self._app = None
+        self._executor = None
+        self._scheduler = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._dirty = {}        # file_id -> 最后一次变更时间
+        self._in_flight = set()
+
+    @property
+    def enabled(self):
+        return self._executor is not None
+
+    def start(self, app, interval):
+        """订阅笔记变更并启动调度线程（interval 为空时不启动，由调用方执行 run_pending），重复调用无副作用"""
+        with self._lock:
+            self._app = app
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            note_events.subscribe(self._on_notes_changed)
+            if interval and (self._scheduler is None or not self._scheduler.is_alive()):
+                self._stop.clear()
+                self._scheduler = threading.Thread(target=self._schedule_loop, args=(interval,),
+                                                   name=f'{self.name}-scheduler', daemon=True)
+                self._scheduler.start()
+
+    def stop(self):
+        note_events.unsubscribe(self._on_notes_changed)
+        self._stop.set()
+
+    def is_pending(self, file_id):
+        """文件是否等待处理或正在处理"""
+        with self._lock:
+            return file_id in self._dirty or file_id in self._in_flight
+
+    def submit(self, file_id):
+        """
+        立即提交单个文件
+
+        Returns:
+            bool: 是否已提交（未启用、已在处理中时返回False）
+        """
+        if self._executor is None:
+            return False
+        with self._lock:
+            if file_id in self._in_flight:
+                return False
+            self._dirty.pop(file_id, None)
+            self._in_flight.add(file_id)
+        self._executor.submit(self._run, file_id)
+        return True
+
+    def _on_notes_changed(self, change_set):
+        # 在事务提交回调中调用，只做标记
+        now = self._clock()
+        with self._lock:
+            for file_id in change_set.files:
+                self._dirty[file_id] = now
+
+    def run_pending(self, now=None):
+        """
+        提交最后一次变更后已空闲超过 delay 的文件
+
+        Returns:
+            list: 本次提交的文件ID
+        """
+        if self._executor is None:
+            return []
+        now = self._clock() if now is None else now
+        submitted = []
+        with self._lock:
+            capacity = self.max_workers - len(self._in_flight)
+            for file_id, changed_at in sorted(self._dirty.items(), key=lambda item: item[1]):
+                if capacity <= 0:
+                    break
+                if now - changed_at < self.delay or file_id in self._in_flight:
+                    continue
+                del self._dirty[file_id]
+                self._in_flight.add(file_id)
+                submitted.append(file_id)
+                capacity -= 1
+        for file_id in submitted:
+            self._executor.submit(self._run, file_id)
+        return submitted
+
+    def _run(self, file_id):
+        try:
+            with self._app.app_context():
+                self.task(file_id)
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"{self.name} 处理文件 {file_id} 失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(file_id)
+
+    def _schedule_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"{self.name} 调度失败: {str(e)}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'enabled': self._executor is not None,
+                'max_workers': self.max_workers,
+                'pending': len(self._dirty),
+                'in_flight': len(self._in_flight)
+            }
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: duplicate_detector.py
+模块: 服务层 - 近似重复检测
+描述: 基于MinHash签名和LSH分桶的笔记近似重复检测
+功能:
+    - 笔记写入时在同一事务中按纯文本派生列计算并保存MinHash签名和LSH分桶
+    - 单条笔记的相似块查询（只比较同桶候选，不做全量两两比较）
+    - 工作区或文件夹范围内的重复笔记分组
+    - 应用AI优化结果前检查新块是否与已有笔记重复
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - numpy: 签名计算与相似度比较
+    - sqlalchemy: 会话事件
+    - app.models.note_signature: 签名与分桶模型
+
+注意事项:
+    - 签名取字符5-gram的64个最小哈希，分16段每段4行，
+      相似度约0.5以上的笔记大概率落入同一个桶，再用签名估计的Jaccard相似度过滤
+    - 绕过ORM的批量写入需要调用 refresh_signatures 同步签名
+
+许可证: Apache-2.0
+"""
+
+import zlib
+import datetime
+import logging
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.models.note_signature import NoteSignature, NoteLshBucket
+from app.services.note_text import plain_text_of
+from app.utils.text import strip_html
+
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = (1 << 31) - 1
+SQL_BATCH = 500
+PREVIEW_LENGTH = 80
+
+
+class MinHasher:
+    """MinHash签名计算器"""
+
+    def __init__(self, num_perm=64, bands=16, shingle_size=5, seed=20261018):
+        if num_perm % bands:
+            raise ValueError('num_perm 必须能被 bands 整除')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # a < 2^31 且哈希值 < 2^32，a*x+b 不会超出 int64
+        self._a = rng.randint(1, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.int64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.int64)
+
+    def shingles(self, text):
+        text = ' '.join((text or '').lower().split())
+        if not text:
+            return set()
+        if len(text) <= self.shingle_size:
+            return {text}
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        """计算纯文本的MinHash签名，文本为空时返回None"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                             dtype=np.int64, count=len(shingles))
+        signature = np.full(self.num_perm, MERSENNE_PRIME, dtype=np.int64)
+        # 分块计算，限制长笔记的中间矩阵大小
+        for start in range(0, hashes.size, 4096):
+            block = (self._a * hashes[start:start + 4096] + self._b) % MERSENNE_PRIME
+            np.minimum(signature, block.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def buckets(self, signature):
+        """签名各分段的桶值，高位为分段序号"""
+        return [(band << 32) | zlib.crc32(signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(signature, signatures):
+        """估计的Jaccard相似度，signatures 为二维数组时返回每行的相似度"""
+        return (signatures == signature).mean(axis=-1)
+
+
+def _chunks(items, size=SQL_BATCH):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _preview(text):
+    return (text or '')[:PREVIEW_LENGTH]
+
+
+class DuplicateDetector:
+    """近似重复检测服务"""
+
+    def __init__(self, hasher=None, threshold=0.8):
+        self.hasher = hasher or MinHasher()
+        self.threshold = threshold
+        self._installed = False
+        self._backfilled = False
+
+    def init_app(self, app):
+        self.threshold = float(app.config.get('DUPLICATE_THRESHOLD', self.threshold))
+        self._backfilled = False
+        self.install()
+
+    def install(self):
+        """注册flush事件，笔记写入时同步签名；重复调用无副作用"""
+        if self._installed:
+            return
+        event.listen(Session, 'after_flush', self._after_flush)
+        self._installed = True
+
+    # ==================== 签名维护 ====================
+
+    def _after_flush(self, session, flush_context):
+        changed = {}
+        deleted = []
+        # 纯文本派生列已在本次flush的 before_insert/before_update 中刷新
+        for obj in session.new:
+            if isinstance(obj, Note):
+                changed[obj.id] = plain_text_of(obj.plain_text, obj.content)
+        for obj in session.dirty:
+            if isinstance(obj, Note) and db.inspect(obj).attrs.content.history.has_changes():
+                changed[obj.id] = plain_text_of(obj.plain_text, obj.content)
+        for obj in session.deleted:
+            if isinstance(obj, Note):
+                deleted.append(obj.id)
+        if changed or deleted:
+            self._write(session.connection(), changed, deleted)
+
+    def refresh_signatures(self, session, contents, deleted_ids=()):
+        """
+        为绕过ORM写入的笔记同步签名
+
+        Args:
+            session: 当前数据库会话
+            contents: dict，笔记ID -> 内容（HTML或纯文本）
+            deleted_ids: 已删除的笔记ID
+        """
+        texts = {note_id: strip_html(content) for note_id, content in contents.items()}
+        self._write(session.connection(), texts, list(deleted_ids))
+
+    def _write(self, connection, changed, deleted):
+        bucket_table = NoteLshBucket.__table__
+        signature_table = NoteSignature.__table__
+        for batch in _chunks(list(changed) + list(deleted)):
+            connection.execute(bucket_table.delete().where(bucket_table.c.note_id.in_(batch)))
+            connection.execute(signature_table.delete().where(signature_table.c.note_id.in_(batch)))
+
+        signature_rows = []
+        bucket_rows = []
+        now = datetime.datetime.utcnow()
+        for note_id, text in changed.items():
+            signature = self.hasher.signature(text)
+            if signature is None:
+                continue
+            signature_rows.append({'note_id': note_id, 'signature': signature.tobytes(), 'updated_at': now})
+            bucket_rows.extend({'note_id': note_id, 'band': band, 'bucket': bucket}
+                               for band, bucket in enumerate(self.hasher.buckets(signature)))
+        if signature_rows:
+            connection.execute(signature_table.insert(), signature_rows)
+            connection.execute(bucket_table.insert(), bucket_rows)
+
+    def _ensure_backfilled(self):
+        """为功能上线前已存在的笔记补算签名，每个进程执行一次"""
+        if self._backfilled:
+            return
+        missing = db.session.query(Note.id, Note.plain_text, Note.content) \
+            .outerjoin(NoteSignature, NoteSignature.note_id == Note.id) \
+            .filter(NoteSignature.note_id.is_(None), Note.content.isnot(None), Note.content != '') \
+            .all()
+        if missing:
+            for batch in _chunks(missing):
+                texts = {note_id: plain_text_of(plain_text, content) for note_id, plain_text, content in batch}
+                self._write(db.session.connection(), texts, [])
+            db.session.commit()
+            logger.info(f"已为 {len(missing)} 条笔记补算MinHash签名")
+        self._backfilled = True
+
+    def _load_signatures(self, note_ids):
+        """批量读取签名，返回 note_id -> (file_id, 签名)"""
+        result = {}
+        for batch in _chunks(note_ids):
+            rows = db.session.query(NoteSignature.note_id, NoteSignature.signature, Note.file_id) \
+                .join(Note, Note.id == NoteSignature.note_id) \
+                .filter(NoteSignature.note_id.in_(batch)).all()
+            for note_id, signature, file_id in rows:
+                result[note_id] = (file_id, np.frombuffer(signature, dtype=np.uint32))
+        return result
+
+    def _candidates(self, bucket_keys, exclude_file_id=None):
+        """按桶值查找候选笔记，返回 bucket -> [note_id]"""
+        result = {}
+        for batch in _chunks(set(bucket_keys)):
+            query = db.session.query(NoteLshBucket.bucket, NoteLshBucket.note_id) \
+                .filter(NoteLshBucket.bucket.in_(batch))
+            if exclude_file_id is not None:
+                query = query.join(Note, Note.id == NoteLshBucket.note_id).filter(Note.file_id != exclude_file_id)
+            for bucket, note_id in query:
+                result.setdefault(bucket, []).append(note_id)
+        return result
+
+    def _match(self, signature, candidate_ids, signatures, threshold):
+        candidate_ids = [note_id for note_id in candidate_ids if note_id in signatures]
+        if not candidate_ids:
+            return []
+        matrix = np.stack([signatures[note_id][1] for note_id in candidate_ids])
+        scores = self.hasher.similarity(signature, matrix)
+        matches = [
+            {'note_id': note_id, 'file_id': signatures[note_id][0], 'similarity': round(float(score), 4)}
+            for note_id, score in zip(candidate_ids, scores) if score >= threshold
+        ]
+        matches.sort(key=lambda item: -item['similarity'])
+        return matches
+
+    # ==================== 查询 ====================
+
+    def similar_notes(self, note_id, threshold=0.5, limit=20, include_same_file=True):
+        """
+        查询与指定笔记相似的笔记块
+
+        Returns:
+            list: [{'note_id', 'file_id', 'similarity'}]，按相似度降序
+        """
+        self._ensure_backfilled()
+        own = self._load_signatures([note_id]).get(note_id)
+        if own is None:
+            return []
+        file_id, signature = own
+        buckets = self._candidates(self.hasher.buckets(signature))
+        candidate_ids = {other for ids in buckets.values() for other in ids if other != note_id}
+        signatures = self._load_signatures(candidate_ids)
+        if not include_same_file:
+            signatures = {k: v for k, v in signatures.items() if v[0] != file_id}
+        return self._match(signature, candidate_ids, signatures, threshold)[:limit]
+
+    def find_duplicates(self, folder_id=None, threshold=None, limit=100):
+        """
+        查找近似重复的笔记分组
+
+        Args:
+            folder_id: 文件夹ID，为空时检查整个工作区
+            threshold: 相似度阈值
+            limit: 最多返回的分组数
+
+        Returns:
+            dict: {'groups': [...], 'total_groups': int, 'duplicate_notes': int}
+        """
+        self._ensure_backfilled()
+        threshold = self.threshold if threshold is None else threshold
+
+        def scoped(query):
+            if folder_id is None:
+                return query
+            return query.join(Note, Note.id == NoteLshBucket.note_id) \
+                .join(NoteFile, NoteFile.id == Note.file_id) \
+                .filter(NoteFile.folder_id == folder_id)
+
+        shared = scoped(db.session.query(NoteLshBucket.bucket)) \
+            .group_by(NoteLshBucket.bucket) \
+            .having(db.func.count(NoteLshBucket.note_id) > 1) \
+            .subquery()
+        rows = scoped(db.session.query(NoteLshBucket.bucket, NoteLshBucket.note_id)) \
+            .filter(NoteLshBucket.bucket.in_(db.select(shared.c.bucket))) \
+            .all()
+        buckets = {}
+        for bucket, note_id in rows:
+            buckets.setdefault(bucket, []).append(note_id)
+        signatures = self._load_signatures({note_id for _, note_id in rows})
+
+        parent = {}
+
+        def find(x):
+            while parent.get(x, x) != x:
+                parent[x] = parent.get(parent[x], parent[x])
+                x = parent[x]
+            return x
+
+        # 每个桶内以首个笔记为代表比较，未匹配的笔记再选新代表，避免桶内两两比较
+        for members in buckets.values():
+            remaining = [note_id for note_id in members if note_id in signatures]
+            while len(remaining) > 1:
+                representative, others = remaining[0], remaining[1:]
+                matrix = np.stack([signatures[note_id][1] for note_id in others])
+                scores = self.hasher.similarity(signatures[representative][1], matrix)
+                remaining = []
+                parent.setdefault(representative, representative)
+                for note_id, score in zip(others, scores):
+                    if score >= threshold:
+                        parent[find(note_id)] = find(representative)
+                    else:
+                        remaining.append(note_id)
+
+        groups = {}
+        for note_id in parent:
+            groups.setdefault(find(note_id), set()).add(note_id)
+        groups = sorted((sorted(members) for members in groups.values() if len(members) > 1),
+                        key=lambda members: (-len(members), members[0]))
+        total_groups = len(groups)
+        duplicate_notes = sum(len(members) for members in groups)
+        groups = groups[:limit]
+
+        note_ids = [note_id for members in groups for note_id in members]
+        notes = {}
+        for batch in _chunks(note_ids):
+            for note_id, plain_text, content, file_id, file_name in db.session.query(
+                    Note.id, Note.plain_text, Note.content, Note.file_id, NoteFile.name) \
+                    .join(NoteFile, NoteFile.id == Note.file_id) \
+                    .filter(Note.id.in_(batch)):
+                notes[note_id] = {'note_id': note_id, 'file_id': file_id, 'file_name': file_name,
+                                  'preview': _preview(plain_text_of(plain_text, content))}
+
+        result_groups = []
+        for members in groups:
+            first = signatures[members[0]][1]
+            matrix = np.stack([signatures[note_id][1] for note_id in members[1:]])
+            result_groups.append({
+                'size': len(members),
+                'min_similarity': round(float(self.hasher.similarity(first, matrix).min()), 4),
+                'notes': [notes[note_id] for note_id in members if note_id in notes]
+            })
+
+        return {
+            'groups': result_groups,
+            'total_groups': total_groups,
+            'duplicate_notes': duplicate_notes
+        }
+
+    def check_blocks(self, contents, exclude_file_id=None, threshold=None):
+        """
+        检查待写入的内容块是否与已有笔记重复
+
+        Args:
+            contents: 内容块列表
+            exclude_file_id: 不参与比较的文件ID（通常是将被替换的文件）
+            threshold: 相似度阈值
+
+        Returns:
+            list: [{'block_index', 'preview', 'matches'}]，只包含有重复的块
+        """
+        self._ensure_backfilled()
+        threshold = self.threshold if threshold is None else threshold
+        block_signatures = []
+        for index, content in enumerate(contents):
+            text = strip_html(content)
+            signature = self.hasher.signature(text)
+            if signature is not None:
+                block_signatures.append((index, text, signature, self.hasher.buckets(signature)))
+        if not block_signatures:
+            return []
+
+        buckets = self._candidates((key for *_, keys in block_signatures for key in keys),
+                                   exclude_file_id=exclude_file_id)
+        signatures = self._load_signatures({note_id for ids in buckets.values() for note_id in ids})
+
+        warnings = []
+        for index, text, signature, keys in block_signatures:
+            candidate_ids = {note_id for key in keys for note_id in buckets.get(key, ())}
+            matches = self._match(signature, candidate_ids, signatures, threshold)
+            if matches:
+                warnings.append({
+                    'block_index': index,
+                    'preview': _preview(text),
+                    'matches': matches[:5]
+                })
+        return warnings
+
+
+duplicate_detector = DuplicateDetector()
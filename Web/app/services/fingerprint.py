@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: fingerprint.py
+模块: 服务层 - 内容指纹
+描述: 通过一次聚合查询计算文件中全部笔记的内容指纹，用于判断派生数据是否过期
+功能:
+    - 单个文件的指纹计算
+    - 多个文件的指纹批量计算（GROUP BY一次查询）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - hashlib: 摘要算法
+    - app.models.note: 笔记模型
+
+注意事项:
+    - 指纹基于笔记数量、ID、顺序、内容长度和最后修改时间，不读取笔记正文
+    - 笔记的任何修改都会刷新 updated_at，因此修改内容一定会改变指纹
+
+许可证: Apache-2.0
+"""
+
+import hashlib
+from app.extensions import db
+from app.models.note import Note
+
+EMPTY_FINGERPRINT = 'empty'
+
+
+def _aggregate_columns():
+    return (
+        db.func.count(Note.id),
+        db.func.max(Note.updated_at),
+        db.func.sum(Note.id * (Note.order + 1)),
+        db.func.sum(db.func.length(Note.content)),
+        db.func.sum(Note.id),
+        db.func.max(Note.id)
+    )
+
+
+def _digest(row):
+    if not row or not row[0]:
+        return EMPTY_FINGERPRINT
+    raw = '|'.join(str(value) for value in row)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def compute_file_fingerprint(file_id):
+    """
+    计算文件内容指纹
+
+    Args:
+        file_id: 文件ID
+
+    Returns:
+        str: 指纹字符串，文件没有笔记时返回 'empty'
+    """
+    row = db.session.query(*_aggregate_columns()).filter(Note.file_id == file_id).one()
+    return _digest(row)
+
+
+def compute_file_fingerprints(file_ids):
+    """
+    批量计算多个文件的内容指纹
+
+    Returns:
+        dict: file_id -> 指纹
+    """
+    file_ids = list(file_ids)
+    if not file_ids:
+        return {}
+    rows = db.session.query(Note.file_id, *_aggregate_columns()) \
+        .filter(Note.file_id.in_(file_ids)) \
+        .group_by(Note.file_id).all()
+    result = {file_id: EMPTY_FINGERPRINT for file_id in file_ids}
+    for row in rows:
+        result[row[0]] = _digest(row[1:])
+    return result
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: http_pool.py
+模块: AI服务 - HTTP连接池
+描述: 为大模型服务商提供进程内共享的 keep-alive HTTP 会话，并统计连接复用情况
+功能:
+    - 按进程共享 requests.Session，TLS 连接在多次调用之间复用
+    - 连接池大小可配置（每个工作进程一份）
+    - 统计请求数、新建连接数、复用率和因池满被丢弃的连接数
+    - 进程 fork 后自动重建会话，避免父子进程共用同一套接字
+    - 按名称获取进程内共享的连接池（get_pool）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - requests: HTTP 会话
+    - urllib3: 连接池（通过自定义连接池类统计新建连接）
+    - app.utils.metrics: 指标注册表
+
+环境变量:
+    - AI_HTTP_POOL_SIZE: 每个工作进程对同一主机保持的最大连接数，默认与 AI_MAX_CONCURRENCY 相同
+    - AI_HTTP_KEEP_ALIVE: 是否启用 keep-alive，默认启用；关闭后每次调用都重新握手（仅用于对比测试）
+
+许可证: Apache-2.0
+"""
+
+import os
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _ConnectionCounter:
+    """连接事件计数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.discarded = 0
+
+    def add(self, key):
+        with self._lock:
+            setattr(self, key, getattr(self, key) + 1)
+
+
+def _counting_pool_class(base, counter):
+    """生成统计建连和丢弃连接的连接池类"""
+
+    class CountingConnection(base.ConnectionCls):
+        def connect(self):
+            # 服务端关闭后 urllib3 会复用连接对象重新建连，因此在 connect 而非 _new_conn 中计数
+            counter.add('created')
+            return super().connect()
+
+    class CountingConnectionPool(base):
+        ConnectionCls = CountingConnection
+
+        def _put_conn(self, conn):
+            # 池已满时 urllib3 会直接关闭归还的连接，这里提前判断以便计数
+            if conn is not None and self.pool is not None and self.pool.full():
+                counter.add('discarded')
+            return super()._put_conn(conn)
+
+    CountingConnectionPool.__name__ = f'Counting{base.__name__}'
+    return CountingConnectionPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    """使用计数连接池的适配器"""
+
+    def __init__(self, counter, **kwargs):
+        self._counter = counter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self._counter),
+            'https': _counting_pool_class(HTTPSConnectionPool, self._counter),
+        }
+
+
+class HTTPSessionPool:
+    """
+    共享的 keep-alive HTTP 会话
+
+    requests.Session 本身是线程安全的连接复用容器：pool_size 决定对同一主机
+    最多保留多少条空闲连接，应不小于该进程内并发调用数，否则超出的连接用完即关闭。
+    """
+
+    def __init__(self, name='http', pool_size=4, keep_alive=True):
+        self.name = name
+        self.pool_size = max(1, int(pool_size))
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._counter = _ConnectionCounter()
+        self._requests = 0
+        self._errors = 0
+        metrics.register_collector(f'http.{name}', self.get_stats)
+
+    @classmethod
+    def from_env(cls, name='http', **overrides):
+        """根据环境变量创建连接池"""
+        default_size = os.getenv('AI_MAX_CONCURRENCY', '4')
+        options = {
+            'pool_size': int(os.getenv('AI_HTTP_POOL_SIZE', default_size)),
+            'keep_alive': os.getenv('AI_HTTP_KEEP_ALIVE', 'true').lower() in ('1', 'true', 'yes'),
+        }
+        options.update(overrides)
+        return cls(name=name, **options)
+
+    def _build_session(self):
+        session = requests.Session()
+        # 重试由弹性层统一负责，这里不做传输层重试
+        adapter = _CountingAdapter(self._counter, pool_connections=4,
+                                   pool_maxsize=self.pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @property
+    def session(self):
+        """当前进程的会话，首次访问或 fork 后重建"""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    if self._session is not None:
+                        logger.info(f"检测到进程变化，重建HTTP会话: {self.name}")
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        """发起请求并计数，异常原样抛出"""
+        with self._lock:
+            self._requests += 1
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    def get_stats(self):
+        """返回连接复用统计"""
+        with self._lock:
+            request_count = self._requests
+            errors = self._errors
+        created = self._counter.created
+        reused = max(0, request_count - created)
+        return {
+            'name': self.name,
+            'pool_size': self.pool_size,
+            'keep_alive': self.keep_alive,
+            'requests': request_count,
+            'errors': errors,
+            'connections_created': created,
+            'connections_reused': reused,
+            'connections_discarded': self._counter.discarded,
+            'reuse_ratio': round(reused / request_count, 4) if request_count else 0.0
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name):
+    """按名称获取进程内共享的连接池，首次使用时根据环境变量创建"""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = HTTPSessionPool.from_env(name=name)
+                _pools[name] = pool
+    return pool
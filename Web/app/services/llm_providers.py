@@ -0,0 +1,516 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: llm_providers.py
+模块: AI服务 - 大模型服务商
+描述: 大模型服务商抽象层，按配置选择通义千问、OpenAI兼容接口或本地桩服务
+功能:
+    - 统一的服务商接口（generate -> LLMResponse）
+    - 通义千问/DashScope 服务商（REST接口，共享 keep-alive 连接池）
+    - OpenAI 兼容接口服务商（支持自定义 base_url）
+    - 本地确定性桩服务：可配置延迟分布、token数和错误率，用于离线压测
+    - 真实响应的录制与回放
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - requests: DashScope REST 接口调用
+    - app.services.http_pool: 共享的 keep-alive 会话
+    - openai: OpenAI SDK（仅openai服务商需要）
+    - app.services.llm_resilience: 错误类型
+
+环境变量:
+    - AI_PROVIDER: qwen | openai | stub | replay，默认qwen
+    - AI_MODEL / AI_TEMPERATURE / AI_MAX_TOKENS: 模型参数
+    - QWEN_API_KEY: 通义千问API密钥
+    - DASHSCOPE_BASE_URL: DashScope 接口地址，默认 https://dashscope.aliyuncs.com/api/v1
+    - AI_HTTP_TIMEOUT: 单次HTTP请求超时秒数，默认120
+    - AI_HTTP_POOL_SIZE / AI_HTTP_KEEP_ALIVE: 连接池配置，见 http_pool.py
+    - OPENAI_API_KEY / OPENAI_BASE_URL: OpenAI兼容接口的密钥和地址
+    - AI_STUB_LATENCY: 桩服务延迟分布，如 fixed:0.2、uniform:0.1,0.5、
+      normal:0.3,0.05、lognormal:-1.5,0.5，默认无延迟
+    - AI_STUB_TOKEN_LATENCY: 桩服务每个输出token额外延迟秒数，默认0
+    - AI_STUB_ERROR_RATE: 桩服务注入的错误率，默认0
+    - AI_STUB_SEED: 桩服务随机种子，默认42
+    - AI_RECORD_PATH: 设置后将真实响应追加录制到该JSONL文件
+    - AI_REPLAY_PATH: replay服务商读取的JSONL文件
+
+许可证: Apache-2.0
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+import logging
+import requests
+from app.services.http_pool import get_pool
+from app.services.llm_resilience import LLMProviderError
+
+logger = logging.getLogger(__name__)
+
+DASHSCOPE_BASE_URL = 'https://dashscope.aliyuncs.com/api/v1'
+
+DEFAULT_MODELS = {
+    'qwen': 'qwen-turbo',
+    'openai': 'gpt-4o-mini',
+    'stub': 'stub-deterministic',
+    'replay': 'replay'
+}
+
+
+def estimate_tokens(text, chars_per_token=2.0):
+    """粗略估算token数（中英文混合文本约2字符/token）"""
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / chars_per_token))
+
+
+class LLMResponse:
+    """一次大模型调用的结果"""
+
+    def __init__(self, text, model, input_tokens=0, output_tokens=0, latency=0.0):
+        self.text = text
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.latency = latency
+
+    def to_dict(self):
+        return {
+            'text': self.text,
+            'model': self.model,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'latency': self.latency
+        }
+
+
+class BaseLLMProvider:
+    """服务商基类，子类实现 _generate"""
+
+    name = 'base'
+
+    def __init__(self, model_name=None, temperature=0.3, max_tokens=1500):
+        self.model_name = model_name or DEFAULT_MODELS.get(self.name, self.name)
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def generate(self, prompt, stop=None):
+        """
+        调用大模型
+
+        Returns:
+            LLMResponse
+
+        Raises:
+            LLMProviderError: 调用失败，retryable 属性表示是否值得重试
+        """
+        started = time.monotonic()
+        response = self._generate(prompt, stop=stop)
+        response.latency = time.monotonic() - started
+        return response
+
+    def _generate(self, prompt, stop=None):
+        raise NotImplementedError
+
+    def get_info(self):
+        return {
+            'provider': self.name,
+            'model': self.model_name,
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens
+        }
+
+
+class QwenProvider(BaseLLMProvider):
+    """
+    通义千问/DashScope 服务商
+
+    直接调用 DashScope 文本生成 REST 接口，通过进程内共享的 keep-alive 会话发送请求；
+    SDK 的 Generation.call 每次调用都会新建会话并重新进行 TLS 握手。
+    """
+
+    name = 'qwen'
+
+    def __init__(self, api_key=None, base_url=None, http_pool=None, timeout=None, verify=True, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key if api_key is not None else os.getenv('QWEN_API_KEY', '')
+        self.base_url = (base_url or os.getenv('DASHSCOPE_BASE_URL') or DASHSCOPE_BASE_URL).rstrip('/')
+        self.timeout = timeout if timeout is not None else float(os.getenv('AI_HTTP_TIMEOUT', '120'))
+        self.verify = verify
+        self._http_pool = http_pool
+
+    @property
+    def http_pool(self):
+        if self._http_pool is None:
+            self._http_pool = get_pool('dashscope')
+        return self._http_pool
+
+    def _generate(self, prompt, stop=None):
+        if not self.api_key:
+            raise LLMProviderError('QWEN_API_KEY environment variable is required',
+                                   status_code=401, retryable=False)
+
+        parameters = {
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+            'result_format': 'text'
+        }
+        if stop:
+            parameters['stop'] = list(stop)
+        payload = {
+            'model': self.model_name,
+            'input': {'prompt': prompt},
+            'parameters': parameters
+        }
+
+        try:
+            response = self.http_pool.post(
+                f'{self.base_url}/services/aigc/text-generation/generation',
+                json=payload,
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                timeout=self.timeout,
+                verify=self.verify
+            )
+        except requests.RequestException as e:
+            # 网络层错误（连接失败、读超时等）视为可重试
+            logger.error(f"Error calling Qwen API: {str(e)}")
+            raise LLMProviderError(f"调用AI服务时出错: {str(e)}", retryable=True)
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+
+        if response.status_code != 200:
+            message = body.get('message') or response.text[:200]
+            logger.error(f"Qwen API error: {body.get('code')} - {message}")
+            raise LLMProviderError(
+                f"API调用失败: {message}",
+                status_code=response.status_code,
+                code=body.get('code')
+            )
+
+        output = body.get('output') or {}
+        text = output.get('text')
+        if text is None and output.get('choices'):
+            text = output['choices'][0].get('message', {}).get('content')
+        usage = body.get('usage') or {}
+        return LLMResponse(
+            text=(text or '').strip(),
+            model=self.model_name,
+            input_tokens=usage.get('input_tokens', 0),
+            output_tokens=usage.get('output_tokens', 0)
+        )
+
+    def get_info(self):
+        info = super().get_info()
+        info['base_url'] = self.base_url
+        info['http_pool_size'] = self.http_pool.pool_size
+        return info
+
+
+class OpenAICompatibleProvider(BaseLLMProvider):
+    """OpenAI 兼容接口服务商（OpenAI、DashScope兼容模式、本地vLLM等）"""
+
+    name = 'openai'
+
+    def __init__(self, api_key=None, base_url=None, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key if api_key is not None else os.getenv('OPENAI_API_KEY', '')
+        self.base_url = base_url if base_url is not None else os.getenv('OPENAI_BASE_URL') or None
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+                    # 客户端长期持有，httpx 连接池在调用之间保持 keep-alive；池大小与 qwen 服务商一致
+                    pool_size = int(os.getenv('AI_HTTP_POOL_SIZE', os.getenv('AI_MAX_CONCURRENCY', '4')))
+                    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                    # 重试和超时由弹性层统一负责
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                          http_client=httpx.Client(limits=limits))
+        return self._client
+
+    def _generate(self, prompt, stop=None):
+        if not self.api_key:
+            raise LLMProviderError('OPENAI_API_KEY environment variable is required',
+                                   status_code=401, retryable=False)
+
+        import openai
+
+        try:
+            completion = self._get_client().chat.completions.create(
+                model=self.model_name,
+                messages=[{'role': 'user', 'content': prompt}],
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stop=stop or None
+            )
+        except openai.APIStatusError as e:
+            raise LLMProviderError(f"API调用失败: {str(e)}", status_code=e.status_code)
+        except openai.APIError as e:
+            # 连接错误和超时
+            raise LLMProviderError(f"调用AI服务时出错: {str(e)}", retryable=True)
+
+        usage = completion.usage
+        return LLMResponse(
+            text=(completion.choices[0].message.content or '').strip(),
+            model=completion.model or self.model_name,
+            input_tokens=usage.prompt_tokens if usage else 0,
+            output_tokens=usage.completion_tokens if usage else 0
+        )
+
+    def get_info(self):
+        info = super().get_info()
+        info['base_url'] = self.base_url
+        return info
+
+
+def parse_latency_spec(spec):
+    """
+    解析延迟分布配置
+
+    Returns:
+        (distribution, params) 例如 ('uniform', [0.1, 0.5])
+    """
+    if not spec or spec.strip() in ('0', 'none'):
+        return 'fixed', [0.0]
+    if ':' not in spec:
+        return 'fixed', [float(spec)]
+    distribution, _, raw_params = spec.partition(':')
+    distribution = distribution.strip().lower()
+    params = [float(p) for p in raw_params.split(',') if p.strip()]
+    expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+    if distribution not in expected or len(params) != expected[distribution]:
+        raise ValueError(f'无效的延迟分布配置: {spec}')
+    return distribution, params
+
+
+class StubProvider(BaseLLMProvider):
+    """
+    本地确定性桩服务
+
+    从提示词中提取待处理内容（模板中首个空行到最后一个空行之间的部分），
+    对摘要类提示返回前几句话，其余返回规范化后的内容。相同输入总是得到相同输出。
+    """
+
+    name = 'stub'
+
+    def __init__(self, latency='0', token_latency=0.0, error_rate=0.0, seed=42,
+                 chars_per_token=2.0, sleep=time.sleep, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_distribution, self.latency_params = parse_latency_spec(latency)
+        self.token_latency = float(token_latency)
+        self.error_rate = float(error_rate)
+        self.chars_per_token = chars_per_token
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._sleep = sleep
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(
+            latency=os.getenv('AI_STUB_LATENCY', '0'),
+            token_latency=float(os.getenv('AI_STUB_TOKEN_LATENCY', '0')),
+            error_rate=float(os.getenv('AI_STUB_ERROR_RATE', '0')),
+            seed=int(os.getenv('AI_STUB_SEED', '42')),
+            **kwargs
+        )
+
+    def sample_latency(self):
+        """按配置的分布采样一次基础延迟"""
+        params = self.latency_params
+        with self._rng_lock:
+            if self.latency_distribution == 'fixed':
+                value = params[0]
+            elif self.latency_distribution == 'uniform':
+                value = self._rng.uniform(params[0], params[1])
+            elif self.latency_distribution == 'normal':
+                value = self._rng.gauss(params[0], params[1])
+            elif self.latency_distribution == 'lognormal':
+                value = self._rng.lognormvariate(params[0], params[1])
+            else:
+                value = self._rng.expovariate(1.0 / params[0]) if params[0] > 0 else 0.0
+        return max(0.0, value)
+
+    def _should_fail(self):
+        if self.error_rate <= 0:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+    def _generate(self, prompt, stop=None):
+        self.calls += 1
+        text = self.transform(prompt)
+        if stop:
+            for stop_word in stop:
+                index = text.find(stop_word)
+                if index >= 0:
+                    text = text[:index]
+
+        max_chars = int(self.max_tokens * self.chars_per_token)
+        if len(text) > max_chars:
+            text = text[:max_chars]
+
+        input_tokens = estimate_tokens(prompt, self.chars_per_token)
+        output_tokens = estimate_tokens(text, self.chars_per_token)
+
+        delay = self.sample_latency() + self.token_latency * output_tokens
+        if delay > 0:
+            self._sleep(delay)
+
+        if self._should_fail():
+            raise LLMProviderError('stub injected failure', status_code=503)
+
+        return LLMResponse(text=text, model=self.model_name,
+                           input_tokens=input_tokens, output_tokens=output_tokens)
+
+    @staticmethod
+    def transform(prompt):
+        """确定性变换：提取内容并规范化"""
+        parts = prompt.split('\n\n')
+        body = '\n\n'.join(parts[1:-1]) if len(parts) >= 3 else prompt
+
+        if '摘要' in parts[0]:
+            sentences = re.split(r'(?<=[。！？.!?])\s*', re.sub(r'\s+', ' ', body).strip())
+            return ''.join(sentences[:2]).strip()
+
+        lines = []
+        for line in body.split('\n'):
+            line = re.sub(r'[ \t]+', ' ', line).rstrip()
+            # 标题井号后补空格
+            line = re.sub(r'^(#{1,6})(?=[^#\s])', r'\1 ', line)
+            lines.append(line)
+        return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def _record_key(prompt, stop):
+    raw = json.dumps([prompt, stop or []], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class RecordingProvider(BaseLLMProvider):
+    """录制包装器：透传给真实服务商，并把响应追加写入JSONL文件"""
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.name = inner.name
+        self.model_name = inner.model_name
+        self.temperature = inner.temperature
+        self.max_tokens = inner.max_tokens
+        self._lock = threading.Lock()
+
+    def _generate(self, prompt, stop=None):
+        response = self.inner.generate(prompt, stop=stop)
+        record = {
+            'key': _record_key(prompt, stop),
+            'model': response.model,
+            'prompt': prompt,
+            'stop': stop or [],
+            'response': response.to_dict()
+        }
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return response
+
+    def get_info(self):
+        info = self.inner.get_info()
+        info['recording_to'] = self.path
+        return info
+
+
+class ReplayProvider(BaseLLMProvider):
+    """回放服务商：按 (提示词, 停止词) 查找录制的响应，可配置未命中时的后备服务商"""
+
+    name = 'replay'
+
+    def __init__(self, path, fallback=None, replay_latency=False, sleep=time.sleep, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.fallback = fallback
+        self.replay_latency = replay_latency
+        self._sleep = sleep
+        self.records = {}
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[record['key']] = record
+
+    def _generate(self, prompt, stop=None):
+        record = self.records.get(_record_key(prompt, stop))
+        if record is None:
+            self.misses += 1
+            if self.fallback is not None:
+                return self.fallback.generate(prompt, stop=stop)
+            raise LLMProviderError('回放记录中没有匹配的响应', status_code=404, retryable=False)
+
+        self.hits += 1
+        data = record['response']
+        if self.replay_latency and data.get('latency'):
+            self._sleep(data['latency'])
+        return LLMResponse(text=data['text'], model=data['model'],
+                           input_tokens=data.get('input_tokens', 0),
+                           output_tokens=data.get('output_tokens', 0))
+
+    def get_info(self):
+        info = super().get_info()
+        info.update({'path': self.path, 'records': len(self.records),
+                     'hits': self.hits, 'misses': self.misses})
+        return info
+
+
+def create_provider(name=None):
+    """
+    根据配置创建服务商
+
+    Args:
+        name: 服务商名称，默认读取环境变量 AI_PROVIDER
+
+    Returns:
+        BaseLLMProvider
+    """
+    name = (name or os.getenv('AI_PROVIDER', 'qwen')).strip().lower()
+    options = {
+        'model_name': os.getenv('AI_MODEL') or None,
+        'temperature': float(os.getenv('AI_TEMPERATURE', '0.3')),
+        'max_tokens': int(os.getenv('AI_MAX_TOKENS', '1500'))
+    }
+
+    if name == 'qwen':
+        provider = QwenProvider(**options)
+    elif name == 'openai':
+        provider = OpenAICompatibleProvider(**options)
+    elif name == 'stub':
+        provider = StubProvider.from_env(**options)
+    elif name == 'replay':
+        fallback = StubProvider.from_env(**options) if os.getenv('AI_REPLAY_FALLBACK') == 'stub' else None
+        return ReplayProvider(os.getenv('AI_REPLAY_PATH', ''), fallback=fallback, **options)
+    else:
+        raise ValueError(f'未知的AI服务商: {name}')
+
+    record_path = os.getenv('AI_RECORD_PATH')
+    if record_path:
+        provider = RecordingProvider(provider, record_path)
+    return provider
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: llm_resilience.py
+模块: AI服务 - 调用弹性层
+描述: 包装大模型调用，提供并发限制、限流、重试、超时和熔断能力
+功能:
+    - 全局与单客户端两级并发信号量
+    - 令牌桶限流，匹配服务商配额
+    - 可重试错误的指数退避重试（带随机抖动）
+    - 单次调用超时控制
+    - 熔断器：服务商故障时快速失败
+    - 半开探测遇到不可重试错误时也记录结果或归还名额，熔断器不会停在半开状态
+    - 状态统计与指标上报
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.1
+
+依赖:
+    - threading, concurrent.futures: 并发控制
+    - app.utils.metrics: 指标注册表
+
+环境变量:
+    - AI_MAX_CONCURRENCY: 单客户端最大并发调用数，默认4
+    - AI_GLOBAL_MAX_CONCURRENCY: 进程内所有客户端总并发数，默认8
+    - AI_RATE_LIMIT_PER_SEC: 令牌桶每秒补充令牌数，默认5
+    - AI_RATE_LIMIT_BURST: 令牌桶容量，默认10
+    - AI_CALL_TIMEOUT: 单次调用超时秒数，默认60
+    - AI_ACQUIRE_TIMEOUT: 等待并发槽位/令牌的最长秒数，默认30
+    - AI_MAX_RETRIES: 最大重试次数（不含首次调用），默认3
+    - AI_RETRY_BASE_DELAY / AI_RETRY_MAX_DELAY: 退避基础/最大延迟秒数，默认0.5/8
+    - AI_CIRCUIT_FAILURE_THRESHOLD: 连续失败多少次后熔断，默认5
+    - AI_CIRCUIT_RECOVERY_TIMEOUT: 熔断后多少秒进入半开状态，默认30
+
+许可证: Apache-2.0
+"""
+
+import os
+import time
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== 异常定义 ====================
+
+class LLMError(Exception):
+    """大模型调用错误基类"""
+    retryable = False
+
+
+class LLMProviderError(LLMError):
+    """服务商返回的错误，根据状态码判断是否可重试"""
+
+    def __init__(self, message, status_code=None, code=None, retryable=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        if retryable is None:
+            # 429限流和5xx服务端错误可以重试，其余4xx为请求本身的问题
+            retryable = status_code is None or status_code == 429 or status_code >= 500
+        self.retryable = retryable
+
+
+class LLMTimeoutError(LLMError):
+    """单次调用超时"""
+    retryable = True
+
+
+class LLMRateLimitError(LLMError):
+    """本地限流：在等待时间内没有拿到令牌或并发槽位"""
+    retryable = False
+
+
+class CircuitOpenError(LLMError):
+    """熔断器处于打开状态，快速失败"""
+    retryable = False
+
+
+def is_retryable(exc):
+    """判断异常是否值得重试"""
+    if isinstance(exc, LLMError):
+        return exc.retryable
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+# ==================== 基础组件 ====================
+
+class TokenBucket:
+    """令牌桶限流器"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def try_acquire(self, tokens=1):
+        """非阻塞获取令牌，返回需要等待的秒数（0表示已获取）"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """阻塞获取令牌，超时返回False"""
+        deadline = None if timeout is None else self._clock() + timeout
+        waited = False
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if not waited:
+                self.throttled += 1
+                waited = True
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining <= 0 or wait > remaining:
+                    return False
+            self._sleep(wait)
+
+    def get_stats(self):
+        with self._lock:
+            self._refill()
+            return {
+                'rate_per_sec': self.rate,
+                'capacity': self.capacity,
+                'available_tokens': round(self._tokens, 3),
+                'throttled': self.throttled
+            }
+
+
+class ConcurrencyLimiter:
+    """基于信号量的并发限制器，记录当前和峰值并发数"""
+
+    def __init__(self, limit, name='limiter'):
+        self.limit = int(limit)
+        self.name = name
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.rejected = 0
+
+    def acquire(self, timeout=None):
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'peak': self.peak,
+                'rejected': self.rejected
+            }
+
+
+class RetryPolicy:
+    """指数退避重试策略，使用全抖动（full jitter）"""
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=8.0, rng=None):
+        self.max_retries = int(max_retries)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self._rng = rng or random.Random()
+
+    def backoff(self, attempt):
+        """第attempt次重试前的等待秒数（attempt从1开始）"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return self._rng.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """熔断器：closed -> open -> half_open -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1,
+                 clock=time.monotonic):
+        self.failure_threshold = int(failure_threshold)
+        self.recovery_timeout = float(recovery_timeout)
+        self.half_open_max_calls = int(half_open_max_calls)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._half_open_calls = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def allow(self):
+        """判断是否允许本次调用"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """放行的调用没有得出服务商是否可用的结论（如本地限流超时）时，归还半开探测名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._state != self.CLOSED:
+                logger.info("熔断器恢复为关闭状态")
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"熔断器打开，连续失败 {self._consecutive_failures} 次")
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def get_stats(self):
+        with self._lock:
+            self._maybe_half_open()
+            retry_after = None
+            if self._state == self.OPEN:
+                retry_after = max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+            return {
+                'state': self._state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'retry_after': retry_after
+            }
+
+
+# 进程内所有客户端共享的全局并发限制
+global_limiter = ConcurrencyLimiter(int(os.getenv('AI_GLOBAL_MAX_CONCURRENCY', '8')), name='global')
+
+
+# ==================== 弹性客户端 ====================
+
+class ResilientLLMClient:
+    """
+    大模型调用弹性包装器
+
+    call_fn(prompt, **kwargs) 负责真正的服务商调用，失败时应抛出异常
+    （推荐 LLMProviderError，附带状态码以便判断是否重试）。
+    """
+
+    def __init__(self, call_fn, name='llm', max_concurrency=4, rate_per_sec=5.0, burst=10,
+                 timeout=60.0, acquire_timeout=30.0, retry_policy=None, circuit_breaker=None,
+                 limiter=None, sleep=time.sleep):
+        self.call_fn = call_fn
+        self.name = name
+        self.timeout = float(timeout)
+        self.acquire_timeout = float(acquire_timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.rate_limiter = limiter or TokenBucket(rate_per_sec, burst)
+        self.client_limiter = ConcurrencyLimiter(max_concurrency, name=name)
+        self.global_limiter = global_limiter
+        self._sleep = sleep
+        # 工作线程数与单客户端并发数一致：槽位在调用真正结束时才释放，线程池不会排队堆积
+        self._executor = ThreadPoolExecutor(max_workers=self.client_limiter.limit,
+                                            thread_name_prefix=f'llm-{name}')
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'circuit_rejections': 0,
+            'rate_limited': 0
+        }
+        metrics.register_collector(f'llm.{name}', self.get_stats)
+
+    @classmethod
+    def from_env(cls, call_fn, name='llm', **overrides):
+        """根据环境变量创建客户端"""
+        options = {
+            'max_concurrency': int(os.getenv('AI_MAX_CONCURRENCY', '4')),
+            'rate_per_sec': float(os.getenv('AI_RATE_LIMIT_PER_SEC', '5')),
+            'burst': float(os.getenv('AI_RATE_LIMIT_BURST', '10')),
+            'timeout': float(os.getenv('AI_CALL_TIMEOUT', '60')),
+            'acquire_timeout': float(os.getenv('AI_ACQUIRE_TIMEOUT', '30')),
+            'retry_policy': RetryPolicy(
+                max_retries=int(os.getenv('AI_MAX_RETRIES', '3')),
+                base_delay=float(os.getenv('AI_RETRY_BASE_DELAY', '0.5')),
+                max_delay=float(os.getenv('AI_RETRY_MAX_DELAY', '8'))
+            ),
+            'circuit_breaker': CircuitBreaker(
+                failure_threshold=int(os.getenv('AI_CIRCUIT_FAILURE_THRESHOLD', '5')),
+                recovery_timeout=float(os.getenv('AI_CIRCUIT_RECOVERY_TIMEOUT', '30'))
+            )
+        }
+        options.update(overrides)
+        return cls(call_fn, name=name, **options)
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self._stats[key] += value
+        metrics.incr(f'llm.{self.name}.{key}', value)
+
+    def call(self, prompt, **kwargs):
+        """
+        发起一次带弹性保护的调用
+
+        Returns:
+            服务商返回的结果
+
+        Raises:
+            CircuitOpenError: 熔断器打开
+            LLMRateLimitError: 等待令牌或并发槽位超时
+            LLMError: 重试耗尽后的最后一次错误
+        """
+        self._count('calls')
+        attempt = 0
+        while True:
+            if not self.circuit_breaker.allow():
+                self._count('circuit_rejections')
+                self._count('failures')
+                raise CircuitOpenError(f'AI服务暂不可用（熔断中）: {self.name}')
+
+            # 通过 allow() 的每次调用都要记录结果或归还半开探测名额，否则熔断器会一直停在半开状态
+            settled = False
+            try:
+                result = self._attempt(prompt, kwargs)
+                self.circuit_breaker.record_success()
+                settled = True
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.circuit_breaker.record_failure()
+                    settled = True
+                elif isinstance(e, LLMProviderError):
+                    # 不可重试的服务商错误（如400/401）说明服务商可达
+                    self.circuit_breaker.record_success()
+                    settled = True
+                if isinstance(e, LLMTimeoutError):
+                    self._count('timeouts')
+                if isinstance(e, LLMRateLimitError):
+                    self._count('rate_limited')
+
+                attempt += 1
+                if not retryable or attempt > self.retry_policy.max_retries:
+                    self._count('failures')
+                    raise
+
+                delay = self.retry_policy.backoff(attempt)
+                self._count('retries')
+                logger.warning(f"AI调用失败，{delay:.2f}秒后进行第{attempt}次重试: {str(e)}")
+                self._sleep(delay)
+                continue
+            finally:
+                if not settled:
+                    # 本地限流超时等情况没有到达服务商，只归还名额
+                    self.circuit_breaker.release()
+
+            self._count('successes')
+            return result
+
+    def _attempt(self, prompt, kwargs):
+        """执行一次调用：限流 -> 获取并发槽位 -> 带超时执行"""
+        if not self.rate_limiter.acquire(timeout=self.acquire_timeout):
+            raise LLMRateLimitError(f'等待限流令牌超时: {self.name}')
+
+        if not self.client_limiter.acquire(timeout=self.acquire_timeout):
+            raise LLMRateLimitError(f'等待客户端并发槽位超时: {self.name}')
+        if not self.global_limiter.acquire(timeout=self.acquire_timeout):
+            self.client_limiter.release()
+            raise LLMRateLimitError('等待全局并发槽位超时')
+
+        def release(_future=None):
+            self.global_limiter.release()
+            self.client_limiter.release()
+
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(self.call_fn, prompt, **kwargs)
+        except Exception:
+            release()
+            raise
+        future.add_done_callback(release)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # 超时的调用仍占用槽位直到真正结束，避免线程无限堆积
+            raise LLMTimeoutError(f'AI调用超时（{self.timeout}秒）')
+        finally:
+            metrics.observe(f'llm.{self.name}.latency', time.monotonic() - started)
+
+    def get_stats(self):
+        """返回客户端当前状态"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            'name': self.name,
+            'timeout': self.timeout,
+            'max_retries': self.retry_policy.max_retries,
+            'counters': stats,
+            'circuit_breaker': self.circuit_breaker.get_stats(),
+            'rate_limiter': self.rate_limiter.get_stats(),
+            'concurrency': self.client_limiter.get_stats(),
+            'global_concurrency': self.global_limiter.get_stats()
+        }
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: note_diff.py
+模块: 服务层 - 笔记块差异
+描述: 比较文件现有笔记与新内容块，得到最少的插入、修改、删除和调序操作
+功能:
+    - 按格式和纯文本计算块哈希（忽略空白），复用优化报告的哈希序列差异算法对齐两侧
+    - 对齐为相等的块再比较内容，HTML不同时比较两侧的Markdown，行内标记变化按修改处理；
+      只有这一步需要新块的Markdown，未对齐的新块不做HTML转Markdown
+    - 相等的块保留原笔记（ID、格式、HTML内容都不变），只在位置变化时调序
+    - 替换区间内按位置配对修改，多出的笔记删除、多出的块插入
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.1
+
+依赖:
+    - app.services.optimization_report: 哈希序列差异算法
+    - app.services.note_text: 笔记Markdown派生文本
+
+许可证: Apache-2.0
+"""
+
+from app.services.optimization_report import diff_opcodes
+from app.services.note_text import markdown_of, plain_text_of
+
+
+def _normalize(text):
+    return ' '.join((text or '').split())
+
+
+def block_key(format_type, text):
+    """块哈希：格式加纯文本，忽略空白（HTML转Markdown会在粗体、斜体标记两侧补空格，往返后纯文本多出空格）；
+    空白的真实改动由 same_markup 比较Markdown时发现"""
+    return hash((format_type or 'text', ''.join((text or '').split())))
+
+
+def same_markup(note, block):
+    """格式和纯文本相同的两块，确认行内标记（粗体、链接等）也相同"""
+    if note.content == block.content:
+        return True
+    return _normalize(markdown_of(note)) == _normalize(markdown_of(block))
+
+
+class NoteChangePlan:
+    """把现有笔记变为新内容块所需的操作
+
+    Attributes:
+        inserts (list): [(顺序, 新块)]
+        updates (list): [(笔记ID, 顺序, 新块)]
+        deletes (list): [笔记ID]
+        reorders (list): [(笔记ID, 顺序)]，内容不变只调整顺序
+        unchanged (int): 内容和顺序都不变的笔记数
+    """
+
+    def __init__(self):
+        self.inserts = []
+        self.updates = []
+        self.deletes = []
+        self.reorders = []
+        self.unchanged = 0
+
+    @property
+    def touched(self):
+        """需要写入的行数"""
+        return len(self.inserts) + len(self.updates) + len(self.deletes) + len(self.reorders)
+
+    def to_dict(self):
+        return {
+            'inserted': len(self.inserts),
+            'updated': len(self.updates),
+            'deleted': len(self.deletes),
+            'reordered': len(self.reorders),
+            'unchanged': self.unchanged
+        }
+
+    def __repr__(self):
+        return f'<NoteChangePlan {self.to_dict()}>'
+
+
+def plan_note_changes(notes, blocks):
+    """
+    计算把现有笔记变为新内容块的操作
+
+    Args:
+        notes: 按顺序排列的现有笔记（需要 id、order、content、format、markdown、plain_text 属性）
+        blocks: 按顺序排列的新内容块（需要 content、format、markdown、plain_text 属性，markdown 可为 None）
+
+    Returns:
+        NoteChangePlan: 新笔记的顺序为块在 blocks 中的下标
+    """
+    plan = NoteChangePlan()
+    old_keys = [block_key(note.format, plain_text_of(note.plain_text, note.content)) for note in notes]
+    new_keys = [block_key(block.format, block.plain_text) for block in blocks]
+
+    def keep(note, order, block):
+        if not same_markup(note, block):
+            plan.updates.append((note.id, order, block))
+        elif note.order == order:
+            plan.unchanged += 1
+        else:
+            plan.reorders.append((note.id, order))
+
+    for tag, i1, i2, j1, j2 in diff_opcodes(old_keys, new_keys):
+        if tag == 'equal':
+            for offset in range(i2 - i1):
+                keep(notes[i1 + offset], j1 + offset, blocks[j1 + offset])
+            continue
+        # 替换区间按位置配对修改，其余删除或插入
+        paired = min(i2 - i1, j2 - j1)
+        for offset in range(paired):
+            plan.updates.append((notes[i1 + offset].id, j1 + offset, blocks[j1 + offset]))
+        plan.deletes.extend(note.id for note in notes[i1 + paired:i2])
+        plan.inserts.extend((j, blocks[j]) for j in range(j1 + paired, j2))
+    return plan
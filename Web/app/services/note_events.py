@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: note_events.py
+模块: 服务层 - 笔记变更事件
+描述: 跟踪数据库会话中笔记的增删改，在事务提交后通知订阅者
+功能:
+    - 通过SQLAlchemy会话事件收集本次事务中变更的笔记和文件
+    - 事务提交后分发变更集，回滚时丢弃
+    - 批量SQL语句绕过ORM时可手动登记变更
+    - 只调整顺序的笔记单独登记，内容相关的订阅者可以忽略
+    - 提交前可读取本次事务尚未分发的变更集（修订版本记录使用）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - sqlalchemy: 会话事件
+    - app.models.note: 笔记模型
+
+注意事项:
+    - 订阅者在 after_commit 中被调用，不能在回调中使用同一个会话执行SQL，
+      应只做入队、标记等轻量操作
+
+许可证: Apache-2.0
+"""
+
+import threading
+import logging
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.note import Note
+
+logger = logging.getLogger(__name__)
+
+_SESSION_KEY = 'note_changes'
+
+_subscribers = []
+_subscribers_lock = threading.Lock()
+_installed = False
+
+
+class NoteChangeSet:
+    """一次事务中的笔记变更集合"""
+
+    def __init__(self):
+        self.upserted = {}   # note_id -> file_id
+        self.deleted = {}    # note_id -> file_id
+        self.reordered = {}  # note_id -> file_id，内容未变只调整了顺序
+        self.files = set()
+
+    def add(self, note_id, file_id, deleted=False):
+        self.reordered.pop(note_id, None)
+        if deleted:
+            self.upserted.pop(note_id, None)
+            self.deleted[note_id] = file_id
+        else:
+            self.upserted[note_id] = file_id
+        if file_id is not None:
+            self.files.add(file_id)
+
+    def add_reordered(self, note_id, file_id):
+        if note_id not in self.upserted and note_id not in self.deleted:
+            self.reordered[note_id] = file_id
+        if file_id is not None:
+            self.files.add(file_id)
+
+    def add_file(self, file_id):
+        self.files.add(file_id)
+
+    def __bool__(self):
+        return bool(self.files or self.upserted or self.deleted or self.reordered)
+
+    def __repr__(self):
+        return (f'<NoteChangeSet files={sorted(self.files)} upserted={len(self.upserted)} '
+                f'deleted={len(self.deleted)} reordered={len(self.reordered)}>')
+
+
+def subscribe(callback):
+    """订阅笔记变更，callback(change_set) 在事务提交后调用；重复订阅会被忽略"""
+    with _subscribers_lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    with _subscribers_lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def _pending(session):
+    changes = session.info.get(_SESSION_KEY)
+    if changes is None:
+        changes = NoteChangeSet()
+        session.info[_SESSION_KEY] = changes
+    return changes
+
+
+def pending_changes(session):
+    """本次事务中已登记、尚未分发的变更集，没有变更时返回None"""
+    return session.info.get(_SESSION_KEY)
+
+
+def mark_notes_changed(session, file_id, upserted_ids=(), deleted_ids=(), reordered_ids=()):
+    """
+    手动登记变更，用于绕过ORM单对象flush的批量语句
+
+    Args:
+        session: 当前数据库会话
+        file_id: 文件ID
+        upserted_ids: 新增或修改的笔记ID
+        deleted_ids: 删除的笔记ID
+        reordered_ids: 内容未变、只调整顺序的笔记ID
+    """
+    changes = _pending(session)
+    changes.add_file(file_id)
+    for note_id in upserted_ids:
+        changes.add(note_id, file_id)
+    for note_id in deleted_ids:
+        changes.add(note_id, file_id, deleted=True)
+    for note_id in reordered_ids:
+        changes.add_reordered(note_id, file_id)
+
+
+def _after_flush(session, flush_context):
+    # after_flush 中 new/dirty/deleted 仍是flush前的状态，且新对象已分配ID
+    targets = [(obj, False) for obj in session.new if isinstance(obj, Note)]
+    targets += [(obj, False) for obj in session.dirty if isinstance(obj, Note) and session.is_modified(obj)]
+    targets += [(obj, True) for obj in session.deleted if isinstance(obj, Note)]
+    if not targets:
+        return
+    changes = _pending(session)
+    for note, deleted in targets:
+        changes.add(note.id, note.file_id, deleted=deleted)
+
+
+def _after_commit(session):
+    changes = session.info.pop(_SESSION_KEY, None)
+    if not changes:
+        return
+    with _subscribers_lock:
+        callbacks = list(_subscribers)
+    for callback in callbacks:
+        try:
+            callback(changes)
+        except Exception as e:
+            logger.error(f"笔记变更回调执行失败 {callback}: {str(e)}")
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def install():
+    """注册会话事件监听，重复调用无副作用"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _installed = True
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: note_text.py
+模块: 服务层 - 笔记派生文本
+描述: 维护笔记的Markdown和纯文本派生列，写入时计算，读取方直接使用
+功能:
+    - 根据笔记内容和格式计算Markdown与纯文本
+    - text格式的笔记以块级HTML标签开头时（编辑器或应用优化写入）按HTML转换
+    - 笔记插入或内容、格式变更时在同一次flush中刷新派生列
+    - 为已有数据库补充派生列并分批回填
+    - 提供 flask backfill-note-text 命令
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - sqlalchemy: 映射器事件与批量更新
+    - click: 命令行参数
+    - app.utils.html_markdown: HTML转Markdown
+    - app.utils.text: 去除HTML标签
+
+注意事项:
+    - 派生列为NULL表示尚未回填，读取方应通过 plain_text_of / markdown_of 退回实时计算
+    - 绕过ORM写入笔记时需要用 derive_note_text 一并写入派生列
+
+许可证: Apache-2.0
+"""
+
+import re
+import logging
+import click
+from sqlalchemy import event, bindparam, inspect as sa_inspect, text
+from app.extensions import db
+from app.models.note import Note
+from app.utils.html_markdown import html_to_markdown
+from app.utils.text import strip_html
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 500
+
+# text格式中以这些块级标签开头的内容视为HTML，其余按纯文本原样保留
+_HTML_BLOCK_START = re.compile(r'\s*<(?:p|h[1-6]|ul|ol|blockquote|pre|hr|div)[\s>/]', re.IGNORECASE)
+
+# 早于派生列的数据库需要补充的列
+_ADDED_COLUMNS = (
+    ('markdown', 'TEXT'),
+    ('plain_text', 'TEXT'),
+)
+
+_installed = False
+
+
+def render_markdown(content, format_type):
+    """
+    按笔记格式得到Markdown：HTML内容单遍转换，纯文本只去掉首尾空白
+
+    Args:
+        content: 笔记内容
+        format_type: 笔记格式
+
+    Returns:
+        str: Markdown文本
+    """
+    if not content:
+        return ''
+    if (format_type and format_type != 'text') or _HTML_BLOCK_START.match(content):
+        try:
+            return html_to_markdown(content)
+        except Exception as e:
+            # 转换失败时退回纯文本
+            logger.warning(f"笔记内容转换markdown失败，使用纯文本: {str(e)}")
+            return strip_html(content)
+    return content.strip()
+
+
+def derive_note_text(content, format_type):
+    """计算笔记的派生文本，返回 (markdown, plain_text)"""
+    return render_markdown(content, format_type), strip_html(content)
+
+
+def markdown_of(note):
+    """笔记的Markdown，派生列尚未回填时实时计算"""
+    if note.markdown is not None:
+        return note.markdown
+    return render_markdown(note.content, note.format)
+
+
+def plain_text_of(plain_text, content):
+    """笔记的纯文本，派生列尚未回填时实时计算"""
+    return plain_text if plain_text is not None else strip_html(content)
+
+
+def refresh(note):
+    """按当前内容刷新笔记对象的派生列"""
+    note.markdown, note.plain_text = derive_note_text(note.content, note.format)
+
+
+# ==================== 写入时计算 ====================
+
+def _before_insert(mapper, connection, target):
+    refresh(target)
+
+
+def _before_update(mapper, connection, target):
+    state = sa_inspect(target)
+    if (state.attrs.content.history.has_changes() or state.attrs.format.history.has_changes()
+            or target.plain_text is None):
+        refresh(target)
+
+
+def install():
+    """注册笔记映射器事件，重复调用无副作用"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Note, 'before_insert', _before_insert)
+    event.listen(Note, 'before_update', _before_update)
+    _installed = True
+
+
+def ensure_columns(engine):
+    """为早于派生列的数据库补充列，db.create_all 不会修改已有的表"""
+    inspector = sa_inspect(engine)
+    if not inspector.has_table(Note.__tablename__):
+        return
+    existing = {column['name'] for column in inspector.get_columns(Note.__tablename__)}
+    for column, definition in _ADDED_COLUMNS:
+        if column not in existing:
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {Note.__tablename__} ADD COLUMN {column} {definition}'))
+            logger.info(f"笔记表已补充派生列 {column}")
+
+
+# ==================== 回填 ====================
+
+def backfill(batch_size=BACKFILL_BATCH, recompute=False):
+    """
+    分批回填派生列，需要在应用上下文中调用
+
+    Args:
+        batch_size: 每批处理的笔记数
+        recompute: 为True时重新计算所有笔记，否则只处理尚未回填的笔记
+
+    Returns:
+        int: 更新的笔记数
+    """
+    table = Note.__table__
+    # 保留原更新时间，避免回填使内容指纹和索引失效
+    statement = table.update() \
+        .where(table.c.id == bindparam('_id')) \
+        .values(markdown=bindparam('_markdown'), plain_text=bindparam('_plain_text'),
+                updated_at=bindparam('_updated_at'))
+
+    updated = 0
+    last_id = 0
+    while True:
+        query = db.session.query(Note.id, Note.content, Note.format, Note.updated_at) \
+            .filter(Note.id > last_id)
+        if not recompute:
+            query = query.filter(Note.plain_text.is_(None))
+        rows = query.order_by(Note.id.asc()).limit(batch_size).all()
+        if not rows:
+            break
+        params = []
+        for note_id, content, format_type, updated_at in rows:
+            markdown, plain_text = derive_note_text(content, format_type)
+            params.append({'_id': note_id, '_markdown': markdown, '_plain_text': plain_text,
+                           '_updated_at': updated_at})
+        db.session.execute(statement, params)
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+    return updated
+
+
+@click.command('backfill-note-text')
+@click.option('--batch-size', default=BACKFILL_BATCH, show_default=True, help='每批处理的笔记数')
+@click.option('--all', 'recompute', is_flag=True, help='重新计算所有笔记（转换规则变化后使用）')
+def backfill_command(batch_size, recompute):
+    """回填笔记的Markdown和纯文本派生列"""
+    updated = backfill(batch_size=batch_size, recompute=recompute)
+    click.echo(f'已更新 {updated} 条笔记的派生文本')
+
+
+def init_app(app):
+    """补充派生列、注册写入事件和回填命令"""
+    with app.app_context():
+        ensure_columns(db.engine)
+    install()
+    app.cli.add_command(backfill_command)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: optimization_report.py
+模块: AI服务 - 优化报告
+描述: 以块和行哈希为单位比较原始内容与优化结果，生成结构化的改动统计
+功能:
+    - 快速统计（长度、词数），不做差异比较
+    - 块级差异：按空行切分为块，比较块哈希
+    - 行级差异：修改过的块内部按行哈希比较
+    - 时间和规模预算，超出预算时退化为多重集合统计
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - bisect: 最长递增子序列
+    - collections: 多重集合计数
+
+注意事项:
+    - 差异算法为 patience diff：先去掉公共前后缀，再以两侧都只出现一次的元素为锚点
+      递归切分，锚点通过最长递增子序列选取，整体接近线性
+    - 没有唯一锚点的区间直接视为替换，不做二次方复杂度的最优对齐
+
+许可证: Apache-2.0
+"""
+
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+
+DEFAULT_BUDGET_MS = 200
+MAX_UNITS = 200000
+MAX_ENTRIES = 200
+PREVIEW_LENGTH = 60
+
+_BLOCK_SEPARATOR = re.compile(r'\n[ \t]*\n')
+
+
+class _Budget:
+    """差异计算的时间预算"""
+
+    def __init__(self, budget_ms):
+        self.deadline = time.perf_counter() + budget_ms / 1000.0
+        self.exhausted = False
+
+    def check(self):
+        if not self.exhausted and time.perf_counter() > self.deadline:
+            self.exhausted = True
+        return self.exhausted
+
+
+def split_blocks(text):
+    """按空行切分为块，与笔记应用时的分块方式一致"""
+    if not text or not text.strip():
+        return []
+    return [block.strip() for block in _BLOCK_SEPARATOR.split(text.strip()) if block.strip()]
+
+
+def _longest_increasing(pairs):
+    """pairs 按第一项递增，返回第二项递增的最长子序列"""
+    tails = []
+    tail_index = []
+    previous = [-1] * len(pairs)
+    for index, (_, value) in enumerate(pairs):
+        position = bisect_left(tails, value)
+        if position == len(tails):
+            tails.append(value)
+            tail_index.append(index)
+        else:
+            tails[position] = value
+            tail_index[position] = index
+        previous[index] = tail_index[position - 1] if position else -1
+    result = []
+    index = tail_index[-1] if tail_index else -1
+    while index >= 0:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+
+def diff_opcodes(a, b, budget=None):
+    """
+    比较两个哈希序列，返回与 difflib 相同格式的操作码
+
+    Args:
+        a: 原始序列（可哈希元素）
+        b: 新序列
+        budget: 时间预算，超出后剩余区间按整体替换处理
+
+    Returns:
+        list: [(tag, i1, i2, j1, j2)]，tag 为 equal/replace/delete/insert
+    """
+    opcodes = []
+    # 显式栈代替递归：区间项为 (a_lo, a_hi, b_lo, b_hi)，标记项为 ('equal', ...)，按入栈的相反顺序处理
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if isinstance(item[0], str):
+            opcodes.append(item)
+            continue
+        a_lo, a_hi, b_lo, b_hi = item
+
+        prefix = 0
+        while a_lo + prefix < a_hi and b_lo + prefix < b_hi and a[a_lo + prefix] == b[b_lo + prefix]:
+            prefix += 1
+        if prefix:
+            opcodes.append(('equal', a_lo, a_lo + prefix, b_lo, b_lo + prefix))
+            a_lo += prefix
+            b_lo += prefix
+
+        suffix = 0
+        while a_hi - suffix > a_lo and b_hi - suffix > b_lo and a[a_hi - suffix - 1] == b[b_hi - suffix - 1]:
+            suffix += 1
+        a_hi -= suffix
+        b_hi -= suffix
+        if suffix:
+            stack.append(('equal', a_hi, a_hi + suffix, b_hi, b_hi + suffix))
+
+        if a_lo == a_hi and b_lo == b_hi:
+            continue
+        if a_lo == a_hi:
+            opcodes.append(('insert', a_lo, a_hi, b_lo, b_hi))
+            continue
+        if b_lo == b_hi:
+            opcodes.append(('delete', a_lo, a_hi, b_lo, b_hi))
+            continue
+
+        anchors = [] if budget is not None and budget.check() else _unique_anchors(a, a_lo, a_hi, b, b_lo, b_hi)
+        if not anchors:
+            opcodes.append(('replace', a_lo, a_hi, b_lo, b_hi))
+            continue
+
+        # 锚点之间的区间和锚点本身（相等元素）逆序入栈
+        pending = []
+        i, j = a_lo, b_lo
+        for ai, bj in anchors:
+            pending.append((i, ai, j, bj))
+            pending.append(('equal', ai, ai + 1, bj, bj + 1))
+            i, j = ai + 1, bj + 1
+        pending.append((i, a_hi, j, b_hi))
+        stack.extend(reversed(pending))
+
+    return _merge(opcodes)
+
+
+def _unique_anchors(a, a_lo, a_hi, b, b_lo, b_hi):
+    counts_a = Counter(a[a_lo:a_hi])
+    counts_b = Counter(b[b_lo:b_hi])
+    positions_b = {}
+    for j in range(b_lo, b_hi):
+        item = b[j]
+        if counts_b[item] == 1 and counts_a.get(item) == 1:
+            positions_b[item] = j
+    pairs = [(i, positions_b[a[i]]) for i in range(a_lo, a_hi) if a[i] in positions_b]
+    return _longest_increasing(pairs)
+
+
+def _merge(opcodes):
+    merged = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if i1 == i2 and j1 == j2:
+            continue
+        if merged and merged[-1][0] == tag and merged[-1][2] == i1 and merged[-1][4] == j1:
+            merged[-1] = (tag, merged[-1][1], i2, merged[-1][3], j2)
+        else:
+            merged.append((tag, i1, i2, j1, j2))
+    return merged
+
+
+def _line_changes(original_block, optimized_block, budget):
+    """修改块内部的行级增删数量"""
+    a = [hash(line.strip()) for line in original_block.split('\n')]
+    b = [hash(line.strip()) for line in optimized_block.split('\n')]
+    if budget.check():
+        common = sum((Counter(a) & Counter(b)).values())
+        return len(b) - common, len(a) - common
+    added = removed = 0
+    for tag, i1, i2, j1, j2 in diff_opcodes(a, b, budget):
+        if tag != 'equal':
+            removed += i2 - i1
+            added += j2 - j1
+    return added, removed
+
+
+def _preview(block):
+    return block[:PREVIEW_LENGTH].replace('\n', ' ') if block is not None else None
+
+
+def summarize(original, optimized, optimization_type=None, improvements=None):
+    """
+    快速统计，不做差异比较，随优化结果一起返回
+
+    Returns:
+        dict: 长度和词数统计，detailed 为 False
+    """
+    original = original or ''
+    optimized = optimized or ''
+    original_words = len(original.split())
+    optimized_words = len(optimized.split())
+    return {
+        'optimization_type': optimization_type,
+        'original_length': len(original),
+        'optimized_length': len(optimized),
+        'length_change': len(optimized) - len(original),
+        'original_words': original_words,
+        'optimized_words': optimized_words,
+        'word_change': optimized_words - original_words,
+        'changes_detected': original != optimized,
+        'improvements': improvements or [],
+        'detailed': False
+    }
+
+
+def build_report(original, optimized, optimization_type=None, improvements=None,
+                 budget_ms=DEFAULT_BUDGET_MS, max_entries=MAX_ENTRIES):
+    """
+    生成包含块级改动明细的优化报告
+
+    Args:
+        original: 原始内容
+        optimized: 优化后内容
+        optimization_type: 优化类型
+        improvements: 改进项目说明
+        budget_ms: 差异计算的时间预算（毫秒）
+        max_entries: 返回的块改动明细最大条数
+
+    Returns:
+        dict: summarize 的字段，加上 changes_count、blocks、lines、block_changes 等
+    """
+    started = time.perf_counter()
+    budget = _Budget(budget_ms)
+    report = summarize(original, optimized, optimization_type, improvements)
+    a_blocks = split_blocks(original)
+    b_blocks = split_blocks(optimized)
+    a_hashes = [hash(block) for block in a_blocks]
+    b_hashes = [hash(block) for block in b_blocks]
+
+    blocks = {'original': len(a_blocks), 'optimized': len(b_blocks),
+              'unchanged': 0, 'modified': 0, 'added': 0, 'removed': 0}
+    lines = {'added': 0, 'removed': 0}
+    entries = []
+
+    def record(entry):
+        if len(entries) < max_entries:
+            entries.append(entry)
+
+    if len(a_blocks) + len(b_blocks) > MAX_UNITS:
+        # 超出规模预算：只按多重集合统计相同的块
+        method = 'multiset'
+        common = sum((Counter(a_hashes) & Counter(b_hashes)).values())
+        blocks['unchanged'] = common
+        blocks['removed'] = len(a_blocks) - common
+        blocks['added'] = len(b_blocks) - common
+        budget.exhausted = True
+    else:
+        method = 'patience'
+        for tag, i1, i2, j1, j2 in diff_opcodes(a_hashes, b_hashes, budget):
+            if tag == 'equal':
+                blocks['unchanged'] += i2 - i1
+                continue
+            paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+            for offset in range(paired):
+                added, removed = _line_changes(a_blocks[i1 + offset], b_blocks[j1 + offset], budget)
+                blocks['modified'] += 1
+                lines['added'] += added
+                lines['removed'] += removed
+                record({'op': 'modified', 'original_index': i1 + offset, 'optimized_index': j1 + offset,
+                        'lines_added': added, 'lines_removed': removed,
+                        'original_preview': _preview(a_blocks[i1 + offset]),
+                        'optimized_preview': _preview(b_blocks[j1 + offset])})
+            for index in range(i1 + paired, i2):
+                count = a_blocks[index].count('\n') + 1
+                blocks['removed'] += 1
+                lines['removed'] += count
+                record({'op': 'removed', 'original_index': index, 'optimized_index': None,
+                        'lines_added': 0, 'lines_removed': count,
+                        'original_preview': _preview(a_blocks[index]), 'optimized_preview': None})
+            for index in range(j1 + paired, j2):
+                count = b_blocks[index].count('\n') + 1
+                blocks['added'] += 1
+                lines['added'] += count
+                record({'op': 'added', 'original_index': None, 'optimized_index': index,
+                        'lines_added': count, 'lines_removed': 0,
+                        'original_preview': None, 'optimized_preview': _preview(b_blocks[index])})
+
+    total_changes = blocks['modified'] + blocks['added'] + blocks['removed']
+    changes_count = total_changes
+    if changes_count == 0 and report['changes_detected']:
+        changes_count = 1  # 只有空白差异时至少算一处改动
+
+    report.update({
+        'changes_count': changes_count,
+        'blocks': blocks,
+        'lines': lines,
+        'block_changes': entries,
+        'block_changes_truncated': total_changes > len(entries),
+        'method': method,
+        'exact': not budget.exhausted,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        'detailed': True
+    })
+    return report
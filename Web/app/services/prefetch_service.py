@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: prefetch_service.py
+模块: AI服务 - 内容预收集
+描述: 在打开文件或编辑停顿后于后台提前生成收集产物
+功能:
+    - 收集产物带内容指纹，内容未变化时之后的收集直接复用，不再重复查询和转换
+    - 可选的预收集模式：打开文件时或最后一次编辑空闲一段时间后，由后台线程提前收集
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.1
+
+依赖:
+    - app.services.debounced_worker: 按文件防抖的后台任务（与摘要刷新共用）
+    - app.services.data_processor: 内容收集（按指纹复用收集产物）
+
+配置项:
+    - AI_PREFETCH_ENABLED: 是否启用预收集，默认关闭
+    - AI_PREFETCH_IDLE_DELAY: 编辑后空闲多少秒触发预收集
+    - AI_PREFETCH_WORKERS: 预收集的最大并发数
+    - AI_PREFETCH_INTERVAL: 调度线程检查间隔（秒）
+
+许可证: Apache-2.0
+"""
+
+import time
+import logging
+from app.services.debounced_worker import DebouncedFileWorker
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchService:
+    """内容预收集服务"""
+
+    def __init__(self, data_processor, idle_delay=10.0, max_workers=1, clock=time.monotonic):
+        self.data_processor = data_processor
+        self._worker = DebouncedFileWorker(self._prefetch_in_background, idle_delay, max_workers,
+                                           name='collect-prefetch', clock=clock)
+
+    @property
+    def enabled(self):
+        return self._worker.enabled
+
+    @property
+    def idle_delay(self):
+        return self._worker.delay
+
+    @property
+    def max_workers(self):
+        return self._worker.max_workers
+
+    def init_app(self, app):
+        """根据应用配置启用预收集"""
+        if not app.config.get('AI_PREFETCH_ENABLED', False):
+            return
+        self._worker.delay = float(app.config.get('AI_PREFETCH_IDLE_DELAY', self.idle_delay))
+        self._worker.max_workers = int(app.config.get('AI_PREFETCH_WORKERS', self.max_workers))
+        interval = float(app.config.get('AI_PREFETCH_INTERVAL', 2.0))
+        self.start(app, interval)
+
+    def start(self, app, interval=2.0):
+        """订阅笔记变更并启动调度线程，重复调用无副作用"""
+        self._worker.start(app, interval)
+        logger.info(f"内容预收集已启用: 空闲延迟={self.idle_delay}s, 并发={self.max_workers}")
+
+    def stop(self):
+        self._worker.stop()
+
+    def request(self, file_id):
+        """
+        打开文件时请求预收集
+
+        Returns:
+            bool: 是否已提交到后台（未启用、已在进行中时返回False）
+        """
+        return self._worker.submit(file_id)
+
+    def run_pending(self, now=None):
+        """
+        提交编辑后已空闲超过 idle_delay 的文件进行预收集
+
+        Returns:
+            list: 本次提交的文件ID
+        """
+        return self._worker.run_pending(now)
+
+    def _prefetch_in_background(self, file_id):
+        result = self.data_processor.prefetch_collection(file_id)
+        if result['success'] and not result.get('cached'):
+            metrics.incr('collect.prefetched')
+
+    def get_stats(self):
+        stats = self._worker.get_stats()
+        stats['idle_delay'] = self.idle_delay
+        return stats
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: related_index.py
+模块: 服务层 - 相关笔记索引
+描述: 基于哈希向量的本地相关笔记索引，向量矩阵持久化为内存映射文件
+功能:
+    - 笔记纯文本（写入时计算的派生列）转为定长哈希词频向量并做L2归一化
+    - 笔记写入后增量更新索引，启动时按更新时间与数据库对账
+    - 分块矩阵乘法批量计算余弦相似度并取前k个结果
+    - 相关笔记和相关文件查询
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - numpy: 向量矩阵与内存映射文件
+    - app.services.note_events: 笔记变更事件
+
+配置项:
+    - RELATED_INDEX_DIR: 索引文件目录，为空时只保存在内存中
+    - RELATED_INDEX_DIM: 哈希向量维度，修改后索引会重建
+
+注意事项:
+    - 索引文件由单个进程写入，多进程部署时每个进程应使用独立目录
+    - 变更只在事务提交时登记，向量在下一次查询前批量计算
+
+许可证: Apache-2.0
+"""
+
+import os
+import math
+import zlib
+import threading
+import logging
+from collections import Counter
+import numpy as np
+from app.extensions import db
+from app.models.note import Note
+from app.services import note_events
+from app.services.note_text import plain_text_of
+from app.utils.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = 'vectors.npy'
+ROWS_FILE = 'rows.npy'
+
+# rows 矩阵的列：笔记ID、文件ID、笔记更新时间戳；笔记ID为0表示空行
+COL_NOTE, COL_FILE, COL_STAMP = 0, 1, 2
+
+MIN_CAPACITY = 1024
+FETCH_BATCH = 500
+
+
+def _stamp(updated_at):
+    return updated_at.timestamp() if updated_at else 0.0
+
+
+class RelatedNotesIndex:
+    """相关笔记向量索引"""
+
+    def __init__(self, index_dir=None, dim=1024, chunk_rows=8192, min_score=0.1):
+        self.index_dir = index_dir
+        self.dim = dim
+        self.chunk_rows = chunk_rows
+        self.min_score = min_score
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._rows = np.zeros((0, 3), dtype=np.float64)
+        self._row_of = {}
+        self._free = []
+        self._pending_upserts = set()
+        self._pending_deletes = set()
+        self._reconciled = False
+
+    def init_app(self, app):
+        """根据应用配置打开索引并订阅笔记变更"""
+        with self._lock:
+            self.index_dir = app.config.get('RELATED_INDEX_DIR')
+            self.dim = int(app.config.get('RELATED_INDEX_DIM', self.dim))
+            self._reset()
+            self._open()
+        note_events.subscribe(self._on_notes_changed)
+
+    # ==================== 存储 ====================
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _open(self):
+        if not self.index_dir:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        try:
+            if os.path.exists(self._path(VECTORS_FILE)) and os.path.exists(self._path(ROWS_FILE)):
+                vectors = np.load(self._path(VECTORS_FILE), mmap_mode='r+')
+                rows = np.load(self._path(ROWS_FILE), mmap_mode='r+')
+                if vectors.shape[1] == self.dim and vectors.shape[0] == rows.shape[0]:
+                    self._vectors, self._rows = vectors, rows
+                    self._rebuild_row_map()
+                    logger.info(f"相关笔记索引已加载: {len(self._row_of)} 条, 容量 {rows.shape[0]}")
+                    return
+                logger.warning("相关笔记索引维度不一致，将重建")
+        except Exception as e:
+            logger.warning(f"相关笔记索引加载失败，将重建: {str(e)}")
+        self._vectors, self._rows = self._allocate(MIN_CAPACITY)
+        self._rebuild_row_map()
+
+    def _rebuild_row_map(self):
+        note_ids = self._rows[:, COL_NOTE].astype(np.int64)
+        occupied = np.flatnonzero(note_ids > 0)
+        self._row_of = {int(note_ids[row]): int(row) for row in occupied}
+        self._free = sorted(np.flatnonzero(note_ids <= 0).tolist(), reverse=True)
+
+    def _allocate(self, capacity):
+        """分配指定容量的矩阵，持久化模式下写入临时文件后原子替换"""
+        if not self.index_dir:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            rows = np.zeros((capacity, 3), dtype=np.float64)
+            used = min(capacity, self._rows.shape[0])
+            vectors[:used] = self._vectors[:used]
+            rows[:used] = self._rows[:used]
+            return vectors, rows
+
+        result = []
+        for name, old, shape, dtype in (
+            (VECTORS_FILE, self._vectors, (capacity, self.dim), np.float32),
+            (ROWS_FILE, self._rows, (capacity, 3), np.float64),
+        ):
+            tmp_path = self._path(name + '.tmp')
+            new = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+            used = min(capacity, old.shape[0])
+            if used and old.shape[1:] == shape[1:]:
+                new[:used] = old[:used]
+            new.flush()
+            del new
+            os.replace(tmp_path, self._path(name))
+            result.append(np.load(self._path(name), mmap_mode='r+'))
+        return tuple(result)
+
+    def _grow(self):
+        capacity = max(MIN_CAPACITY, self._rows.shape[0] * 2)
+        old_capacity = self._rows.shape[0]
+        self._vectors, self._rows = self._allocate(capacity)
+        self._free = list(range(capacity - 1, old_capacity - 1, -1)) + self._free
+
+    def _flush(self):
+        if self.index_dir:
+            self._vectors.flush()
+            self._rows.flush()
+
+    # ==================== 向量化 ====================
+
+    def vectorize(self, text):
+        """将笔记纯文本转为L2归一化的哈希词频向量（次线性词频）"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts = Counter(tokenize(text or ''))
+        if not counts:
+            return vector
+        hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) for token in counts),
+                             dtype=np.int64, count=len(counts))
+        weights = np.fromiter((1.0 + math.log(tf) for tf in counts.values()),
+                              dtype=np.float32, count=len(counts))
+        # 高位决定符号，抵消哈希冲突带来的偏差
+        signs = np.where((hashes >> 31) & 1, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dim, weights * signs)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    # ==================== 增量更新 ====================
+
+    def _on_notes_changed(self, change_set):
+        # 在事务提交回调中调用，只登记变更
+        with self._pending_lock:
+            for note_id in change_set.upserted:
+                self._pending_upserts.add(note_id)
+                self._pending_deletes.discard(note_id)
+            for note_id in change_set.deleted:
+                self._pending_deletes.add(note_id)
+                self._pending_upserts.discard(note_id)
+            # 批量删除整个文件时无法得知笔记ID，对账时处理
+            if change_set.files and not (change_set.upserted or change_set.deleted):
+                self._reconciled = False
+
+    def _reconcile(self):
+        """与数据库对账：更新时间不一致或缺失的笔记重新向量化，不存在的笔记删除"""
+        stamps = {note_id: _stamp(updated_at)
+                  for note_id, updated_at in db.session.query(Note.id, Note.updated_at)}
+        upserts = [note_id for note_id, stamp in stamps.items()
+                   if note_id not in self._row_of
+                   or self._rows[self._row_of[note_id], COL_STAMP] != stamp]
+        deletes = [note_id for note_id in self._row_of if note_id not in stamps]
+        with self._pending_lock:
+            self._pending_upserts.update(upserts)
+            self._pending_deletes.update(deletes)
+        self._reconciled = True
+        if upserts or deletes:
+            logger.info(f"相关笔记索引对账: 更新 {len(upserts)} 条, 删除 {len(deletes)} 条")
+
+    def sync(self):
+        """应用待处理的变更，需要在应用上下文中调用"""
+        with self._lock:
+            if not self._reconciled:
+                self._reconcile()
+            with self._pending_lock:
+                upserts = list(self._pending_upserts)
+                deletes = list(self._pending_deletes)
+                self._pending_upserts.clear()
+                self._pending_deletes.clear()
+            if not upserts and not deletes:
+                return 0
+
+            for note_id in deletes:
+                self._remove(note_id)
+            found = set()
+            for start in range(0, len(upserts), FETCH_BATCH):
+                batch = upserts[start:start + FETCH_BATCH]
+                rows = db.session.query(Note.id, Note.file_id, Note.plain_text, Note.content, Note.updated_at) \
+                    .filter(Note.id.in_(batch)).all()
+                for note_id, file_id, plain_text, content, updated_at in rows:
+                    text = plain_text_of(plain_text, content)
+                    self._put(note_id, file_id or 0, self.vectorize(text), _stamp(updated_at))
+                    found.add(note_id)
+            # 登记后又被删除的笔记
+            for note_id in set(upserts) - found:
+                self._remove(note_id)
+            self._flush()
+            return len(upserts) + len(deletes)
+
+    def _put(self, note_id, file_id, vector, stamp):
+        row = self._row_of.get(note_id)
+        if row is None:
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self._row_of[note_id] = row
+        self._vectors[row] = vector
+        self._rows[row] = (note_id, file_id, stamp)
+
+    def _remove(self, note_id):
+        row = self._row_of.pop(note_id, None)
+        if row is None:
+            return
+        self._vectors[row] = 0
+        self._rows[row] = 0
+        self._free.append(row)
+
+    # ==================== 查询 ====================
+
+    def _scores(self, queries):
+        """分块计算所有行与查询向量的相似度，多个查询向量时取最大值"""
+        capacity = self._rows.shape[0]
+        scores = np.empty(capacity, dtype=np.float32)
+        for start in range(0, capacity, self.chunk_rows):
+            block = np.asarray(self._vectors[start:start + self.chunk_rows])
+            scores[start:start + block.shape[0]] = (block @ queries.T).max(axis=1)
+        scores[self._rows[:, COL_NOTE] <= 0] = -np.inf
+        return scores
+
+    def _top_rows(self, scores, k):
+        candidates = np.flatnonzero(scores >= self.min_score)
+        if candidates.size > k:
+            part = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[part]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    def related_notes(self, note_id, k=10, include_same_file=False):
+        """
+        查询与指定笔记最相似的笔记
+
+        Returns:
+            list: [{'note_id', 'file_id', 'score'}]，笔记不存在时返回None
+        """
+        with self._lock:
+            self.sync()
+            row = self._row_of.get(note_id)
+            if row is None:
+                return None
+            query = np.asarray(self._vectors[row:row + 1])
+            if not query.any():
+                return []
+            scores = self._scores(query)
+            scores[row] = -np.inf
+            if not include_same_file:
+                scores[self._rows[:, COL_FILE] == self._rows[row, COL_FILE]] = -np.inf
+            return [self._describe(r, scores[r]) for r in self._top_rows(scores, k)]
+
+    def related_files(self, file_id, k=10):
+        """
+        查询与指定文件最相关的其他文件，文件相关度取两文件笔记间的最大相似度
+
+        Returns:
+            list: [{'file_id', 'score', 'note_id'}]，note_id 为该文件中最相似的笔记
+        """
+        with self._lock:
+            self.sync()
+            file_rows = np.flatnonzero((self._rows[:, COL_FILE] == file_id) & (self._rows[:, COL_NOTE] > 0))
+            if file_rows.size == 0:
+                return []
+            queries = np.asarray(self._vectors[file_rows])
+            queries = queries[queries.any(axis=1)]
+            if queries.shape[0] == 0:
+                return []
+            scores = self._scores(queries)
+            scores[self._rows[:, COL_FILE] == file_id] = -np.inf
+
+            # 先取足够多的候选笔记，再按文件去重
+            results = {}
+            for row in self._top_rows(scores, k * 20):
+                other = int(self._rows[row, COL_FILE])
+                if other not in results:
+                    results[other] = {
+                        'file_id': other,
+                        'score': round(float(scores[row]), 4),
+                        'note_id': int(self._rows[row, COL_NOTE])
+                    }
+                    if len(results) >= k:
+                        break
+            return list(results.values())
+
+    def _describe(self, row, score):
+        return {
+            'note_id': int(self._rows[row, COL_NOTE]),
+            'file_id': int(self._rows[row, COL_FILE]),
+            'score': round(float(score), 4)
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'persisted': bool(self.index_dir),
+                'dim': self.dim,
+                'notes': len(self._row_of),
+                'capacity': int(self._rows.shape[0]),
+                'pending': len(self._pending_upserts) + len(self._pending_deletes)
+            }
+
+
+related_index = RelatedNotesIndex()
@@ -0,0 +1,589 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: revision_store.py
+模块: 服务层 - 文件修订版本
+描述: 在笔记写入和应用AI优化时记录文件版本，相邻版本之间存差量、定期存完整快照，支持按时间点重建和恢复
+功能:
+    - 事务提交前根据本次的笔记变更集记录版本：只含变化笔记的差量，或完整快照
+    - 版本链长度达到上限、或差量累计字节超过快照本身时写入新快照，重建任意版本读取的记录数有上界
+    - 短时间内的连续编辑合并到同一个版本
+    - 应用优化前把当前状态标记为备份点（文件还没有版本时先写入快照）
+    - 按文件分页列出版本，按版本ID或时间点重建文件内容
+    - 后台压缩：近期版本全部保留，较早的按小时、再按天稀疏，超过保留天数的删除，
+      被删除版本之后的记录改写为相对上一保留版本的差量或快照
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - zlib / json: 版本内容编码
+    - sqlalchemy: 会话事件
+    - app.models.note_revision: 修订版本模型
+    - app.services.note_events: 本次事务的笔记变更集
+
+配置项:
+    - REVISIONS_ENABLED: 是否记录版本
+    - REVISION_SNAPSHOT_INTERVAL: 两个快照之间最多的差量版本数
+    - REVISION_COALESCE_SECONDS: 连续编辑合并为一个版本的时间窗口
+    - REVISION_KEEP_ALL_HOURS: 全部保留的最近小时数
+    - REVISION_THIN_MINUTES: 稀疏后每个时间段保留一个版本的时长（分钟）
+    - REVISION_DAILY_AFTER_DAYS: 超过该天数后每天只保留一个版本
+    - REVISION_MAX_AGE_DAYS: 版本保留天数（每个文件的最新版本始终保留）
+    - REVISION_COMPACT_ENABLED / REVISION_COMPACT_INTERVAL: 后台压缩开关和间隔（秒）
+
+注意事项:
+    - 版本内容为 zlib 压缩的 JSON。快照为 {"notes": [[id, order, format, content]]}，
+      差量为 {"set": [[id, order, format, content]], "move": [[id, order]], "del": [id]}
+    - 记录在 before_commit 中以批量语句写入，与笔记修改在同一事务中提交；
+      记录失败时只记日志，该文件的下一个版本改为完整快照
+
+许可证: Apache-2.0
+"""
+
+import json
+import zlib
+import time
+import datetime
+import threading
+import logging
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.models.note_revision import NoteRevision
+from app.services import note_events
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SQL_BATCH = 500
+
+KIND_SNAPSHOT = 'snapshot'
+KIND_DELTA = 'delta'
+
+REASON_EDIT = 'edit'
+REASON_BASELINE = 'baseline'
+
+_REASON_KEY = 'revision_reason'
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _chunks(items, size=SQL_BATCH):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _encode(payload):
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def _delta_payload(sets, moves, deleted):
+    payload = {}
+    if sets:
+        payload['set'] = sorted(sets)
+    if moves:
+        payload['move'] = sorted(moves)
+    if deleted:
+        payload['del'] = sorted(deleted)
+    return payload
+
+
+def apply_payload(state, kind, payload):
+    """
+    把一个版本应用到文件状态
+
+    Args:
+        state: dict，笔记ID -> (顺序, 格式, 内容)，原地修改
+        kind: 版本类型
+        payload: 解码后的版本内容
+    """
+    if kind == KIND_SNAPSHOT:
+        state.clear()
+        for note_id, order, format_type, content in payload['notes']:
+            state[note_id] = (order, format_type, content)
+        return state
+    for note_id in payload.get('del', ()):
+        state.pop(note_id, None)
+    for note_id, order, format_type, content in payload.get('set', ()):
+        state[note_id] = (order, format_type, content)
+    for note_id, order in payload.get('move', ()):
+        if note_id in state:
+            state[note_id] = (order,) + state[note_id][1:]
+    return state
+
+
+def merge_deltas(first, second):
+    """把相邻的两个差量合并为一个，效果等同于依次应用"""
+    sets = {row[0]: row for row in first.get('set', ())}
+    moves = {note_id: order for note_id, order in first.get('move', ())}
+    deleted = set(first.get('del', ()))
+    for note_id in second.get('del', ()):
+        sets.pop(note_id, None)
+        moves.pop(note_id, None)
+        deleted.add(note_id)
+    for row in second.get('set', ()):
+        sets[row[0]] = row
+        moves.pop(row[0], None)
+        deleted.discard(row[0])
+    for note_id, order in second.get('move', ()):
+        if note_id in sets:
+            sets[note_id] = [note_id, order] + list(sets[note_id][2:])
+        else:
+            moves[note_id] = order
+    return _delta_payload([list(row) for row in sets.values()], [list(item) for item in moves.items()], deleted)
+
+
+def diff_states(old, new):
+    """计算把状态 old 变为 new 的差量"""
+    sets = []
+    moves = []
+    for note_id, row in new.items():
+        before = old.get(note_id)
+        if before is None or before[1:] != row[1:]:
+            sets.append([note_id, *row])
+        elif before[0] != row[0]:
+            moves.append([note_id, row[0]])
+    deleted = [note_id for note_id in old if note_id not in new]
+    return _delta_payload(sets, moves, deleted)
+
+
+def _snapshot_payload(state):
+    return {'notes': sorted(([note_id, *row] for note_id, row in state.items()), key=lambda row: (row[1], row[0]))}
+
+
+class RevisionStore:
+    """文件修订版本服务"""
+
+    def __init__(self, snapshot_interval=32, coalesce_seconds=300, keep_all_hours=24, thin_minutes=60,
+                 daily_after_days=7, max_age_days=90, clock=datetime.datetime.utcnow):
+        self.enabled = False
+        self.snapshot_interval = snapshot_interval
+        self.coalesce_seconds = coalesce_seconds
+        self.keep_all_hours = keep_all_hours
+        self.thin_minutes = thin_minutes
+        self.daily_after_days = daily_after_days
+        self.max_age_days = max_age_days
+        self._clock = clock
+        self._installed = False
+        self._resync = set()  # 记录失败的文件，下一个版本写入完整快照
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'dropped': 0,
+            'rewritten': 0,
+            'purged': 0,
+            'last_run_at': None,
+            'last_duration_ms': None,
+            'last_error': None
+        }
+
+    def init_app(self, app):
+        """根据应用配置启用版本记录和后台压缩"""
+        self._app = app
+        self.enabled = bool(app.config.get('REVISIONS_ENABLED', True))
+        self.snapshot_interval = int(app.config.get('REVISION_SNAPSHOT_INTERVAL', self.snapshot_interval))
+        self.coalesce_seconds = float(app.config.get('REVISION_COALESCE_SECONDS', self.coalesce_seconds))
+        self.keep_all_hours = float(app.config.get('REVISION_KEEP_ALL_HOURS', self.keep_all_hours))
+        self.thin_minutes = float(app.config.get('REVISION_THIN_MINUTES', self.thin_minutes))
+        self.daily_after_days = float(app.config.get('REVISION_DAILY_AFTER_DAYS', self.daily_after_days))
+        self.max_age_days = float(app.config.get('REVISION_MAX_AGE_DAYS', self.max_age_days))
+        self.install()
+        if self.enabled and app.config.get('REVISION_COMPACT_ENABLED', False):
+            self.start(float(app.config.get('REVISION_COMPACT_INTERVAL', 3600)))
+
+    def install(self):
+        """注册提交前事件，重复调用无副作用"""
+        if self._installed:
+            return
+        event.listen(Session, 'before_commit', self._before_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+        self._installed = True
+
+    @staticmethod
+    def set_reason(session, reason):
+        """设置本次事务产生的版本的操作类型（默认 edit）"""
+        session.info[_REASON_KEY] = reason
+
+    # ==================== 记录 ====================
+
+    def _before_commit(self, session):
+        reason = session.info.pop(_REASON_KEY, REASON_EDIT)
+        if not self.enabled:
+            return
+        # 先写出尚未flush的对象，变更集才完整
+        session.flush()
+        changes = note_events.pending_changes(session)
+        if not changes:
+            return
+        for file_id in sorted(changes.files):
+            try:
+                self._record(session.connection(), file_id, changes, reason)
+            except Exception as e:
+                self._resync.add(file_id)
+                logger.error(f"记录文件 {file_id} 的版本失败: {str(e)}")
+
+    def _after_rollback(self, session):
+        session.info.pop(_REASON_KEY, None)
+
+    def _record(self, connection, file_id, changes, reason):
+        if connection.execute(select(NoteFile.id).where(NoteFile.id == file_id)).first() is None:
+            return
+        latest = self._latest(connection, file_id)
+        now = self._clock()
+        if latest is None or file_id in self._resync:
+            self._insert_snapshot(connection, file_id, reason, now)
+            return
+
+        payload = self._delta_from_changes(connection, file_id, changes)
+        if not payload:
+            return
+        notes_count = connection.execute(select(func.count(Note.id)).where(Note.file_id == file_id)).scalar()
+        table = NoteRevision.__table__
+
+        if reason == REASON_EDIT and latest.reason == REASON_EDIT and latest.kind == KIND_DELTA \
+                and not latest.pinned and (now - latest.created_at).total_seconds() < self.coalesce_seconds:
+            # 连续编辑合并到上一个版本
+            data = _encode(merge_deltas(_decode(latest.data), payload))
+            connection.execute(table.update().where(table.c.id == latest.id)
+                               .values(data=data, size=len(data), notes_count=notes_count, updated_at=now))
+            metrics.incr('revisions.coalesced')
+            return
+
+        data = _encode(payload)
+        base_id = self._snapshot_before(connection, file_id, latest.id)
+        chain = connection.execute(select(table.c.id, table.c.size)
+                                   .where(table.c.file_id == file_id, table.c.id >= base_id)).all()
+        base_size = next((size for revision_id, size in chain if revision_id == base_id), 0)
+        delta_bytes = sum(size for revision_id, size in chain if revision_id != base_id)
+        if len(chain) > self.snapshot_interval or delta_bytes + len(data) > base_size:
+            self._insert_snapshot(connection, file_id, reason, now)
+            return
+        connection.execute(table.insert().values(
+            file_id=file_id, kind=KIND_DELTA, reason=reason, pinned=False,
+            notes_count=notes_count, size=len(data), data=data, created_at=now, updated_at=now))
+        metrics.incr('revisions.deltas')
+
+    @staticmethod
+    def _latest(connection, file_id):
+        table = NoteRevision.__table__
+        return connection.execute(
+            select(table.c.id, table.c.kind, table.c.reason, table.c.pinned, table.c.created_at, table.c.data)
+            .where(table.c.file_id == file_id)
+            .order_by(table.c.id.desc()).limit(1)
+        ).first()
+
+    @staticmethod
+    def _snapshot_before(connection, file_id, revision_id):
+        """不晚于指定版本的最近一个快照的ID"""
+        table = NoteRevision.__table__
+        return connection.execute(select(func.max(table.c.id))
+                                  .where(table.c.file_id == file_id, table.c.id <= revision_id,
+                                         table.c.kind == KIND_SNAPSHOT)).scalar()
+
+    @staticmethod
+    def _delta_from_changes(connection, file_id, changes):
+        """由本次事务的变更集生成差量，只读取变化的笔记"""
+        upserted = [note_id for note_id, owner in changes.upserted.items() if owner == file_id]
+        reordered = {note_id for note_id, owner in changes.reordered.items() if owner == file_id}
+        deleted = [note_id for note_id, owner in changes.deleted.items() if owner == file_id]
+        sets = []
+        moves = []
+        for batch in _chunks(upserted + list(reordered)):
+            rows = connection.execute(select(Note.id, Note.order, Note.format, Note.content, Note.file_id)
+                                      .where(Note.id.in_(batch)))
+            for note_id, order, format_type, content, owner in rows:
+                if owner != file_id:
+                    continue
+                if note_id in reordered:
+                    moves.append([note_id, order])
+                else:
+                    sets.append([note_id, order, format_type or 'text', content or ''])
+        return _delta_payload(sets, moves, deleted)
+
+    @staticmethod
+    def _current_state(connection, file_id):
+        rows = connection.execute(select(Note.id, Note.order, Note.format, Note.content)
+                                  .where(Note.file_id == file_id))
+        return {note_id: (order, format_type or 'text', content or '') for note_id, order, format_type, content in rows}
+
+    def _insert_snapshot(self, connection, file_id, reason, now, pinned=False):
+        table = NoteRevision.__table__
+        state = self._current_state(connection, file_id)
+        data = _encode(_snapshot_payload(state))
+        revision_id = connection.execute(table.insert().values(
+            file_id=file_id, kind=KIND_SNAPSHOT, reason=reason, pinned=pinned, notes_count=len(state),
+            size=len(data), data=data, created_at=now, updated_at=now)).inserted_primary_key[0]
+        self._resync.discard(file_id)
+        metrics.incr('revisions.snapshots')
+        return revision_id
+
+    def checkpoint(self, session, file_id):
+        """
+        把文件当前状态标记为备份点，在应用优化等整体改写前调用
+
+        文件还没有版本、本次事务中已有未提交的修改或版本链需要重新同步时先写入完整快照
+
+        Returns:
+            dict: 备份点的版本信息，未启用版本记录时返回None
+        """
+        if not self.enabled:
+            return None
+        session.flush()
+        connection = session.connection()
+        latest = self._latest(connection, file_id)
+        changes = note_events.pending_changes(session)
+        if latest is None or file_id in self._resync or (changes and file_id in changes.files):
+            revision_id = self._insert_snapshot(connection, file_id, REASON_BASELINE, self._clock(), pinned=True)
+        else:
+            revision_id = latest.id
+            table = NoteRevision.__table__
+            connection.execute(table.update().where(table.c.id == revision_id).values(pinned=True))
+        return self._describe(connection, revision_id)
+
+    # ==================== 查询与重建 ====================
+
+    @staticmethod
+    def _describe(connection, revision_id):
+        table = NoteRevision.__table__
+        row = connection.execute(select(table.c.id, table.c.file_id, table.c.kind, table.c.reason, table.c.pinned,
+                                        table.c.notes_count, table.c.size, table.c.created_at, table.c.updated_at)
+                                 .where(table.c.id == revision_id)).first()
+        if row is None:
+            return None
+        result = dict(row._mapping)
+        result['created_at'] = row.created_at.isoformat()
+        result['updated_at'] = row.updated_at.isoformat()
+        return result
+
+    def list_revisions(self, file_id, limit=50, before_id=None):
+        """
+        按版本ID倒序分页列出文件的版本（不读取版本内容）
+
+        Args:
+            file_id: 文件ID
+            limit: 本页数量
+            before_id: 只返回ID小于该值的版本，用于翻页
+
+        Returns:
+            list: 版本信息列表
+        """
+        table = NoteRevision.__table__
+        query = select(table.c.id).where(table.c.file_id == file_id)
+        if before_id is not None:
+            query = query.where(table.c.id < before_id)
+        connection = db.session.connection()
+        ids = [row.id for row in connection.execute(query.order_by(table.c.id.desc()).limit(limit))]
+        return [self._describe(connection, revision_id) for revision_id in ids]
+
+    def find_revision(self, file_id, revision_id=None, at=None):
+        """
+        定位版本：指定版本ID，或不晚于时间点 at 的最后一个版本，都未指定时为最新版本
+
+        Returns:
+            dict: 版本信息，不存在时返回None
+        """
+        table = NoteRevision.__table__
+        query = select(table.c.id).where(table.c.file_id == file_id)
+        if revision_id is not None:
+            query = query.where(table.c.id == revision_id)
+        elif at is not None:
+            query = query.where(table.c.updated_at <= at).order_by(table.c.updated_at.desc(), table.c.id.desc())
+        else:
+            query = query.order_by(table.c.id.desc())
+        connection = db.session.connection()
+        row = connection.execute(query.limit(1)).first()
+        return self._describe(connection, row.id) if row else None
+
+    def reconstruct(self, file_id, revision_id):
+        """
+        重建文件在指定版本时的笔记，只读取所属快照到该版本之间的记录
+
+        Returns:
+            list: [{'id', 'order', 'format', 'content'}]，按顺序排列；版本不存在时返回None
+        """
+        table = NoteRevision.__table__
+        connection = db.session.connection()
+        base_id = self._snapshot_before(connection, file_id, revision_id)
+        exists = connection.execute(select(table.c.id)
+                                    .where(table.c.id == revision_id, table.c.file_id == file_id)).first()
+        if base_id is None or exists is None:
+            return None
+        state = {}
+        rows = connection.execute(select(table.c.kind, table.c.data)
+                                  .where(table.c.file_id == file_id, table.c.id >= base_id, table.c.id <= revision_id)
+                                  .order_by(table.c.id))
+        for kind, data in rows:
+            apply_payload(state, kind, _decode(data))
+        return [{'id': note_id, 'order': order, 'format': format_type, 'content': content}
+                for note_id, (order, format_type, content) in sorted(state.items(), key=lambda item: (item[1][0], item[0]))]
+
+    # ==================== 保留与压缩 ====================
+
+    def _retained(self, rows, now):
+        """
+        按保留策略选出要保留的版本ID；每个时间段保留最后一个版本
+
+        近期版本之前的一个版本也保留，压缩时不会改写可能正在合并连续编辑的近期版本
+        """
+        keep = {rows[-1].id}
+        buckets = {}
+        for index, row in enumerate(rows):
+            age = (now - row.updated_at).total_seconds()
+            if age <= self.keep_all_hours * 3600:
+                keep.update(other.id for other in rows[max(index - 1, 0):])
+                break
+            if self.max_age_days and age > self.max_age_days * 86400:
+                continue
+            if row.pinned:
+                keep.add(row.id)
+                continue
+            span = self.thin_minutes * 60 if age <= self.daily_after_days * 86400 else 86400
+            buckets[(span, int((row.updated_at - _EPOCH).total_seconds() // span))] = row.id
+        keep.update(buckets.values())
+        return keep
+
+    def compact_file(self, file_id, now=None):
+        """
+        按保留策略压缩一个文件的版本，被删除版本之后的第一条记录改写为相对上一保留版本的差量，
+        没有可依赖的保留版本或版本链过长时改写为快照
+
+        Returns:
+            tuple: (删除的版本数, 改写的版本数)
+        """
+        now = now or self._clock()
+        table = NoteRevision.__table__
+        connection = db.session.connection()
+        rows = connection.execute(select(table.c.id, table.c.kind, table.c.pinned, table.c.updated_at)
+                                  .where(table.c.file_id == file_id).order_by(table.c.id)).all()
+        if not rows:
+            return 0, 0
+        keep = self._retained(rows, now)
+        if len(keep) == len(rows):
+            return 0, 0
+
+        state = {}
+        kept_state = None
+        chain = 0
+        previous_kept = False
+        dropped = []
+        rewritten = 0
+        for index, row in enumerate(rows):
+            data = connection.execute(select(table.c.data).where(table.c.id == row.id)).scalar()
+            apply_payload(state, row.kind, _decode(data))
+            if row.id not in keep:
+                dropped.append(row.id)
+                previous_kept = False
+                continue
+
+            if row.kind == KIND_SNAPSHOT:
+                chain = 0
+            elif previous_kept and chain < self.snapshot_interval:
+                chain += 1
+            elif not previous_kept and kept_state is not None and chain < self.snapshot_interval:
+                # 依赖的版本被删除，改写为相对上一保留版本的差量
+                data = _encode(diff_states(kept_state, state))
+                connection.execute(table.update().where(table.c.id == row.id).values(data=data, size=len(data)))
+                rewritten += 1
+                chain += 1
+            else:
+                # 没有可依赖的保留版本或版本链过长，改写为快照
+                data = _encode(_snapshot_payload(state))
+                connection.execute(table.update().where(table.c.id == row.id)
+                                   .values(kind=KIND_SNAPSHOT, data=data, size=len(data)))
+                rewritten += 1
+                chain = 0
+            previous_kept = True
+            if index + 1 < len(rows) and rows[index + 1].id not in keep:
+                kept_state = dict(state)
+
+        for batch in _chunks(dropped):
+            connection.execute(table.delete().where(table.c.id.in_(batch)))
+        return len(dropped), rewritten
+
+    def compact(self, now=None):
+        """
+        压缩全部文件的版本，并删除已不存在的文件的版本
+
+        Returns:
+            dict: 删除、改写和清理的版本数
+        """
+        table = NoteRevision.__table__
+        result = {'dropped': 0, 'rewritten': 0, 'purged': 0}
+        session = db.session
+        purged = session.execute(table.delete().where(table.c.file_id.notin_(select(NoteFile.id))))
+        result['purged'] = purged.rowcount or 0
+        session.commit()
+        file_ids = [file_id for file_id, in session.execute(select(table.c.file_id).distinct())]
+        for file_id in file_ids:
+            dropped, rewritten = self.compact_file(file_id, now)
+            session.commit()
+            result['dropped'] += dropped
+            result['rewritten'] += rewritten
+        return result
+
+    def start(self, interval=3600.0):
+        """启动后台压缩线程，重复调用无副作用"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(interval,),
+                                            name='revision-compactor', daemon=True)
+            self._thread.start()
+        logger.info(f"版本后台压缩已启用: 间隔={interval}s")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, interval):
+        while not self._stop.wait(interval):
+            self.run_once()
+
+    def run_once(self):
+        """在应用上下文中执行一轮压缩并更新统计"""
+        started = time.perf_counter()
+        result = {'dropped': 0, 'rewritten': 0, 'purged': 0}
+        error = None
+        try:
+            with self._app.app_context():
+                result = self.compact()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"版本压缩失败: {error}")
+
+        with self._lock:
+            self._stats['runs'] += 1
+            for key, value in result.items():
+                self._stats[key] += value
+            self._stats['last_run_at'] = time.time()
+            self._stats['last_duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            self._stats['last_error'] = error
+        for key, value in result.items():
+            if value:
+                metrics.incr(f'revisions.{key}', value)
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        stats['compactor_running'] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+
+# 创建全局实例
+revision_store = RevisionStore()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: summary_service.py
+模块: AI服务 - 文件摘要
+描述: 持久化每个文件的AI摘要及其内容指纹，笔记变更稳定后在后台刷新过期摘要
+功能:
+    - 摘要读取（按文件ID单次索引查询）和批量读取
+    - 基于内容指纹的刷新，内容未变化时跳过AI调用
+    - 订阅笔记变更事件，防抖窗口后由有界线程池后台刷新（共用 DebouncedFileWorker）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.1
+
+依赖:
+    - app.services.debounced_worker: 按文件防抖的后台任务
+    - app.services.fingerprint: 内容指纹
+    - app.services.ai_service: AI摘要生成
+
+配置项:
+    - SUMMARY_AUTO_REFRESH: 是否在笔记变更后自动刷新摘要
+    - SUMMARY_REFRESH_DEBOUNCE: 防抖窗口（秒），最后一次修改后等待该时长再刷新
+    - SUMMARY_REFRESH_WORKERS: 后台刷新的最大并发数
+    - SUMMARY_REFRESH_INTERVAL: 调度线程检查间隔（秒）
+
+许可证: Apache-2.0
+"""
+
+import time
+import logging
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.models.note_summary import NoteSummary
+from app.services.debounced_worker import DebouncedFileWorker
+from app.services.fingerprint import compute_file_fingerprint, compute_file_fingerprints
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryService:
+    """文件摘要服务"""
+
+    def __init__(self, data_processor, debounce=60.0, max_workers=2, clock=time.monotonic):
+        self.data_processor = data_processor
+        self._worker = DebouncedFileWorker(self._refresh_in_background, debounce, max_workers,
+                                           name='summary-refresh', clock=clock)
+
+    @property
+    def debounce(self):
+        return self._worker.delay
+
+    @property
+    def max_workers(self):
+        return self._worker.max_workers
+
+    def init_app(self, app):
+        """根据应用配置启用后台刷新"""
+        if not app.config.get('SUMMARY_AUTO_REFRESH', False):
+            return
+        self._worker.delay = float(app.config.get('SUMMARY_REFRESH_DEBOUNCE', self.debounce))
+        self._worker.max_workers = int(app.config.get('SUMMARY_REFRESH_WORKERS', self.max_workers))
+        interval = float(app.config.get('SUMMARY_REFRESH_INTERVAL', 5.0))
+        self.start(app, interval)
+
+    def start(self, app, interval=5.0):
+        """订阅笔记变更并启动调度线程，重复调用无副作用"""
+        self._worker.start(app, interval)
+        logger.info(f"摘要后台刷新已启用: 防抖={self.debounce}s, 并发={self.max_workers}")
+
+    def stop(self):
+        self._worker.stop()
+
+    # ==================== 读取 ====================
+
+    def get_summary(self, file_id, check_stale=False):
+        """
+        读取文件摘要
+
+        Args:
+            file_id: 文件ID
+            check_stale: 是否计算当前指纹判断摘要是否过期
+
+        Returns:
+            dict: 摘要信息，不存在时返回None
+        """
+        record = NoteSummary.query.filter_by(file_id=file_id).first()
+        if record is None:
+            return None
+        result = record.to_dict()
+        result['pending'] = self._worker.is_pending(file_id)
+        if check_stale:
+            result['stale'] = record.fingerprint != compute_file_fingerprint(file_id)
+        return result
+
+    def get_summaries(self, file_ids, check_stale=False):
+        """批量读取多个文件的摘要，返回 file_id -> 摘要信息"""
+        file_ids = list(file_ids)
+        if not file_ids:
+            return {}
+        records = NoteSummary.query.filter(NoteSummary.file_id.in_(file_ids)).all()
+        fingerprints = compute_file_fingerprints(file_ids) if check_stale else {}
+        result = {}
+        for record in records:
+            item = record.to_dict()
+            item['pending'] = self._worker.is_pending(record.file_id)
+            if check_stale:
+                item['stale'] = record.fingerprint != fingerprints.get(record.file_id)
+            result[record.file_id] = item
+        return result
+
+    # ==================== 刷新 ====================
+
+    def refresh(self, file_id, force=False):
+        """
+        刷新文件摘要，内容指纹未变化时跳过AI调用
+
+        Args:
+            file_id: 文件ID
+            force: 是否忽略指纹强制重新生成
+
+        Returns:
+            dict: {'success', 'refreshed', 'summary'} 或错误信息
+        """
+        try:
+            note_file = NoteFile.query.get(file_id)
+            if not note_file:
+                return {
+                    'success': False,
+                    'error': '文件不存在'
+                }
+
+            fingerprint = compute_file_fingerprint(file_id)
+            record = NoteSummary.query.filter_by(file_id=file_id).first()
+            if (not force and record is not None and record.status == 'ready'
+                    and record.fingerprint == fingerprint):
+                metrics.incr('summary.skipped')
+                return {
+                    'success': True,
+                    'refreshed': False,
+                    'summary': record.to_dict()
+                }
+
+            notes = Note.query.filter_by(file_id=file_id).order_by(Note.order).all()
+            content = self.data_processor._collect_and_format_notes_markdown(notes)
+            # 读取完成后结束只读事务，避免在AI调用期间占用连接
+            db.session.commit()
+
+            if not content.strip():
+                summary, error = '', None
+            else:
+                from app.services.ai_service import ai_service
+                ai_result = ai_service.generate_summary(content)
+                summary = ai_result.get('summary') if ai_result['success'] else None
+                error = None if ai_result['success'] else ai_result['error']
+
+            record = self._store(file_id, fingerprint, summary, error)
+            if error:
+                metrics.incr('summary.failed')
+                return {
+                    'success': False,
+                    'error': error,
+                    'summary': record.to_dict()
+                }
+
+            metrics.incr('summary.refreshed')
+            return {
+                'success': True,
+                'refreshed': True,
+                'summary': record.to_dict()
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"刷新文件 {file_id} 的摘要失败: {str(e)}")
+            return {
+                'success': False,
+                'error': f'刷新摘要失败: {str(e)}'
+            }
+
+    def _store(self, file_id, fingerprint, summary, error=None):
+        """保存摘要；失败时保留上一次成功的摘要，只记录错误"""
+        from app.services.ai_service import ai_service
+        record = NoteSummary.query.filter_by(file_id=file_id).first()
+        if record is None:
+            record = NoteSummary(file_id=file_id)
+            db.session.add(record)
+        if error:
+            record.status = 'error'
+            record.error = error
+        else:
+            record.summary = summary
+            record.fingerprint = fingerprint
+            record.model = ai_service.get_provider_info().get('model')
+            record.status = 'ready'
+            record.error = None
+        db.session.commit()
+        return record
+
+    # ==================== 后台刷新 ====================
+
+    def run_pending(self, now=None):
+        """
+        提交已超过防抖窗口的文件进行刷新
+
+        Returns:
+            list: 本次提交的文件ID
+        """
+        return self._worker.run_pending(now)
+
+    def _refresh_in_background(self, file_id):
+        result = self.refresh(file_id)
+        if not result['success']:
+            logger.warning(f"后台刷新文件 {file_id} 的摘要失败: {result['error']}")
+
+    def get_stats(self):
+        stats = self._worker.get_stats()
+        stats['debounce'] = self.debounce
+        return stats
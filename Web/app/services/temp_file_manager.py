@@ -8,23 +8,27 @@
 功能:
     - 临时文件的创建和命名管理
     - 自动清理过期文件
-    - 文件数量限制和存储管理
-    - 提供文件列表和状态查询
+    - 文件数量限制和存储管理（后台清理器按访问时间做LRU淘汰）
+    - 提供文件列表和状态查询（基于产物清单的索引查询）
 
 作者: Jolly
 创建时间: 2025-04-01
-最后修改: 2025-06-04
+最后修改: 2026-10-18
 修改人: Jolly
-版本: 1.1.0
+版本: 1.4.0
 
 依赖:
-    - os, datetime: 系统文件和时间处理
+    - os, time: 系统文件和时间处理
+    - app.services.artifact_store: 产物存储
+    - app.services.artifact_janitor: 后台清理（过期、每文件上限、总字节配额）
 
 许可证: Apache-2.0
 """
 
 import os
-import datetime
+import time
+from app.services.artifact_store import get_artifact_store
+from app.services.artifact_janitor import ArtifactJanitor
 
 class TempFileManager:
     """临时文件管理器，负责临时文件的创建、清理和管理"""
@@ -40,6 +44,11 @@ class TempFileManager:
         # 确保临时目录存在
         if not os.path.exists(self.temp_dir):
             os.makedirs(self.temp_dir)
+        self.artifacts = get_artifact_store(self.temp_dir)
+        # 淘汰在后台进行，写入产物的请求路径上不做清理
+        self.janitor = ArtifactJanitor(self.artifacts,
+                                       max_per_file=self.config['max_files_per_note'],
+                                       max_age_days=self.config['max_age_days'])
     
     def list_temp_files(self, file_id=None):
         """
@@ -53,38 +62,19 @@ class TempFileManager:
         """
         try:
             temp_files = []
-            
-            for filename in os.listdir(self.temp_dir):
-                filepath = os.path.join(self.temp_dir, filename)
-                
-                # 如果指定了file_id，只返回该文件的临时文件
-                if file_id and f"_{file_id}_" not in filename:
-                    continue
-                
-                try:
-                    file_stat = os.stat(filepath)
-                    file_info = {
-                        'filename': filename,
-                        'size': file_stat.st_size,
-                        'created_at': datetime.datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
-                        'modified_at': datetime.datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
-                        'url': f'/api/ai/temp-file/{filename}',
-                        'type': self._determine_file_type(filename)
-                    }
-                    
-                    # 从文件名解析信息
-                    if '_optimized_' in filename:
-                        parts = filename.split('_optimized_')
-                        if len(parts) == 2:
-                            file_info['optimization_type'] = parts[1].replace('.txt', '')
-                    
-                    temp_files.append(file_info)
-                    
-                except OSError:
-                    continue
-            
-            # 按修改时间排序
-            temp_files.sort(key=lambda x: x['modified_at'], reverse=True)
+            for record in self.artifacts.list(file_id=file_id):
+                info = self.artifacts.describe(record)
+                file_info = {
+                    'filename': info['filename'],
+                    'size': info['size'],
+                    'created_at': info['created_at'],
+                    'modified_at': info['modified_at'],
+                    'url': info['url'],
+                    'type': info['type']
+                }
+                if info['optimization_type']:
+                    file_info['optimization_type'] = info['optimization_type']
+                temp_files.append(file_info)
             
             return {
                 'success': True,
@@ -107,14 +97,13 @@ class TempFileManager:
             dict: 包含清理结果的字典
         """
         try:
-            cleaned_count = 0
-            
             if file_id:
                 # 清理指定文件的临时文件
-                cleaned_count = self._cleanup_temp_files_by_file_id(file_id)
+                cleaned_count = self.artifacts.delete(file_id=file_id)
             else:
                 # 清理所有旧临时文件
-                cleaned_count = self._cleanup_old_temp_files_by_age(days_old)
+                cutoff = time.time() - days_old * 86400
+                cleaned_count = self.artifacts.delete_older_than(cutoff)
             
             return {
                 'success': True,
@@ -125,82 +114,35 @@ class TempFileManager:
         except Exception as e:
             return {'success': False, 'error': f'清理临时文件失败: {str(e)}'}
     
-    def _determine_file_type(self, filename):
-        """
-        根据文件名确定文件类型
-        """
-        if 'optimized' in filename:
-            return 'optimized'
-        elif 'collected' in filename:
-            return 'collected'
-        else:
-            return 'unknown'
-    
-    def _cleanup_temp_files_by_file_id(self, file_id):
-        """
-        清理指定文件ID的所有临时文件
-        """
-        cleaned_count = 0
-        try:
-            for filename in os.listdir(self.temp_dir):
-                if f"_{file_id}_" in filename:
-                    filepath = os.path.join(self.temp_dir, filename)
-                    try:
-                        os.remove(filepath)
-                        cleaned_count += 1
-                    except OSError:
-                        pass
-        except Exception:
-            pass
-        
-        return cleaned_count
-    
-    def _cleanup_old_temp_files_by_age(self, days_old):
-        """
-        清理指定天数前的临时文件
-        """
-        cleaned_count = 0
-        cutoff_time = datetime.datetime.now() - datetime.timedelta(days=days_old)
-        
-        try:
-            for filename in os.listdir(self.temp_dir):
-                filepath = os.path.join(self.temp_dir, filename)
-                try:
-                    file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(filepath))
-                    if file_mtime < cutoff_time:
-                        os.remove(filepath)
-                        cleaned_count += 1
-                except OSError:
-                    pass
-        except Exception:
-            pass
-        
-        return cleaned_count
-    
     def get_temp_file_info(self, filename):
         """
         获取临时文件信息
         """
         try:
-            filepath = os.path.join(self.temp_dir, filename)
-            
-            if not os.path.exists(filepath):
+            record = self.artifacts.find_by_filename(filename)
+            if not record or not os.path.exists(record['path']):
                 return {'success': False, 'error': '临时文件不存在'}
             
-            file_stat = os.stat(filepath)
-            
+            info = self.artifacts.describe(record)
             return {
                 'success': True,
                 'filename': filename,
-                'size': file_stat.st_size,
-                'created_at': datetime.datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
-                'modified_at': datetime.datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
-                'type': self._determine_file_type(filename)
+                'size': info['size'],
+                'created_at': info['created_at'],
+                'modified_at': info['modified_at'],
+                'type': info['type']
             }
             
         except Exception as e:
             return {'success': False, 'error': f'获取文件信息失败: {str(e)}'}
     
+    def get_temp_file_record(self, filename):
+        """按对外文件名查找产物记录（含磁盘路径和压缩编码），不存在时返回None"""
+        record = self.artifacts.find_by_filename(filename)
+        if record and os.path.exists(record['path']):
+            return record
+        return None
+    
     def auto_cleanup(self):
         """
         自动清理过期的临时文件
@@ -209,36 +151,59 @@ class TempFileManager:
             return
         
         try:
-            # 清理超过配置天数的文件
-            result = self.cleanup_temp_files(days_old=self.config['max_age_days'])
-            return result
+            # 过期清理、每文件上限和总字节配额淘汰
+            result = self.janitor.run_once()
+            return {
+                'success': True,
+                'cleaned_count': sum(result.values()),
+                'details': result
+            }
         except Exception as e:
             return {'success': False, 'error': f'自动清理失败: {str(e)}'}
     
+    def get_health_status(self):
+        """
+        获取临时文件管理器健康状态
+        """
+        try:
+            if not os.path.exists(self.temp_dir):
+                return {'success': False, 'error': '临时目录不存在'}
+            
+            if not os.access(self.temp_dir, os.W_OK):
+                return {'success': False, 'error': '临时目录不可写'}
+            
+            storage_info = self.get_storage_info()
+            if not storage_info['success']:
+                return storage_info
+            
+            return {
+                'success': True,
+                'status': 'healthy',
+                'file_count': storage_info['file_count'],
+                'total_size_mb': storage_info['total_size_mb']
+            }
+            
+        except Exception as e:
+            return {'success': False, 'error': f'健康检查失败: {str(e)}'}
+    
     def get_storage_info(self):
         """
         获取存储信息
         """
         try:
-            total_size = 0
-            file_count = 0
-            
-            for filename in os.listdir(self.temp_dir):
-                filepath = os.path.join(self.temp_dir, filename)
-                try:
-                    file_stat = os.stat(filepath)
-                    total_size += file_stat.st_size
-                    file_count += 1
-                except OSError:
-                    continue
+            stats = self.artifacts.get_stats()
+            total_size = stats['total_size']
             
             return {
                 'success': True,
                 'temp_dir': self.temp_dir,
-                'file_count': file_count,
+                'file_count': stats['file_count'],
                 'total_size': total_size,
                 'total_size_mb': round(total_size / (1024 * 1024), 2),
-                'config': self.config
+                'stored_size': stats['stored_size'],
+                'stored_size_mb': round(stats['stored_size'] / (1024 * 1024), 2),
+                'config': self.config,
+                'janitor': self.janitor.get_stats()
             }
             
         except Exception as e:
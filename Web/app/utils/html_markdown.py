@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: html_markdown.py
+模块: 工具模块 - HTML转Markdown
+描述: 基于词法分析器的单遍HTML到Markdown转换，面向TipTap编辑器产生的标签集合
+功能:
+    - 标题、段落、列表（含嵌套和起始编号）、引用、分隔线、换行
+    - 粗体、斜体、下划线、删除线、行内代码、链接、图片
+    - 代码块写为 ``` 围栏（带 language- 类名时附语言），保留代码缩进，可由 markdown_blocks 还原
+    - 与原 html2text 转换规则保持一致的转义和空白处理
+    - 整个转换只扫描一遍输入，输出片段最后拼接一次并合并多余空行
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - html.parser: 标准库HTML词法分析器
+
+注意事项:
+    - 输出规则沿用 html2text（body_width=0, unicode_snob, escape_snob）的行为，
+      旧的正则预处理会把 <br>、<blockquote>、<pre>、<img> 误当成 <b>/<p>/<i> 改写，这里不再保留该问题
+    - 代码块不沿用 html2text 的四空格缩进：去掉首尾空白后第一行的缩进会丢失，无法还原为代码块；
+      已存储的派生列可用 flask backfill-note-text --recompute 重新计算
+    - 空段落 <p></p>（只含空白）不产生任何输出，与旧的预处理一致
+    - 只在一个转换器实例内使用，非线程安全；并发调用请各自调用 html_to_markdown
+
+许可证: Apache-2.0
+"""
+
+import re
+import html.entities
+from html.parser import HTMLParser
+
+# 与 html2text 相同的转义规则
+_SLASH_CHARS = r"\`*_{}[]()#+-.!"
+_ESCAPE_PATTERN = re.compile(r'\\(?=[%s])|([`*_{}\[\]()#!])' % re.escape(_SLASH_CHARS))
+_LINK_ESCAPE_PATTERN = re.compile(r'([\\\[\]()])')
+_DOT_PATTERN = re.compile(r'^(\s*\d+)(\.)(?=\s)', re.MULTILINE)
+_PLUS_PATTERN = re.compile(r'^(\s*)(\+)(?=\s)', re.MULTILINE)
+_DASH_PATTERN = re.compile(r'^(\s*)(-)(?=\s|-)', re.MULTILINE)
+# 三个及以上换行（之间只有空白）合并为一个空行；每次重复都消耗一个换行，不会回溯
+_BLANK_LINES = re.compile(r'\n(?:[^\S\n]*\n){2,}')
+_ABSOLUTE_URL = re.compile(r'^[a-zA-Z+]+://')
+_NOT_SPACE = re.compile(r'[^\s]')
+_NOT_SPACE_OR_END = re.compile(r'[^\s.!?]')
+
+# 实体 &nbsp; 在空白归并时需要保留，先用占位字符代替，写出时再换回
+_NBSP_PLACEHOLDER = '\ue000'
+
+_EMPHASIS_TAGS = {'em': '_', 'i': '_', 'u': '_', 'strong': '**', 'b': '**',
+                  'del': '~~', 'strike': '~~', 's': '~~'}
+_CODE_TAGS = ('kbd', 'code', 'tt')
+_QUIET_TAGS = ('head', 'style', 'script')
+_CODE_LANGUAGE = re.compile(r'(?:^|\s)language-([\w+#.-]+)')
+
+
+def _escape_section(text):
+    """正文转义（对应 html2text 的 escape_md_section(snob=True)）"""
+    text = _ESCAPE_PATTERN.sub(lambda m: '\\' + (m.group(1) or '\\'), text)
+    if '.' in text:
+        text = _DOT_PATTERN.sub(r'\1\\\2', text)
+    if '+' in text:
+        text = _PLUS_PATTERN.sub(r'\1\\\2', text)
+    if '-' in text:
+        text = _DASH_PATTERN.sub(r'\1\\\2', text)
+    return text
+
+
+def _escape_link(text):
+    return _LINK_ESCAPE_PATTERN.sub(r'\\\1', text)
+
+
+def _heading_level(tag):
+    if tag[0] == 'h' and len(tag) == 2 and '0' < tag[1] <= '9':
+        return int(tag[1])
+    return 0
+
+
+class MarkdownConverter(HTMLParser):
+    """单遍HTML到Markdown转换器"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts = []
+        self._last_was_newline = False
+        self.quiet = 0
+        self.p_p = 0                    # 下次输出前需要的换行数
+        self.start = True
+        self.space = False
+        self.maybe_automatic_link = None
+        self.empty_link = False
+        self.astack = []
+        self.list = []                  # [列表类型, 当前编号]
+        self.blockquote = 0
+        self.pre = False
+        self.pre_text = []              # 代码块的原文，结束时整体写为围栏
+        self.pre_language = ''
+        self.code = False
+        self.quote = False
+        self.br_toggle = ''
+        self.last_was_list = False
+        self.stressed = False
+        self.preceding_stressed = False
+        self.preceding_data = ''
+        self.current_tag = ''
+        self._pending_p = None          # 尚未确认是否为空段落的 <p>
+
+    # ==================== 入口 ====================
+
+    def convert(self, content):
+        self.feed(content)
+        self.close()
+        self._flush_pending_p()
+        self.pbr()
+        self.o('', force='end')
+        text = ''.join(self.parts).replace(_NBSP_PLACEHOLDER, '\xa0')
+        return _BLANK_LINES.sub('\n\n', text).strip()
+
+    # ==================== 词法事件 ====================
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_pending_p()
+        if tag == 'p':
+            self._pending_p = []
+            return
+        self.handle_tag(tag, dict(attrs), True)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush_pending_p()
+        self.handle_tag(tag, dict(attrs), True)
+        self.handle_tag(tag, {}, False)
+
+    def handle_endtag(self, tag):
+        if tag == 'p' and self._pending_p is not None:
+            # 只含空白的段落整体忽略
+            self._pending_p = None
+            return
+        self._flush_pending_p()
+        self.handle_tag(tag, {}, False)
+
+    def handle_data(self, data):
+        if self._pending_p is not None:
+            if data.isspace():
+                self._pending_p.append(data)
+                return
+            self._flush_pending_p()
+        self._handle_text(data)
+
+    def handle_entityref(self, name):
+        self._flush_pending_p()
+        if name == 'nbsp':
+            self._handle_text(_NBSP_PLACEHOLDER, True)
+            return
+        self._handle_text(html.entities.html5.get(name + ';', f'&{name};'), True)
+
+    def handle_charref(self, name):
+        self._flush_pending_p()
+        try:
+            char = chr(int(name[1:], 16) if name[0] in 'xX' else int(name))
+        except (ValueError, OverflowError):
+            char = ''
+        self._handle_text(char, True)
+
+    def _flush_pending_p(self):
+        if self._pending_p is None:
+            return
+        buffered, self._pending_p = self._pending_p, None
+        self.handle_tag('p', {}, True)
+        for data in buffered:
+            self._handle_text(data)
+
+    # ==================== 输出 ====================
+
+    def out(self, text):
+        self.parts.append(text)
+        if text:
+            self._last_was_newline = text[-1] == '\n'
+
+    def p(self):
+        self.p_p = 2
+
+    def pbr(self):
+        if self.p_p == 0:
+            self.p_p = 1
+
+    def o(self, data, puredata=False, force=False):
+        """处理缩进和空白后输出"""
+        if self.quiet:
+            return
+        if puredata and not self.pre:
+            # 空白归并为单个空格，开头的空格延后到下一段输出时决定
+            if data:
+                leading = data[0].isspace()
+                trailing = data[-1].isspace()
+                data = ' '.join(data.split())
+                if data:
+                    data = (' ' if leading else '') + data + (' ' if trailing else '')
+                elif leading:
+                    data = ' '
+            if data and data[0] == ' ':
+                self.space = True
+                data = data[1:]
+        if not data and not force:
+            return
+
+        bq = '>' * self.blockquote
+        if not (force and data and data[0] == '>') and self.blockquote:
+            bq += ' '
+
+        if self.pre:
+            # 列表内的代码块缩进到列表项之下
+            bq += '    ' * len(self.list)
+            data = data.replace('\n', '\n' + bq)
+
+        if self.start:
+            self.space = False
+            self.p_p = 0
+            self.start = False
+
+        if force == 'end':
+            self.p_p = 0
+            self.out('\n')
+            self.space = False
+
+        if self.p_p:
+            self.out((self.br_toggle + '\n' + bq) * self.p_p)
+            self.space = False
+            self.br_toggle = ''
+
+        if self.space:
+            if not self._last_was_newline:
+                self.out(' ')
+            self.space = False
+
+        self.p_p = 0
+        self.out(data)
+
+    def _handle_text(self, data, entity_char=False):
+        if not data:
+            return
+
+        if self.pre:
+            self.pre_text.append(data)
+            return
+
+        if self.stressed:
+            data = data.strip()
+            self.stressed = False
+            self.preceding_stressed = True
+        elif self.preceding_stressed:
+            if (_NOT_SPACE_OR_END.match(data[0])
+                    and not _heading_level(self.current_tag)
+                    and self.current_tag not in ('a', 'code', 'pre')):
+                data = ' ' + data
+            self.preceding_stressed = False
+
+        if self.maybe_automatic_link is not None:
+            href = self.maybe_automatic_link
+            if href == data and _ABSOLUTE_URL.match(href):
+                self.o('<' + data + '>')
+                self.empty_link = False
+                return
+            self.o('[')
+            self.maybe_automatic_link = None
+            self.empty_link = False
+
+        if not self.code and not self.pre and not entity_char:
+            data = _escape_section(data)
+        self.preceding_data = data
+        self.o(data, puredata=True)
+
+    # ==================== 标签 ====================
+
+    def handle_tag(self, tag, attrs, start):
+        if self.pre and tag != 'pre':
+            # 代码块内只保留文字
+            if tag == 'br' and start:
+                self.pre_text.append('\n')
+            elif tag in _CODE_TAGS and start and not self.pre_text:
+                match = _CODE_LANGUAGE.search(attrs.get('class') or '')
+                self.pre_language = match.group(1) if match else ''
+            return
+        self.current_tag = tag
+
+        # 链接内的第一个输出来自子标签
+        if (start and self.maybe_automatic_link is not None
+                and tag not in ('p', 'div', 'style', 'dl', 'dt', 'img')):
+            self.o('[')
+            self.maybe_automatic_link = None
+            self.empty_link = False
+
+        level = _heading_level(tag)
+        if level:
+            self.p()
+            if not start:
+                return
+            self.o('#' * level + ' ')
+        elif tag in ('p', 'div'):
+            if not (self.astack and tag == 'div'):
+                self.p()
+        elif tag == 'br':
+            if start:
+                self.o('  \n> ' if self.blockquote > 0 else '  \n')
+        elif tag == 'hr':
+            if start:
+                self.p()
+                self.o('* * *')
+                self.p()
+        elif tag in _QUIET_TAGS:
+            self.quiet += 1 if start else -1
+        elif tag == 'body':
+            self.quiet = 0
+        elif tag == 'blockquote':
+            if start:
+                self.p()
+                self.o('> ', force=True)
+                self.start = True
+                self.blockquote += 1
+            else:
+                self.blockquote -= 1
+                self.p()
+        elif tag in _EMPHASIS_TAGS:
+            mark = _EMPHASIS_TAGS[tag]
+            if start and self.preceding_data and _NOT_SPACE.match(self.preceding_data[-1]):
+                mark = ' ' + mark
+            self.o(mark)
+            if start:
+                self.stressed = True
+        elif tag in _CODE_TAGS:
+            if not self.pre:
+                self.o('`')
+                self.code = not self.code
+        elif tag == 'q':
+            self.o('"')
+            self.quote = not self.quote
+        elif tag == 'a':
+            self._handle_link(attrs, start)
+        elif tag == 'img':
+            if start:
+                self._handle_image(attrs)
+        elif tag == 'pre':
+            if start:
+                self.p()
+                self.pre = True
+                self.pre_text = []
+                self.pre_language = ''
+            else:
+                self._write_fence()
+                self.pre = False
+                self.p()
+        elif tag == 'li':
+            self.pbr()
+            if start:
+                item = self.list[-1] if self.list else ['ul', 0]
+                self.o('  ' * len(self.list))
+                if item[0] == 'ul':
+                    self.o('* ')
+                elif item[0] == 'ol':
+                    item[1] += 1
+                    self.o(f'{item[1]}. ')
+                self.start = True
+
+        if tag in ('ol', 'ul'):
+            if not self.list and not self.last_was_list:
+                self.p()
+            if start:
+                self.list.append([tag, self._numbering_start(attrs)])
+            elif self.list:
+                self.list.pop()
+                if not self.list:
+                    self.o('\n')
+            self.last_was_list = True
+        else:
+            self.last_was_list = False
+
+    def _write_fence(self):
+        code = ''.join(self.pre_text)
+        if code.endswith('\n'):
+            code = code[:-1]
+        if not code.strip():
+            return
+        # 围栏比代码中最长的连续反引号更长
+        fence = '`' * max(3, max((len(run) for run in re.findall(r'`+', code)), default=0) + 1)
+        self.o(f'{fence}{self.pre_language}\n{code}\n{fence}')
+
+    def _handle_link(self, attrs, start):
+        if start:
+            href = attrs.get('href')
+            if href is not None and not href.startswith('#'):
+                self.astack.append(attrs)
+                self.maybe_automatic_link = href
+                self.empty_link = True
+            else:
+                self.astack.append(None)
+            return
+        if not self.astack:
+            return
+        link = self.astack.pop()
+        if self.maybe_automatic_link and not self.empty_link:
+            self.maybe_automatic_link = None
+        elif link:
+            if self.empty_link:
+                self.o('[')
+                self.empty_link = False
+                self.maybe_automatic_link = None
+            title = _escape_link(link.get('title') or '')
+            title = f' "{title}"' if title.strip() else ''
+            self.o(f"]({_escape_link(link['href'])}{title})")
+
+    def _handle_image(self, attrs):
+        src = attrs.get('src')
+        if src is None:
+            return
+        alt = attrs.get('alt') or ''
+        if self.maybe_automatic_link is not None:
+            self.o('[')
+            self.maybe_automatic_link = None
+            self.empty_link = False
+        self.o(f'![{_escape_link(alt)}]({_escape_link(src)})')
+
+    @staticmethod
+    def _numbering_start(attrs):
+        try:
+            return int(attrs.get('start')) - 1
+        except (TypeError, ValueError):
+            return 0
+
+
+def html_to_markdown(content):
+    """
+    把笔记HTML转换为Markdown
+
+    Args:
+        content: HTML内容
+
+    Returns:
+        str: Markdown文本（已合并多余空行并去掉首尾空白）
+    """
+    if not content:
+        return ''
+    return MarkdownConverter().convert(content)
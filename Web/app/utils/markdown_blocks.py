@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: markdown_blocks.py
+模块: 工具模块 - Markdown分块
+描述: 把AI优化后的Markdown一遍扫描切分为笔记块，识别每块对应的笔记格式并生成编辑器可直接使用的HTML
+功能:
+    - 标题（h1-h3，四级及以下归为h3）、列表（bullet/number，含嵌套）、引用（quote）单独成块
+    - 代码块（``` 或 ~~~ 围栏）和分隔线整体成块，格式为text；列表项下缩进的围栏属于该列表项
+    - 普通段落按空行分块，段内换行保留为 <br>；列表项之间的空行不分块（html_markdown 输出的列表项以空行分隔）
+    - 行内的粗体、斜体、删除线、行内代码、链接、图片和反斜杠转义；链接地址和图片说明中的转义字符还原，
+      地址可含转义的括号和成对括号
+    - 引用内以空行（单独的 >）分隔的段落分别生成 <p>
+    - 去掉文件开头的元数据头（前几行内的 key: value 与 --- 分隔符）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - re: 正则表达式
+    - html: HTML转义
+
+注意事项:
+    - 每行只做一次块级匹配，行内正则的分隔符内容不含同类分隔符，整体为线性时间
+    - 生成的HTML沿用TipTap的标签结构（列表项内为 <p>），与 html_markdown 转换互为往返（测试中用黄金语料逐条校验）
+
+许可证: Apache-2.0
+"""
+
+import re
+import html
+from collections import namedtuple
+
+MarkdownBlock = namedtuple('MarkdownBlock', 'format content')
+
+FORMAT_TEXT = 'text'
+FORMAT_BULLET = 'bullet'
+FORMAT_NUMBER = 'number'
+FORMAT_QUOTE = 'quote'
+# 编辑器只有三级标题
+MAX_HEADING_LEVEL = 3
+
+_HEADING = re.compile(r'^ {0,3}(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$')
+_RULE = re.compile(r'^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$')
+_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})[ \t]*([^`\s]*)')
+_LIST_ITEM = re.compile(r'^([ \t]*)([-*+]|(\d{1,9})[.)])[ \t]+(.*)$')
+_QUOTE = re.compile(r'^ {0,3}>[ \t]?(.*)$')
+# 块级标记的首字符（另有有序列表的数字）
+_BLOCK_MARKERS = frozenset('`~#-*_+>')
+
+_INLINE = re.compile(
+    r'\\(?P<escaped>[\\`*_{}\[\]()#+\-.!~>|])'
+    r'|`(?P<code>[^`\n]+)`'
+    r'|\*\*(?P<strong>[^*\n]*)\*\*'
+    r'|__(?P<strong2>[^_\n]*)__'
+    r'|~~(?P<strike>[^~\n]*)~~'
+    r'|\*(?P<em>[^*\s](?:[^*\n]*[^*\s])?)\*'
+    r'|(?<!\w)_(?P<em2>(?:[^_\s](?:[^_\n]*[^_\s])?)?)_(?!\w)'
+    r'|!?\[(?P<label>(?:[^\]\\\n]|\\.)*)\]'
+    r'\((?P<url>(?:[^()\s\\]|\\.|\((?:[^()\s\\]|\\.)*\))+)(?:[ \t]+"(?:[^"\\\n]|\\.)*")?\)'
+)
+# 链接地址和图片说明中的反斜杠转义（html_markdown 会转义其中的反斜杠、方括号和圆括号）
+_LINK_ESCAPE = re.compile(r'\\([!-/:-@\[-`{-~])')
+# 不含这些字符的行没有行内标记，也不需要转义
+_INLINE_TRIGGER = re.compile(r'[\\`*_~\[&<>\xa0]')
+_INLINE_TAGS = {'strong': 'strong', 'strong2': 'strong', 'strike': 's', 'em': 'em', 'em2': 'em'}
+# 只生成这些协议或相对地址的链接，其余只保留文字
+_SAFE_URL = re.compile(r'^(?:https?:|mailto:|[/#.?]|[^:]*$)', re.IGNORECASE)
+
+_METADATA_SCAN_LINES = 6
+
+
+def _escape(text):
+    # 不换行空格写为实体，HTML转Markdown时才能保留
+    return html.escape(text, quote=False).replace('\xa0', '&nbsp;')
+
+
+def _unescape_link(text):
+    return _LINK_ESCAPE.sub(r'\1', text)
+
+
+def render_inline(text):
+    """
+    把一行Markdown的行内标记转换为HTML
+
+    Args:
+        text: Markdown文本
+
+    Returns:
+        str: HTML片段
+    """
+    if not _INLINE_TRIGGER.search(text):
+        return text
+    parts = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        parts.append(_escape(text[position:match.start()]))
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'escaped':
+            parts.append(_escape(match.group('escaped')))
+        elif kind == 'code':
+            parts.append(f'<code>{_escape(match.group("code"))}</code>')
+        elif kind == 'url':
+            label, url = match.group('label'), _unescape_link(match.group('url'))
+            if not _SAFE_URL.match(url):
+                parts.append(render_inline(label))
+            elif match.group(0).startswith('!'):
+                parts.append(f'<img src="{html.escape(url)}" alt="{html.escape(_unescape_link(label))}">')
+            else:
+                parts.append(f'<a href="{html.escape(url)}">{render_inline(label)}</a>')
+        else:
+            tag = _INLINE_TAGS[kind]
+            parts.append(f'<{tag}>{render_inline(match.group(kind))}</{tag}>')
+    parts.append(_escape(text[position:]))
+    return ''.join(parts)
+
+
+def _render_lines(lines):
+    return '<br>'.join(render_inline(line.strip()) for line in lines)
+
+
+def _render_list(items):
+    """items 为 [(缩进, 是否有序, 起始编号, 行列表, 项内代码块HTML列表)]，按缩进生成嵌套列表"""
+    parts = []
+    stack = []
+    for indent, ordered, number, lines, code_blocks in items:
+        tag = 'ol' if ordered else 'ul'
+        while stack and indent < stack[-1][0]:
+            parts.append(f'</li></{stack.pop()[1]}>')
+        if stack and indent == stack[-1][0]:
+            if tag == stack[-1][1]:
+                parts.append('</li>')
+            else:
+                parts.append(f'</li></{stack.pop()[1]}>')
+        if not stack or indent > stack[-1][0]:
+            start = f' start="{number}"' if ordered and number != 1 else ''
+            parts.append(f'<{tag}{start}>')
+            stack.append((indent, tag))
+        parts.append(f'<li><p>{_render_lines(lines)}</p>')
+        parts.extend(code_blocks)
+    while stack:
+        parts.append(f'</li></{stack.pop()[1]}>')
+    return ''.join(parts)
+
+
+def strip_metadata_header(content):
+    """
+    去掉文件开头的元数据头
+
+    只有前几行内出现 ---，且它之前有 key: value 形式的行时才认为是元数据，
+    正文中间的 --- 是分隔线
+    """
+    lines = content.split('\n', _METADATA_SCAN_LINES)
+    has_metadata = False
+    for i, line in enumerate(lines[:_METADATA_SCAN_LINES]):
+        stripped = line.strip()
+        if stripped == '---' and i > 0 and has_metadata:
+            return content.split('\n', i + 1)[-1].strip() if i + 1 < len(lines) else ''
+        if ':' in line and not stripped.startswith('#'):
+            has_metadata = True
+    return content.strip()
+
+
+class _BlockBuilder:
+    """逐行累积当前块，遇到块边界时输出"""
+
+    def __init__(self):
+        self.blocks = []
+        self.kind = None
+        self.lines = []
+        self.items = []
+        self.blank = False      # 当前列表块中刚遇到空行
+        self.loose = False      # 列表项之间有空行
+
+    def emit(self, format_type, content):
+        self.blocks.append(MarkdownBlock(format_type, content))
+
+    def emit_code(self, info, lines, in_list=False):
+        if not any(line.strip() for line in lines):
+            return
+        if in_list:
+            self.loose = self.loose or self.blank
+            self.blank = False
+            self.items[-1][4].append(_render_code(info, lines))
+        else:
+            self.emit(FORMAT_TEXT, _render_code(info, lines))
+
+    def in_list_item(self, indent):
+        """缩进比列表第一项更深的行属于当前列表项"""
+        return self.kind == 'list' and indent > self.items[0][0]
+
+    def flush(self):
+        if self.kind == 'paragraph':
+            self.emit(FORMAT_TEXT, f'<p>{_render_lines(self.lines)}</p>')
+        elif self.kind == 'quote' and any(line.strip() for line in self.lines):
+            self.emit(FORMAT_QUOTE, f'<blockquote>{_render_quote(self.lines)}</blockquote>')
+        elif self.kind == 'list':
+            self.emit(FORMAT_NUMBER if self.items[0][1] else FORMAT_BULLET, _render_list(self._list_items()))
+        self.kind = None
+        self.lines = []
+        self.items = []
+        self.blank = False
+        self.loose = False
+
+    def _list_items(self):
+        """
+        空行分隔的列表沿用 html_markdown 的缩进：顶层项缩进两格，只有第一项因去掉首尾空白而没有缩进，
+        这时把第一项视为与其余顶层项同级
+        """
+        items = self.items
+        if self.loose and items[0][0] == 0 and len(items) > 1 and all(item[0] > 0 for item in items[1:]):
+            first = items[0]
+            items = [(min(2, min(item[0] for item in items[1:])),) + first[1:]] + items[1:]
+        return items
+
+    def end_line(self):
+        """空行：列表项之间的空行不结束列表，由下一行决定"""
+        if self.kind == 'list':
+            self.blank = True
+        else:
+            self.flush()
+
+    def add_line(self, kind, text):
+        if self.kind != kind:
+            self.flush()
+            self.kind = kind
+        self.lines.append(text)
+
+    def add_text(self, line):
+        if self.kind == 'list' and not self.blank:
+            # 列表项的续行
+            self.items[-1][3].append(line)
+        else:
+            self.add_line('paragraph', line)
+
+    def add_item(self, indent, ordered, number, text):
+        # 同一列表块内允许嵌套；顶层列表类型变化时另起一块。
+        # 空行之后只有比第一项缩进更深的项属于同一块，与第一项同样缩进的项是下一条笔记的列表
+        if self.kind == 'list':
+            deeper = indent > self.items[0][0]
+            if deeper or (not self.blank and ordered == self.items[0][1]):
+                self.loose = self.loose or self.blank
+                self.blank = False
+                self.items.append((indent, ordered, number, [text], []))
+                return
+        self.flush()
+        self.kind = 'list'
+        self.items.append((indent, ordered, number, [text], []))
+
+
+def parse_markdown_blocks(content):
+    """
+    把Markdown切分为笔记块
+
+    Args:
+        content: Markdown文本（可带元数据头）
+
+    Returns:
+        list: MarkdownBlock(格式, HTML内容) 列表，按原文顺序排列，不含空块
+    """
+    if not content:
+        return []
+    builder = _BlockBuilder()
+    fence = None
+    fence_info = ''
+    fence_indent = 0
+    fence_in_list = False
+    code_lines = []
+
+    for line in strip_metadata_header(content).split('\n'):
+        if fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                builder.emit_code(fence_info, code_lines, fence_in_list)
+                fence = None
+            else:
+                # 去掉与围栏相同的缩进（列表项下的代码块）
+                code_lines.append(line[fence_indent:] if not line[:fence_indent].strip() else line.lstrip())
+            continue
+
+        first = line.lstrip()[:1]
+        if not first:
+            builder.end_line()
+            continue
+        if first not in _BLOCK_MARKERS and not first.isdigit():
+            # 没有块级标记的行只可能是段落或列表项的续行
+            builder.add_text(line)
+            continue
+
+        indent = len(line) - len(line.lstrip())
+        match = _FENCE.match(line.lstrip())
+        if match and (indent <= 3 or builder.in_list_item(indent)):
+            fence_in_list = builder.in_list_item(indent)
+            if not fence_in_list:
+                builder.flush()
+            fence, fence_info, fence_indent, code_lines = match.group(1), match.group(2), indent, []
+            continue
+
+        match = _HEADING.match(line)
+        if match:
+            builder.flush()
+            if not match.group(2):
+                continue
+            level = min(len(match.group(1)), MAX_HEADING_LEVEL)
+            builder.emit(f'h{level}', f'<h{level}>{render_inline(match.group(2))}</h{level}>')
+            continue
+
+        if _RULE.match(line):
+            builder.flush()
+            builder.emit(FORMAT_TEXT, '<hr>')
+            continue
+
+        match = _LIST_ITEM.match(line)
+        if match:
+            indent = len(match.group(1).expandtabs(4))
+            number = match.group(3)
+            builder.add_item(indent, number is not None, int(number or 1), match.group(4))
+            continue
+
+        match = _QUOTE.match(line)
+        if match:
+            builder.add_line('quote', match.group(1))
+            continue
+
+        builder.add_text(line)
+
+    if fence is not None:
+        # 未闭合的代码块到文末为止
+        builder.emit_code(fence_info, code_lines, fence_in_list)
+    builder.flush()
+    return builder.blocks
+
+
+def _render_quote(lines):
+    """引用内以空行分隔的段落分别生成 <p>"""
+    paragraphs = []
+    current = []
+    for line in lines:
+        if line.strip():
+            current.append(line)
+        elif current:
+            paragraphs.append(current)
+            current = []
+    if current:
+        paragraphs.append(current)
+    return ''.join(f'<p>{_render_lines(paragraph)}</p>' for paragraph in paragraphs)
+
+
+def _render_code(info, lines):
+    language = f' class="language-{html.escape(info)}"' if info else ''
+    code = _escape('\n'.join(lines))
+    return f'<pre><code{language}>{code}</code></pre>'
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: metrics.py
+模块: 工具 - 运行指标
+描述: 进程内的轻量指标注册表，供各服务上报计数、耗时和状态
+功能:
+    - 计数器（counter）累加
+    - 瞬时值（gauge）记录
+    - 耗时/数值分布统计（count/sum/min/max/last）
+    - 注册状态采集函数，在快照时统一收集
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - threading: 线程锁
+
+许可证: Apache-2.0
+"""
+
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRegistry:
+    """线程安全的进程内指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._observations = {}
+        self._collectors = {}
+
+    def incr(self, name, value=1):
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """设置瞬时值"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """记录一次观测值（通常是耗时，单位秒）"""
+        with self._lock:
+            stat = self._observations.get(name)
+            if stat is None:
+                stat = {'count': 0, 'sum': 0.0, 'min': value, 'max': value, 'last': value}
+                self._observations[name] = stat
+            stat['count'] += 1
+            stat['sum'] += value
+            stat['min'] = min(stat['min'], value)
+            stat['max'] = max(stat['max'], value)
+            stat['last'] = value
+
+    def register_collector(self, name, collector):
+        """注册状态采集函数，快照时调用，返回值需可JSON序列化"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self):
+        """返回当前所有指标的快照"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            observations = {}
+            for name, stat in self._observations.items():
+                observations[name] = dict(stat)
+                observations[name]['avg'] = stat['sum'] / stat['count'] if stat['count'] else 0.0
+            collectors = dict(self._collectors)
+
+        collected = {}
+        for name, collector in collectors.items():
+            try:
+                collected[name] = collector()
+            except Exception as e:
+                logger.warning(f"指标采集失败 {name}: {str(e)}")
+                collected[name] = {'error': str(e)}
+
+        return {
+            'counters': counters,
+            'gauges': gauges,
+            'observations': observations,
+            'collectors': collected
+        }
+
+    def reset(self):
+        """清空计数和观测值（主要用于测试）"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._observations.clear()
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
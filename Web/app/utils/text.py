@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: text.py
+模块: 工具模块 - 文本处理
+描述: 笔记文本处理的通用函数
+功能:
+    - 去除HTML标签得到纯文本
+    - 中英文混合文本的分词（英文单词 + 中文二元组）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - re: 正则表达式
+    - html: HTML实体解码
+
+许可证: Apache-2.0
+"""
+
+import re
+import html
+
+_BLOCK_TAG_PATTERN = re.compile(r'<\s*(br|/p|/div|/li|/h[1-6]|/blockquote)[^>]*>', re.IGNORECASE)
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+_SPACE_PATTERN = re.compile(r'[ \t\r\f\v]+')
+_TOKEN_PATTERN = re.compile(r'[a-z0-9_]+|[一-鿿]+')
+
+
+def strip_html(content):
+    """
+    去除HTML标签并解码实体，块级标签转为换行
+
+    Args:
+        content: 笔记内容（HTML或纯文本）
+
+    Returns:
+        str: 纯文本
+    """
+    if not content:
+        return ''
+    text = _BLOCK_TAG_PATTERN.sub('\n', content)
+    text = _TAG_PATTERN.sub('', text)
+    text = html.unescape(text).replace('\xa0', ' ')
+    text = _SPACE_PATTERN.sub(' ', text)
+    return '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+
+
+def tokenize(text):
+    """
+    分词：英文和数字按单词切分，中文按相邻二元组切分（单字词保留单字）
+
+    Returns:
+        list: 词项列表
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.findall(text.lower()):
+        if match[0] >= '一':
+            if len(match) == 1:
+                tokens.append(match)
+            else:
+                tokens.extend(match[i:i + 2] for i in range(len(match) - 1))
+        elif len(match) > 1:
+            tokens.append(match)
+    return tokens
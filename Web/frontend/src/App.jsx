@@ -38,6 +38,7 @@ import { useFiles } from './hooks/useFiles';
 import { useNotes } from './hooks/useNotes';
 import { DragDropContext } from './utils/dndWrapper.jsx';
 import ErrorBoundary from './components/ErrorBoundary'; // Import the ErrorBoundary
+import aiService from './services/aiService';
 
 function App() {
   // 1. API 状态管理
@@ -105,6 +106,12 @@ function App() {
     initialize();
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []); // 初始加载，依赖项为空
+  // 打开文件时请求后台预收集，AI优化对话框可以直接使用已整理好的内容
+  React.useEffect(() => {
+    if (activeFileId) {
+      aiService.prefetchContent(activeFileId);
+    }
+  }, [activeFileId]);
   // 删除文件夹后刷新文件列表
   const handleDeleteFolder = useCallback(async (folderId) => {
     const success = await deleteFolder(folderId);
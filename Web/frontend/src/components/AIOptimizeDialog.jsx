@@ -8,11 +8,12 @@
  *   - 提供加载状态和错误处理
  *   - 支持预览优化前后对比
  *   - 显示优化报告和统计信息
+ *   - 原始和优化后内容按段加载，优化和应用都使用服务端产物，不回传正文
  *  * 作者: 前端团队
  * 创建时间: 2024-11-20
- * 最后修改: 2024-12-25
- * 修改人: UI开发者
- * 版本: 1.3.0
+ * 最后修改: 2026-10-18
+ * 修改人: Jolly
+ * 版本: 1.5.1
  * 许可证: Apache-2.0
  * 
  * 依赖:
@@ -73,12 +74,19 @@ import {
 } from '@mui/icons-material';
 import aiService from '../services/aiService';
 
+// 对比视图每次加载的字节数
+const TEXT_PAGE_SIZE = 64 * 1024;
+
+const emptyText = { filename: null, text: '', nextOffset: 0, eof: true };
+
 const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
     const [step, setStep] = useState('collecting'); // collecting, optimizing, result
     const [loadingStatus, setLoadingStatus] = useState('');
     const [error, setError] = useState(null);
-    const [originalContent, setOriginalContent] = useState('');
-    const [optimizedContent, setOptimizedContent] = useState('');
+    // 分段加载的正文：{ filename, text, nextOffset, eof }
+    const [originalText, setOriginalText] = useState(emptyText);
+    const [optimizedText, setOptimizedText] = useState(emptyText);
+    const [optimizedArtifact, setOptimizedArtifact] = useState(null); // 审阅中的优化结果引用（含 etag）
     const [optimizationReport, setOptimizationReport] = useState(null);
     const [tabValue, setTabValue] = useState(0); // 0: 优化, 1: 临时文件管理
     const [tempFiles, setTempFiles] = useState([]);
@@ -99,9 +107,12 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
         try {
             const result = await aiService.collectFileContent(fileId);
             if (result.success) {
-                setOriginalContent(result.collected_content);
+                // 收集接口只返回产物引用，正文只加载第一段用于预览
+                if (result.artifact) {
+                    setOriginalText(await loadTextPage(result.artifact.filename, emptyText));
+                }
                 setStep('optimizing');
-                await handleOptimizeContent(result.collected_content);
+                await handleOptimizeContent();
             } else {
                 setError(result.error || '收集内容失败');
             }
@@ -111,21 +122,60 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
         setLoading(false);
     };
 
-    const handleOptimizeContent = async (content) => {
+    const loadTextPage = async (filename, current) => {
+        const offset = current.filename === filename ? current.nextOffset : 0;
+        const page = await aiService.getArtifactText(filename, offset, TEXT_PAGE_SIZE);
+        if (!page.success) {
+            throw new Error(page.error || '读取内容失败');
+        }
+        return {
+            filename,
+            text: (current.filename === filename ? current.text : '') + page.text,
+            nextOffset: page.next_offset,
+            eof: page.eof
+        };
+    };
+
+    const handleLoadMore = async (current, setText) => {
+        try {
+            setText(await loadTextPage(current.filename, current));
+        } catch (err) {
+            setError('加载内容时发生错误: ' + err.message);
+        }
+    };
+
+    const handleOptimizeContent = async () => {
         setLoading(true);
         setError(null);
         setLoadingStatus('正在连接AI服务...');
 
         try {
             setLoadingStatus('AI正在分析内容...');
-            const result = await aiService.optimizeContent(fileId, content, 'general');
+            // 使用服务端已收集的内容，响应只含优化结果的产物引用
+            const result = await aiService.optimizeContent(fileId, null, 'general', {
+                compact: true,
+                fromCollected: true
+            });
             
             setLoadingStatus('正在处理优化结果...');
             if (result.success) {
-                setOptimizedContent(result.optimized_content);
+                if (result.optimized_artifact) {
+                    setOptimizedArtifact(result.optimized_artifact);
+                    setOptimizedText(await loadTextPage(result.optimized_artifact.filename, emptyText));
+                }
                 setOptimizationReport(result.report);
                 setStep('result');
                 setLoadingStatus('');
+                // 块级改动明细按需获取，不阻塞优化结果展示
+                if (result.report && !result.report.detailed) {
+                    aiService.getOptimizationReport(fileId, 'general')
+                        .then((reportResult) => {
+                            if (reportResult.success) {
+                                setOptimizationReport(reportResult.report);
+                            }
+                        })
+                        .catch(() => {});
+                }
             } else {
                 setError(result.error || 'AI优化失败');
             }
@@ -141,7 +191,10 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
         setError(null);
 
         try {
-            const result = await aiService.applyOptimization(fileId, optimizedContent, true);
+            // 应用服务端保存的优化结果，只应用用户审阅过的那一版
+            const result = await aiService.applyOptimization(
+                fileId, null, true, 'general', optimizedArtifact ? optimizedArtifact.etag : null
+            );
             if (result.success) {
                 onClose(true); // 传递true表示已应用优化
             } else {
@@ -160,8 +213,9 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
     const handleReset = () => {
         setStep('collecting');
         setError(null);
-        setOriginalContent('');
-        setOptimizedContent('');
+        setOriginalText(emptyText);
+        setOptimizedText(emptyText);
+        setOptimizedArtifact(null);
         setOptimizationReport(null);
         handleCollectContent();
     };
@@ -248,14 +302,14 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
             <Typography variant="caption" color="text.secondary" sx={{ mt: 1, display: 'block' }}>
                 预计需要 8-15 秒，请耐心等待
             </Typography>
-            {originalContent && (
+            {originalText.text && (
                 <Paper sx={{ mt: 3, p: 2, textAlign: 'left', maxHeight: 200, overflow: 'auto' }}>
                     <Typography variant="subtitle2" gutterBottom>
                         原始内容预览:
                     </Typography>
                     <Typography variant="body2" sx={{ whiteSpace: 'pre-wrap' }}>
-                        {originalContent.substring(0, 500)}
-                        {originalContent.length > 500 && '...'}
+                        {originalText.text.substring(0, 500)}
+                        {originalText.text.length > 500 && '...'}
                     </Typography>
                 </Paper>
             )}
@@ -273,7 +327,9 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
                     <Box sx={{ display: 'flex', flexWrap: 'wrap', gap: 1, mb: 1 }}>
                         <Chip 
                             size="small" 
-                            label={`检测到 ${optimizationReport.changes_count} 处改进`}
+                            label={optimizationReport.detailed
+                                ? `检测到 ${optimizationReport.changes_count} 处改进`
+                                : '正在统计改动...'}
                             color="primary"
                         />
                         <Chip 
@@ -300,8 +356,13 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
                         原始内容
                     </Typography>
                     <Typography variant="body2" sx={{ whiteSpace: 'pre-wrap' }}>
-                        {originalContent}
+                        {originalText.text}
                     </Typography>
+                    {!originalText.eof && (
+                        <Button size="small" onClick={() => handleLoadMore(originalText, setOriginalText)}>
+                            加载更多
+                        </Button>
+                    )}
                 </Paper>
 
                 <Divider orientation="vertical" flexItem />
@@ -312,8 +373,13 @@ const AIOptimizeDialog = ({ open, onClose, fileId, fileName }) => {
                         AI优化后内容
                     </Typography>
                     <Typography variant="body2" sx={{ whiteSpace: 'pre-wrap' }}>
-                        {optimizedContent}
+                        {optimizedText.text}
                     </Typography>
+                    {!optimizedText.eof && (
+                        <Button size="small" onClick={() => handleLoadMore(optimizedText, setOptimizedText)}>
+                            加载更多
+                        </Button>
+                    )}
                 </Paper>
             </Box>
         </Box>
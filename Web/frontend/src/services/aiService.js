@@ -5,7 +5,7 @@
  * 功能: AI内容优化、文本收集、内容应用、API通信、错误处理
  * 作者: Jolly Chen
  * 时间: 2024-11-20
- * 版本: 1.3.0
+ * 版本: 1.6.1
  * 依赖: Fetch API
  * 许可证: Apache-2.0
  */
@@ -42,13 +42,57 @@ class AIService {
         }
     }
 
+    /**
+     * 读取服务端已生成的收集内容正文（收集接口只返回元数据和产物引用）
+     * @param {number} fileId - 文件ID
+     * @returns {Promise<string>} 收集内容正文
+     */
+    async getCollectedContent(fileId) {
+        try {
+            const response = await fetch(`${API_BASE_URL}/ai/collected-content/${fileId}?body_only=true`);
+
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            const result = await response.json();
+            if (!result.success) {
+                throw new Error(result.error || '未找到收集的内容');
+            }
+            return result.collected_content;
+        } catch (error) {
+            console.error('读取收集内容失败:', error);
+            throw error;
+        }
+    }
+
+    /**
+     * 打开文件时请求服务端后台预收集内容（服务端未启用时不做任何事）
+     * 失败不影响正常流程，只记录警告
+     * @param {number} fileId - 文件ID
+     */
+    async prefetchContent(fileId) {
+        try {
+            await fetch(`${API_BASE_URL}/ai/prefetch`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ file_id: fileId })
+            });
+        } catch (error) {
+            console.warn('请求预收集失败:', error);
+        }
+    }
+
     /**
      * 对内容进行AI优化
      * @param {number} fileId - 文件ID
      * @param {string} content - 待优化的内容
      * @param {string} type - 优化类型 (general, grammar, structure, clarity)
+     * @param {Object} options - compact: 响应只含产物引用和长度；fromCollected: 使用服务端已收集的内容（content 可为空）
      * @returns {Promise} 包含优化结果的响应
-     */    async optimizeContent(fileId, content, type = 'general') {
+     */    async optimizeContent(fileId, content, type = 'general', { compact = false, fromCollected = false } = {}) {
         try {
             console.log('AI优化请求:', {
                 url: `${API_BASE_URL}/ai/optimize-content`,
@@ -69,7 +113,9 @@ class AIService {
                 body: JSON.stringify({
                     file_id: parseInt(fileId, 10),
                     content,
-                    type
+                    type,
+                    compact,
+                    from_collected: fromCollected
                 }),
                 signal: controller.signal
             });
@@ -98,14 +144,72 @@ class AIService {
         }
     }
 
+    /**
+     * 按需获取块级优化报告（使用服务端保存的收集内容和优化结果）
+     * @param {number} fileId - 文件ID
+     * @param {string} type - 优化类型
+     * @returns {Promise} 包含报告的响应
+     */
+    async getOptimizationReport(fileId, type = 'general') {
+        try {
+            const response = await fetch(`${API_BASE_URL}/ai/optimization-report`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    file_id: parseInt(fileId, 10),
+                    optimization_type: type
+                })
+            });
+
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            return await response.json();
+        } catch (error) {
+            console.error('获取优化报告失败:', error);
+            throw error;
+        }
+    }
+
+    /**
+     * 按字节偏移分段读取产物正文
+     * @param {string} filename - 产物文件名
+     * @param {number} offset - 起始偏移（上一段返回的 next_offset）
+     * @param {number} limit - 本段字节数
+     * @param {boolean} bodyOnly - 是否跳过元数据头部
+     * @returns {Promise} 包含 text、next_offset、eof 的响应
+     */
+    async getArtifactText(filename, offset = 0, limit = 64 * 1024, bodyOnly = true) {
+        try {
+            const params = new URLSearchParams({ offset, limit, body_only: bodyOnly });
+            const response = await fetch(
+                `${API_BASE_URL}/ai/artifacts/${encodeURIComponent(filename)}/text?${params}`
+            );
+
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            return await response.json();
+        } catch (error) {
+            console.error('分段读取产物失败:', error);
+            throw error;
+        }
+    }
+
     /**
      * 应用AI优化结果
      * @param {number} fileId - 文件ID
-     * @param {string} optimizedContent - 优化后的内容
+     * @param {string|null} optimizedContent - 优化后的内容，为空时使用服务端保存的优化结果
      * @param {boolean} backupOriginal - 是否备份原始内容
-     * @returns {Promise} 应用结果响应
+     * @param {string} type - 优化类型（使用服务端优化结果时）
+     * @param {string|null} artifactEtag - 审阅过的优化结果版本（optimized_artifact.etag），使用服务端优化结果时必填
+     * @returns {Promise} 应用结果响应；优化结果已被重新生成时返回 success=false、conflict=true
      */
-    async applyOptimization(fileId, optimizedContent, backupOriginal = true) {
+    async applyOptimization(fileId, optimizedContent, backupOriginal = true, type = 'general', artifactEtag = null) {
         try {
             const response = await fetch(`${API_BASE_URL}/ai/apply-optimization`, {
                 method: 'POST',
@@ -115,11 +219,16 @@ class AIService {
                 body: JSON.stringify({
                     file_id: fileId,
                     optimized_content: optimizedContent,
-                    backup_original: backupOriginal
+                    from_artifact: !optimizedContent,
+                    optimization_type: type,
+                    artifact_etag: artifactEtag,
+                    backup_original: backupOriginal,
+                    compact: true
                 })
             });
 
-            if (!response.ok) {
+            // 409：审阅后优化结果被重新生成，返回错误信息由调用方提示
+            if (!response.ok && response.status !== 409) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
@@ -161,15 +270,16 @@ class AIService {
             console.log('正在收集文件内容...');
             const contentResult = await this.collectFileContent(fileId);
             
-            if (!contentResult.success || !contentResult.collected_content) {
+            if (!contentResult.success) {
                 throw new Error('无法收集文件内容');
             }
+            const collectedContent = await this.getCollectedContent(fileId);
 
             // 步骤2: AI优化内容
             console.log('正在进行AI优化...');
             const optimizationResult = await this.optimizeContent(
                 fileId, 
-                contentResult.collected_content, 
+                collectedContent, 
                 optimizationType
             );
 
@@ -179,7 +289,7 @@ class AIService {
 
             return {
                 success: true,
-                originalContent: contentResult.collected_content,
+                originalContent: collectedContent,
                 optimizedContent: optimizationResult.optimized_content,
                 report: optimizationResult.report,
                 fileInfo: {
@@ -290,6 +400,15 @@ class AIService {
             throw error;
         }
     }
+
+    /**
+     * 获取临时文件的下载地址（服务端流式发送，浏览器自动处理gzip编码）
+     * @param {string} filename - 临时文件名
+     * @returns {string} 下载地址
+     */
+    getTempFileDownloadUrl(filename) {
+        return `${API_BASE_URL}/ai/temp-file/${encodeURIComponent(filename)}?download=true`;
+    }
 }
 
 // 创建单例实例
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_ai_batch.py
+模块: 批量AI处理测试
+描述: 使用本地桩服务商测试文件夹批量优化/摘要、进度查询和失败后继续
+功能:
+    - 文件夹批量处理测试
+    - 部分失败与继续执行测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app: 应用程序模块
+
+许可证: Apache-2.0
+"""
+
+import time
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.api import ai as ai_api
+from app.extensions import db
+from app.models.folder import Folder
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services.ai_service import ai_service
+from app.services.batch_processor import BatchProcessor
+from app.services.llm_providers import StubProvider
+from app.services.llm_resilience import LLMProviderError
+
+
+class FailingForFileProvider(StubProvider):
+    """对包含指定标记的内容返回不可重试错误"""
+
+    def __init__(self, marker):
+        super().__init__()
+        self.marker = marker
+
+    def _generate(self, prompt, stop=None):
+        if self.marker and self.marker in prompt:
+            raise LLMProviderError('bad request', status_code=400)
+        return super()._generate(prompt, stop=stop)
+
+
+class AIBatchTestCase(unittest.TestCase):
+    """批量AI处理测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+        folder = Folder(name='批量')
+        db.session.add(folder)
+        db.session.flush()
+        self.folder_id = folder.id
+        for i in range(3):
+            note_file = NoteFile(name=f'file{i}', order=i, folder_id=folder.id)
+            db.session.add(note_file)
+            db.session.flush()
+            db.session.add(Note(file_id=note_file.id, order=0, format='text',
+                                content=f'文件{i}的内容。第二句。'))
+        db.session.commit()
+
+        # 内存SQLite只有一个连接，测试中使用单线程处理
+        self.processor = BatchProcessor(ai_api.data_processor, ai_api.ai_optimizer,
+                                        ai_api.data_applier, max_workers=1)
+        self.patches = [
+            mock.patch.object(ai_api, 'batch_processor', self.processor),
+            mock.patch.object(ai_service.llm, '_provider', FailingForFileProvider('文件1')),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def wait_for(self, job_id):
+        for _ in range(200):
+            job = self.client.get(f'/api/ai/batch/{job_id}').get_json()['job']
+            if job['status'] not in ('running', 'cancelling'):
+                return job
+            time.sleep(0.02)
+        self.fail('批量任务未在预期时间内完成')
+
+    def test_folder_batch_with_partial_failure_and_resume(self):
+        """文件夹批量处理：部分失败后可以继续"""
+        response = self.client.post('/api/ai/batch', json={
+            'folder_id': self.folder_id,
+            'operations': ['summary', 'optimize']
+        })
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job']['job_id']
+
+        job = self.wait_for(job_id)
+        self.assertEqual(job['status'], 'partially_failed')
+        self.assertEqual(job['steps'], ['collect', 'optimize', 'summary'])
+        self.assertEqual(job['counts']['succeeded'], 2)
+        failed = [item for item in job['items'] if item['status'] == 'failed']
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0]['completed_steps'], ['collect'])
+
+        # 修复服务商后继续，失败的文件从优化步骤继续
+        ai_service.llm._provider.marker = None
+        response = self.client.post(f'/api/ai/batch/{job_id}/resume')
+        self.assertEqual(response.status_code, 202)
+        job = self.wait_for(job_id)
+        self.assertEqual(job['status'], 'completed')
+        for item in job['items']:
+            self.assertTrue(item['result']['summary'])
+        resumed = [item for item in job['items'] if item['attempts'] == 2]
+        self.assertEqual(len(resumed), 1)
+
+    def test_batch_requires_targets(self):
+        """缺少文件夹和文件列表时返回400"""
+        response = self.client.post('/api/ai/batch', json={'operations': ['summary']})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/ai/batch', json={'file_ids': [999]})
+        self.assertEqual(response.status_code, 404)
+        for file_ids in (['abc'], [None], 5, [True]):
+            response = self.client.post('/api/ai/batch', json={'file_ids': file_ids})
+            self.assertEqual(response.status_code, 400, file_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
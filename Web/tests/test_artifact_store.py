@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_artifact_store.py
+模块: 产物存储测试
+描述: 测试带索引清单的中间产物存储及其与数据处理、优化服务的集成
+功能:
+    - 写入、索引查询和清理测试
+    - 文件名包含数字时按文件ID正确区分测试
+    - 旧版平铺临时文件导入测试
+    - 后台清理：每文件上限、总字节配额按访问时间淘汰、残留文件清理测试
+    - 压缩存储与流式下载（gzip原样发送、流式解压、Range请求）测试
+    - 分段读取正文（UTF-8边界对齐、跳过元数据头部）和精简响应测试
+    - 多进程并发写入、读取、清理压力测试（不允许读到不完整内容）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.artifact_store: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import gzip
+import hashlib
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.api import ai as ai_api
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services.artifact_store import (
+    ArtifactStore,
+    ENCODING_GZIP,
+    KIND_COLLECTED,
+    KIND_OPTIMIZED,
+    strip_header,
+)
+from app.services.artifact_janitor import ArtifactJanitor
+from app.services.ai_optimizer import AIOptimizer
+from app.services.data_processor import DataProcessor
+from app.services.temp_file_manager import TempFileManager
+
+COLLECTED = """# 笔记内容收集 - {name}
+生成时间: 2026-10-18 10:00:00
+文件ID: {file_id}
+原始文件名: {name}
+
+---
+
+{body}
+"""
+
+
+def _stress_worker(root, seed, iterations, results):
+    """子进程：随机写入、读取和清理产物，统计读到的不完整内容"""
+    store = ArtifactStore(root, fsync='none')
+    rng = random.Random(seed)
+    reads = torn = 0
+    for _ in range(iterations):
+        file_id = rng.randint(1, 3)
+        kind, variant = rng.choice([(KIND_COLLECTED, ''), (KIND_OPTIMIZED, 'general')])
+        action = rng.random()
+        if action < 0.45:
+            body = os.urandom(rng.randint(1, 64 * 1024)).hex()
+            store.put(file_id, kind, hashlib.sha1(body.encode()).hexdigest() + '\n' + body,
+                      f'f{file_id}', variant)
+        elif action < 0.9:
+            record = store.get(file_id, kind, variant)
+            content = store.read(record) if record else None
+            if content is not None:
+                reads += 1
+                checksum, _, body = content.partition('\n')
+                if hashlib.sha1(body.encode()).hexdigest() != checksum:
+                    torn += 1
+        elif action < 0.95:
+            store.evict_per_file(1)
+        else:
+            store.delete(file_id=file_id)
+    results.put((reads, torn))
+
+
+class ArtifactStoreTestCase(unittest.TestCase):
+    """产物存储测试用例"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.clock_value = 1000.0
+        self.store = ArtifactStore(self.root, clock=lambda: self.clock_value)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_put_get_and_replace(self):
+        """同一文件和类型只保留最新一份，文件改名后旧文件被删除"""
+        first = self.store.put(3, KIND_COLLECTED, COLLECTED.format(name='a', file_id=3, body='v1'), 'a')
+        self.assertEqual(first['filename'], 'a_3_collected.txt')
+        self.assertTrue(os.path.exists(first['path']))
+
+        second = self.store.put(3, KIND_COLLECTED, COLLECTED.format(name='b', file_id=3, body='v2'), 'b')
+        self.assertFalse(os.path.exists(first['path']))
+        record = self.store.get(3, KIND_COLLECTED)
+        self.assertEqual(record['filename'], second['filename'])
+        self.assertEqual(strip_header(self.store.read(record)), 'v2')
+        self.assertEqual(self.store.get_stats()['file_count'], 1)
+
+    def test_digits_in_file_names(self):
+        """文件名中的数字不会与文件ID混淆"""
+        self.store.put(7, KIND_COLLECTED, 'x', 'report 2024')
+        self.store.put(2024, KIND_OPTIMIZED, 'y', 'notes', variant='general')
+        self.assertEqual([r['file_id'] for r in self.store.list(file_id=7)], [7])
+        self.assertIsNone(self.store.get(2024, KIND_COLLECTED))
+
+        self.assertEqual(self.store.delete(file_id=2024), 1)
+        self.assertEqual(self.store.get(7, KIND_COLLECTED)['filename'], 'report_2024_7_collected.txt')
+
+    def test_cleanup_by_age_and_missing_files(self):
+        """按生成时间清理；文件丢失时读取返回None并移除记录"""
+        self.store.put(1, KIND_COLLECTED, 'old', 'old')
+        self.clock_value += 100
+        record = self.store.put(2, KIND_COLLECTED, 'new', 'new')
+        self.assertEqual(self.store.delete_older_than(1050), 1)
+        self.assertEqual([r['file_id'] for r in self.store.list()], [2])
+
+        os.remove(record['path'])
+        self.assertIsNone(self.store.read(record))
+        self.assertEqual(self.store.list(), [])
+
+    def test_legacy_files_are_imported(self):
+        """旧版平铺文件按头部的文件ID导入清单"""
+        legacy_root = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(legacy_root, 'plan_2_12_collected.txt'), 'w', encoding='utf-8') as f:
+                f.write(COLLECTED.format(name='plan 2', file_id=12, body='内容'))
+            store = ArtifactStore(legacy_root)
+            record = store.get(12, KIND_COLLECTED)
+            self.assertEqual(record['filename'], 'plan_2_12_collected.txt')
+            self.assertEqual(strip_header(store.read(record)), '内容')
+            self.assertFalse(os.path.exists(os.path.join(legacy_root, 'plan_2_12_collected.txt')))
+        finally:
+            shutil.rmtree(legacy_root, ignore_errors=True)
+
+    def test_services_share_the_index(self):
+        """数据处理、优化和临时文件管理通过同一清单查询"""
+        processor = DataProcessor(self.root)
+        optimizer = AIOptimizer(self.root)
+        manager = TempFileManager(self.root)
+
+        processor._save_to_temp_file('收集', 'doc 5', 5, 'collected')
+        optimizer._save_optimized_to_temp_file('优化', 'doc 5', 5, 'grammar')
+        self.assertTrue(processor.check_collected_content_exists(5)['exists'])
+        self.assertEqual(optimizer.check_optimized_content_exists(5)['optimization_types'], ['grammar'])
+        self.assertEqual(strip_header(optimizer.get_optimized_content(5, 'grammar')['optimized_content']), '优化')
+        # 其他优化类型的结果互不覆盖，同一类型只保留最新一份
+        optimizer._save_optimized_to_temp_file('摘要', 'doc 5', 5, 'summary')
+        optimizer._save_optimized_to_temp_file('再次优化', 'doc 5', 5, 'grammar')
+        self.assertEqual(sorted(optimizer.check_optimized_content_exists(5)['optimization_types']),
+                         ['grammar', 'summary'])
+        self.assertEqual(strip_header(optimizer.get_optimized_content(5, 'grammar')['optimized_content']), '再次优化')
+
+        listing = manager.list_temp_files(5)
+        self.assertEqual(listing['total_count'], 3)
+        content = processor.get_temp_file_content('doc_5_5_collected.txt')
+        self.assertEqual(strip_header(content['content']), '收集')
+
+        # 写入其他文件的产物不会清理已有文件的产物
+        processor._save_to_temp_file('其他', 'other', 6, 'collected')
+        self.assertTrue(processor.check_collected_content_exists(5)['exists'])
+        self.assertEqual(manager.cleanup_temp_files(file_id=6)['cleaned_count'], 1)
+        self.assertIn('janitor', manager.get_storage_info())
+
+    def test_janitor_evicts_least_recently_used(self):
+        """超出每文件上限和总字节配额时淘汰最久未访问的产物"""
+        for file_id in (1, 2, 3):
+            self.clock_value += 1
+            stored_size = self.store.put(file_id, KIND_COLLECTED, 'x' * 100, f'doc{file_id}')['stored_size']
+        self.clock_value += 1
+        self.store.put(1, KIND_OPTIMIZED, 'y' * 100, 'doc1', variant='general')
+        self.clock_value += 1
+        self.store.put(1, KIND_OPTIMIZED, 'z' * 100, 'doc1', variant='grammar')
+
+        # 最早写入的文件1在被访问后变为最近使用
+        self.clock_value += 1
+        self.assertIsNotNone(self.store.get(1, KIND_COLLECTED))
+
+        # 配额按磁盘占用计算，只容得下两个产物
+        quota = stored_size * 2 + stored_size // 2
+        janitor = ArtifactJanitor(self.store, max_bytes=quota, max_per_file=2, max_age_days=0,
+                                  clock=lambda: self.clock_value)
+        result = janitor.run_once()
+        self.assertEqual(result['evicted_per_file'], 1)
+        self.assertEqual(result['evicted_quota'], 2)
+        self.assertIsNone(self.store.get(1, KIND_OPTIMIZED, 'general', touch=False))
+        self.assertEqual(sorted((r['file_id'], r['kind']) for r in self.store.list()),
+                         [(1, KIND_COLLECTED), (1, KIND_OPTIMIZED)])
+        self.assertLessEqual(self.store.get_stats()['stored_size'], quota)
+        self.assertEqual(janitor.get_stats()['evicted_quota'], 2)
+
+    def test_janitor_removes_orphaned_files(self):
+        """清单未引用且超过宽限期的残留文件被删除，新文件保留"""
+        record = self.store.put(4, KIND_COLLECTED, '内容', 'doc')
+        shard = os.path.dirname(record['path'])
+        stale = os.path.join(shard, '.tmp-stale')
+        fresh = os.path.join(shard, '.tmp-fresh')
+        for path in (stale, fresh):
+            with open(path, 'w') as f:
+                f.write('partial')
+        os.utime(stale, (0, 0))
+        os.utime(fresh, (self.clock_value, self.clock_value))
+
+        self.assertEqual(self.store.sweep_orphans(grace_seconds=60), 1)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(record['path']))
+
+    def test_compressed_storage_and_old_manifest(self):
+        """新产物压缩存储；旧清单补齐列后未压缩的产物仍可读取"""
+        content = COLLECTED.format(name='big', file_id=8, body='重复的段落\n' * 2000)
+        record = self.store.put(8, KIND_COLLECTED, content, 'big')
+        self.assertEqual(record['encoding'], ENCODING_GZIP)
+        self.assertEqual(record['size'], len(content.encode('utf-8')))
+        self.assertLess(record['stored_size'], record['size'] // 10)
+        with gzip.open(record['path'], 'rt', encoding='utf-8') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(self.store.read(record), content)
+
+        legacy_root = tempfile.mkdtemp()
+        try:
+            conn = sqlite3.connect(os.path.join(legacy_root, 'manifest.db'))
+            conn.execute('CREATE TABLE artifacts (id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, '
+                         'kind TEXT NOT NULL, variant TEXT NOT NULL DEFAULT \'\', filename TEXT NOT NULL UNIQUE, '
+                         'path TEXT NOT NULL, size INTEGER NOT NULL DEFAULT 0, fingerprint TEXT, file_name TEXT, '
+                         'created_at REAL NOT NULL, accessed_at REAL NOT NULL, UNIQUE (file_id, kind, variant))')
+            conn.execute("INSERT INTO artifacts VALUES (1, 3, 'collected', '', 'a_3_collected.txt', "
+                         "'03/a_3_collected.txt', 5, NULL, 'a', 1.0, 1.0)")
+            conn.commit()
+            conn.close()
+            os.makedirs(os.path.join(legacy_root, '03'))
+            with open(os.path.join(legacy_root, '03', 'a_3_collected.txt'), 'w') as f:
+                f.write('plain')
+            store = ArtifactStore(legacy_root)
+            old = store.get(3, KIND_COLLECTED)
+            self.assertEqual(old['encoding'], '')
+            self.assertEqual(store.read(old), 'plain')
+            self.assertEqual(store.get_stats()['stored_size'], 5)
+        finally:
+            shutil.rmtree(legacy_root, ignore_errors=True)
+
+
+class ArtifactDownloadTestCase(unittest.TestCase):
+    """产物流式下载测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        self.root = tempfile.mkdtemp()
+        self.manager = TempFileManager(self.root)
+        self.patches = [
+            mock.patch.object(ai_api, 'temp_file_manager', self.manager),
+            mock.patch.object(ai_api, 'data_processor', DataProcessor(self.root)),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.content = COLLECTED.format(name='doc', file_id=9, body='第一行内容\n' * 5000)
+        self.record = self.manager.artifacts.put(9, KIND_COLLECTED, self.content, 'doc')
+        self.url = f"/api/ai/temp-file/{self.record['filename']}"
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_gzip_passthrough(self):
+        """客户端接受 gzip 时原样发送压缩文件"""
+        response = self.client.get(f'{self.url}?download=true', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        self.assertEqual(int(response.headers['Content-Length']), self.record['stored_size'])
+        self.assertEqual(gzip.decompress(response.data).decode('utf-8'), self.content)
+        response.close()
+
+    def test_identity_stream_and_ranges(self):
+        """不接受 gzip 时边读边解压，Range 请求返回对应的原始字节"""
+        data = self.content.encode('utf-8')
+        response = self.client.get(f'{self.url}?raw=true', headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.data, data)
+        etag = response.headers['ETag']
+        response.close()
+
+        response = self.client.get(f'{self.url}?raw=true', headers={'Range': 'bytes=1000-1999'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], f'bytes 1000-1999/{len(data)}')
+        self.assertEqual(response.data, data[1000:2000])
+        response.close()
+
+        response = self.client.get(f'{self.url}?raw=true', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        response.close()
+
+        response = self.client.get(f'{self.url}?raw=true', headers={'Range': f'bytes={len(data) + 10}-'})
+        self.assertEqual(response.status_code, 416)
+        response.close()
+
+    def test_stream_closed_when_body_not_sent(self):
+        """416 和 304 时立即关闭解压流；记录存在但文件已被删除时返回404"""
+        data = self.content.encode('utf-8')
+        opened = []
+        artifacts = ai_api.temp_file_manager.artifacts
+        original_open = artifacts.open
+
+        def tracking_open(record):
+            stream = original_open(record)
+            opened.append(stream)
+            return stream
+
+        with mock.patch.object(artifacts, 'open', tracking_open):
+            response = self.client.get(f'{self.url}?raw=true', headers={'Range': f'bytes={len(data) + 10}-'})
+            self.assertEqual(response.status_code, 416)
+            self.assertTrue(opened[-1].closed)
+
+            etag = self.client.get(f'{self.url}?raw=true', headers={'Range': 'bytes=0-0'}).headers['ETag']
+            response = self.client.get(f'{self.url}?raw=true', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertTrue(opened[-1].closed)
+
+        os.remove(self.record['path'])
+        for headers in ({'Accept-Encoding': 'identity'}, {'Accept-Encoding': 'gzip'}):
+            response = self.client.get(f'{self.url}?raw=true', headers=headers)
+            self.assertEqual(response.status_code, 404, headers)
+
+    def test_missing_file_and_json_view(self):
+        """未指定下载参数时仍返回JSON内容；不存在的文件返回404"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.get_json()['content'], self.content)
+        response = self.client.get('/api/ai/temp-file/missing_1_collected.txt?download=true')
+        self.assertEqual(response.status_code, 404)
+
+    def test_text_pages(self):
+        """按 next_offset 分段读取压缩产物，每段对齐字符边界，拼接后等于正文"""
+        url = f"/api/ai/artifacts/{self.record['filename']}/text"
+        pages = []
+        offset = 0
+        while True:
+            # 1000 不是3的倍数，分段位置会落在中文字符中间
+            result = self.client.get(f'{url}?offset={offset}&limit=1000&body_only=true').get_json()
+            self.assertTrue(result['success'], result)
+            self.assertLessEqual(len(result['text'].encode('utf-8')), 1002)
+            pages.append(result['text'])
+            if result['eof']:
+                break
+            offset = result['next_offset']
+        self.assertGreater(len(pages), 10)
+        self.assertEqual(''.join(pages).strip(), strip_header(self.content))
+        self.assertEqual(result['size'], len(self.content.encode('utf-8')))
+
+        response = self.client.get('/api/ai/artifacts/missing_1_collected.txt/text')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f'{url}?limit=0')
+        self.assertEqual(response.status_code, 400)
+
+    def test_apply_from_artifact_requires_reviewed_version(self):
+        """使用已保存的优化结果时必须带上审阅过的 etag，优化结果被重新生成后返回409"""
+        optimizer = AIOptimizer(self.root)
+        with self.app.app_context(), mock.patch.object(ai_api, 'ai_optimizer', optimizer):
+            db.create_all()
+            note_file = NoteFile(name='doc', order=0)
+            db.session.add(note_file)
+            db.session.flush()
+            db.session.add(Note(file_id=note_file.id, order=0, format='text', content='原内容'))
+            db.session.commit()
+            file_id = note_file.id
+
+            _, reviewed = optimizer._save_optimized_to_temp_file('审阅过的内容', 'doc', file_id, 'general')
+            request = {'file_id': file_id, 'from_artifact': True, 'optimization_type': 'general'}
+            response = self.client.post('/api/ai/preview-optimization', json=request)
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/ai/preview-optimization',
+                                        json=dict(request, artifact_etag=reviewed['etag']))
+            self.assertEqual(response.status_code, 200, response.get_json())
+
+            # 另一个页面或批量任务重新生成了优化结果
+            time.sleep(0.01)
+            _, latest = optimizer._save_optimized_to_temp_file('另一份内容', 'doc', file_id, 'general')
+            self.assertNotEqual(latest['etag'], reviewed['etag'])
+            response = self.client.post('/api/ai/apply-optimization',
+                                        json=dict(request, artifact_etag=reviewed['etag']))
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.get_json()['optimized_artifact']['etag'], latest['etag'])
+            self.assertEqual([note.content for note in Note.query.all()], ['原内容'])
+
+            response = self.client.post('/api/ai/apply-optimization',
+                                        json=dict(request, artifact_etag=latest['etag']))
+            self.assertEqual(response.status_code, 200, response.get_json())
+            self.assertIn('另一份内容', Note.query.one().content)
+            db.session.remove()
+            db.drop_all()
+
+    def test_compact_response(self):
+        """精简模式把正文字段替换为长度，嵌套结果一并处理"""
+        result = ai_api._compact({
+            'success': True,
+            'optimized_content': '优化后的正文',
+            'optimized_artifact': {'filename': 'a.txt', 'size': 18},
+            'apply_result': {'applied_content': 'abc', 'backup_info': {'content': 'xy', 'filename': 'b.txt'}},
+        })
+        self.assertEqual(result, {
+            'success': True,
+            'optimized_content_length': 6,
+            'optimized_artifact': {'filename': 'a.txt', 'size': 18},
+            'apply_result': {'applied_content_length': 3, 'backup_info': {'content_length': 2, 'filename': 'b.txt'}},
+        })
+
+
+class ArtifactConcurrencyTestCase(unittest.TestCase):
+    """产物存储多进程并发测试用例"""
+
+    def test_concurrent_processes_never_read_torn_content(self):
+        """多个进程并发写入、读取、清理同一批产物，读到的内容总是完整的"""
+        root = tempfile.mkdtemp()
+        try:
+            ArtifactStore(root)
+            context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+            results = context.Queue()
+            workers = [context.Process(target=_stress_worker, args=(root, seed, 150, results))
+                       for seed in range(4)]
+            for worker in workers:
+                worker.start()
+            outcomes = [results.get(timeout=120) for _ in workers]
+            for worker in workers:
+                worker.join(timeout=30)
+                self.assertEqual(worker.exitcode, 0)
+
+            self.assertGreater(sum(reads for reads, _ in outcomes), 0)
+            self.assertEqual(sum(torn for _, torn in outcomes), 0)
+
+            # 清单中的每条记录都对应完整的文件，没有残留的临时文件
+            store = ArtifactStore(root)
+            for record in store.list():
+                self.assertIsNotNone(store.read(record))
+            leftovers = [name for _, _, names in os.walk(root) for name in names if name.startswith('.tmp-')]
+            self.assertEqual(leftovers, [])
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
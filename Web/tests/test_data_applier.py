@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_data_applier.py
+模块: 数据应用测试
+描述: 测试按块级差异应用优化结果
+功能:
+    - 差异计划：相等块保留、替换区间配对修改、插入和删除
+    - 小改动只写入少量行，未改动的笔记保留ID、格式和HTML内容
+    - 批量语句写入后同步派生文本、近似重复签名和变更事件
+    - 整体替换和备份恢复（恢复笔记格式）
+    - 结构化块的格式识别，重复应用相同内容不写入
+    - 收集文件后原样应用收集结果不写入任何行
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.1
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.data_applier: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import shutil
+import tempfile
+import unittest
+from collections import namedtuple
+
+from app import create_app
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.models.note_signature import NoteSignature
+from app.services import note_events
+from app.services.data_applier import DataApplier
+from app.services.data_processor import DataProcessor
+from app.services.note_diff import plan_note_changes
+
+Row = namedtuple('Row', 'id order content format markdown plain_text')
+Block = namedtuple('Block', 'content format markdown plain_text')
+
+
+class NoteDiffTestCase(unittest.TestCase):
+    """差异计划测试用例"""
+
+    def test_plan_operations(self):
+        """相等块保留，替换区间按位置配对，多余的删除或插入"""
+        notes = [Row(i + 1, i, f'块{i}', 'text', None, None) for i in range(5)]
+        plan = plan_note_changes(notes, [Block(f'<p>块{i}</p>', 'text', None, f'块{i}') for i in range(5)])
+        self.assertEqual(plan.touched, 0)
+        self.assertEqual(plan.unchanged, 5)
+
+        # 纯文本相同但行内标记不同按修改处理
+        plan = plan_note_changes(notes, [Block(f'<p><strong>块{i}</strong></p>' if i == 1 else f'块{i}', 'text',
+                                               None, f'块{i}') for i in range(5)])
+        self.assertEqual([note_id for note_id, _, _ in plan.updates], [2])
+        self.assertEqual(plan.unchanged, 4)
+
+        blocks = [Block(content, 'text', None, content) for content in ['新块', '块0', '块1 ', '改过的块2', '块4']]
+        plan = plan_note_changes(notes, blocks)
+        self.assertEqual(plan.inserts, [(0, blocks[0])])
+        self.assertEqual(plan.updates, [(3, 3, blocks[3])])
+        self.assertEqual(plan.deletes, [4])
+        self.assertEqual(plan.reorders, [(1, 1), (2, 2)])
+        self.assertEqual(plan.unchanged, 1)
+
+
+class DataApplierTestCase(unittest.TestCase):
+    """差异应用测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        note_file = NoteFile(name='应用', order=0)
+        db.session.add(note_file)
+        db.session.flush()
+        self.file_id = note_file.id
+        contents = [('<h2>项目计划</h2>', 'h2')] + [(f'第{i}段：会议纪要和后续的行动项目安排', 'text') for i in range(20)]
+        self.notes = [Note(file_id=self.file_id, order=i, format=format_type, content=content)
+                      for i, (content, format_type) in enumerate(contents)]
+        db.session.add_all(self.notes)
+        db.session.commit()
+        self.ids = [note.id for note in self.notes]
+        self.applier = DataApplier()
+        self.changes = []
+        note_events.subscribe(self.changes.append)
+
+    def tearDown(self):
+        note_events.unsubscribe(self.changes.append)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _optimized(self, paragraphs):
+        return '## 项目计划\n\n' + '\n\n'.join(paragraphs)
+
+    def test_small_change_touches_few_rows(self):
+        """只改一段时只修改这一行，其余笔记保持原ID和内容"""
+        paragraphs = [f'第{i}段：会议纪要和后续的行动项目安排' for i in range(20)]
+        paragraphs[7] = '第7段：完全改写后的总结内容'
+        result = self.applier.apply_optimization(self.file_id, self._optimized(paragraphs), backup_original=False)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['changes'], {'inserted': 0, 'updated': 1, 'deleted': 0,
+                                             'reordered': 0, 'unchanged': 20})
+
+        notes = Note.query.filter_by(file_id=self.file_id).order_by(Note.order).all()
+        self.assertEqual([note.id for note in notes], self.ids)
+        self.assertEqual((notes[0].format, notes[0].content), ('h2', '<h2>项目计划</h2>'))
+        self.assertEqual((notes[8].format, notes[8].content), ('text', '<p>第7段：完全改写后的总结内容</p>'))
+        self.assertEqual(notes[8].plain_text, '第7段：完全改写后的总结内容')
+        self.assertEqual(self.changes[-1].upserted, {self.ids[8]: self.file_id})
+        self.assertIsNotNone(NoteSignature.query.get(self.ids[8]))
+
+    def test_insert_and_delete_blocks(self):
+        """插入和删除块时保留其余笔记，只调整顺序"""
+        paragraphs = [f'第{i}段：会议纪要和后续的行动项目安排' for i in range(20) if i != 3]
+        paragraphs.insert(0, '新增的前言段落')
+        result = self.applier.apply_optimization(self.file_id, self._optimized(paragraphs), backup_original=False)
+        self.assertEqual(result['changes']['inserted'], 1)
+        self.assertEqual(result['changes']['deleted'], 1)
+        self.assertEqual(result['changes']['updated'], 0)
+
+        notes = Note.query.filter_by(file_id=self.file_id).order_by(Note.order).all()
+        self.assertEqual([note.order for note in notes], list(range(21)))
+        self.assertEqual(notes[1].content, '<p>新增的前言段落</p>')
+        self.assertEqual([note.id for note in notes[2:]], self.ids[1:4] + self.ids[5:])
+        self.assertIsNone(NoteSignature.query.get(self.ids[4]))
+        self.assertEqual(set(self.changes[-1].deleted), {self.ids[4]})
+        self.assertEqual(set(self.changes[-1].upserted), {notes[1].id})
+
+    def test_structured_blocks_reapply_unchanged(self):
+        """标题、列表和代码块写入对应格式；再次应用相同内容时不写入任何行"""
+        content = '## 项目计划\n\n- 事项一\n- 事项二\n\n```\nprint(1)\n```\n\n> 备注'
+        result = self.applier.apply_optimization(self.file_id, content, backup_original=False)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['changes']['unchanged'], 1)
+        notes = Note.query.filter_by(file_id=self.file_id).order_by(Note.order).all()
+        self.assertEqual([note.format for note in notes], ['h2', 'bullet', 'text', 'quote'])
+
+        result = self.applier.apply_optimization(self.file_id, content, backup_original=False)
+        self.assertEqual(result['changes']['unchanged'], 4)
+        self.assertEqual(result['changes']['updated'] + result['changes']['inserted'], 0)
+
+    def test_reapply_collected_content_is_noop(self):
+        """收集文件后原样应用收集结果，不插入、修改或调整任何笔记"""
+        note_file = NoteFile(name='往返', order=1)
+        db.session.add(note_file)
+        db.session.flush()
+        contents = [
+            ('<h1>周报</h1>', 'h1'),
+            ('<p>本周<strong>重点</strong>：上线新版本</p>', 'text'),
+            ('<ul><li><p>修复登录问题</p></li><li><p>优化加载速度</p></li></ul>', 'bullet'),
+            ('<ol><li><p>整理需求</p></li><li><p>安排评审</p></li></ol>', 'number'),
+            ('<blockquote><p>下周继续跟进</p></blockquote>', 'quote'),
+            ('<p>参考 <a href="https://en.wikipedia.org/wiki/Foo_(bar)">Foo</a></p>', 'text'),
+            ('<pre><code class="language-python">def f():\n    return 1</code></pre>', 'text'),
+            ('<p>其他事项</p>', 'text'),
+        ]
+        db.session.add_all([Note(file_id=note_file.id, order=i, format=format_type, content=content)
+                            for i, (content, format_type) in enumerate(contents)])
+        db.session.commit()
+
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        processor = DataProcessor(temp_dir)
+        self.assertTrue(processor.collect_file_content(note_file.id)['success'])
+        collected = processor.read_collected_content(note_file.id)
+
+        plan = plan_note_changes(self.applier._load_notes(note_file.id),
+                                 self.applier._parse_optimized_content(collected))
+        self.assertEqual(plan.touched, 0, plan)
+        result = self.applier.apply_optimization(note_file.id, collected, backup_original=False)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['changes'], {'inserted': 0, 'updated': 0, 'deleted': 0,
+                                             'reordered': 0, 'unchanged': len(contents)})
+
+    def test_replace_and_restore(self):
+        """整体替换删除全部旧笔记；从备份恢复后内容与备份一致"""
+        backup = self.applier._create_backup(self.file_id, self.applier._load_notes(self.file_id))['content']
+        result = self.applier.apply_optimization(self.file_id, '# 新标题\n\n唯一的段落',
+                                                 backup_original=False, mode='replace')
+        self.assertEqual(result['changes']['deleted'], 21)
+        notes = Note.query.filter_by(file_id=self.file_id).order_by(Note.order).all()
+        self.assertEqual([(note.format, note.content) for note in notes],
+                         [('h1', '<h1>新标题</h1>'), ('text', '<p>唯一的段落</p>')])
+        self.assertEqual(NoteSignature.query.count(), 2)
+        self.assertEqual(len(self.changes[-1].deleted), 21)
+
+        result = self.applier.restore_from_backup(self.file_id, backup)
+        self.assertEqual(result['restored_notes_count'], 21)
+        notes = Note.query.filter_by(file_id=self.file_id).order_by(Note.order).all()
+        self.assertEqual((notes[0].format, notes[0].content), ('h2', '<h2>项目计划</h2>'))
+        self.assertEqual(notes[20].plain_text, '第19段：会议纪要和后续的行动项目安排')
+        self.assertEqual(NoteSignature.query.count(), 21)
+
+
+if __name__ == '__main__':
+    unittest.main()
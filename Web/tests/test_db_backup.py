@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_db_backup.py
+模块: 数据库在线备份测试
+描述: 测试SQLite在线快照的一致性、完整性检查、保留数量和恢复
+功能:
+    - 并发写入期间分步复制得到的快照完整且只包含已提交的事务
+    - 超过保留数量的旧快照被清理
+    - 多个进程同时到期时只备份一次
+    - 损坏的快照不能用于恢复
+    - 从快照恢复（含命令行）并在恢复前保存当前数据库
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.1
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.db_backup: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.services.db_backup import DatabaseBackup, db_backup, _StepTimer
+
+
+def _scheduled_worker(db_path, backup_dir, barrier, results):
+    """子进程：与其他进程同时到期，执行一次定时备份"""
+    backup = DatabaseBackup(db_path, backup_dir)
+    barrier.wait()
+    result = backup.run_scheduled()
+    results.put(bool(result and result['success']))
+
+
+class DatabaseBackupTestCase(unittest.TestCase):
+    """数据库在线备份测试用例"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, 'notes.db')
+        self.backup_dir = os.path.join(self.directory, 'backups')
+        connection = sqlite3.connect(self.db_path)
+        connection.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, pair INTEGER, payload TEXT)')
+        connection.executemany('INSERT INTO items (pair, payload) VALUES (?, ?)',
+                               [(i // 2, 'x' * 200) for i in range(4000)])
+        connection.commit()
+        connection.close()
+        self.backup = DatabaseBackup(self.db_path, self.backup_dir, keep=3, pages_per_step=8, step_sleep=0.001)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _count(self, path):
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_snapshot_during_writes_is_consistent(self):
+        """写入进行中生成的快照通过完整性检查，且每个事务要么全在要么全不在"""
+        stop = threading.Event()
+        committed = []
+
+        def writer():
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            pair = 10000
+            while not stop.is_set():
+                # 每个事务写入两行，快照中的行数必须为偶数
+                with connection:
+                    connection.executemany('INSERT INTO items (pair, payload) VALUES (?, ?)',
+                                           [(pair, 'y' * 200), (pair, 'y' * 200)])
+                committed.append(pair)
+                pair += 1
+                stop.wait(0.002)
+            connection.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            result = self.backup.snapshot()
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertTrue(result['success'], result)
+        self.assertGreater(result['steps'], 1)
+        path = os.path.join(self.backup_dir, result['name'])
+        self.assertTrue(self.backup.verify(path)['ok'])
+        count = self._count(path)
+        self.assertEqual(count % 2, 0)
+        self.assertGreaterEqual(count, 4000)
+        self.assertLessEqual(count, 4000 + 2 * len(committed))
+        self.assertEqual([name for name in os.listdir(self.backup_dir) if name.endswith('.tmp')], [])
+        stats = self.backup.get_stats()
+        self.assertEqual(stats['last_snapshot'], result['name'])
+        self.assertIsNotNone(stats['last_writer_stall_ms'])
+
+    def test_frequent_restarts_fall_back_to_single_step(self):
+        """分步复制重启次数过多时改为一次复制完"""
+        self.backup.max_restarts = 0
+        connection = sqlite3.connect(self.db_path)
+        progress = _StepTimer.progress
+
+        def write_between_steps(timer, *args):
+            # 每步之后由其他连接修改源库，迫使复制从头开始
+            with connection:
+                connection.execute("INSERT INTO items (pair, payload) VALUES (-1, 'z')")
+            return progress(timer, *args)
+
+        with mock.patch.object(_StepTimer, 'progress', write_between_steps):
+            result = self.backup.snapshot()
+        connection.close()
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['restarts'], 1)
+        self.assertTrue(self.backup.verify(os.path.join(self.backup_dir, result['name']))['ok'])
+
+    def test_retention_keeps_latest_snapshots(self):
+        """只保留最近的快照"""
+        names = [self.backup.snapshot()['name'] for _ in range(5)]
+        snapshots = self.backup.list_snapshots()
+        self.assertEqual([snapshot['name'] for snapshot in snapshots], names[::-1][:3])
+        self.assertFalse(self.backup.is_due())
+
+    def test_processes_due_together_snapshot_once(self):
+        """多个进程同时到期时只生成一个快照"""
+        context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+        barrier = context.Barrier(4)
+        results = context.Queue()
+        workers = [context.Process(target=_scheduled_worker, args=(self.db_path, self.backup_dir, barrier, results))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get(timeout=60) for _ in workers]
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sorted(outcomes), [False, False, False, True])
+        self.assertEqual(len(self.backup.list_snapshots()), 1)
+        self.assertIsNone(self.backup.run_scheduled())
+
+    def test_corrupt_snapshot_is_rejected(self):
+        """损坏的快照完整性检查不通过，不能用于恢复"""
+        os.makedirs(self.backup_dir)
+        name = 'snapshot-20261018-080000-000000-manual.db'
+        with open(os.path.join(self.backup_dir, name), 'wb') as f:
+            f.write(b'SQLite format 3\x00' + b'\xff' * 4096)
+        self.assertFalse(self.backup.verify(os.path.join(self.backup_dir, name))['ok'])
+        result = self.backup.restore(name)
+        self.assertFalse(result['success'])
+        self.assertEqual(self._count(self.db_path), 4000)
+
+    def test_restore_from_snapshot(self):
+        """从快照恢复，恢复前保存当前数据库；命令行恢复"""
+        name = self.backup.snapshot()['name']
+        connection = sqlite3.connect(self.db_path)
+        with connection:
+            connection.execute('DELETE FROM items WHERE id > 100')
+        connection.close()
+
+        result = self.backup.restore(name)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(self._count(self.db_path), 4000)
+        self.assertEqual(self._count(os.path.join(self.backup_dir, result['safety_snapshot'])), 100)
+
+        app = create_app('testing')
+        runner = app.test_cli_runner()
+        with mock.patch.multiple(db_backup, db_path=self.db_path, backup_dir=self.backup_dir):
+            outcome = runner.invoke(args=['db-backup', 'restore', result['safety_snapshot'], '--yes'])
+            self.assertEqual(outcome.exit_code, 0, outcome.output)
+            self.assertEqual(self._count(self.db_path), 100)
+            outcome = runner.invoke(args=['db-backup', 'list'])
+            self.assertIn(name, outcome.output)
+            outcome = runner.invoke(args=['db-backup', 'restore', 'missing.db', '--yes'])
+            self.assertNotEqual(outcome.exit_code, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_duplicates.py
+模块: 近似重复检测测试
+描述: 测试MinHash签名维护、重复分组、相似块查询和应用前的重复检查
+功能:
+    - 签名随笔记写入同步测试
+    - 工作区和文件夹范围重复分组测试
+    - 应用优化结果时的重复提示测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app: 应用程序模块
+
+许可证: Apache-2.0
+"""
+
+import unittest
+
+from app import create_app
+from app.extensions import db
+from app.models.folder import Folder
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.models.note_signature import NoteSignature, NoteLshBucket
+
+PASTED = '分布式系统中的一致性协议包括 Paxos 和 Raft，它们通过多数派投票保证日志复制的安全性。'
+
+
+class DuplicatesTestCase(unittest.TestCase):
+    """近似重复检测测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+        self.folder = Folder(name='资料')
+        db.session.add(self.folder)
+        db.session.flush()
+        contents = [
+            (self.folder.id, [f'<p>{PASTED}</p>', '今天的会议纪要']),
+            (self.folder.id, [PASTED + '。', '购物清单：牛奶、面包']),
+            (None, [PASTED]),
+        ]
+        self.files = []
+        self.notes = []
+        for i, (folder_id, items) in enumerate(contents):
+            note_file = NoteFile(name=f'file{i}', order=i, folder_id=folder_id)
+            db.session.add(note_file)
+            db.session.flush()
+            self.files.append(note_file.id)
+            for order, content in enumerate(items):
+                note = Note(file_id=note_file.id, order=order, format='text', content=content)
+                db.session.add(note)
+                self.notes.append(note)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_signatures_follow_note_writes(self):
+        """笔记新增、修改、删除时同步签名和分桶"""
+        self.assertEqual(NoteSignature.query.count(), len(self.notes))
+        self.assertEqual(NoteLshBucket.query.filter_by(note_id=self.notes[0].id).count(), 16)
+
+        before = NoteSignature.query.get(self.notes[1].id).signature
+        self.notes[1].content = '完全不同的会议内容'
+        db.session.commit()
+        self.assertNotEqual(NoteSignature.query.get(self.notes[1].id).signature, before)
+
+        db.session.delete(self.notes[1])
+        db.session.commit()
+        self.assertIsNone(NoteSignature.query.get(self.notes[1].id))
+        self.assertEqual(NoteLshBucket.query.filter_by(note_id=self.notes[1].id).count(), 0)
+
+    def test_duplicate_groups_and_similar(self):
+        """按范围查询重复分组，按笔记查询相似块"""
+        data = self.client.get('/api/duplicates').get_json()
+        self.assertEqual(data['total_groups'], 1)
+        group_ids = [note['note_id'] for note in data['groups'][0]['notes']]
+        self.assertEqual(group_ids, [self.notes[0].id, self.notes[2].id, self.notes[4].id])
+
+        data = self.client.get(f'/api/duplicates?folder_id={self.folder.id}').get_json()
+        self.assertEqual(data['groups'][0]['size'], 2)
+        self.assertEqual(self.client.get('/api/duplicates?threshold=2').status_code, 400)
+
+        similar = self.client.get(f'/api/notes/{self.notes[4].id}/similar').get_json()['similar']
+        self.assertEqual({item['note_id'] for item in similar}, {self.notes[0].id, self.notes[2].id})
+
+    def test_apply_warns_about_duplicates(self):
+        """应用优化结果时提示或阻止重复块"""
+        content = f'# 新标题\n\n{PASTED}\n\n独有的段落内容'
+        response = self.client.post('/api/ai/apply-optimization', json={
+            'file_id': self.files[2], 'optimized_content': content,
+            'backup_original': False, 'duplicate_check': 'block'
+        })
+        self.assertEqual(response.status_code, 409)
+        warnings = response.get_json()['duplicate_warnings']
+        self.assertEqual([w['block_index'] for w in warnings], [1])
+        self.assertEqual(Note.query.filter_by(file_id=self.files[2]).count(), 1)
+
+        response = self.client.post('/api/ai/apply-optimization', json={
+            'file_id': self.files[2], 'optimized_content': content,
+            'backup_original': False, 'duplicate_check': 'warn'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['duplicate_warnings']), 1)
+        self.assertEqual(Note.query.filter_by(file_id=self.files[2]).count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
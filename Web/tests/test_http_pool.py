@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_http_pool.py
+模块: HTTP连接池测试
+描述: 使用本地 HTTP 替身服务测试共享会话的连接复用和通义千问服务商的接口调用
+功能:
+    - keep-alive 连接复用统计测试
+    - 关闭 keep-alive 时每次新建连接测试
+    - 通义千问服务商响应解析与错误映射测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.http_pool: 被测模块
+    - app.services.llm_providers: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.http_pool import HTTPSessionPool
+from app.services.llm_providers import QwenProvider
+from app.services.llm_resilience import LLMProviderError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.payloads.append(payload)
+        status, body = self.server.responses.pop(0) if self.server.responses else (200, {
+            'output': {'text': ' 结果 ', 'finish_reason': 'stop'},
+            'usage': {'input_tokens': 7, 'output_tokens': 3}
+        })
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPPoolTestCase(unittest.TestCase):
+    """HTTP连接池测试用例"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.payloads = []
+        self.server.responses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/api/v1'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _provider(self, http_pool):
+        return QwenProvider(api_key='test', base_url=self.base_url, http_pool=http_pool)
+
+    def test_keep_alive_reuses_connection(self):
+        """共享会话在多次调用之间复用同一连接"""
+        pool = HTTPSessionPool('test-reuse', pool_size=2)
+        provider = self._provider(pool)
+        for _ in range(5):
+            self.assertEqual(provider.generate('hi').text, '结果')
+        stats = pool.get_stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections_created'], 1)
+        self.assertEqual(stats['connections_reused'], 4)
+        pool.close()
+
+    def test_without_keep_alive_connects_every_call(self):
+        """关闭 keep-alive 后每次调用都新建连接"""
+        pool = HTTPSessionPool('test-close', keep_alive=False)
+        provider = self._provider(pool)
+        for _ in range(3):
+            provider.generate('hi')
+        self.assertEqual(pool.get_stats()['connections_created'], 3)
+        pool.close()
+
+    def test_qwen_request_and_errors(self):
+        """请求体符合接口格式，错误状态码映射为是否可重试"""
+        pool = HTTPSessionPool('test-errors')
+        provider = self._provider(pool)
+        response = provider.generate('hello', stop=['END'])
+        self.assertEqual((response.input_tokens, response.output_tokens), (7, 3))
+        payload = self.server.payloads[-1]
+        self.assertEqual(payload['input']['prompt'], 'hello')
+        self.assertEqual(payload['parameters']['stop'], ['END'])
+
+        self.server.responses = [(400, {'code': 'InvalidParameter', 'message': 'bad'}),
+                                 (503, {'code': 'ServiceUnavailable', 'message': 'busy'})]
+        with self.assertRaises(LLMProviderError) as ctx:
+            provider.generate('hello')
+        self.assertFalse(ctx.exception.retryable)
+        self.assertEqual(ctx.exception.code, 'InvalidParameter')
+        with self.assertRaises(LLMProviderError) as ctx:
+            provider.generate('hello')
+        self.assertTrue(ctx.exception.retryable)
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_llm_providers.py
+模块: 大模型服务商测试
+描述: 测试服务商工厂、本地确定性桩服务以及录制/回放
+功能:
+    - 桩服务确定性输出测试
+    - 延迟分布配置解析测试
+    - 录制与回放往返测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.llm_providers: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import os
+import tempfile
+import unittest
+
+from app.services.llm_providers import (
+    QwenProvider,
+    RecordingProvider,
+    ReplayProvider,
+    StubProvider,
+    create_provider,
+    parse_latency_spec,
+)
+from app.services.llm_resilience import LLMProviderError
+
+OPTIMIZE_PROMPT = """请优化以下内容（类型：general）：
+
+#标题
+这是   第一段。
+
+要求：保持原意，输出优化后的markdown格式内容，无需解释。
+"""
+
+
+class LLMProvidersTestCase(unittest.TestCase):
+    """大模型服务商测试用例"""
+
+    def test_stub_is_deterministic(self):
+        """桩服务相同输入得到相同输出，并估算token数"""
+        provider = StubProvider(seed=1)
+        first = provider.generate(OPTIMIZE_PROMPT)
+        second = provider.generate(OPTIMIZE_PROMPT)
+        self.assertEqual(first.text, second.text)
+        self.assertEqual(first.text, '# 标题\n这是 第一段。')
+        self.assertGreater(first.input_tokens, first.output_tokens)
+
+    def test_stub_latency_distribution(self):
+        """延迟按配置的分布采样"""
+        slept = []
+        provider = StubProvider(latency='uniform:0.1,0.2', token_latency=0.01, sleep=slept.append)
+        response = provider.generate(OPTIMIZE_PROMPT)
+        self.assertEqual(len(slept), 1)
+        base = slept[0] - 0.01 * response.output_tokens
+        self.assertTrue(0.1 <= base <= 0.2)
+        self.assertEqual(parse_latency_spec('lognormal:-1.5,0.5'), ('lognormal', [-1.5, 0.5]))
+        with self.assertRaises(ValueError):
+            parse_latency_spec('normal:1')
+
+    def test_missing_api_key_fails_on_call(self):
+        """缺少密钥时在调用时报错且不可重试"""
+        provider = QwenProvider(api_key='')
+        with self.assertRaises(LLMProviderError) as ctx:
+            provider.generate('hi')
+        self.assertFalse(ctx.exception.retryable)
+
+    def test_record_and_replay(self):
+        """录制的响应可以离线回放"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'records.jsonl')
+            recorder = RecordingProvider(StubProvider(), path)
+            recorded = recorder.generate(OPTIMIZE_PROMPT)
+
+            replay = ReplayProvider(path)
+            replayed = replay.generate(OPTIMIZE_PROMPT)
+            self.assertEqual(recorded.text, replayed.text)
+            self.assertEqual(replay.hits, 1)
+            with self.assertRaises(LLMProviderError):
+                replay.generate('unknown prompt')
+
+    def test_factory_selects_provider(self):
+        """工厂根据名称创建服务商"""
+        self.assertIsInstance(create_provider('stub'), StubProvider)
+        self.assertIsInstance(create_provider('qwen'), QwenProvider)
+        with self.assertRaises(ValueError):
+            create_provider('nope')
+
+
+if __name__ == '__main__':
+    unittest.main()
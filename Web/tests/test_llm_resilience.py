@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_llm_resilience.py
+模块: AI调用弹性层测试
+描述: 使用本地假服务商（可注入延迟和错误率）测试并发限制、限流、重试、超时和熔断
+功能:
+    - 重试与退避测试
+    - 熔断器状态切换测试
+    - 并发上限测试
+    - 超时测试
+    - 令牌桶限流测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.llm_resilience: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import random
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMProviderError,
+    LLMRateLimitError,
+    LLMTimeoutError,
+    ResilientLLMClient,
+    RetryPolicy,
+    TokenBucket,
+)
+
+
+class FakeProvider:
+    """本地假服务商：可注入延迟、错误率和固定的失败次数"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, fail_first=0, status_code=503, seed=42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.status_code = status_code
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.active = 0
+        self.peak_active = 0
+
+    def __call__(self, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call_no = self.calls
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            fail = call_no <= self.fail_first or self._rng.random() < self.error_rate
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if fail:
+                raise LLMProviderError('fake failure', status_code=self.status_code)
+            return f'ok:{prompt}'
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_client(provider, **overrides):
+    options = {
+        'max_concurrency': 4,
+        'rate_per_sec': 1000,
+        'burst': 1000,
+        'timeout': 2.0,
+        'acquire_timeout': 5.0,
+        'retry_policy': RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.01),
+        'circuit_breaker': CircuitBreaker(failure_threshold=5, recovery_timeout=60),
+    }
+    options.update(overrides)
+    return ResilientLLMClient(provider, name='fake', **options)
+
+
+class LLMResilienceTestCase(unittest.TestCase):
+    """AI调用弹性层测试用例"""
+
+    def test_retries_transient_errors(self):
+        """可重试错误经过重试后成功"""
+        provider = FakeProvider(fail_first=2)
+        client = make_client(provider)
+        self.assertEqual(client.call('hello'), 'ok:hello')
+        self.assertEqual(provider.calls, 3)
+        self.assertEqual(client.get_stats()['counters']['retries'], 2)
+
+    def test_client_errors_are_not_retried(self):
+        """4xx错误不重试，也不计入熔断"""
+        provider = FakeProvider(fail_first=1, status_code=400)
+        client = make_client(provider)
+        with self.assertRaises(LLMProviderError):
+            client.call('hello')
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(client.get_stats()['circuit_breaker']['consecutive_failures'], 0)
+
+    def test_circuit_opens_and_fails_fast(self):
+        """持续失败后熔断，后续调用不再到达服务商"""
+        provider = FakeProvider(error_rate=1.0)
+        client = make_client(
+            provider,
+            retry_policy=RetryPolicy(max_retries=0),
+            circuit_breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=60),
+        )
+        for _ in range(3):
+            with self.assertRaises(LLMProviderError):
+                client.call('x')
+        with self.assertRaises(CircuitOpenError):
+            client.call('x')
+        self.assertEqual(provider.calls, 3)
+        self.assertEqual(client.get_stats()['circuit_breaker']['state'], 'open')
+
+    def test_circuit_half_open_recovers(self):
+        """恢复时间过后半开探测成功则关闭熔断器"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        clock.sleep(10)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_half_open_probe_with_client_error_releases_circuit(self):
+        """半开探测遇到400等不可重试错误后，后续调用仍能放行"""
+        clock = FakeClock()
+        provider = FakeProvider(error_rate=1.0)
+        client = make_client(
+            provider,
+            retry_policy=RetryPolicy(max_retries=0),
+            circuit_breaker=CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock),
+        )
+        with self.assertRaises(LLMProviderError):
+            client.call('x')
+        with self.assertRaises(CircuitOpenError):
+            client.call('x')
+        clock.sleep(10)
+        provider.status_code = 400
+        with self.assertRaises(LLMProviderError):
+            client.call('probe')
+        provider.error_rate = 0.0
+        self.assertEqual(client.call('next'), 'ok:next')
+        self.assertEqual(client.get_stats()['circuit_breaker']['state'], 'closed')
+
+    def test_half_open_slot_released_on_local_rate_limit(self):
+        """半开探测在本地限流超时时只归还名额，不改变熔断状态"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+        client = make_client(FakeProvider(), circuit_breaker=breaker, acquire_timeout=0.01,
+                             limiter=TokenBucket(0, 0))
+        breaker.record_failure()
+        clock.sleep(10)
+        with self.assertRaises(LLMRateLimitError):
+            client.call('x')
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertTrue(breaker.allow())
+
+    def test_concurrency_is_bounded(self):
+        """并发调用数不超过客户端上限"""
+        provider = FakeProvider(latency=0.05)
+        client = make_client(provider, max_concurrency=3)
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(client.call, [str(i) for i in range(20)]))
+        self.assertEqual(len(results), 20)
+        self.assertLessEqual(provider.peak_active, 3)
+        self.assertLessEqual(client.get_stats()['concurrency']['peak'], 3)
+
+    def test_timeout(self):
+        """慢调用超时后抛出超时错误"""
+        provider = FakeProvider(latency=0.3)
+        client = make_client(provider, timeout=0.05, retry_policy=RetryPolicy(max_retries=0))
+        with self.assertRaises(LLMTimeoutError):
+            client.call('slow')
+        self.assertEqual(client.get_stats()['counters']['timeouts'], 1)
+
+    def test_error_rate_under_load(self):
+        """在随机错误率下，重试使绝大多数调用成功"""
+        provider = FakeProvider(latency=0.001, error_rate=0.2)
+        client = make_client(provider, circuit_breaker=CircuitBreaker(failure_threshold=1000))
+        succeeded = 0
+        for i in range(50):
+            try:
+                client.call(str(i))
+                succeeded += 1
+            except LLMProviderError:
+                pass
+        self.assertGreaterEqual(succeeded, 48)
+
+    def test_token_bucket_limits_rate(self):
+        """令牌桶按速率放行"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+        for _ in range(6):
+            self.assertTrue(bucket.acquire())
+        # 初始2个令牌，之后每个令牌需要0.5秒
+        self.assertAlmostEqual(clock.now, 2.0)
+        self.assertFalse(bucket.acquire(timeout=0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_markdown_conversion.py
+模块: HTML转Markdown测试
+描述: 用黄金语料校验单遍转换器的输出，并检查大文档和异常输入的处理
+功能:
+    - 黄金语料逐条比对（TipTap常用标签、转义、实体、空白）
+    - 空段落、纯文本格式笔记测试
+    - 深层嵌套和超长文本的线性处理测试
+    - 进程池并行转换的顺序、阈值和退回测试
+    - 收集未回填派生列的大文件时按进程池阈值分窗口，走进程池转换
+    - 进程池子进程重新执行主模块时不初始化应用服务
+    - Markdown分块：格式识别、编辑器HTML、线性处理
+    - 黄金语料逐条按笔记收集再分块，内容和格式不变
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.3.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.utils.html_markdown: 被测模块
+    - app.utils.markdown_blocks: 被测模块
+
+注意事项:
+    - fixtures/markdown_golden.json 中 source=legacy 的条目与原 html2text + 正则预处理的输出一致；
+      source=html2text 的条目是旧预处理误改写标签（<br>、<blockquote>、<pre>、<img>、<ol start>）的情况，
+      期望值为 html2text 对未被误改写的HTML的输出；source=fenced 的条目是代码块，改为围栏输出，
+      以便分块时还原代码块和缩进
+
+许可证: Apache-2.0
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from html.parser import HTMLParser
+from unittest import mock
+
+from app import create_app
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services import data_processor as data_processor_module
+from app.services.conversion_pool import ConversionPool
+from app.services.data_processor import DataProcessor
+from app.utils.html_markdown import html_to_markdown
+from app.utils.markdown_blocks import parse_markdown_blocks, render_inline
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'markdown_golden.json')
+
+# 顶层标签对应的笔记格式
+TAG_FORMATS = {'h1': 'h1', 'h2': 'h2', 'h3': 'h3', 'ul': 'bullet', 'ol': 'number', 'blockquote': 'quote'}
+
+
+class _TopLevelSplitter(HTMLParser):
+    """把HTML按顶层元素切分，每个元素对应一条笔记"""
+
+    VOID_TAGS = ('br', 'hr', 'img')
+
+    def __init__(self, content):
+        super().__init__(convert_charrefs=False)
+        self.content = content
+        self.line_starts = [0] + [i + 1 for i, char in enumerate(content) if char == '\n']
+        self.depth = 0
+        self.start = None
+        self.elements = []
+
+    def _offset(self):
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth == 0:
+            self.start = (tag, self._offset())
+        if tag in self.VOID_TAGS:
+            if self.depth == 0:
+                self._close()
+        else:
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        self.depth -= 1
+        if self.depth == 0:
+            self._close()
+
+    def _close(self):
+        tag, start = self.start
+        end = self.content.index('>', self._offset()) + 1
+        self.elements.append((tag, self.content[start:end]))
+
+
+class MarkdownConversionTestCase(unittest.TestCase):
+    """HTML转Markdown测试用例"""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+            cls.golden = json.load(f)
+
+    def test_golden_corpus(self):
+        """黄金语料逐条输出一致"""
+        self.assertGreater(len(self.golden), 20)
+        for case in self.golden:
+            with self.subTest(case['name']):
+                self.assertEqual(html_to_markdown(case['html']), case['markdown'])
+
+    def test_data_processor_uses_converter(self):
+        """数据处理器对HTML笔记使用转换器，纯文本笔记只去掉首尾空白"""
+        processor = DataProcessor(tempfile.mkdtemp())
+        html_content = '<h2>标题</h2><p>段落 <strong>重点</strong></p>'
+        self.assertEqual(processor._process_note_content_markdown(html_content, 'markdown'),
+                         '## 标题\n\n段落 **重点**')
+        self.assertEqual(processor._process_note_content_markdown('  <b>原样</b>  ', 'text'), '<b>原样</b>')
+        self.assertEqual(processor._process_note_content_markdown('', 'markdown'), '')
+
+    def test_large_and_nested_input_is_linear(self):
+        """大量段落和深层嵌套的输入在线性时间内完成"""
+        paragraph = '<p>' + '<strong>粗体</strong>普通文字 ' * 20 + '</p>'
+        small = html_to_markdown(paragraph * 200)
+        started = time.perf_counter()
+        large = html_to_markdown(paragraph * 2000)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(large.count('**粗体**'), small.count('**粗体**') * 10)
+        self.assertLess(elapsed, 10)
+
+        nested = '<ul><li><p>项</p>' * 50 + '</li></ul>' * 50
+        self.assertEqual(html_to_markdown(nested).count('* 项'), 50)
+
+        # 未闭合的标签不会导致异常或回溯
+        self.assertEqual(html_to_markdown('<h1>标题' + 'x' * 100000), '# 标题' + 'x' * 100000)
+
+    def test_conversion_pool_preserves_order(self):
+        """超过阈值时走进程池，结果按笔记顺序拼回；进程池失败时退回当前线程"""
+        items = [(f'<p>笔记 <strong>{i}</strong></p>', 'markdown') for i in range(40)] + [(' 纯文本 ', 'text')]
+        expected = [f'笔记 **{i}**' for i in range(40)] + ['纯文本']
+
+        pool = ConversionPool(workers=2, min_notes=10, min_chars=0)
+        try:
+            self.assertEqual(pool.render(items[:5]), expected[:5])
+            self.assertEqual(pool.render(items), expected)
+            stats = pool.get_stats()
+            self.assertEqual((stats['inline_batches'], stats['parallel_batches']), (1, 1))
+
+            with mock.patch.object(pool, '_render_parallel', side_effect=RuntimeError('broken')):
+                self.assertEqual(pool.render(items), expected)
+            self.assertEqual(pool.get_stats()['fallbacks'], 1)
+            self.assertFalse(pool.get_stats()['running'])
+        finally:
+            pool.shutdown()
+
+        # 单进程配置从不启动进程池
+        single = ConversionPool(workers=1, min_notes=1, min_chars=0)
+        self.assertEqual(single.render(items), expected)
+        self.assertFalse(single.get_stats()['running'])
+
+    def test_collect_large_unbackfilled_file_uses_pool(self):
+        """未回填派生列的大文件收集时按进程池阈值分窗口，走进程池转换且顺序不变"""
+        app = create_app('testing')
+        app_context = app.app_context()
+        app_context.push()
+        temp_dir = tempfile.mkdtemp()
+        pool = ConversionPool(workers=2)
+        try:
+            db.create_all()
+            note_file = NoteFile(name='大文件', order=0)
+            db.session.add(note_file)
+            db.session.flush()
+            texts = [f'第{i}条笔记：' + '会议纪要' * 40 for i in range(3000)]
+            db.session.add_all([Note(file_id=note_file.id, order=i, format='text', content=f'<p>{text}</p>')
+                                for i, text in enumerate(texts)])
+            db.session.commit()
+            db.session.execute(Note.__table__.update().values(markdown=None))
+            db.session.commit()
+
+            processor = DataProcessor(temp_dir)
+            with mock.patch.object(data_processor_module, 'conversion_pool', pool):
+                self.assertTrue(processor.collect_file_content(note_file.id)['success'])
+            stats = pool.get_stats()
+            self.assertGreater(stats['parallel_batches'], 0, stats)
+            self.assertEqual(stats['notes'], 3000)
+            self.assertEqual(processor.read_collected_content(note_file.id).strip(), '\n\n'.join(texts))
+        finally:
+            pool.shutdown()
+            db.session.remove()
+            db.drop_all()
+            app_context.pop()
+            shutil.rmtree(temp_dir)
+
+
+    def test_pool_workers_do_not_start_app_services(self):
+        """主模块在导入时创建应用：进程池子进程重新执行主模块时不初始化数据库、不启动后台任务"""
+        directory = tempfile.mkdtemp()
+        try:
+            script = os.path.join(directory, 'entry.py')
+            with open(script, 'w', encoding='utf-8') as f:
+                f.write(WORKER_ENTRY_SCRIPT)
+            env = dict(os.environ, WEB_ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       ENTRY_DIR=directory)
+            result = subprocess.run([sys.executable, script], cwd=directory, env=env,
+                                    capture_output=True, text=True, timeout=120)
+            self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+            records = []
+            for name in os.listdir(directory):
+                if name.startswith('record-'):
+                    with open(os.path.join(directory, name), encoding='utf-8') as f:
+                        records.append(json.loads(f.read()))
+            parent = [record for record in records if record['name'] == '__main__']
+            workers = [record for record in records if record['name'] != '__main__']
+            self.assertEqual(len(parent), 1)
+            self.assertIn('db-backup', parent[0]['threads'])
+            self.assertTrue(parent[0]['tables'])
+            # 子进程确实重新执行了主模块，但其中创建的应用没有副作用
+            self.assertTrue(workers)
+            for record in workers:
+                self.assertNotIn('db-backup', record['threads'])
+                self.assertEqual(record['threads'], ['MainThread'])
+            self.assertEqual(sorted(name for name in os.listdir(os.path.join(directory, 'backups'))), [])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+WORKER_ENTRY_SCRIPT = """
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.environ['WEB_ROOT'])
+directory = os.environ['ENTRY_DIR']
+
+from app import create_app
+from app.config import config
+from app.config.config import TestingConfig
+from app.extensions import db
+from app.services.conversion_pool import ConversionPool
+
+
+class EntryConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'notes.db')
+    BACKUP_ENABLED = True
+    BACKUP_DIR = os.path.join(directory, 'backups')
+
+
+config['entry'] = EntryConfig
+# 在导入时创建应用
+app = create_app('entry')
+tables = []
+if os.path.exists(os.path.join(directory, 'notes.db')):
+    with app.app_context():
+        tables = db.inspect(db.engine).get_table_names()
+with open(os.path.join(directory, f'record-{os.getpid()}.json'), 'w', encoding='utf-8') as f:
+    json.dump({'name': __name__, 'threads': sorted(t.name for t in threading.enumerate()),
+               'tables': tables}, f)
+
+if __name__ == '__main__':
+    os.makedirs(EntryConfig.BACKUP_DIR, exist_ok=True)
+    pool = ConversionPool(workers=2, min_notes=1, min_chars=0)
+    try:
+        items = [('<p>%d</p>' % i, 'markdown') for i in range(20)]
+        assert pool.render(items) == [str(i) for i in range(20)]
+        assert pool.get_stats()['parallel_batches'] == 1
+    finally:
+        pool.shutdown()
+"""
+
+
+class MarkdownBlocksTestCase(unittest.TestCase):
+    """Markdown分块测试用例"""
+
+    def test_block_formats(self):
+        """标题、列表、引用、代码块、分隔线和段落分别成块并识别格式"""
+        content = '\n'.join([
+            'title: 周报', 'model: x', '---',
+            '# 总结', '', '第一行 **重点**', '第二行 <不是标签>', '',
+            '- 事项一', '  - 子项', '- 事项二', '3. 第三', '4. 第四', '',
+            '> 引用', '', '* * *', '#### 细节', '```python', 'if a < b:', '', '    pass', '```', '',
+        ])
+        blocks = parse_markdown_blocks(content)
+        self.assertEqual([block.format for block in blocks],
+                         ['h1', 'text', 'bullet', 'number', 'quote', 'text', 'h3', 'text'])
+        self.assertEqual(blocks[1].content, '<p>第一行 <strong>重点</strong><br>第二行 &lt;不是标签&gt;</p>')
+        self.assertEqual(blocks[2].content,
+                         '<ul><li><p>事项一</p><ul><li><p>子项</p></li></ul></li><li><p>事项二</p></li></ul>')
+        self.assertEqual(blocks[3].content, '<ol start="3"><li><p>第三</p></li><li><p>第四</p></li></ol>')
+        self.assertEqual(blocks[5].content, '<hr>')
+        self.assertEqual(blocks[7].content, '<pre><code class="language-python">if a &lt; b:\n\n    pass</code></pre>')
+
+        # 与HTML转Markdown互为往返
+        self.assertEqual(html_to_markdown(blocks[1].content), '第一行 **重点**  \n第二行 <不是标签>')
+
+    def test_inline_markup(self):
+        """行内标记、转义和不安全链接"""
+        self.assertEqual(render_inline('*斜* _也斜_ snake_case ~~删~~ `a*b*` \\*字面\\*'),
+                         '<em>斜</em> <em>也斜</em> snake_case <s>删</s> <code>a*b*</code> *字面*')
+        self.assertEqual(render_inline('[文档](https://a.com/?x=1&y=2) [坏](javascript:void)'),
+                         '<a href="https://a.com/?x=1&amp;y=2">文档</a> 坏')
+
+        # 转换器写出的链接：地址和图片说明中的转义还原，地址可含括号
+        html_content = ('<p><a href="https://en.wikipedia.org/wiki/Foo_(bar)">Foo</a> ok '
+                        '<a href="https://a.com/?b=[2]">b</a> <img src="https://a.com/p.png" alt="pic (1)"></p>')
+        self.assertEqual(parse_markdown_blocks(html_to_markdown(html_content))[0].content, html_content)
+        self.assertEqual(render_inline('[维基](https://e.org/Foo_(bar)) [空]()'),
+                         '<a href="https://e.org/Foo_(bar)">维基</a> [空]()')
+
+    def test_golden_corpus_round_trip(self):
+        """黄金语料按笔记收集为Markdown后再分块，每块的格式和内容与原笔记一致"""
+        with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+            golden = json.load(f)
+        for case in golden:
+            with self.subTest(case['name']):
+                splitter = _TopLevelSplitter(case['html'])
+                splitter.feed(case['html'])
+                splitter.close()
+                notes = [(TAG_FORMATS.get(tag, 'text'), html_to_markdown(element))
+                         for tag, element in splitter.elements]
+                notes = [(format_type, markdown) for format_type, markdown in notes if markdown]
+                # 与数据处理器收集时相同：各笔记的Markdown以空行连接
+                blocks = parse_markdown_blocks('\n\n'.join(markdown for _, markdown in notes))
+                self.assertEqual([(block.format, html_to_markdown(block.content)) for block in blocks], notes)
+
+    def test_large_input_is_linear(self):
+        """大文档和未闭合的标记在线性时间内完成"""
+        section = '## 标题\n\n' + '段落 **粗体** 和 `代码` 文字。\n' * 5 + '\n- 项\n- 项\n\n'
+        small = parse_markdown_blocks(section * 200)
+        started = time.perf_counter()
+        large = parse_markdown_blocks(section * 2000)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(len(large), len(small) * 10)
+        self.assertLess(elapsed, 10)
+
+        self.assertEqual(len(parse_markdown_blocks('*' + 'x ' * 100000)), 1)
+        self.assertEqual(len(parse_markdown_blocks('```\n' + 'code\n' * 10000)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
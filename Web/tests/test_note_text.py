@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_note_text.py
+模块: 笔记派生文本测试
+描述: 测试笔记Markdown和纯文本派生列的写入时计算、回填命令和旧表补列
+功能:
+    - 插入和修改内容、格式时刷新派生列，只改顺序时不重新计算
+    - text格式的HTML内容按HTML转换，纯文本原样保留
+    - 回填命令只处理未回填的笔记且不改变更新时间
+    - 已有数据库补充派生列
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app: 应用程序模块
+
+许可证: Apache-2.0
+"""
+
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import create_app
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services import note_text
+
+
+class NoteTextTestCase(unittest.TestCase):
+    """笔记派生文本测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        note_file = NoteFile(name='file', order=0)
+        db.session.add(note_file)
+        db.session.flush()
+        self.file_id = note_file.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _add(self, content, format_type='markdown', order=0):
+        note = Note(file_id=self.file_id, order=order, format=format_type, content=content)
+        db.session.add(note)
+        db.session.commit()
+        return note
+
+    def test_derived_text_refreshed_on_write(self):
+        """插入和修改内容、格式时刷新派生列"""
+        note = self._add('<h2>标题</h2><p>段落 <strong>重点</strong> &amp; 更多</p>')
+        self.assertEqual(note.markdown, '## 标题\n\n段落 **重点** & 更多')
+        self.assertEqual(note.plain_text, '标题\n段落 重点 & 更多')
+
+        note.content = '<p>新的内容</p>'
+        db.session.commit()
+        self.assertEqual(note.markdown, '新的内容')
+
+        note.format = 'text'
+        db.session.commit()
+        self.assertEqual(note.markdown, '新的内容')
+        self.assertEqual(note.plain_text, '新的内容')
+
+        # text格式的纯文本原样保留，不做Markdown转义
+        note.content = 'a*b <T> 类型'
+        db.session.commit()
+        self.assertEqual(note.markdown, 'a*b <T> 类型')
+
+        # 只改顺序不重新计算
+        with mock.patch.object(note_text, 'derive_note_text') as derive:
+            note.order = 5
+            db.session.commit()
+            derive.assert_not_called()
+
+    def test_backfill_command(self):
+        """回填命令只处理未回填的笔记，保留更新时间"""
+        notes = [self._add(f'<p>笔记 {i}</p>', order=i) for i in range(5)]
+        db.session.execute(Note.__table__.update().values(markdown=None, plain_text=None,
+                                                          updated_at=Note.updated_at))
+        db.session.commit()
+        stamps = {note_id: updated_at for note_id, updated_at in db.session.query(Note.id, Note.updated_at)}
+
+        # 未回填时读取方退回实时计算
+        self.assertEqual(note_text.plain_text_of(None, '<p>笔记 0</p>'), '笔记 0')
+
+        result = self.app.test_cli_runner().invoke(args=['backfill-note-text', '--batch-size', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('5', result.output)
+
+        db.session.expire_all()
+        for i, note in enumerate(notes):
+            note = db.session.get(Note, note.id)
+            self.assertEqual(note.markdown, f'笔记 {i}')
+            self.assertEqual(note.plain_text, f'笔记 {i}')
+            self.assertEqual(note.updated_at, stamps[note.id])
+        self.assertEqual(note_text.backfill(), 0)
+        self.assertEqual(note_text.backfill(recompute=True), 5)
+
+    def test_ensure_columns_on_existing_table(self):
+        """早于派生列的笔记表补充列，重复执行无副作用"""
+        engine = create_engine('sqlite://')
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE notes (id INTEGER PRIMARY KEY, content TEXT)'))
+        note_text.ensure_columns(engine)
+        note_text.ensure_columns(engine)
+        columns = {column['name'] for column in inspect(engine).get_columns('notes')}
+        self.assertTrue({'markdown', 'plain_text'} <= columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
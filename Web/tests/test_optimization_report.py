@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_optimization_report.py
+模块: 优化报告测试
+描述: 测试块/行哈希差异算法、改动统计、预算退化以及按需报告接口
+功能:
+    - 差异操作码正确性测试
+    - 块级与行级改动统计测试
+    - 报告接口测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.optimization_report: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import random
+import unittest
+
+from app import create_app
+from app.services.optimization_report import build_report, diff_opcodes, summarize
+
+ORIGINAL = """# 标题
+
+第一段内容。
+
+第二段
+第二段第二行
+
+将被删除的段落"""
+
+OPTIMIZED = """# 标题
+
+第一段内容。
+
+第二段
+第二段第二行（已修改）
+
+新增的段落"""
+
+
+class OptimizationReportTestCase(unittest.TestCase):
+    """优化报告测试用例"""
+
+    def test_opcodes_rebuild_target(self):
+        """操作码可以把原序列还原为新序列"""
+        rng = random.Random(7)
+        for _ in range(500):
+            a = [rng.randint(0, 6) for _ in range(rng.randint(0, 25))]
+            b = [rng.randint(0, 6) for _ in range(rng.randint(0, 25))]
+            rebuilt, i_pos, j_pos = [], 0, 0
+            for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+                self.assertEqual((i1, j1), (i_pos, j_pos))
+                if tag == 'equal':
+                    self.assertEqual(a[i1:i2], b[j1:j2])
+                rebuilt.extend(b[j1:j2])
+                i_pos, j_pos = i2, j2
+            self.assertEqual((i_pos, j_pos), (len(a), len(b)))
+            self.assertEqual(rebuilt, b)
+
+    def test_block_and_line_statistics(self):
+        """按块统计改动，修改块内部按行统计"""
+        report = build_report(ORIGINAL, OPTIMIZED, 'general', ['综合优化'])
+        self.assertTrue(report['detailed'])
+        self.assertTrue(report['exact'])
+        self.assertEqual(report['blocks']['unchanged'], 2)
+        self.assertEqual(report['blocks']['modified'], 2)
+        self.assertEqual(report['changes_count'], 2)
+        self.assertEqual(report['lines'], {'added': 2, 'removed': 2})
+        self.assertEqual(report['block_changes'][0]['original_index'], 2)
+        self.assertEqual(report['block_changes'][0]['lines_removed'], 1)
+
+        quick = summarize(ORIGINAL, OPTIMIZED)
+        self.assertFalse(quick['detailed'])
+        self.assertNotIn('changes_count', quick)
+
+    def test_budget_exhausted_still_reports(self):
+        """预算耗尽时仍返回统计，但标记为非精确"""
+        original = '\n\n'.join(f'段落 {i}' for i in range(2000))
+        optimized = '\n\n'.join(f'段落 {i}' for i in reversed(range(2000)))
+        report = build_report(original, optimized, budget_ms=0, max_entries=10)
+        self.assertFalse(report['exact'])
+        self.assertEqual(len(report['block_changes']), 10)
+        self.assertTrue(report['block_changes_truncated'])
+
+    def test_report_endpoint(self):
+        """按需报告接口"""
+        app = create_app('testing')
+        with app.app_context():
+            client = app.test_client()
+            response = client.post('/api/ai/optimization-report', json={
+                'original_content': ORIGINAL, 'optimized_content': OPTIMIZED
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['report']['changes_count'], 2)
+            self.assertEqual(client.post('/api/ai/optimization-report', json={}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
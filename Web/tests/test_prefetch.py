@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_prefetch.py
+模块: 内容预收集测试
+描述: 测试按内容指纹复用收集产物、流式收集，以及打开文件、编辑空闲后的后台预收集
+功能:
+    - 内容未变化时复用收集产物测试
+    - 重启后按产物指纹跳过转换和写盘测试
+    - 流式收集的响应只含元数据、内存占用不随文件增长测试
+    - 打开文件触发预收集测试
+    - 编辑空闲后预收集测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.1.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.prefetch_service: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.api import ai as ai_api
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services.data_processor import DataProcessor
+from app.services.prefetch_service import PrefetchService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class PrefetchTestCase(unittest.TestCase):
+    """内容预收集测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+        note_file = NoteFile(name='预收集', order=0)
+        db.session.add(note_file)
+        db.session.flush()
+        self.file_id = note_file.id
+        self.note = Note(file_id=note_file.id, order=0, format='markdown',
+                         content='<h1>标题</h1><p>第一段内容</p>')
+        db.session.add(self.note)
+        db.session.commit()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.processor = DataProcessor(self.temp_dir)
+        self.clock = FakeClock()
+        self.service = PrefetchService(self.processor, idle_delay=10, max_workers=1, clock=self.clock)
+        self.patches = [
+            mock.patch.object(ai_api, 'data_processor', self.processor),
+            mock.patch.object(ai_api, 'prefetch_service', self.service),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        self.service.stop()
+        for patch in self.patches:
+            patch.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _wait_idle(self):
+        deadline = time.time() + 5
+        while self.service.get_stats()['in_flight'] and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _collect(self):
+        return self.client.post('/api/ai/collect-content', json={'file_id': self.file_id}).get_json()
+
+    def test_unchanged_content_is_collected_once(self):
+        """内容未变化时第二次收集复用产物，修改后重新收集"""
+        first = self._collect()
+        self.assertFalse(first['cached'])
+        self.assertEqual(first['total_notes'], 1)
+        self.assertNotIn('collected_content', first)
+        self.assertNotIn('original_notes', first)
+        body = self.client.get(first['content_url']).get_json()['collected_content']
+        self.assertEqual(body, '# 标题\n\n第一段内容')
+
+        with mock.patch.object(self.processor.artifacts, 'put_stream', side_effect=AssertionError) as put:
+            second = self._collect()
+            put.assert_not_called()
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['temp_file'], first['temp_file'])
+
+        self.note.content = '<p>改过的内容</p>'
+        db.session.commit()
+        third = self._collect()
+        self.assertFalse(third['cached'])
+        self.assertEqual(self.processor.read_collected_content(self.file_id), '改过的内容')
+
+    def test_matching_artifact_skips_conversion_and_write(self):
+        """重启后指纹一致的已有产物直接复用"""
+        first = self._collect()
+        self.assertFalse(first['cached'])
+
+        restarted = DataProcessor(self.temp_dir)
+        with mock.patch.object(ai_api, 'data_processor', restarted), \
+                mock.patch.object(restarted, '_iter_notes_markdown', side_effect=AssertionError) as convert, \
+                mock.patch.object(restarted.artifacts, 'put_stream', side_effect=AssertionError) as put:
+            second = self._collect()
+            convert.assert_not_called()
+            put.assert_not_called()
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['temp_file']['created_at'], first['temp_file']['created_at'])
+        self.assertEqual(second['fingerprint'], first['fingerprint'])
+
+    def _fill_notes(self, count, size):
+        """绕过ORM批量插入纯文本笔记（派生列为空，收集时转换）"""
+        db.session.query(Note).filter_by(file_id=self.file_id).delete()
+        line = '这是一段用于测试流式收集的笔记内容。' * (size // 20)
+        db.session.execute(Note.__table__.insert(), [
+            {'file_id': self.file_id, 'order': i, 'format': 'text', 'content': f'{i}: {line}'}
+            for i in range(count)
+        ])
+        db.session.commit()
+        return count * size
+
+    def _peak_collect_memory(self):
+        tracemalloc.start()
+        try:
+            result = self.processor.collect_file_content(self.file_id)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertTrue(result['success'], result)
+        return result, peak
+
+    def test_streaming_collection_memory_is_flat(self):
+        """流式收集：笔记按顺序完整写入产物，峰值内存不随文件大小增长"""
+        self._fill_notes(600, 1000)
+        small, small_peak = self._peak_collect_memory()
+        self.assertEqual(small['total_notes'], 600)
+
+        total_chars = self._fill_notes(2400, 1000)
+        large, large_peak = self._peak_collect_memory()
+        self.assertEqual(large['total_notes'], 2400)
+        self.assertGreater(large['temp_file']['size'], total_chars)
+
+        body = self.processor.read_collected_content(self.file_id)
+        blocks = body.split('\n\n')
+        self.assertEqual(len(blocks), 2400)
+        self.assertEqual([block.split(':')[0] for block in blocks[:3]], ['0', '1', '2'])
+        self.assertLess(large_peak, small_peak * 2)
+        self.assertLess(large_peak, large['temp_file']['size'] / 2)
+
+    def test_open_file_prefetches_when_enabled(self):
+        """未启用时请求直接返回；启用后打开文件在后台生成产物，随后的收集直接复用"""
+        data = self.client.post('/api/ai/prefetch', json={'file_id': self.file_id}).get_json()
+        self.assertFalse(data['enabled'])
+        self.assertFalse(data['queued'])
+
+        self.service.start(self.app, interval=None)
+        response = self.client.post('/api/ai/prefetch', json={'file_id': self.file_id})
+        self.assertEqual(response.status_code, 202)
+        self._wait_idle()
+        self.assertIsNotNone(self.processor.read_collected_content(self.file_id))
+
+        data = self._collect()
+        self.assertTrue(data['cached'])
+
+        response = self.client.post('/api/ai/prefetch', json={'file_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_idle_after_edit_prefetches(self):
+        """编辑后空闲超过延迟才触发预收集"""
+        self.service.start(self.app, interval=None)
+        self.note.content = '<p>新内容</p>'
+        db.session.commit()
+
+        self.clock.now += 5
+        self.assertEqual(self.service.run_pending(), [])
+        self.clock.now += 10
+        self.assertEqual(self.service.run_pending(), [self.file_id])
+        self._wait_idle()
+
+        result = self.processor.prefetch_collection(self.file_id)
+        self.assertTrue(result['cached'])
+
+
+if __name__ == '__main__':
+    unittest.main()
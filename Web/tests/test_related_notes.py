@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_related_notes.py
+模块: 相关笔记索引测试
+描述: 测试哈希向量索引的相关笔记/相关文件查询、增量更新和持久化加载
+功能:
+    - 相关笔记与相关文件接口测试
+    - 笔记修改和删除后的增量更新测试
+    - 内存映射索引重新加载测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app: 应用程序模块
+
+许可证: Apache-2.0
+"""
+
+import tempfile
+import unittest
+
+from app import create_app
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services.related_index import RelatedNotesIndex, related_index
+
+
+class RelatedNotesTestCase(unittest.TestCase):
+    """相关笔记索引测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+        contents = [
+            ['<p>Python 异步编程与 asyncio 事件循环</p>', '晚餐菜单：番茄炒蛋'],
+            ['<h2>asyncio 事件循环的 Python 异步编程实践</h2>'],
+            ['周末登山路线和天气预报'],
+        ]
+        self.files = []
+        self.notes = []
+        for i, items in enumerate(contents):
+            note_file = NoteFile(name=f'file{i}', order=i)
+            db.session.add(note_file)
+            db.session.flush()
+            self.files.append(note_file.id)
+            for order, content in enumerate(items):
+                note = Note(file_id=note_file.id, order=order, format='text', content=content)
+                db.session.add(note)
+                self.notes.append(note)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_related_notes_and_files(self):
+        """相关笔记来自其他文件，按相似度排序"""
+        response = self.client.get(f'/api/notes/{self.notes[0].id}/related')
+        self.assertEqual(response.status_code, 200)
+        related = response.get_json()['related']
+        self.assertEqual(related[0]['note_id'], self.notes[2].id)
+        self.assertEqual(related[0]['file_name'], 'file1')
+        self.assertNotIn(self.notes[1].id, [item['note_id'] for item in related])
+
+        related_files = self.client.get(f'/api/files/{self.files[0]}/related').get_json()['related']
+        self.assertEqual([item['file_id'] for item in related_files], [self.files[1]])
+        self.assertEqual(self.client.get('/api/notes/999/related').status_code, 404)
+
+    def test_incremental_updates(self):
+        """笔记修改、删除后索引增量更新"""
+        self.assertTrue(related_index.related_notes(self.notes[0].id))
+
+        self.notes[2].content = '周末登山的天气预报'
+        db.session.commit()
+        self.assertEqual(related_index.get_stats()['pending'], 1)
+        related = related_index.related_notes(self.notes[3].id)
+        self.assertEqual([item['note_id'] for item in related], [self.notes[2].id])
+
+        db.session.delete(self.notes[3])
+        db.session.commit()
+        self.assertIsNone(related_index.related_notes(self.notes[3].id))
+        self.assertEqual(related_index.get_stats()['notes'], 3)
+
+    def test_persisted_index_reloads_without_rebuild(self):
+        """持久化索引重新加载后无需重新向量化"""
+        with tempfile.TemporaryDirectory() as tmp:
+            index = RelatedNotesIndex(index_dir=tmp)
+            index._open()
+            self.assertEqual(index.sync(), len(self.notes))
+
+            reloaded = RelatedNotesIndex(index_dir=tmp)
+            reloaded._open()
+            self.assertEqual(reloaded.sync(), 0)
+            self.assertEqual(reloaded.get_stats()['notes'], len(self.notes))
+            self.assertEqual(reloaded.related_notes(self.notes[0].id)[0]['note_id'], self.notes[2].id)
+            del index, reloaded
+
+
+if __name__ == '__main__':
+    unittest.main()
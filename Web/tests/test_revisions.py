@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_revisions.py
+模块: 修订版本测试
+描述: 测试文件修订版本的记录、重建、恢复和压缩
+功能:
+    - 编辑产生差量版本，连续编辑合并，版本链达到上限时写入快照
+    - 任意版本重建结果与当时的笔记一致
+    - 应用优化前的备份点，按版本ID和时间点恢复，备份列表与接口
+    - 保留策略压缩后剩余版本仍可正确重建
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app.services.revision_store: 被测模块
+
+许可证: Apache-2.0
+"""
+
+import datetime
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.models.note_revision import NoteRevision
+from app.services.data_applier import DataApplier
+from app.services.revision_store import revision_store, KIND_SNAPSHOT, KIND_DELTA
+
+
+class RevisionStoreTestCase(unittest.TestCase):
+    """修订版本测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+        self.now = datetime.datetime(2026, 10, 1, 8, 0, 0)
+        self.clock = mock.patch.object(revision_store, '_clock', lambda: self.now)
+        self.clock.start()
+        self.interval = mock.patch.object(revision_store, 'snapshot_interval', 4)
+        self.interval.start()
+
+        note_file = NoteFile(name='版本', order=0)
+        db.session.add(note_file)
+        db.session.flush()
+        self.file_id = note_file.id
+        self.notes = [Note(file_id=self.file_id, order=i, format='text', content=f'第{i}段：初始内容')
+                      for i in range(10)]
+        db.session.add_all(self.notes)
+        db.session.commit()
+        self.applier = DataApplier()
+
+    def tearDown(self):
+        self.interval.stop()
+        self.clock.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _current(self):
+        notes = Note.query.filter_by(file_id=self.file_id).order_by(Note.order, Note.id).all()
+        return [(note.format, note.content) for note in notes]
+
+    def _reconstructed(self, revision_id):
+        return [(note['format'], note['content']) for note in revision_store.reconstruct(self.file_id, revision_id)]
+
+    def _revisions(self):
+        return NoteRevision.query.filter_by(file_id=self.file_id).order_by(NoteRevision.id).all()
+
+    def _edit(self, index, content, minutes=10):
+        self.now += datetime.timedelta(minutes=minutes)
+        self.notes[index].content = content
+        db.session.commit()
+
+    def test_edits_record_deltas_and_snapshots(self):
+        """编辑产生差量，版本链达到上限时写入快照，每个版本都能重建"""
+        expected = {self._revisions()[-1].id: self._current()}
+        for step in range(12):
+            self._edit(step % 10, f'第{step % 10}段：第{step}次修改')
+            if step == 5:
+                # 调序和删除也记入差量
+                self.notes[0].order = 20
+                db.session.delete(self.notes[9])
+                db.session.commit()
+            expected[self._revisions()[-1].id] = self._current()
+
+        revisions = self._revisions()
+        kinds = [revision.kind for revision in revisions]
+        self.assertEqual(kinds[0], KIND_SNAPSHOT)
+        self.assertIn(KIND_DELTA, kinds)
+        self.assertGreater(kinds.count(KIND_SNAPSHOT), 1)
+        # 快照之间的差量数不超过上限
+        chain = 0
+        for kind in kinds:
+            chain = 0 if kind == KIND_SNAPSHOT else chain + 1
+            self.assertLessEqual(chain, 4)
+        for revision_id, state in expected.items():
+            self.assertEqual(self._reconstructed(revision_id), state)
+
+    def test_consecutive_edits_are_coalesced(self):
+        """合并窗口内的连续编辑只更新同一个版本"""
+        self._edit(1, '第1段：修改一')
+        count = len(self._revisions())
+        for i in range(5):
+            self._edit(2, f'第2段：连续修改{i}', minutes=0.5)
+        revisions = self._revisions()
+        self.assertEqual(len(revisions), count)
+        self.assertEqual(self._reconstructed(revisions[-1].id), self._current())
+        self.assertEqual(revisions[-1].updated_at, self.now)
+
+    def test_apply_backup_and_restore(self):
+        """应用优化前的备份点可按版本ID和时间点恢复"""
+        original = self._current()
+        self.now += datetime.timedelta(hours=1)
+        result = self.applier.apply_optimization(self.file_id, '# 新标题\n\n唯一的段落')
+        self.assertTrue(result['success'], result)
+        backup_id = result['backup_info']['backup_id']
+        self.assertTrue(NoteRevision.query.get(backup_id).pinned)
+        self.assertEqual(self._current(), [('h1', '<h1>新标题</h1>'), ('text', '<p>唯一的段落</p>')])
+
+        backups = self.applier.list_backups(self.file_id, limit=1)
+        self.assertEqual(backups['backups'][0]['reason'], 'ai_apply')
+        self.assertEqual(backups['next_before_id'], backups['backups'][0]['id'])
+        older = self.applier.list_backups(self.file_id, before_id=backups['next_before_id'])
+        self.assertEqual(older['backups'][0]['id'], backup_id)
+
+        self.now += datetime.timedelta(minutes=30)
+        result = self.applier.restore_backup(self.file_id, backup_id)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(self._current(), original)
+        self.assertEqual(self._revisions()[-1].reason, 'restore')
+
+        # 按时间点恢复到应用优化之后的状态
+        self.now += datetime.timedelta(hours=1)
+        response = self.client.post('/api/ai/restore-backup', json={
+            'file_id': self.file_id, 'at': (self.now - datetime.timedelta(minutes=75)).isoformat() + 'Z'})
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(len(self._current()), 2)
+
+        response = self.client.get(f'/api/ai/list-backups/{self.file_id}?limit=2')
+        self.assertEqual(len(response.get_json()['backups']), 2)
+        response = self.client.get(f'/api/ai/backups/{self.file_id}/{backup_id}')
+        self.assertEqual(len(response.get_json()['notes']), 10)
+        response = self.client.post('/api/ai/restore-backup', json={'file_id': self.file_id, 'backup_id': 99999})
+        self.assertEqual(response.status_code, 400)
+
+    def test_compaction_keeps_retained_revisions_reconstructable(self):
+        """压缩按时间稀疏版本，剩余版本的重建结果不变，存储只增长到保留策略的上限"""
+        self.now = datetime.datetime(2026, 10, 2)
+        self.notes[0].content = '第0段：起点'
+        db.session.commit()
+        expected = {}
+        for step in range(60):
+            # 每次编辑间隔20分钟，跨越合并窗口
+            self._edit(step % 10, f'第{step % 10}段：第{step}次修改', minutes=20)
+            expected[self._revisions()[-1].id] = self._current()
+        before = len(self._revisions())
+
+        # 最早的编辑已超过一天，按小时稀疏
+        now = self.now + datetime.timedelta(hours=12)
+        dropped, rewritten = revision_store.compact_file(self.file_id, now=now)
+        db.session.commit()
+        revisions = self._revisions()
+        self.assertGreater(dropped, 0)
+        self.assertEqual(len(revisions), before - dropped)
+        for revision in revisions:
+            if revision.id in expected:
+                self.assertEqual(self._reconstructed(revision.id), expected[revision.id])
+        self.assertEqual(self._reconstructed(revisions[-1].id), self._current())
+
+        # 超过保留天数后只剩最新版本（改写为快照）
+        dropped, _ = revision_store.compact_file(self.file_id, now=self.now + datetime.timedelta(days=200))
+        db.session.commit()
+        revisions = self._revisions()
+        self.assertEqual(len(revisions), 1)
+        self.assertEqual(revisions[0].kind, KIND_SNAPSHOT)
+        self.assertEqual(self._reconstructed(revisions[0].id), self._current())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: test_summaries.py
+模块: 文件摘要测试
+描述: 测试摘要持久化、基于指纹的过期判断和防抖后台刷新
+功能:
+    - 摘要刷新与读取测试
+    - 内容未变化时跳过AI调用测试
+    - 笔记变更后的防抖刷新测试
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - unittest: 单元测试框架
+    - app: 应用程序模块
+
+许可证: Apache-2.0
+"""
+
+import time
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.api import ai as ai_api
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services.ai_service import ai_service
+from app.services.llm_providers import StubProvider
+from app.services.summary_service import SummaryService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SummaryTestCase(unittest.TestCase):
+    """文件摘要测试用例"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+        db.create_all()
+
+        note_file = NoteFile(name='摘要', order=0)
+        db.session.add(note_file)
+        db.session.flush()
+        self.file_id = note_file.id
+        self.note = Note(file_id=note_file.id, order=0, format='text',
+                         content='第一句话。第二句话。第三句话。')
+        db.session.add(self.note)
+        db.session.commit()
+
+        self.provider = StubProvider()
+        self.clock = FakeClock()
+        self.service = SummaryService(ai_api.data_processor, debounce=30, max_workers=1, clock=self.clock)
+        self.patches = [
+            mock.patch.object(ai_api, 'summary_service', self.service),
+            mock.patch.object(ai_service.llm, '_provider', self.provider),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        self.service.stop()
+        for patch in self.patches:
+            patch.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_refresh_and_read(self):
+        """刷新后可以读取，内容未变化时不再调用AI"""
+        response = self.client.get(f'/api/ai/summary/{self.file_id}')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(f'/api/ai/summary/{self.file_id}/refresh')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertTrue(data['refreshed'])
+        self.assertEqual(data['summary']['summary'], '第一句话。第二句话。')
+
+        with mock.patch.object(self.provider, '_generate', side_effect=AssertionError) as generate:
+            data = self.client.post(f'/api/ai/summary/{self.file_id}/refresh').get_json()
+            self.assertFalse(data['refreshed'])
+            generate.assert_not_called()
+
+        response = self.client.get(f'/api/ai/summaries?file_ids={self.file_id},999&check_stale=true')
+        summaries = response.get_json()['summaries']
+        self.assertEqual(list(summaries), [str(self.file_id)])
+        self.assertFalse(summaries[str(self.file_id)]['stale'])
+
+    def test_edit_marks_stale_and_refreshes_after_debounce(self):
+        """笔记修改后摘要过期，防抖窗口过后后台刷新"""
+        self.service.refresh(self.file_id)
+        self.service.start(self.app, interval=None)
+
+        self.note.content = '新的开头。后面的内容。'
+        db.session.commit()
+        summary = self.service.get_summary(self.file_id, check_stale=True)
+        self.assertTrue(summary['stale'])
+        self.assertTrue(summary['pending'])
+
+        # 防抖窗口内不刷新
+        self.clock.now += 10
+        self.assertEqual(self.service.run_pending(), [])
+
+        self.clock.now += 30
+        self.assertEqual(self.service.run_pending(), [self.file_id])
+        for _ in range(200):
+            if not self.service.get_stats()['in_flight']:
+                break
+            time.sleep(0.01)
+
+        summary = self.service.get_summary(self.file_id, check_stale=True)
+        self.assertFalse(summary['stale'])
+        self.assertEqual(summary['summary'], '新的开头。后面的内容。')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: benchmark_ai_pipeline.py
+模块: 工具 - AI流程压测
+描述: 使用本地桩服务商离线压测 收集 -> 优化 -> 应用 的完整AI流程吞吐量
+功能:
+    - 在内存数据库中生成测试文件和笔记
+    - 多线程并发执行完整AI流程
+    - 输出吞吐量、延迟分位数和弹性层统计
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app: 应用工厂和AI服务
+
+使用方法:
+    python tools/benchmark_ai_pipeline.py --files 20 --notes 50 --workers 4 --latency uniform:0.05,0.2
+
+注意事项:
+    - 无需网络和API密钥，桩服务商延迟分布通过 --latency 配置
+    - 可通过 --replay 指定录制文件，使用真实响应回放
+
+许可证: Apache-2.0
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AI流程离线压测')
+    parser.add_argument('--files', type=int, default=20, help='文件数量')
+    parser.add_argument('--notes', type=int, default=50, help='每个文件的笔记数量')
+    parser.add_argument('--workers', type=int, default=4, help='并发线程数')
+    parser.add_argument('--latency', default='uniform:0.05,0.2', help='桩服务延迟分布')
+    parser.add_argument('--token-latency', default='0', help='每个输出token的额外延迟')
+    parser.add_argument('--error-rate', default='0', help='注入的错误率')
+    parser.add_argument('--replay', default=None, help='回放文件路径（使用replay服务商）')
+    parser.add_argument('--no-apply', action='store_true', help='跳过应用步骤')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    args = parse_args()
+
+    # 必须在导入应用之前设置服务商
+    if args.replay:
+        os.environ['AI_PROVIDER'] = 'replay'
+        os.environ['AI_REPLAY_PATH'] = args.replay
+        os.environ.setdefault('AI_REPLAY_FALLBACK', 'stub')
+    else:
+        os.environ['AI_PROVIDER'] = 'stub'
+    os.environ['AI_STUB_LATENCY'] = args.latency
+    os.environ['AI_STUB_TOKEN_LATENCY'] = args.token_latency
+    os.environ['AI_STUB_ERROR_RATE'] = args.error_rate
+    os.environ.setdefault('AI_RATE_LIMIT_PER_SEC', '1000')
+    os.environ.setdefault('AI_RATE_LIMIT_BURST', '1000')
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from app import create_app
+    from app.extensions import db
+    from app.models.note import Note
+    from app.models.note_file import NoteFile
+    from app.api.ai import data_processor, ai_optimizer, data_applier
+    from app.services.ai_service import ai_service
+
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        file_ids = []
+        for i in range(args.files):
+            note_file = NoteFile(name=f'bench_{i}', order=i)
+            db.session.add(note_file)
+            db.session.flush()
+            for j in range(args.notes):
+                fmt = 'h2' if j % 10 == 0 else 'text'
+                db.session.add(Note(
+                    file_id=note_file.id,
+                    order=j,
+                    format=fmt,
+                    content=f'<p>第{j}段 <strong>重点</strong> 内容，用于压测 AI 流程。Note {j} of file {i}.</p>'
+                ))
+            file_ids.append(note_file.id)
+        db.session.commit()
+
+    def run_pipeline(file_id):
+        timings = {}
+        with app.app_context():
+            started = time.perf_counter()
+            collected = data_processor.collect_file_content(file_id)
+            timings['collect'] = time.perf_counter() - started
+            if not collected['success']:
+                return False, timings
+
+            started = time.perf_counter()
+            optimized = ai_optimizer.optimize_content(
+                file_id, collected['file_name'], collected['collected_content'], 'general'
+            )
+            timings['optimize'] = time.perf_counter() - started
+            if not optimized['success']:
+                return False, timings
+
+            if not args.no_apply:
+                started = time.perf_counter()
+                applied = data_applier.apply_optimization(file_id, optimized['optimized_content'], False)
+                timings['apply'] = time.perf_counter() - started
+                if not applied['success']:
+                    return False, timings
+        return True, timings
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(run_pipeline, file_ids))
+    wall = time.perf_counter() - wall_started
+
+    succeeded = sum(1 for ok, _ in results if ok)
+    print(f"服务商: {ai_service.get_provider_info()}")
+    print(f"文件数: {len(file_ids)}  成功: {succeeded}  并发: {args.workers}")
+    print(f"总耗时: {wall:.3f}s  吞吐量: {len(file_ids) / wall:.2f} 文件/秒")
+    for step in ('collect', 'optimize', 'apply'):
+        values = [t[step] for _, t in results if step in t]
+        if values:
+            print(f"  {step:<9} mean={statistics.mean(values) * 1000:8.2f}ms "
+                  f"p50={percentile(values, 50) * 1000:8.2f}ms "
+                  f"p95={percentile(values, 95) * 1000:8.2f}ms")
+    stats = ai_service.get_client_stats()
+    print(f"弹性层计数: {stats['counters']}")
+    print(f"熔断器: {stats['circuit_breaker']['state']}  峰值并发: {stats['concurrency']['peak']}")
+
+
+if __name__ == '__main__':
+    main()
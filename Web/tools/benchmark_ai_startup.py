@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: benchmark_ai_startup.py
+模块: 工具 - AI启动与调用开销压测
+描述: 测量应用冷启动导入耗时、内存占用，以及每次AI调用在服务商之外的额外开销
+功能:
+    - 在独立子进程中测量冷导入耗时和峰值内存，并列出已加载的重量级模块
+    - 使用零延迟桩服务商测量每次调用的框架开销
+    - 安装了 langchain 时，同时测量旧的 LLMChain 调用路径作为对比
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app: 应用工厂和AI服务
+    - langchain: 可选，仅用于对比旧调用路径
+
+使用方法:
+    python tools/benchmark_ai_startup.py --runs 5 --calls 2000
+
+许可证: Apache-2.0
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEAVY_MODULES = ('langchain', 'langchain_core', 'langchain_community', 'dashscope', 'openai', 'pydantic')
+
+IMPORT_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'elapsed': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    'loaded': sorted(m for m in {heavy!r} if m in sys.modules)
+}}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AI启动与调用开销压测')
+    parser.add_argument('--runs', type=int, default=5, help='冷导入测量次数')
+    parser.add_argument('--calls', type=int, default=2000, help='调用开销测量次数')
+    return parser.parse_args()
+
+
+def measure_import(statement, runs):
+    """在新进程中执行导入语句，返回耗时中位数、内存和已加载模块"""
+    env = dict(os.environ, AI_PROVIDER='stub', PYTHONDONTWRITEBYTECODE='1')
+    samples = []
+    for _ in range(runs):
+        code = IMPORT_PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'elapsed_ms': statistics.median(s['elapsed'] for s in samples) * 1000,
+        'max_rss_mb': statistics.median(s['max_rss_mb'] for s in samples),
+        'loaded': samples[-1]['loaded']
+    }
+
+
+def time_calls(fn, calls):
+    fn()
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def legacy_chain(client):
+    """用 langchain 构造旧的 LLMChain 调用路径，未安装时返回None"""
+    try:
+        from langchain.llms.base import LLM
+        from langchain.prompts import PromptTemplate as LangChainPrompt
+        from langchain.chains import LLMChain
+    except ImportError:
+        return None
+
+    class LegacyLLM(LLM):
+        @property
+        def _llm_type(self):
+            return 'legacy'
+
+        def _call(self, prompt, stop=None, **kwargs):
+            return client.call(prompt, stop=stop)
+
+    from app.services.ai_service import CONTENT_SUMMARY_TEMPLATE
+    prompt = LangChainPrompt(input_variables=['content'], template=CONTENT_SUMMARY_TEMPLATE.template)
+    return LLMChain(llm=LegacyLLM(), prompt=prompt)
+
+
+def main():
+    args = parse_args()
+
+    print('== 冷导入（子进程，中位数）==')
+    for label, statement in (
+        ('import app.api.ai', 'import app.api.ai'),
+        ('create_app', "from app import create_app; create_app('testing')"),
+        ('langchain (旧依赖)', 'import langchain.chains, langchain.llms.base, langchain.prompts'),
+    ):
+        try:
+            result = measure_import(statement, args.runs)
+        except subprocess.CalledProcessError:
+            print(f"  {label:<20} 不可用")
+            continue
+        print(f"  {label:<20} {result['elapsed_ms']:8.1f}ms  rss={result['max_rss_mb']:.1f}MB  "
+              f"重量级模块={result['loaded'] or '无'}")
+
+    os.environ['AI_PROVIDER'] = 'stub'
+    os.environ['AI_STUB_LATENCY'] = '0'
+    os.environ.setdefault('AI_RATE_LIMIT_PER_SEC', '1000000')
+    os.environ.setdefault('AI_RATE_LIMIT_BURST', '1000000')
+    import logging
+    logging.disable(logging.INFO)
+    from app.services.ai_service import ai_service
+
+    content = '第一句话。第二句话。第三句话。' * 20
+    prompt = ai_service.content_summary_template.format(content=content)
+    provider = ai_service.llm.provider
+    client = ai_service.llm.client
+
+    print(f'== 每次调用开销（{args.calls} 次，零延迟桩服务）==')
+    direct = time_calls(lambda: provider.generate(prompt), args.calls)
+    resilient = time_calls(lambda: client.call(prompt), args.calls)
+    service = time_calls(lambda: ai_service.generate_summary(content), args.calls)
+    print(f"  服务商直接调用        {direct:8.1f}us")
+    print(f"  弹性层                {resilient:8.1f}us  (+{resilient - direct:.1f}us)")
+    print(f"  ai_service 摘要       {service:8.1f}us  (+{service - direct:.1f}us)")
+
+    chain = legacy_chain(client)
+    if chain is not None:
+        legacy = time_calls(lambda: chain.run(content=content), args.calls)
+        print(f"  LLMChain.run (旧路径) {legacy:8.1f}us  (+{legacy - direct:.1f}us)")
+
+
+if __name__ == '__main__':
+    main()
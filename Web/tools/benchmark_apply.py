@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: benchmark_apply.py
+模块: 工具 - 优化结果应用基准测试
+描述: 在万级笔记块的文件上对比应用优化结果的几种写入方式
+功能:
+    - 原逐对象方式：每条笔记一次 session.delete / session.add
+    - 整体替换：按文件一条删除语句 + 一次批量插入
+    - 块级差异：小改动只写入变化的行
+    - 从备份恢复（整体替换路径）
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app.services.data_applier: 被测服务
+
+使用方法:
+    python tools/benchmark_apply.py --blocks 10000
+
+注意事项:
+    - 使用临时目录中的SQLite文件数据库，后台刷新、预收集和产物清理都关闭
+
+许可证: Apache-2.0
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORK_DIR = tempfile.mkdtemp(prefix='apply-bench-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(WORK_DIR, 'notes.db'),
+    'SUMMARY_AUTO_REFRESH': 'false',
+    'AI_PREFETCH_ENABLED': 'false',
+    'ARTIFACT_JANITOR_ENABLED': 'false',
+    'RELATED_INDEX_DIR': os.path.join(WORK_DIR, 'index'),
+})
+
+from app import create_app
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_file import NoteFile
+from app.services.data_applier import DataApplier
+
+
+def paragraphs(count, tag=''):
+    return [f'第{i}段{tag}：会议纪要、行动项目和负责人安排，以及下一步的计划说明。' for i in range(count)]
+
+
+def legacy_apply(file_id, blocks):
+    """原 apply_optimization 的写入方式：逐对象删除和添加"""
+    note_file = NoteFile.query.get(file_id)
+    for note in Note.query.filter_by(file_id=file_id).order_by(Note.order.asc()).all():
+        db.session.delete(note)
+    for i, content in enumerate(blocks):
+        db.session.add(Note(content=content, file_id=file_id, order=i, format='text',
+                            created_at=datetime.datetime.utcnow(), updated_at=datetime.datetime.utcnow()))
+    note_file.updated_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f'  {label:<28} {elapsed * 1000:10.1f} ms')
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='优化结果应用基准测试')
+    parser.add_argument('--blocks', type=int, default=10000, help='文件中的笔记块数量')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app = create_app('production')
+    applier = DataApplier()
+    try:
+        with app.app_context():
+            note_file = NoteFile(name='bench', order=0)
+            db.session.add(note_file)
+            db.session.commit()
+            file_id = note_file.id
+            original = paragraphs(args.blocks)
+            edited = list(original)
+            edited[args.blocks // 2] = '改写后的段落。'
+
+            print(f'{args.blocks} 个笔记块:')
+            timed('初始写入（逐对象）', lambda: legacy_apply(file_id, original))
+            timed('逐对象删除和添加', lambda: legacy_apply(file_id, paragraphs(args.blocks, 'b')))
+            result = timed('整体替换（批量语句）', lambda: applier.apply_optimization(
+                file_id, '\n\n'.join(original), backup_original=False, mode='replace'))
+            assert result['success'], result
+            result = timed('块级差异（改一段）', lambda: applier.apply_optimization(
+                file_id, '\n\n'.join(edited), backup_original=False))
+            print(f'    变更: {result["changes"]}')
+            backup = applier._create_backup(file_id, applier._load_notes(file_id))['content']
+            result = timed('从备份恢复（批量语句）', lambda: applier.restore_from_backup(file_id, backup))
+            assert result['restored_notes_count'] == args.blocks, result
+            db.session.remove()
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
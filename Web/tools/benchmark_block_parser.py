@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: benchmark_block_parser.py
+模块: 工具 - Markdown分块基准测试
+描述: 在数MB的AI优化输出上对比原逐行分块（含每块DEBUG输出）与结构化分块的耗时
+功能:
+    - 生成标题、段落、列表、引用、代码块、分隔线混合的Markdown语料
+    - 原分块方式：按行切分，每块一行DEBUG输出（输出到 /dev/null，不含终端渲染开销）
+    - 结构化分块：识别格式并生成编辑器HTML
+    - 应用优化的解析：结构化分块 + 纯文本（差异比较用）
+    - 重复应用相同内容时的差异计划，以及全部新块写入时的Markdown派生文本
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app.utils.markdown_blocks: 被测分块器
+    - app.services.data_applier: 应用优化的解析入口
+    - app.services.note_diff: 差异计划
+
+使用方法:
+    python tools/benchmark_block_parser.py --sizes 1,4,8
+
+许可证: Apache-2.0
+"""
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.data_applier import DataApplier
+from app.services.note_diff import plan_note_changes
+from app.utils.markdown_blocks import parse_markdown_blocks
+
+SECTION = '''## 第{i}节 项目进展
+
+本周完成了 **接口重构** 和 *性能测试*，详见 [报告](https://example.com/r/{i})。
+剩余工作包括 `cache_size` 参数调优与回归测试。
+
+- 完成数据迁移脚本
+  - 验证 {i} 号分片
+- 更新部署文档
+1. 评审设计
+2. 合并分支
+
+> 注意：上线前需要确认备份策略。
+
+```python
+def handler(event):
+    return event.get("id", {i}) < 100
+```
+
+---
+'''
+
+
+def build_corpus(megabytes):
+    target = megabytes * 1024 * 1024
+    parts = []
+    size = 0
+    i = 0
+    while size < target:
+        section = SECTION.format(i=i)
+        parts.append(section)
+        size += len(section.encode('utf-8'))
+        i += 1
+    return 'title: 优化结果\nmodel: bench\n---\n' + '\n'.join(parts)
+
+
+def legacy_parse(content):
+    """原 _parse_optimized_content 的分块逻辑与每块DEBUG输出"""
+    lines = content.split('\n')
+    blocks = []
+    current_block = []
+    in_code_block = False
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped_line = line.strip()
+        if stripped_line.startswith('```'):
+            if in_code_block:
+                current_block.append(line)
+                blocks.append('\n'.join(current_block))
+                current_block = []
+                in_code_block = False
+            else:
+                if current_block:
+                    blocks.append('\n'.join(current_block))
+                    current_block = []
+                current_block.append(line)
+                in_code_block = True
+            i += 1
+            continue
+        if in_code_block:
+            current_block.append(line)
+            i += 1
+            continue
+        if stripped_line.startswith('#') and ' ' in stripped_line:
+            if current_block:
+                blocks.append('\n'.join(current_block))
+                current_block = []
+            blocks.append(line.strip())
+            i += 1
+            continue
+        if stripped_line == '---':
+            if current_block:
+                blocks.append('\n'.join(current_block))
+                current_block = []
+            blocks.append(stripped_line)
+            i += 1
+            continue
+        if not stripped_line:
+            if current_block:
+                blocks.append('\n'.join(current_block))
+                current_block = []
+            while i < len(lines) and not lines[i].strip():
+                i += 1
+            continue
+        current_block.append(line)
+        i += 1
+    if current_block:
+        blocks.append('\n'.join(current_block))
+    cleaned_blocks = [block.strip() for block in blocks if block.strip()]
+    print(f"DEBUG: 精细化解析后得到 {len(cleaned_blocks)} 个笔记块")
+    for i, block in enumerate(cleaned_blocks):
+        preview = block[:50].replace('\n', '\\n')
+        print(f"DEBUG: Block {i+1}: {preview}...")
+    return cleaned_blocks
+
+
+Row = namedtuple('Row', 'id order content format markdown plain_text')
+
+
+def measure(func, content, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Markdown分块基准测试')
+    parser.add_argument('--sizes', default='1,4,8', help='语料大小（MB），逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    applier = DataApplier()
+    for megabytes in (int(size) for size in args.sizes.split(',')):
+        content = build_corpus(megabytes)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            legacy, legacy_blocks = measure(legacy_parse, content, args.repeat)
+        structured, blocks = measure(parse_markdown_blocks, content, args.repeat)
+        parsed, note_blocks = measure(applier._parse_optimized_content, content, args.repeat)
+        # 已应用过同一内容的文件：现有笔记与新块内容相同
+        notes = [Row(i, i, block.content, block.format, None, block.plain_text) for i, block in enumerate(note_blocks)]
+        planned, plan = measure(lambda blocks: plan_note_changes(notes, blocks), note_blocks, args.repeat)
+        assert plan.touched == 0, plan
+        derived, _ = measure(applier._with_markdown, note_blocks, 1)
+        formats = {}
+        for block in blocks:
+            formats[block.format] = formats.get(block.format, 0) + 1
+        print(f'{megabytes} MB: 原分块 {len(legacy_blocks)} 块 {legacy * 1000:8.1f} ms  '
+              f'结构化分块 {len(blocks)} 块 {structured * 1000:8.1f} ms  解析含纯文本 {parsed * 1000:8.1f} ms')
+        print(f'    重复应用的差异计划 {planned * 1000:8.1f} ms  全部新块计算Markdown {derived * 1000:8.1f} ms')
+        print(f'    格式分布: {formats}')
+
+
+if __name__ == '__main__':
+    main()
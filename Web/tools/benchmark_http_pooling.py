@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: benchmark_http_pooling.py
+模块: 工具 - HTTP连接复用压测
+描述: 启动本地 HTTPS 替身服务模拟 DashScope 接口，对比每次调用新建会话与共享连接池的耗时
+功能:
+    - 使用 openssl 生成自签名证书，启动多线程 HTTPS 替身服务（支持 keep-alive）
+    - 替身服务返回与 DashScope 文本生成接口相同格式的响应，可配置服务端延迟
+    - 对比每次调用新建会话（与 SDK 行为一致）和共享连接池，分别在串行和并发下测量
+    - 输出总耗时、单次耗时分位数、服务端接受的连接数和客户端连接复用统计
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - openssl: 命令行工具，用于生成自签名证书
+    - app.services.llm_providers: QwenProvider
+    - app.services.http_pool: HTTPSessionPool
+
+使用方法:
+    python tools/benchmark_http_pooling.py --calls 200 --concurrency 8 --latency 0.005
+
+许可证: Apache-2.0
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.http_pool import HTTPSessionPool  # noqa: E402
+from app.services.llm_providers import QwenProvider  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='HTTP连接复用压测')
+    parser.add_argument('--calls', type=int, default=200, help='每种方式的调用次数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发方式的线程数')
+    parser.add_argument('--pool-size', type=int, default=8, help='连接池大小')
+    parser.add_argument('--latency', type=float, default=0.0, help='替身服务每次响应的延迟（秒）')
+    return parser.parse_args()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """模拟 DashScope 文本生成接口"""
+
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分多次写出，关闭 Nagle 避免与延迟确认叠加出 40ms 级别的停顿
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        prompt = payload.get('input', {}).get('prompt', '')
+        body = json.dumps({
+            'output': {'text': prompt[:64], 'finish_reason': 'stop'},
+            'usage': {'input_tokens': len(prompt) // 2, 'output_tokens': 32},
+            'request_id': 'stand-in'
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTPS 替身服务，统计接受的连接数"""
+
+    daemon_threads = True
+
+    def __init__(self, context, latency):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        # 握手推迟到处理线程中进行，避免在 accept 线程里串行握手
+        self.socket = context.wrap_socket(self.socket, server_side=True, do_handshake_on_connect=False)
+        self.latency = latency
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def get_request(self):
+        request, address = super().get_request()
+        with self._lock:
+            self.connections += 1
+        return request, address
+
+
+def generate_certificate(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+                    '-keyout', key, '-out', cert], check=True, capture_output=True)
+    return cert, key
+
+
+class SessionPerCall:
+    """每次调用新建并关闭会话，与 dashscope SDK 的 Generation.call 行为一致"""
+
+    pool_size = 1
+
+    def post(self, url, **kwargs):
+        with requests.Session() as session:
+            return session.post(url, **kwargs)
+
+
+def run(provider, calls, concurrency):
+    prompt = '请总结以下内容：' + '这是一段用于压测的笔记内容。' * 20
+    latencies = []
+
+    def one(_):
+        started = time.perf_counter()
+        provider.generate(prompt)
+        latencies.append(time.perf_counter() - started)
+
+    provider.generate(prompt)  # 预热
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for index in range(calls):
+            one(index)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one, range(calls)))
+    total = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'total_s': total,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000
+    }
+
+
+def main():
+    args = parse_args()
+    if not shutil.which('openssl'):
+        print('需要 openssl 命令行工具生成自签名证书')
+        return 1
+
+    directory = tempfile.mkdtemp(prefix='http-pool-bench-')
+    try:
+        cert, key = generate_certificate(directory)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server = StandInServer(context, args.latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'https://127.0.0.1:{server.server_address[1]}/api/v1'
+
+        def provider(http_pool):
+            return QwenProvider(api_key='bench', base_url=base_url, http_pool=http_pool, verify=cert)
+
+        print(f'== {args.calls} 次调用，替身服务延迟 {args.latency * 1000:.1f}ms ==')
+        scenarios = [
+            ('每次新建会话', SessionPerCall(), 1),
+            ('共享连接池', HTTPSessionPool('bench-serial', pool_size=args.pool_size), 1),
+            (f'每次新建会话 x{args.concurrency}', SessionPerCall(), args.concurrency),
+            (f'共享连接池 x{args.concurrency}', HTTPSessionPool('bench-parallel', pool_size=args.pool_size),
+             args.concurrency),
+        ]
+        baseline = {}
+        for label, http_pool, concurrency in scenarios:
+            connections_before = server.connections
+            result = run(provider(http_pool), args.calls, concurrency)
+            connections = server.connections - connections_before
+            reference = baseline.setdefault(concurrency, result['total_s'])
+            print(f"  {label:<18} 总计 {result['total_s'] * 1000:8.1f}ms  "
+                  f"平均 {result['mean_ms']:6.2f}ms  p50 {result['p50_ms']:6.2f}ms  "
+                  f"p95 {result['p95_ms']:6.2f}ms  服务端连接 {connections:4d}  "
+                  f"加速 {reference / result['total_s']:.2f}x")
+            if isinstance(http_pool, HTTPSessionPool):
+                stats = http_pool.get_stats()
+                print(f"  {'':<18} 新建连接 {stats['connections_created']}  "
+                      f"复用 {stats['connections_reused']}  复用率 {stats['reuse_ratio']:.2%}  "
+                      f"池满丢弃 {stats['connections_discarded']}")
+                http_pool.close()
+        server.shutdown()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
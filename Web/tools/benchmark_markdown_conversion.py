@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: benchmark_markdown_conversion.py
+模块: 工具 - HTML转Markdown基准测试
+描述: 对比单遍转换器与原有两条转换路径（正则预处理 + html2text、纯正则备用转换）的速度和输出
+功能:
+    - 按笔记规模生成TipTap风格的HTML语料
+    - 分别统计三种转换方式的耗时和吞吐量
+    - 在黄金语料上核对新转换器与原 html2text 路径的输出差异
+    - 包含未闭合标签等会让非贪婪正则反复回溯的病态输入
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app.utils.html_markdown: 新转换器
+    - html2text: 原转换路径（可选，未安装时跳过该路径）
+
+使用方法:
+    python tools/benchmark_markdown_conversion.py --notes 2000 --repeat 3
+
+许可证: Apache-2.0
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.html_markdown import html_to_markdown
+
+try:
+    import html2text
+except ImportError:
+    html2text = None
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'tests', 'fixtures', 'markdown_golden.json')
+
+
+# ==================== 原有转换路径（用于对比） ====================
+
+def legacy_clean_html(html_content):
+    """原 DataProcessor._clean_html_content"""
+    html_content = re.sub(r'<p[^>]*>\s*</p>', '', html_content)
+    html_content = re.sub(r'\s*style="[^"]*"', '', html_content)
+    html_content = re.sub(r'\s*class="[^"]*"', '', html_content)
+    html_content = re.sub(r'<h([1-6])[^>]*>', r'<h\1>', html_content)
+    html_content = re.sub(r'<p[^>]*>', '<p>', html_content)
+    html_content = re.sub(r'<ul[^>]*>', '<ul>', html_content)
+    html_content = re.sub(r'<ol[^>]*>', '<ol>', html_content)
+    html_content = re.sub(r'<li[^>]*>', '<li>', html_content)
+    html_content = re.sub(r'<strong[^>]*>', '<strong>', html_content)
+    html_content = re.sub(r'<em[^>]*>', '<em>', html_content)
+    html_content = re.sub(r'<b[^>]*>', '<strong>', html_content)
+    html_content = re.sub(r'<i[^>]*>', '<em>', html_content)
+    return html_content
+
+
+def legacy_html2text(content):
+    """原主路径：正则预处理 + html2text + 空行合并"""
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.ignore_images = False
+    h.body_width = 0
+    h.unicode_snob = True
+    h.escape_snob = True
+    markdown_content = h.handle(legacy_clean_html(content))
+    markdown_content = re.sub(r'\n\s*\n\s*\n+', '\n\n', markdown_content)
+    return markdown_content.strip()
+
+
+def legacy_regex(text):
+    """原 DataProcessor._simple_html_to_markdown（备用路径）"""
+    for level in range(1, 7):
+        text = re.sub(r'<h%d[^>]*>(.*?)</h%d>' % (level, level), '#' * level + r' \1\n', text)
+    text = re.sub(r'<(strong|b)[^>]*>(.*?)</\1>', r'**\2**', text)
+    text = re.sub(r'<(em|i)[^>]*>(.*?)</\1>', r'*\2*', text)
+    text = re.sub(r'<(s|del|strike)[^>]*>(.*?)</\1>', r'~~\2~~', text)
+    text = re.sub(r'<code[^>]*>(.*?)</code>', r'`\1`', text)
+    text = re.sub(r'<li[^>]*>(.*?)</li>', r'- \1\n', text)
+    text = re.sub(r'<ul[^>]*>', '', text)
+    text = re.sub(r'</ul>', '\n', text)
+    text = re.sub(r'<ol[^>]*>', '', text)
+    text = re.sub(r'</ol>', '\n', text)
+    text = re.sub(r'<p[^>]*>', '', text)
+    text = re.sub(r'</p>', '\n\n', text)
+    text = re.sub(r'<br[^>]*/?>', '\n', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    for entity, char in (('&lt;', '<'), ('&gt;', '>'), ('&amp;', '&'), ('&quot;', '"'),
+                         ('&#39;', "'"), ('&nbsp;', ' ')):
+        text = text.replace(entity, char)
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    return text.strip()
+
+
+# ==================== 语料 ====================
+
+def build_note(rng, index):
+    """生成一个TipTap风格的笔记块"""
+    words = ['笔记', 'content', '重点', 'example', '总结', 'data_1', 'a*b', '#tag', '数据处理']
+    sentence = lambda: ' '.join(rng.choice(words) for _ in range(rng.randint(4, 12)))
+    kind = rng.random()
+    if kind < 0.15:
+        level = rng.randint(1, 3)
+        return f'<h{level}>{sentence()}</h{level}>'
+    if kind < 0.35:
+        items = ''.join(f'<li><p>{sentence()} <strong>{rng.choice(words)}</strong></p></li>'
+                        for _ in range(rng.randint(2, 6)))
+        return f'<ul>{items}</ul>'
+    if kind < 0.45:
+        items = ''.join(f'<li><p>{sentence()}</p></li>' for _ in range(rng.randint(2, 6)))
+        return f'<ol>{items}</ol>'
+    return (f'<p>{sentence()} <em>{sentence()}</em> <code>f_{index}()</code> '
+            f'<a href="https://example.com/{index}" target="_blank" rel="noopener noreferrer">链接</a> '
+            f'{sentence()}</p>')
+
+
+def build_corpus(notes, seed=7):
+    rng = random.Random(seed)
+    return [build_note(rng, i) for i in range(notes)]
+
+
+def build_pathological(size):
+    """未闭合标题：非贪婪正则对每个 <h1> 都会扫描到文本末尾"""
+    return '<p>' + ('<h1>标题 ' + 'x' * 40) * size + '</p>'
+
+
+# ==================== 计时 ====================
+
+def measure(convert, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for content in corpus:
+            convert(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='HTML转Markdown基准测试')
+    parser.add_argument('--notes', type=int, default=2000, help='笔记块数量')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    parser.add_argument('--pathological', type=int, default=2000, help='病态输入中未闭合标题的数量')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    corpus = build_corpus(args.notes)
+    total_chars = sum(len(content) for content in corpus)
+
+    paths = [('单遍转换器', html_to_markdown), ('纯正则备用路径', legacy_regex)]
+    if html2text is not None:
+        paths.insert(1, ('正则预处理 + html2text', legacy_html2text))
+    else:
+        print('未安装 html2text，跳过原主路径')
+
+    print(f'语料: {len(corpus)} 个笔记块, {total_chars / 1024:.1f} KB')
+    baseline = None
+    for name, convert in paths:
+        elapsed = measure(convert, corpus, args.repeat)
+        baseline = baseline or elapsed
+        print(f'  {name:<24} {elapsed * 1000:9.1f} ms  {total_chars / elapsed / 1024 / 1024:7.2f} MB/s  '
+              f'相对单遍转换器 {elapsed / baseline:5.2f}x')
+
+    pathological = [build_pathological(args.pathological)]
+    print(f'病态输入: {len(pathological[0]) / 1024:.1f} KB（{args.pathological} 个未闭合标题）')
+    for name, convert in paths:
+        elapsed = measure(convert, pathological, 1)
+        print(f'  {name:<24} {elapsed * 1000:9.1f} ms')
+
+    if html2text is not None:
+        with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+            golden = json.load(f)
+        same = sum(1 for case in golden if html_to_markdown(case['html']) == legacy_html2text(case['html']))
+        fixed = [case['name'] for case in golden if case['source'] != 'legacy']
+        print(f'黄金语料: {len(golden)} 条, 与原 html2text 路径输出一致 {same} 条; '
+              f'其余为旧预处理误改写标签的修正: {", ".join(fixed)}')
+
+
+if __name__ == '__main__':
+    main()
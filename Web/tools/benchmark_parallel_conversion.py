@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件名: benchmark_parallel_conversion.py
+模块: 工具 - 并行转换交叉点测量
+描述: 在不同文件规模下对比当前线程转换与进程池并行转换的耗时，找出进程池开始更快的交叉点
+功能:
+    - 按笔记数生成TipTap风格的语料（与 benchmark_markdown_conversion 相同的生成器）
+    - 进程池预热后计时，不计入进程启动时间
+    - 输出每个规模的加速比和建议的 NOTE_CONVERT_PARALLEL_MIN_NOTES / MIN_CHARS
+
+作者: Jolly
+创建时间: 2026-10-18
+最后修改: 2026-10-18
+修改人: Jolly
+版本: 1.0.0
+
+依赖:
+    - app.services.conversion_pool: 被测进程池
+
+使用方法:
+    python tools/benchmark_parallel_conversion.py --workers 4 --sizes 250,500,1000,2000,5000,10000
+
+注意事项:
+    - 单核机器上进程池不会更快，此时应保持 NOTE_CONVERT_WORKERS=1
+
+许可证: Apache-2.0
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.conversion_pool import ConversionPool, _render_chunk
+from benchmark_markdown_conversion import build_corpus
+
+
+def measure(convert, items, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        convert(items)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='并行Markdown转换交叉点测量')
+    parser.add_argument('--workers', type=int, default=max(2, (os.cpu_count() or 1) - 1), help='进程数')
+    parser.add_argument('--sizes', default='100,250,500,1000,2000,5000,10000', help='笔记数，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    pool = ConversionPool(workers=args.workers)
+    print(f'CPU核数: {os.cpu_count()}, 进程数: {pool.workers}')
+
+    # 预热：启动进程并导入转换模块
+    pool._render_parallel([('<p>预热</p>', 'markdown')] * pool.workers * 4)
+
+    crossover = None
+    try:
+        for size in sizes:
+            items = [(content, 'markdown') for content in build_corpus(size)]
+            chars = sum(len(content) for content, _ in items)
+            inline = measure(_render_chunk, items, args.repeat)
+            parallel = measure(pool._render_parallel, items, args.repeat)
+            assert pool._render_parallel(items) == _render_chunk(items)
+            speedup = inline / parallel
+            if speedup > 1 and crossover is None:
+                crossover = (size, chars)
+            elif speedup <= 1:
+                crossover = None
+            print(f'  {size:>6} 个笔记 {chars / 1024:8.1f} KB  当前线程 {inline * 1000:8.1f} ms  '
+                  f'进程池 {parallel * 1000:8.1f} ms  加速 {speedup:5.2f}x')
+    finally:
+        pool.shutdown()
+
+    if crossover:
+        print(f'建议: NOTE_CONVERT_PARALLEL_MIN_NOTES={crossover[0]} NOTE_CONVERT_PARALLEL_MIN_CHARS={crossover[1]}')
+    else:
+        print('测量范围内进程池没有稳定快于当前线程，建议设置 NOTE_CONVERT_WORKERS=1')
+
+
+if __name__ == '__main__':
+    main()